@@ -0,0 +1,124 @@
+"""
+Async Storage API
+Awaitable versions of the storage operations for async route handlers.
+
+storage_service is synchronous: hashing, chunked encryption and PDF parsing of a
+100 MB book take long enough to stall the event loop for every other client when
+called directly from an async def handler. Everything here runs that work in a
+dedicated thread pool (settings.STORAGE_IO_WORKERS threads) and awaits the result.
+Unencrypted local files are streamed with aiofiles when it is installed.
+
+Run benchmark_event_loop_lag.py to measure event-loop lag with and without it.
+"""
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import AsyncIterator, BinaryIO, Callable, Optional, Tuple, TypeVar
+
+try:
+    import aiofiles
+    AIOFILES_AVAILABLE = True
+except ImportError:
+    aiofiles = None
+    AIOFILES_AVAILABLE = False
+
+from app.config import settings
+from app.storage_backends import is_local_location
+from app import storage_service
+from app import blob_store
+
+T = TypeVar("T")
+
+_executor = ThreadPoolExecutor(max_workers=max(1, settings.STORAGE_IO_WORKERS), thread_name_prefix="storage")
+
+
+async def run_in_storage_pool(func: Callable[..., T], *args, **kwargs) -> T:
+    """Run a blocking storage/crypto/PDF call in the storage thread pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, partial(func, *args, **kwargs))
+
+
+def submit_to_storage_pool(func: Callable[..., T], *args, **kwargs) -> Future:
+    """Queue a blocking storage job in the background without waiting for it (errors are logged)"""
+    future = _executor.submit(func, *args, **kwargs)
+    future.add_done_callback(_log_background_error)
+    return future
+
+
+def _log_background_error(future: Future) -> None:
+    if not future.cancelled() and future.exception() is not None:
+        print(f"⚠️ Background storage job failed: {future.exception()}")
+
+
+async def save_file(file_content: bytes, user_id: int, file_type: str, original_filename: str) -> str:
+    return await run_in_storage_pool(storage_service.save_file, file_content, user_id, file_type, original_filename)
+
+
+async def write_blob(content: bytes) -> Tuple[str, str, bool]:
+    """Hash and store content in the blob store (see blob_store.write_blob)"""
+    return await run_in_storage_pool(blob_store.write_blob, content)
+
+
+async def write_blob_stream(source: BinaryIO, sha256: Optional[str] = None) -> Tuple[str, str, bool]:
+    """Store a seekable stream in the blob store chunk by chunk (see blob_store.write_blob_stream)"""
+    return await run_in_storage_pool(blob_store.write_blob_stream, source, sha256)
+
+
+async def ensure_blob_stream(source: BinaryIO, sha256: str) -> bool:
+    """Rewrite a blob purged after write_blob_stream found it (see blob_store.ensure_blob_stream)"""
+    return await run_in_storage_pool(blob_store.ensure_blob_stream, source, sha256)
+
+
+async def read_file(file_path: str) -> bytes:
+    return await run_in_storage_pool(storage_service.read_file, file_path)
+
+
+async def read_file_range(file_path: str, offset: int, length: int) -> bytes:
+    return await run_in_storage_pool(storage_service.read_file_range, file_path, offset, length)
+
+
+async def stored_file_size(file_path: str) -> int:
+    return await run_in_storage_pool(storage_service.stored_file_size, file_path)
+
+
+async def delete_file(file_path: str) -> None:
+    await run_in_storage_pool(storage_service.delete_file, file_path)
+
+
+async def presigned_download_url(file_path: str, filename: str, media_type: str) -> Optional[str]:
+    return await run_in_storage_pool(storage_service.presigned_download_url, file_path, filename, media_type)
+
+
+async def stream_file(file_path: str, chunk_size: Optional[int] = None) -> AsyncIterator[bytes]:
+    """
+    Yield the plaintext of a stored file in chunks, for StreamingResponse.
+    Encrypted or remote files are read chunk by chunk in the storage pool; plain
+    local files are read with aiofiles (or the pool if aiofiles is missing).
+    """
+    chunk_size = chunk_size or settings.STORAGE_CHUNK_SIZE
+    local_plain = is_local_location(file_path) and not (
+        settings.ENCRYPT_STORAGE or await run_in_storage_pool(storage_service.is_chunked_location, file_path)
+    )
+
+    if local_plain and AIOFILES_AVAILABLE:
+        async with aiofiles.open(file_path, "rb") as f:
+            while True:
+                data = await f.read(chunk_size)
+                if not data:
+                    break
+                yield data
+        return
+
+    stream = await run_in_storage_pool(storage_service.open_file, file_path)
+    try:
+        while True:
+            data = await run_in_storage_pool(stream.read, chunk_size)
+            if not data:
+                break
+            yield data
+    finally:
+        await run_in_storage_pool(stream.close)
+
+
+def shutdown_storage_executor() -> None:
+    _executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,209 @@
+"""
+Content-Addressed Blob Store
+Uploads and split parts are stored once per distinct content, keyed by the SHA-256
+of the plaintext:
+
+    blobs/ab/cd/abcd...        the file (encrypted like any stored file)
+    derived/ab/cd/abcd.../     artifacts computed from it (e.g. previews)
+
+Keys are relative to the active storage backend (STORAGE_PATH locally, or the bucket).
+
+Upload and PdfSplitPart rows point at their blob with blob_sha256 (file_path is the
+blob path), and the blobs table counts those references. When the last reference is
+released the blob and its derived artifacts are deleted.
+
+Releasing and re-uploading the same content can race: an upload that finds the file
+still there skips writing it, while a purge deletes it. So a released row is kept at
+ref_count 0 until purge_blobs deletes the files holding that row locked, and uploads
+call ensure_blob_stream once their reference is committed: after that no purge can
+remove the file, so a file missing then is rewritten.
+
+Derived database state is looked up by blob hash too: a second upload of the same
+textbook copies the first one's extracted text and split parts instead of storing,
+splitting and OCRing it again.
+"""
+import hashlib
+import io
+from typing import BinaryIO, Iterable, List, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+
+from app.config import settings
+from app.models import Blob, Upload, PdfSplitPart
+from app.storage_service import write_stream, delete_file, delete_prefix, storage_location, stored_file_exists
+
+
+def content_sha256(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def _fan_out(root: str, sha256: str) -> str:
+    # Two levels of 256 directories keep every directory small even with millions of blobs
+    return storage_location(f"{root}/{sha256[:2]}/{sha256[2:4]}/{sha256}")
+
+
+def blob_path(sha256: str) -> str:
+    return _fan_out("blobs", sha256)
+
+
+def derived_path(sha256: str, name: str) -> str:
+    """Location of a derived artifact of a blob"""
+    return storage_location(f"derived/{sha256[:2]}/{sha256[2:4]}/{sha256}/{name}")
+
+
+class BlobTooLargeError(ValueError):
+    """Content is larger than the caller's limit"""
+
+
+def stream_sha256(source: BinaryIO, max_bytes: Optional[int] = None) -> Tuple[str, int]:
+    """
+    Hash a seekable stream chunk by chunk and rewind it. Returns (sha256, size).
+    Raises BlobTooLargeError as soon as more than max_bytes have been read.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        data = source.read(settings.STORAGE_CHUNK_SIZE)
+        if not data:
+            break
+        size += len(data)
+        if max_bytes is not None and size > max_bytes:
+            raise BlobTooLargeError(f"Content exceeds {max_bytes} bytes")
+        digest.update(data)
+    source.seek(0)
+    return digest.hexdigest(), size
+
+
+def write_blob(content: bytes) -> Tuple[str, str, bool]:
+    """
+    Store content at its blob path unless it is already there.
+    Returns (sha256, file_path, already_stored). Does not touch the database;
+    call acquire_blob to record the reference.
+    """
+    return write_blob_stream(io.BytesIO(content), content_sha256(content))
+
+
+def write_blob_stream(source: BinaryIO, sha256: Optional[str] = None) -> Tuple[str, str, bool]:
+    """
+    Like write_blob, but reads a seekable stream so only one chunk is held in memory.
+    Pass sha256 if the stream has already been hashed (see stream_sha256).
+    """
+    if sha256 is None:
+        sha256, _ = stream_sha256(source)
+    path = blob_path(sha256)
+    if stored_file_exists(path):
+        return sha256, path, True
+
+    # Backend writes are atomic, so concurrent writers of the same content never expose a partial blob
+    write_stream(source, path)
+    return sha256, path, False
+
+
+def ensure_blob_stream(source: BinaryIO, sha256: str) -> bool:
+    """
+    Rewrite a blob from its seekable source if it is missing. Call after the reference
+    from acquire_blob is committed (a purge of an earlier release may have removed the
+    file write_blob_stream found). Returns True if it had to be rewritten.
+    """
+    path = blob_path(sha256)
+    if stored_file_exists(path):
+        return False
+    source.seek(0)
+    write_stream(source, path)
+    print(f"♻️ Rewrote blob {sha256[:12]} removed by a concurrent purge")
+    return True
+
+
+def acquire_blob(db: Session, sha256: str, file_path: str, size: int) -> None:
+    """
+    Add a reference to a blob, creating its row on first use (or reviving a released one).
+    Waits for a purge of the blob in progress. Does not commit.
+    """
+    if _increment(db, sha256):
+        return
+    try:
+        with db.begin_nested():
+            db.add(Blob(sha256=sha256, file_path=file_path, size=size, ref_count=1))
+    except IntegrityError:
+        # Another request registered the same content between our update and insert
+        _increment(db, sha256)
+
+
+def _increment(db: Session, sha256: str) -> bool:
+    updated = db.query(Blob).filter(Blob.sha256 == sha256).update(
+        {Blob.ref_count: Blob.ref_count + 1, Blob.last_used_at: func.now()},
+        synchronize_session=False
+    )
+    return updated > 0
+
+
+def release_blobs(db: Session, sha256s: Iterable[Optional[str]]) -> List[str]:
+    """
+    Drop one reference per entry (None entries - legacy files - are ignored).
+    Blob rows that reach zero are kept at 0 and their hashes returned, so the files
+    and rows can be removed with purge_blobs() after the transaction commits. Does not commit.
+    """
+    orphaned = []
+    for sha256 in sha256s:
+        if not sha256:
+            continue
+        db.query(Blob).filter(Blob.sha256 == sha256).update(
+            {Blob.ref_count: Blob.ref_count - 1},
+            synchronize_session=False
+        )
+        released = db.query(Blob.sha256).filter(Blob.sha256 == sha256, Blob.ref_count <= 0).first()
+        if released:
+            orphaned.append(sha256)
+    return orphaned
+
+
+def purge_blobs(db: Session, sha256s: Iterable[str]) -> None:
+    """
+    Delete the files and rows of released blobs, skipping any re-acquired meanwhile.
+    Each blob's row stays locked while its files are deleted, so a concurrent
+    acquire_blob waits and then registers the content anew. Commits per blob.
+    """
+    for sha256 in set(sha256s):
+        released = db.query(Blob).filter(
+            Blob.sha256 == sha256,
+            Blob.ref_count <= 0
+        ).with_for_update().first()
+        if not released:
+            db.commit()
+            continue
+        try:
+            delete_file(blob_path(sha256))
+            delete_prefix(_fan_out("derived", sha256))
+            db.delete(released)
+            db.commit()
+            print(f"🗑️ Purged blob {sha256[:12]}")
+        except Exception as e:
+            # The row stays at ref_count 0: a new upload revives it and rewrites the file
+            db.rollback()
+            print(f"⚠️ Could not purge blob {sha256[:12]}: {e}")
+
+
+def blob_hashes_for_users(db: Session, user_ids: List[int]) -> List[str]:
+    """One entry per Upload / PdfSplitPart reference owned by the given users (for release_blobs)"""
+    upload_hashes = db.query(Upload.blob_sha256).filter(
+        Upload.user_id.in_(user_ids),
+        Upload.blob_sha256.isnot(None)
+    ).all()
+    part_hashes = db.query(PdfSplitPart.blob_sha256).filter(
+        PdfSplitPart.user_id.in_(user_ids),
+        PdfSplitPart.blob_sha256.isnot(None)
+    ).all()
+    return [sha256 for (sha256,) in upload_hashes + part_hashes]
+
+
+def find_split_donor(db: Session, upload: Upload) -> Optional[Upload]:
+    """Another upload of the same content that has already been split"""
+    if not upload.blob_sha256:
+        return None
+    return db.query(Upload).filter(
+        Upload.blob_sha256 == upload.blob_sha256,
+        Upload.id != upload.id,
+        Upload.is_split == True
+    ).order_by(Upload.id).first()
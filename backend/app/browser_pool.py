@@ -0,0 +1,356 @@
+"""
+Persistent Chromium Pool for Playwright PDF Rendering
+Launching Chromium costs seconds and hundreds of MB per download. The pool keeps
+settings.PDF_BROWSER_POOL_SIZE browsers running for the life of the process, each
+with pre-created browser contexts. A render borrows a context ("lease"), opens a
+page in it, prints, and gives the context back. Contexts serve the local rendering
+assets (KaTeX, app/render_assets.py) through a route, so pages need no network.
+
+- Concurrency: there are PDF_BROWSER_MAX_PAGES leases in total, so at most that
+  many pages render at once; further renders wait up to
+  PDF_BROWSER_ACQUIRE_TIMEOUT_SECONDS (then raise, and the caller falls back to ReportLab).
+- Recycling: a browser is retired after PDF_BROWSER_MAX_RENDERS renders, when its
+  processes use more than PDF_BROWSER_MAX_RSS_MB, or when it disconnects. It stops
+  receiving renders, is closed once its active pages finish, and is relaunched.
+- Health: a background task checks every browser each PDF_BROWSER_HEALTH_INTERVAL_SECONDS.
+
+Everything runs on the application's event loop: start it from the FastAPI lifespan
+(start_browser_pool) and close it on shutdown (shutdown_browser_pool).
+"""
+import asyncio
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional
+
+try:
+    from playwright.async_api import async_playwright
+    PLAYWRIGHT_AVAILABLE = True
+except ImportError:
+    async_playwright = None
+    PLAYWRIGHT_AVAILABLE = False
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    psutil = None
+    PSUTIL_AVAILABLE = False
+
+from app.config import settings
+from app.render_assets import ASSET_URL_PATTERN, route_assets
+
+BROWSER_ARGS = [
+    '--disable-web-security',  # Allow font loading
+    '--disable-features=TranslateUI',
+    '--disable-ipc-flooding-protection',
+    '--font-render-hinting=none',  # Better font rendering
+]
+VIEWPORT = {"width": 1200, "height": 1600}  # Consistent layout for every render
+
+
+def _process_rss_bytes(pid: int) -> int:
+    try:
+        if PSUTIL_AVAILABLE:
+            return psutil.Process(pid).memory_info().rss
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        return 0
+
+
+class _BrowserSlot:
+    """One pooled browser. generation changes on every relaunch, invalidating older leases."""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.browser = None
+        self.generation = 0
+        self.renders = 0
+        self.active = 0
+        self.retiring = False
+        self.relaunching = False
+        self.launched_at = 0.0
+        self.rss_mb: Optional[float] = None
+
+
+class _Lease(NamedTuple):
+    slot: _BrowserSlot
+    generation: int
+    context: object
+
+
+class BrowserPool:
+    def __init__(
+        self,
+        browsers: int,
+        max_pages: int,
+        max_renders: int,
+        max_rss_mb: int,
+        health_interval: float,
+        acquire_timeout: float
+    ):
+        self.browsers = max(1, browsers)
+        self.max_pages = max(1, max_pages)
+        self.contexts_per_browser = math.ceil(self.max_pages / self.browsers)
+        self.max_renders = max_renders
+        self.max_rss_mb = max_rss_mb
+        self.health_interval = health_interval
+        self.acquire_timeout = acquire_timeout
+        self._playwright = None
+        self._slots: List[_BrowserSlot] = []
+        self._leases: Optional[asyncio.Queue] = None
+        self._start_lock = asyncio.Lock()
+        self._health_task: Optional[asyncio.Task] = None
+        self._closing = False
+        self.recycles = 0
+        self.renders = 0
+
+    @property
+    def started(self) -> bool:
+        return self._playwright is not None
+
+    async def start(self) -> None:
+        """Start Playwright and launch the browsers (no-op once started)"""
+        if self.started:
+            return
+        async with self._start_lock:
+            if self.started:
+                return
+            if not PLAYWRIGHT_AVAILABLE:
+                raise RuntimeError("Playwright not available")
+            start = time.perf_counter()
+            # Fresh state: a failed start (or an earlier close) went through close(), which
+            # would otherwise keep _retire from relaunching and stop the health loop at once
+            self._closing = False
+            self._health_task = None
+            self._leases = asyncio.Queue()
+            self._slots = [_BrowserSlot(i) for i in range(self.browsers)]
+            self._playwright = await async_playwright().start()
+            try:
+                for slot in self._slots:
+                    await self._launch(slot)
+            except Exception:
+                await self.close()
+                raise
+            self._health_task = asyncio.create_task(self._health_loop())
+            print(f"✅ Browser pool ready: {self.browsers} Chromium x {self.contexts_per_browser} contexts "
+                  f"({self.max_pages} concurrent pages) in {time.perf_counter() - start:.2f}s")
+
+    async def _launch(self, slot: _BrowserSlot) -> None:
+        slot.browser = await self._playwright.chromium.launch(headless=True, args=BROWSER_ARGS)
+        slot.generation += 1
+        slot.renders = 0
+        slot.retiring = False
+        slot.launched_at = time.time()
+        slot.rss_mb = None
+        # Leases are split over the browsers; the last one may get fewer so the total is max_pages
+        count = min(self.contexts_per_browser, self.max_pages - slot.index * self.contexts_per_browser)
+        for _ in range(max(1, count)):
+            context = await slot.browser.new_context(viewport=VIEWPORT)
+            await context.route(ASSET_URL_PATTERN, route_assets)
+            self._leases.put_nowait(_Lease(slot, slot.generation, context))
+
+    def _is_current(self, lease: _Lease) -> bool:
+        slot = lease.slot
+        return (
+            lease.generation == slot.generation and not slot.retiring
+            and slot.browser is not None and slot.browser.is_connected()
+        )
+
+    async def _acquire(self) -> _Lease:
+        await self.start()
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"No browser page free within {self.acquire_timeout:.0f}s")
+            lease = await asyncio.wait_for(self._leases.get(), timeout=remaining)
+            if self._is_current(lease):
+                lease.slot.active += 1
+                return lease
+            # Lease of a retired or crashed browser: drop it (the relaunch creates new ones)
+            if lease.generation == lease.slot.generation:
+                self._retire(lease.slot, "browser disconnected")
+
+    def _release(self, lease: _Lease) -> None:
+        slot = lease.slot
+        slot.active -= 1
+        slot.renders += 1
+        self.renders += 1
+        if slot.retiring:
+            self._retire(slot, None)
+        elif self.max_renders and slot.renders >= self.max_renders:
+            self._retire(slot, f"{slot.renders} renders")
+        elif not slot.browser.is_connected():
+            self._retire(slot, "browser disconnected")
+        else:
+            self._leases.put_nowait(lease)
+
+    def _drop_leases(self, slot: _BrowserSlot) -> None:
+        """Remove a browser's idle leases from the queue"""
+        kept = []
+        while not self._leases.empty():
+            lease = self._leases.get_nowait()
+            if lease.slot is not slot:
+                kept.append(lease)
+        for lease in kept:
+            self._leases.put_nowait(lease)
+
+    def _retire(self, slot: _BrowserSlot, reason: Optional[str]) -> None:
+        """Stop handing out this browser; relaunch it as soon as its active pages are done"""
+        if reason and not slot.retiring:
+            print(f"♻️ Recycling pooled browser {slot.index}: {reason}")
+        slot.retiring = True
+        if slot.active == 0 and not slot.relaunching and not self._closing:
+            slot.relaunching = True
+            asyncio.create_task(self._relaunch(slot))
+
+    async def _relaunch(self, slot: _BrowserSlot) -> None:
+        old_browser = slot.browser
+        self._drop_leases(slot)
+        try:
+            if old_browser is not None:
+                try:
+                    await old_browser.close()
+                except Exception:
+                    pass
+            await self._launch(slot)
+            self.recycles += 1
+            print(f"✅ Pooled browser {slot.index} relaunched")
+        except Exception as e:
+            # Left retiring; the health check tries again
+            slot.browser = None
+            print(f"❌ Could not relaunch pooled browser {slot.index}: {e}")
+        finally:
+            slot.relaunching = False
+
+    async def _browser_rss_mb(self, slot: _BrowserSlot) -> Optional[float]:
+        """Resident memory of the browser's processes (browser, renderers, GPU, utilities)"""
+        session = await slot.browser.new_browser_cdp_session()
+        try:
+            info = await session.send("SystemInfo.getProcessInfo")
+        finally:
+            await session.detach()
+        pids = [process["id"] for process in info.get("processInfo", [])]
+        return sum(_process_rss_bytes(pid) for pid in pids) / (1024 * 1024) if pids else None
+
+    async def check_health(self) -> None:
+        for slot in self._slots:
+            if slot.relaunching:
+                continue
+            if slot.browser is None or not slot.browser.is_connected():
+                self._retire(slot, "browser disconnected")
+                continue
+            if slot.retiring:
+                self._retire(slot, None)
+                continue
+            if self.max_rss_mb:
+                try:
+                    slot.rss_mb = await self._browser_rss_mb(slot)
+                except Exception as e:
+                    print(f"⚠️ Browser memory check failed: {e}")
+                    continue
+                if slot.rss_mb is not None and slot.rss_mb > self.max_rss_mb:
+                    self._retire(slot, f"{slot.rss_mb:.0f} MB resident")
+
+    async def _health_loop(self) -> None:
+        while not self._closing:
+            await asyncio.sleep(self.health_interval)
+            try:
+                await self.check_health()
+            except Exception as e:
+                print(f"⚠️ Browser pool health check error: {e}")
+
+    @asynccontextmanager
+    async def page(self) -> AsyncIterator[object]:
+        """A fresh page in a pooled browser context; closed (and the context returned) on exit"""
+        lease = await self._acquire()
+        page = None
+        try:
+            page = await lease.context.new_page()
+            yield page
+        finally:
+            if page is not None:
+                try:
+                    await page.close()
+                except Exception:
+                    pass
+            self._release(lease)
+
+    async def close(self, grace_seconds: float = 0) -> None:
+        """Stop health checks, wait up to grace_seconds for active renders, close every browser"""
+        self._closing = True
+        if self._health_task is not None:
+            self._health_task.cancel()
+        deadline = time.monotonic() + grace_seconds
+        while any(slot.active for slot in self._slots) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        for slot in self._slots:
+            if slot.browser is not None:
+                try:
+                    await slot.browser.close()
+                except Exception:
+                    pass
+        if self._playwright is not None:
+            try:
+                await self._playwright.stop()
+            except Exception:
+                pass
+        self._playwright = None
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "started": self.started,
+            "browsers": self.browsers,
+            "max_pages": self.max_pages,
+            "free_pages": self._leases.qsize() if self._leases is not None else 0,
+            "renders": self.renders,
+            "recycles": self.recycles,
+            "slots": [
+                {
+                    "index": slot.index,
+                    "connected": bool(slot.browser is not None and slot.browser.is_connected()),
+                    "renders": slot.renders,
+                    "active_pages": slot.active,
+                    "retiring": slot.retiring,
+                    "uptime_seconds": round(time.time() - slot.launched_at) if slot.launched_at else 0,
+                    "rss_mb": round(slot.rss_mb) if slot.rss_mb is not None else None,
+                }
+                for slot in self._slots
+            ],
+        }
+
+
+_pool: Optional[BrowserPool] = None
+
+
+def get_browser_pool() -> BrowserPool:
+    """The process-wide pool (browsers are launched on start() or the first render)"""
+    global _pool
+    if _pool is None:
+        _pool = BrowserPool(
+            browsers=settings.PDF_BROWSER_POOL_SIZE,
+            max_pages=settings.PDF_BROWSER_MAX_PAGES,
+            max_renders=settings.PDF_BROWSER_MAX_RENDERS,
+            max_rss_mb=settings.PDF_BROWSER_MAX_RSS_MB,
+            health_interval=settings.PDF_BROWSER_HEALTH_INTERVAL_SECONDS,
+            acquire_timeout=settings.PDF_BROWSER_ACQUIRE_TIMEOUT_SECONDS,
+        )
+    return _pool
+
+
+async def start_browser_pool() -> None:
+    await get_browser_pool().start()
+
+
+async def shutdown_browser_pool() -> None:
+    global _pool
+    if _pool is not None:
+        await _pool.close(grace_seconds=settings.PDF_BROWSER_SHUTDOWN_GRACE_SECONDS)
+        _pool = None
+
+
+def get_browser_pool_stats() -> Dict[str, object]:
+    return _pool.stats() if _pool is not None else {"started": False}
@@ -0,0 +1,259 @@
+"""
+Chunked Streaming Encryption (storage format v1)
+Authenticated encryption of stored files in fixed-size chunks, so files can be
+written in one pass and read back as a stream or at any offset while holding only
+one chunk in memory.
+
+On-disk layout:
+
+    header (32 bytes)
+        magic           8  b"SQNAENC1"
+        version         1
+        reserved        1
+        chunk_size      4  plaintext bytes per chunk (big-endian)
+        plaintext_size  8  total plaintext bytes (filled in when the writer closes;
+                           UNKNOWN_SIZE when written to a non-seekable sink)
+        nonce_prefix    7  random per file
+        reserved        3
+    chunks
+        AES-256-GCM(chunk) || 16-byte tag, each chunk_size bytes of plaintext
+        (the last one may be shorter, and is empty for an empty file)
+
+The chunk index is implicit: chunk i starts at HEADER_SIZE + i * (chunk_size + 16),
+so a plaintext offset maps directly to one chunk without scanning the file.
+
+Each chunk's nonce is nonce_prefix || chunk index (4 bytes) || final flag (1 byte).
+Binding the index prevents chunks from being reordered, and binding the final flag
+prevents truncation. The header (with plaintext_size zeroed, since it is only known
+at close) is authenticated as associated data of every chunk; a wrong plaintext_size
+changes which chunk is treated as final or how long it is, so it fails authentication too.
+The AES key is derived from the storage Fernet key with HKDF, so no new key file is needed.
+
+When the output cannot be seeked (e.g. an object-storage multipart upload) the header
+keeps plaintext_size = UNKNOWN_SIZE and readers derive the size from the stored length.
+"""
+import base64
+import io
+import os
+import struct
+from typing import BinaryIO, Optional
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+MAGIC = b"SQNAENC1"
+VERSION = 1
+HEADER_FORMAT = ">8sBBIQ7s3s"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)  # 32
+TAG_SIZE = 16
+DEFAULT_CHUNK_SIZE = 64 * 1024
+UNKNOWN_SIZE = 2 ** 64 - 1
+
+
+class ChunkedEncryptionError(Exception):
+    """File is corrupt, truncated or was encrypted with a different key"""
+
+
+def derive_chunk_key(fernet_key: bytes) -> bytes:
+    """AES-256 key for the chunked format, derived from the storage Fernet key"""
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=b"studyqna-storage-chunked-v1"
+    ).derive(base64.urlsafe_b64decode(fernet_key))
+
+
+def has_chunked_header(data: bytes) -> bool:
+    return data[:len(MAGIC)] == MAGIC
+
+
+def is_chunked_file(path) -> bool:
+    try:
+        with open(path, "rb") as f:
+            return has_chunked_header(f.read(len(MAGIC)))
+    except OSError:
+        return False
+
+
+def _nonce(prefix: bytes, index: int, final: bool) -> bytes:
+    return prefix + struct.pack(">IB", index, 1 if final else 0)
+
+
+def _pack_header(chunk_size: int, plaintext_size: int, nonce_prefix: bytes) -> bytes:
+    return struct.pack(HEADER_FORMAT, MAGIC, VERSION, 0, chunk_size, plaintext_size, nonce_prefix, b"\0" * 3)
+
+
+class EncryptedFileWriter:
+    """
+    Single-pass writer: plaintext is encrypted chunk by chunk as it is written.
+    Only one chunk of plaintext is buffered. Use as a context manager, or call close().
+    sink is a path or a binary file object (closed by close()/abort()).
+    """
+
+    def __init__(self, sink, key: bytes, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self._file = sink if hasattr(sink, "write") else open(sink, "wb")
+        self._aead = AESGCM(key)
+        self.chunk_size = chunk_size
+        self._nonce_prefix = os.urandom(7)
+        self._buffer = bytearray()
+        self._index = 0
+        self.size = 0
+        # plaintext_size is unknown until close(); the header is rewritten then if the sink can seek
+        self._seekable = self._file.seekable()
+        self._file.write(_pack_header(chunk_size, 0 if self._seekable else UNKNOWN_SIZE, self._nonce_prefix))
+        # Chunks authenticate the header with the size field zeroed, so it can be rewritten at close
+        self._aad = _pack_header(chunk_size, 0, self._nonce_prefix)
+
+    def write(self, data: bytes) -> int:
+        self._buffer += data
+        self.size += len(data)
+        while len(self._buffer) > self.chunk_size:
+            # Keep at least one byte back so the last chunk is always written by close() with the final flag
+            self._write_chunk(bytes(self._buffer[:self.chunk_size]), final=False)
+            del self._buffer[:self.chunk_size]
+        return len(data)
+
+    def _write_chunk(self, plaintext: bytes, final: bool) -> None:
+        nonce = _nonce(self._nonce_prefix, self._index, final)
+        self._file.write(self._aead.encrypt(nonce, plaintext, self._aad))
+        self._index += 1
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        try:
+            self._write_chunk(bytes(self._buffer), final=True)
+            self._buffer = bytearray()
+            if self._seekable:
+                self._file.seek(0)
+                self._file.write(_pack_header(self.chunk_size, self.size, self._nonce_prefix))
+        except BaseException:
+            # Closing the sink would publish the incomplete file (rename/complete upload)
+            self.abort()
+            raise
+        self._file.close()
+
+    def abort(self) -> None:
+        """Close without finalizing (the partial file is invalid and should be deleted)"""
+        if hasattr(self._file, "abort"):
+            self._file.abort()
+        else:
+            self._file.close()
+
+    def __enter__(self) -> "EncryptedFileWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class DecryptedFileReader(io.RawIOBase):
+    """
+    Seekable, read-only view of the plaintext of a chunked file.
+    Decrypts one chunk at a time (the current chunk is cached), so reading a few
+    pages of a 100 MB PDF only touches the chunks those pages live in.
+    Wrap in io.BufferedReader for efficient small reads (see storage_service.open_file).
+    """
+
+    def __init__(self, source, key: bytes):
+        super().__init__()
+        self._file: BinaryIO = source if hasattr(source, "read") else open(source, "rb")
+        header = self._file.read(HEADER_SIZE)
+        if len(header) != HEADER_SIZE:
+            self._file.close()
+            raise ChunkedEncryptionError("File too short for header")
+        magic, version, _, chunk_size, plaintext_size, nonce_prefix, _ = struct.unpack(HEADER_FORMAT, header)
+        if magic != MAGIC or version != VERSION:
+            self._file.close()
+            raise ChunkedEncryptionError("Not a chunked encrypted file (or unsupported version)")
+        self.chunk_size = chunk_size
+        self.size = plaintext_size if plaintext_size != UNKNOWN_SIZE else self._size_from_length()
+        self._nonce_prefix = nonce_prefix
+        self._aad = _pack_header(chunk_size, 0, nonce_prefix)
+        self._aead = AESGCM(key)
+        self._chunk_count = max(1, -(-self.size // chunk_size))
+        self._position = 0
+        self._cached_index: Optional[int] = None
+        self._cached_chunk = b""
+
+    def _size_from_length(self) -> int:
+        """Plaintext size of a file written without a size in the header"""
+        body = self._file.seek(0, io.SEEK_END) - HEADER_SIZE
+        full_chunks, remainder = divmod(body, self.chunk_size + TAG_SIZE)
+        if remainder == 0 and full_chunks > 0:
+            return full_chunks * self.chunk_size
+        if remainder < TAG_SIZE:
+            self._file.close()
+            raise ChunkedEncryptionError("Truncated chunk")
+        return full_chunks * self.chunk_size + remainder - TAG_SIZE
+
+    def _chunk(self, index: int) -> bytes:
+        if index == self._cached_index:
+            return self._cached_chunk
+        final = index == self._chunk_count - 1
+        plaintext_length = self.size - index * self.chunk_size if final else self.chunk_size
+        self._file.seek(HEADER_SIZE + index * (self.chunk_size + TAG_SIZE))
+        ciphertext = self._file.read(plaintext_length + TAG_SIZE)
+        try:
+            chunk = self._aead.decrypt(_nonce(self._nonce_prefix, index, final), ciphertext, self._aad)
+        except Exception:
+            raise ChunkedEncryptionError(f"Chunk {index} failed authentication (corrupt, truncated or wrong key)")
+        self._cached_index, self._cached_chunk = index, chunk
+        return chunk
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if position < 0:
+            raise ValueError("Negative seek position")
+        self._position = position
+        return position
+
+    def readinto(self, buffer) -> int:
+        if self._position >= self.size:
+            return 0
+        index, offset = divmod(self._position, self.chunk_size)
+        chunk = self._chunk(index)
+        count = min(len(buffer), len(chunk) - offset)
+        buffer[:count] = chunk[offset:offset + count]
+        self._position += count
+        return count
+
+    def read_range(self, offset: int, length: int) -> bytes:
+        """Plaintext bytes offset..offset+length (clipped to the end of the file)"""
+        self.seek(offset)
+        parts = []
+        remaining = max(0, min(length, self.size - offset))
+        while remaining > 0:
+            data = self.read(min(remaining, self.chunk_size))
+            if not data:
+                break
+            parts.append(data)
+            remaining -= len(data)
+        return b"".join(parts)
+
+    def close(self) -> None:
+        if not self.closed:
+            self._file.close()
+            self._cached_chunk = b""
+        super().close()
@@ -16,7 +16,24 @@ class Settings(BaseSettings):
     
     # Storage
     STORAGE_PATH: str = os.getenv("STORAGE_PATH", "./storage")
-    ENCRYPT_STORAGE: bool = True
+    ENCRYPT_STORAGE: bool = os.getenv("ENCRYPT_STORAGE", "true").lower() == "true"  # Encrypt stored files in the app (disable only with encrypted object storage, e.g. S3 SSE)
+    STORAGE_ENCRYPTION_KEY: str = os.getenv("STORAGE_ENCRYPTION_KEY", "")  # Fernet key shared by all API nodes (default: generated into STORAGE_PATH/.encryption_key)
+    STORAGE_BACKEND: str = os.getenv("STORAGE_BACKEND", "local")  # Where new files are written: "local" (STORAGE_PATH) or "s3"
+    S3_BUCKET: str = os.getenv("S3_BUCKET", "")
+    S3_PREFIX: str = os.getenv("S3_PREFIX", "")  # Key prefix inside the bucket (e.g. "studyqna")
+    S3_ENDPOINT_URL: str = os.getenv("S3_ENDPOINT_URL", "")  # Empty for AWS; set for MinIO / other S3-compatible servers
+    S3_REGION: str = os.getenv("S3_REGION", "")
+    S3_ACCESS_KEY_ID: str = os.getenv("S3_ACCESS_KEY_ID", "")  # Empty to use the default AWS credential chain
+    S3_SECRET_ACCESS_KEY: str = os.getenv("S3_SECRET_ACCESS_KEY", "")
+    S3_MULTIPART_CHUNK_SIZE: int = int(os.getenv("S3_MULTIPART_CHUNK_SIZE", str(8 * 1024 * 1024)))  # Part size for streamed uploads (min 5 MB)
+    S3_READ_BUFFER_SIZE: int = int(os.getenv("S3_READ_BUFFER_SIZE", str(1024 * 1024)))  # Bytes fetched per ranged GET when streaming
+    STORAGE_PRESIGNED_DOWNLOADS: bool = os.getenv("STORAGE_PRESIGNED_DOWNLOADS", "false").lower() == "true"  # Redirect file downloads to presigned URLs (plaintext objects only)
+    STORAGE_PRESIGNED_URL_TTL_SECONDS: int = int(os.getenv("STORAGE_PRESIGNED_URL_TTL_SECONDS", "300"))
+    STORAGE_CHUNK_SIZE: int = int(os.getenv("STORAGE_CHUNK_SIZE", "65536"))  # Plaintext bytes per encrypted chunk (fixed per file at write time)
+    STORAGE_CACHE_MAX_BYTES: int = int(os.getenv("STORAGE_CACHE_MAX_BYTES", str(128 * 1024 * 1024)))  # Decrypted-file cache budget per process (0 = disabled)
+    STORAGE_CACHE_TTL_SECONDS: int = int(os.getenv("STORAGE_CACHE_TTL_SECONDS", "300"))  # Cached plaintext is dropped this long after it was cached
+    STORAGE_IO_WORKERS: int = int(os.getenv("STORAGE_IO_WORKERS", "4"))  # Threads for encryption, hashing and PDF parsing off the event loop
+    STORAGE_REENCRYPT_ON_STARTUP: bool = os.getenv("STORAGE_REENCRYPT_ON_STARTUP", "false").lower() == "true"  # Convert legacy Fernet files to the chunked format in a background thread
     
     # Email - Brevo API (Recommended)
     BREVO_API_KEY: str = os.getenv("BREVO_API_KEY", "")
@@ -52,6 +69,11 @@ class Settings(BaseSettings):
     # Limits
     MAX_PDF_SIZE_MB: int = 6  # Regular upload limit
     MAX_BOOK_PDF_SIZE_MB: int = 100  # Maximum size for book splitting feature
+    SPLIT_MIN_PART_PAGES: int = int(os.getenv("SPLIT_MIN_PART_PAGES", "8"))  # Shorter chapters are merged with their neighbours when splitting a book
+    SPLIT_MAX_PART_PAGES: int = int(os.getenv("SPLIT_MAX_PART_PAGES", "60"))  # Longer chapters are cut into even pieces
+    PART_PREVIEW_PAGES: int = 5  # Pages in a split part's preview PDF
+    PART_THUMBNAIL_WIDTH: int = int(os.getenv("PART_THUMBNAIL_WIDTH", "240"))  # Pixel width of split part first-page thumbnails
+    PART_ARTIFACT_MAX_AGE_SECONDS: int = int(os.getenv("PART_ARTIFACT_MAX_AGE_SECONDS", "86400"))  # Browser cache lifetime of part previews/thumbnails
     MAX_IMAGE_SIZE_MB: int = 10  # Increased for mobile camera photos (typically 3-8MB)
     MAX_PDF_PAGES: int = 40
     MAX_FREE_PDF_PAGES: int = 10
@@ -69,6 +91,60 @@ class Settings(BaseSettings):
     QUESTIONS_PER_PDF_UPLOAD: int = int(os.getenv("QUESTIONS_PER_PDF_UPLOAD", "20"))  # Each PDF upload allows 20 questions
     QUESTIONS_PER_IMAGE_UPLOAD: int = int(os.getenv("QUESTIONS_PER_IMAGE_UPLOAD", "20"))  # Each Image upload allows 20 questions
     
+    # PDF text layer
+    PDF_TEXT_ENGINE: str = os.getenv("PDF_TEXT_ENGINE", "auto")  # "auto" (pdftotext, PyPDF2 for weak pages), "pdftotext" or "pypdf2"
+    PDF_TEXT_WEAK_PAGE_CHARS: int = int(os.getenv("PDF_TEXT_WEAK_PAGE_CHARS", "20"))  # In "auto", pages with less text are retried with PyPDF2
+    
+    # OCR (scanned PDFs)
+    OCR_ADAPTIVE: bool = os.getenv("OCR_ADAPTIVE", "true").lower() == "true"  # Fast low-DPI pass first, escalate hard pages
+    OCR_FAST_DPI: int = int(os.getenv("OCR_FAST_DPI", "150"))  # First-pass rasterization DPI
+    OCR_FULL_DPI: int = int(os.getenv("OCR_FULL_DPI", "300"))  # DPI for escalated (low-confidence) pages
+    OCR_MIN_CONFIDENCE: float = float(os.getenv("OCR_MIN_CONFIDENCE", "75"))  # Mean Tesseract word confidence (0-100) to accept a fast-pass page
+    OCR_MIN_WORDS: int = int(os.getenv("OCR_MIN_WORDS", "5"))  # Fewer recognised words than this also triggers escalation
+    OCR_CLEAN_PAGE_RATIO: float = float(os.getenv("OCR_CLEAN_PAGE_RATIO", "0.92"))  # Share of near-black/near-white pixels above which Otsu thresholding is skipped
+    OCR_ENGINE: str = os.getenv("OCR_ENGINE", "batch")  # "batch" (one tesseract process per batch of pages) or "per_page"
+    OCR_BATCH_SIZE: int = int(os.getenv("OCR_BATCH_SIZE", "16"))  # Pages handed to one tesseract invocation
+    MATHPIX_APP_ID: str = os.getenv("MATHPIX_APP_ID", "")  # Optional Mathpix fallback for pages Tesseract cannot read
+    MATHPIX_APP_KEY: str = os.getenv("MATHPIX_APP_KEY", "")
+    MATHPIX_API_URL: str = os.getenv("MATHPIX_API_URL", "https://api.mathpix.com")  # Point at a mock server for testing
+    MATHPIX_POLL_INTERVAL: float = float(os.getenv("MATHPIX_POLL_INTERVAL", "3"))  # Seconds between PDF job status polls
+    MATHPIX_TIMEOUT: float = float(os.getenv("MATHPIX_TIMEOUT", "120"))  # Give up on a PDF job after this many seconds
+    EXTRACTION_WORKERS: int = int(os.getenv("EXTRACTION_WORKERS", "2"))  # Background extraction threads (started at upload/split time)
+
+    # Image content validation (YOLO object detection, see app/model_registry.py)
+    YOLO_BACKEND: str = os.getenv("YOLO_BACKEND", "auto")  # "auto" (ONNX if exported, else ultralytics), "onnx" or "ultralytics"
+    YOLO_WEIGHTS: str = os.getenv("YOLO_WEIGHTS", "yolov8n.pt")  # ultralytics weights (nano model for speed)
+    YOLO_ONNX_PATH: str = os.getenv("YOLO_ONNX_PATH", "")  # Exported model (default: app/models/<weights>_<size>.onnx)
+    YOLO_INPUT_SIZE: int = int(os.getenv("YOLO_INPUT_SIZE", "640"))  # Fixed square input size
+    YOLO_THREADS: int = int(os.getenv("YOLO_THREADS", "2"))  # ONNX Runtime intra-op threads per inference (capped at the CPU count)
+    YOLO_MAX_BATCH: int = int(os.getenv("YOLO_MAX_BATCH", "8"))  # Images per batched inference
+    YOLO_PRELOAD: bool = os.getenv("YOLO_PRELOAD", "false").lower() == "true"  # Load the model at startup instead of on the first request
+    VALIDATION_WORKERS: int = int(os.getenv("VALIDATION_WORKERS", "3"))  # Threads running the object, face and text checks of an image concurrently
+    VALIDATION_CACHE_ENABLED: bool = os.getenv("VALIDATION_CACHE_ENABLED", "true").lower() == "true"  # Reuse verdicts of previously validated (or near-identical) images
+    VALIDATION_CACHE_TTL_HOURS: int = int(os.getenv("VALIDATION_CACHE_TTL_HOURS", "720"))  # Re-validate an image after this long
+    VALIDATION_PHASH_MAX_DISTANCE: int = int(os.getenv("VALIDATION_PHASH_MAX_DISTANCE", "3"))  # Max differing perceptual-hash bits (of 64) for a near-duplicate; recall is exact up to 3
+
+    # Playwright PDF rendering (persistent Chromium pool, see app/browser_pool.py)
+    PDF_BROWSER_POOL_SIZE: int = int(os.getenv("PDF_BROWSER_POOL_SIZE", "1"))  # Chromium processes kept running
+    PDF_BROWSER_MAX_PAGES: int = int(os.getenv("PDF_BROWSER_MAX_PAGES", "4"))  # Concurrent renders across the pool (pre-created contexts)
+    PDF_BROWSER_MAX_RENDERS: int = int(os.getenv("PDF_BROWSER_MAX_RENDERS", "200"))  # Relaunch a browser after this many renders (0 = never)
+    PDF_BROWSER_MAX_RSS_MB: int = int(os.getenv("PDF_BROWSER_MAX_RSS_MB", "1024"))  # Relaunch a browser whose processes use more memory (0 = no limit)
+    PDF_BROWSER_HEALTH_INTERVAL_SECONDS: float = float(os.getenv("PDF_BROWSER_HEALTH_INTERVAL_SECONDS", "30"))
+    PDF_BROWSER_ACQUIRE_TIMEOUT_SECONDS: float = float(os.getenv("PDF_BROWSER_ACQUIRE_TIMEOUT_SECONDS", "30"))  # Wait for a free page before falling back to ReportLab
+    PDF_BROWSER_SHUTDOWN_GRACE_SECONDS: float = float(os.getenv("PDF_BROWSER_SHUTDOWN_GRACE_SECONDS", "10"))  # Let active renders finish on shutdown
+    PDF_BROWSER_PRELAUNCH: bool = os.getenv("PDF_BROWSER_PRELAUNCH", "true").lower() == "true"  # Launch the pool at startup instead of on the first download
+    KATEX_ASSETS_DIR: str = os.getenv("KATEX_ASSETS_DIR", "")  # Local KaTeX dist (default: app/static/katex, filled by fetch_katex.py)
+    FONT_SUBSETTING: bool = os.getenv("FONT_SUBSETTING", "true").lower() == "true"  # Embed only the glyphs a set uses (needs fontTools)
+    FONT_PAYLOAD_CACHE_SIZE: int = int(os.getenv("FONT_PAYLOAD_CACHE_SIZE", "64"))  # Encoded fonts/subsets kept in memory
+    RENDER_WORKERS: int = int(os.getenv("RENDER_WORKERS", "2"))  # Processes running ReportLab/DOCX/TXT renders (0 = a thread, see app/render_executor.py)
+    RENDER_QUEUE_SIZE: int = int(os.getenv("RENDER_QUEUE_SIZE", "8"))  # Renders allowed to wait for a worker; more get 503
+    RENDER_TIMEOUT_SECONDS: float = float(os.getenv("RENDER_TIMEOUT_SECONDS", "120"))  # Give up on a render this long after a worker picked it up (queue time not counted) with 504
+    BULK_EXPORT_MAX_SETS: int = int(os.getenv("BULK_EXPORT_MAX_SETS", "50"))  # Sets per ZIP export request
+    BULK_EXPORT_CONCURRENCY: int = int(os.getenv("BULK_EXPORT_CONCURRENCY", "2"))  # Documents of one export rendered (and held in memory) at once
+    RENDER_CACHE_ENABLED: bool = os.getenv("RENDER_CACHE_ENABLED", "true").lower() == "true"  # Serve repeat set downloads from rendered files (see app/render_cache.py)
+    RENDER_CACHE_DIR: str = os.getenv("RENDER_CACHE_DIR", "")  # Local directory for rendered downloads (default: STORAGE_PATH/render_cache)
+    RENDER_CACHE_MAX_MB: int = int(os.getenv("RENDER_CACHE_MAX_MB", "512"))  # Disk budget; least recently downloaded files are evicted first
+
     # AI Usage Tracking
     AI_USAGE_THRESHOLD_TOKENS: int = int(os.getenv("AI_USAGE_THRESHOLD_TOKENS", "1000000"))  # Default: 1M tokens
     AI_USAGE_ALERT_EMAIL: str = os.getenv("AI_USAGE_ALERT_EMAIL", "")  # Email to send alerts to
@@ -1,25 +1,26 @@
 """
 Enhanced Content Validation System
 Blocks inappropriate content and only allows study materials
+
+validate_content() decodes the image once into a ValidationContext and runs the
+object, face and text checks concurrently (settings.VALIDATION_WORKERS threads),
+returning on the first blocking verdict.
 """
 import cv2
 import numpy as np
 from PIL import Image
-try:
-    from ultralytics import YOLO
-    ULTRALYTICS_AVAILABLE = True
-except ImportError:
-    YOLO = None
-    ULTRALYTICS_AVAILABLE = False
-    print("⚠️ Warning: ultralytics not available. Content validation will be limited.")
 import os
 import re
-from typing import Tuple, Optional, List, Dict
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Tuple, Optional, List, Dict, Union
 import pytesseract
-
-# Load YOLO model for object detection
-_model_path = os.path.join(os.path.dirname(__file__), "models", "yolov8n.pt")
-_model = None
+from app.blob_store import content_sha256
+from app.config import settings
+from app.database import SessionLocal
+from app.model_registry import get_detector
+from app.ocr_service import save_validation_text
+from app.validation_cache import lookup_exact, lookup_similar, perceptual_hash, store_verdict
 
 # COCO class names (YOLO uses COCO dataset)
 COCO_CLASSES = {
@@ -74,165 +75,145 @@ ALLOWED_KEYWORDS = [
     'geography', 'science', 'literature', 'grammar', 'vocabulary'
 ]
 
-def get_model():
-    """Lazy load YOLO model with PyTorch 2.6+ compatibility"""
-    global _model
-    if _model is None:
-        try:
-            print("📦 Loading YOLO model for content validation...")
-            
-            # Fix for PyTorch 2.6+ weights_only issue
-            import torch
-            import torch.serialization
-            
-            # Add ultralytics classes to safe globals for PyTorch 2.6+
-            try:
-                from ultralytics.nn.tasks import DetectionModel
-                from ultralytics.nn.modules import Conv, Bottleneck, C2f, SPPF, Detect
-                # Add all ultralytics classes that might be needed
-                torch.serialization.add_safe_globals([
-                    DetectionModel,
-                    Conv, Bottleneck, C2f, SPPF, Detect
-                ])
-                print("✅ Added ultralytics classes to safe globals")
-            except ImportError as ie:
-                print(f"⚠️ Could not import ultralytics classes: {ie}")
-                # Try to add them dynamically if possible
-                try:
-                    import ultralytics
-                    # Get all classes from ultralytics.nn
-                    for module_name in ['tasks', 'modules']:
-                        try:
-                            module = __import__(f'ultralytics.nn.{module_name}', fromlist=[''])
-                            for attr_name in dir(module):
-                                attr = getattr(module, attr_name)
-                                if isinstance(attr, type) and attr.__module__.startswith('ultralytics'):
-                                    torch.serialization.add_safe_globals([attr])
-                        except:
-                            pass
-                except:
-                    pass
-            
-            # Load model - YOLO should now work with safe globals
-            if YOLO is None:
-                raise ImportError("ultralytics not available")
-            _model = YOLO("yolov8n.pt")  # nano model for speed
-            print("✅ YOLO model loaded successfully")
-        except Exception as e:
-            print(f"⚠️ Warning: Could not load YOLO model: {e}")
-            print("⚠️ Trying monkey-patch method for PyTorch 2.6+...")
+# Downscaled copies each check works on (longest side, pixels)
+DETECTION_MAX_DIM = 640  # YOLO, faces and skin
+ANALYSIS_MAX_DIM = 800  # Edge/line density of the study material check
+OCR_MAX_DIM = 1200  # Tesseract - larger loses speed, smaller loses accuracy
+
+# Independent checks of one image run concurrently (objects, faces, text)
+_executor = ThreadPoolExecutor(max_workers=max(1, settings.VALIDATION_WORKERS), thread_name_prefix="validation")
+_thread_local = threading.local()
+
+def _downscale(img: np.ndarray, max_dim: int, interpolation: int = cv2.INTER_LINEAR) -> np.ndarray:
+    height, width = img.shape[:2]
+    if max(height, width) <= max_dim:
+        return img
+    scale = max_dim / max(height, width)
+    return cv2.resize(img, (int(width * scale), int(height * scale)), interpolation=interpolation)
+
+class ValidationContext:
+    """
+    An image decoded once and shared by every validation check.
+    The file is read and decoded a single time; the downscaled variants are built
+    up front and never modified, so checks on different threads can share them.
+    ocr_text is None until the text check has run OCR on ocr_image.
+    """
+
+    def __init__(self, image_path: str, data: Optional[bytes] = None):
+        self.image_path = image_path
+        if data is None:
+            with open(image_path, "rb") as f:
+                data = f.read()
+        self.sha256 = content_sha256(data)
+        self.image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        self.ocr_text: Optional[str] = None
+        self.detection_image = self.analysis_image = self.ocr_image = None
+        if self.image is None:
+            return
+        height, width = self.image.shape[:2]
+        self.detection_image = _downscale(self.image, DETECTION_MAX_DIM)
+        self.analysis_image = _downscale(self.image, ANALYSIS_MAX_DIM)
+        ocr_source = _downscale(self.image, OCR_MAX_DIM, cv2.INTER_AREA)
+        self.ocr_image = Image.fromarray(cv2.cvtColor(ocr_source, cv2.COLOR_BGR2RGB))
+        if max(height, width) > DETECTION_MAX_DIM:
+            print(f"📐 Decoded {width}x{height} image once; validating on {DETECTION_MAX_DIM}/{ANALYSIS_MAX_DIM}/{OCR_MAX_DIM}px copies")
+
+def _context(image: Union[str, ValidationContext]) -> ValidationContext:
+    return image if isinstance(image, ValidationContext) else ValidationContext(image)
+
+def _face_cascade() -> Optional["cv2.CascadeClassifier"]:
+    """Haar face cascade, loaded once per thread (detectMultiScale is not safe to share across threads)"""
+    if not hasattr(_thread_local, "face_cascade"):
+        face_cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+        _thread_local.face_cascade = cv2.CascadeClassifier(face_cascade_path) if os.path.exists(face_cascade_path) else None
+    return _thread_local.face_cascade
+
+def _has_readable_text(text: Optional[str]) -> bool:
+    """At least 10 characters, 5 of them alphanumeric"""
+    return bool(text) and len(text.strip()) >= 10 and sum(1 for c in text if c.isalnum()) >= 5
+
+def _load_detection_image(image_path: str) -> Optional[np.ndarray]:
+    """Read an image for object detection, resized to max 640px on the longest side for speed"""
+    img = cv2.imread(image_path)
+    if img is None:
+        return None
+    return _downscale(img, DETECTION_MAX_DIM)
+
+def _blocked_objects_result(detections) -> Tuple[bool, Optional[str], List[str]]:
+    detected_classes = []
+    blocked_detections = []
+    
+    for detection in detections:
+        # Only consider high-confidence detections
+        if detection.confidence > 0.5:
+            class_name = COCO_CLASSES.get(detection.class_id, f"class_{detection.class_id}")
+            detected_classes.append(class_name)
             
-            # Alternative: Monkey-patch torch.load to use weights_only=False
-            try:
-                import torch
-                original_load = torch.load
-                
-                def patched_load(*args, **kwargs):
-                    # Force weights_only=False for YOLO models
-                    if 'weights_only' not in kwargs:
-                        kwargs['weights_only'] = False
-                    return original_load(*args, **kwargs)
-                
-                torch.load = patched_load
-                if YOLO is None:
-                    raise ImportError("ultralytics not available")
-                _model = YOLO("yolov8n.pt")
-                # Restore original
-                torch.load = original_load
-                print("✅ YOLO model loaded with monkey-patch method")
-            except Exception as e2:
-                print(f"⚠️ Alternative loading also failed: {e2}")
-                print("⚠️ Human detection will be limited. Content validation will use other methods (face detection, skin detection, OCR).")
-                _model = None
-    return _model
+            # Check if it's a blocked class
+            if detection.class_id in BLOCKED_CLASSES:
+                blocked_detections.append(f"{class_name} (confidence: {detection.confidence:.2f})")
+    
+    if blocked_detections:
+        # Check if it's a person/human
+        if any('person' in det.lower() for det in blocked_detections):
+            return True, "Image contains human body content. This app supports only educational text images.", detected_classes
+        # Other blocked objects
+        return True, f"Image contains inappropriate content ({', '.join(blocked_detections[:2])}). This app supports only educational text images.", detected_classes
+    
+    return False, None, detected_classes
 
-def detect_blocked_objects(image_path: str) -> Tuple[bool, Optional[str], List[str]]:
+def detect_blocked_objects_batch(
+    image_paths: List[Union[str, ValidationContext]]
+) -> List[Tuple[bool, Optional[str], List[str]]]:
     """
-    Detect blocked objects using YOLO
-    Returns: (has_blocked, error_message, detected_classes)
+    Detect blocked objects in several images with one batched YOLO inference
+    Accepts paths or ValidationContexts (whose decoded copy is reused)
+    Returns: (has_blocked, error_message, detected_classes) per image
     """
     try:
-        model = get_model()
-        if model is None:
+        detector = get_detector()
+        if detector is None:
             # If model not available, we still check other methods
             print("⚠️ YOLO model not available, skipping object detection")
-            return False, None, []
+            return [(False, None, []) for _ in image_paths]
         
-        # Read image
-        img = cv2.imread(image_path)
-        if img is None:
-            return True, "Could not read image", []
-        
-        # Resize image for faster processing (max 640px on longest side)
-        height, width = img.shape[:2]
-        max_dim = 640
-        if max(height, width) > max_dim:
-            scale = max_dim / max(height, width)
-            new_width = int(width * scale)
-            new_height = int(height * scale)
-            img = cv2.resize(img, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
-            print(f"📐 Resized image from {width}x{height} to {new_width}x{new_height} for faster processing")
-        
-        # Run detection on all classes
-        results = model(img, verbose=False)  # Disable verbose output for speed
-        
-        detected_classes = []
-        blocked_detections = []
-        
-        for result in results:
-            boxes = result.boxes
-            if boxes is not None and len(boxes) > 0:
-                for box in boxes:
-                    cls = int(box.cls[0])
-                    conf = float(box.conf[0])
-                    
-                    # Only consider high-confidence detections
-                    if conf > 0.5:
-                        class_name = COCO_CLASSES.get(cls, f"class_{cls}")
-                        detected_classes.append(class_name)
-                        
-                        # Check if it's a blocked class
-                        if cls in BLOCKED_CLASSES:
-                            blocked_detections.append(f"{class_name} (confidence: {conf:.2f})")
-        
-        if blocked_detections:
-            # Check if it's a person/human
-            if any('person' in det.lower() for det in blocked_detections):
-                return True, "Image contains human body content. This app supports only educational text images.", detected_classes
-            # Other blocked objects
-            return True, f"Image contains inappropriate content ({', '.join(blocked_detections[:2])}). This app supports only educational text images.", detected_classes
-        
-        return False, None, detected_classes
+        images = [
+            item.detection_image if isinstance(item, ValidationContext) else _load_detection_image(item)
+            for item in image_paths
+        ]
+        readable = [img for img in images if img is not None]
+        detections = iter(detector.detect(readable, conf=0.25))
+        
+        return [
+            _blocked_objects_result(next(detections)) if img is not None else (True, "Could not read image", [])
+            for img in images
+        ]
         
     except Exception as e:
         print(f"Object detection error: {e}")
         # On error, be conservative and block
-        return True, f"Safety check failed: {str(e)}", []
+        return [(True, f"Safety check failed: {str(e)}", []) for _ in image_paths]
+
+def detect_blocked_objects(image_path: Union[str, ValidationContext]) -> Tuple[bool, Optional[str], List[str]]:
+    """
+    Detect blocked objects using YOLO
+    Returns: (has_blocked, error_message, detected_classes)
+    """
+    return detect_blocked_objects_batch([image_path])[0]
 
-def detect_faces_and_body_parts(image_path: str) -> Tuple[bool, Optional[str]]:
+def detect_faces_and_body_parts(image_path: Union[str, ValidationContext]) -> Tuple[bool, Optional[str]]:
     """
     Detect faces, hands, and other body parts using OpenCV
     """
     try:
-        img = cv2.imread(image_path)
+        img = _context(image_path).detection_image
         if img is None:
             return True, "Could not read image"
         
-        # Resize image for faster processing (max 640px on longest side)
-        height, width = img.shape[:2]
-        max_dim = 640
-        if max(height, width) > max_dim:
-            scale = max_dim / max(height, width)
-            new_width = int(width * scale)
-            new_height = int(height * scale)
-            img = cv2.resize(img, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
-        
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
         
-        # Load face cascade
-        face_cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-        if os.path.exists(face_cascade_path):
-            face_cascade = cv2.CascadeClassifier(face_cascade_path)
+        face_cascade = _face_cascade()
+        if face_cascade is not None:
             # Use more strict parameters to reduce false positives
             # scaleFactor=1.2 (less sensitive), minNeighbors=5 (more confident), minSize=(50,50) (larger faces only)
             faces = face_cascade.detectMultiScale(gray, scaleFactor=1.2, minNeighbors=5, minSize=(50, 50))
@@ -288,26 +269,20 @@ def detect_faces_and_body_parts(image_path: str) -> Tuple[bool, Optional[str]]:
         # On error, be conservative
         return True, f"Safety check failed: {str(e)}"
 
-def detect_text_content(image_path: str) -> Tuple[bool, Optional[str], str]:
+def detect_text_content(image_path: Union[str, ValidationContext]) -> Tuple[bool, Optional[str], str]:
     """
     Extract text from image and check for blocked keywords
     Returns: (has_blocked_text, error_message, extracted_text)
+    Records the OCR result on the context (ctx.ocr_text) so later steps don't repeat it
     """
     try:
+        ctx = _context(image_path)
         # Extract text using OCR - optimized for speed
         extracted_text = ""
         try:
-            img = Image.open(image_path)
-            
-            # Resize image for faster OCR (max 1200px on longest side for OCR quality)
-            width, height = img.size
-            max_dim = 1200
-            if max(width, height) > max_dim:
-                scale = max_dim / max(width, height)
-                new_width = int(width * scale)
-                new_height = int(height * scale)
-                img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                print(f"📐 Resized image for OCR from {width}x{height} to {new_width}x{new_height}")
+            img = ctx.ocr_image
+            if img is None:
+                raise ValueError("Could not read image")
             
             # Try OCR with best PSM mode first (PSM 6 is usually best for uniform text blocks)
             try:
@@ -325,6 +300,7 @@ def detect_text_content(image_path: str) -> Tuple[bool, Optional[str], str]:
                 # If OCR fails, try default mode
                 print(f"⚠️ OCR with PSM failed, trying default: {ocr_error}")
                 extracted_text = pytesseract.image_to_string(img)
+            ctx.ocr_text = extracted_text
         except Exception as ocr_error:
             # If OCR fails, log but continue
             print(f"⚠️ OCR error (non-blocking): {ocr_error}")
@@ -366,7 +342,25 @@ def detect_text_content(image_path: str) -> Tuple[bool, Optional[str], str]:
         # On error, allow but log
         return False, None, ""
 
-def check_is_study_material(image_path: str, extracted_text: str = "") -> Tuple[bool, Optional[str]]:
+def _retry_ocr(ctx: ValidationContext, label: str) -> bool:
+    """
+    One more PSM 6 pass, only when the text check has not OCRed this image yet
+    (it already ran PSM 6 on the same copy, so a retry would return the same text)
+    """
+    if ctx.ocr_text is not None or ctx.ocr_image is None:
+        return False
+    try:
+        text = pytesseract.image_to_string(ctx.ocr_image, config='--psm 6')
+    except Exception as e:
+        print(f"⚠️ {label} failed: {e}")
+        return False
+    ctx.ocr_text = text
+    if _has_readable_text(text):
+        print(f"✅ Text found with {label} ({len(text.strip())} chars)")
+        return True
+    return False
+
+def check_is_study_material(image_path: Union[str, ValidationContext], extracted_text: str = "") -> Tuple[bool, Optional[str]]:
     """
     Check if image appears to be study material
     Requires actual text content - blocks random photos without text
@@ -384,19 +378,11 @@ def check_is_study_material(image_path: str, extracted_text: str = "") -> Tuple[
                 print(f"⚠️ Text detected but insufficient alphanumeric content ({alnum_count} chars)")
         
         # SECONDARY CHECK: Analyze image for text-like patterns (optimized for speed)
-        img = cv2.imread(image_path)
+        ctx = _context(image_path)
+        img = ctx.analysis_image
         if img is None:
             return False, "Could not read image"
         
-        # Resize image for faster analysis (max 800px on longest side)
-        height, width = img.shape[:2]
-        max_dim = 800
-        if max(height, width) > max_dim:
-            scale = max_dim / max(height, width)
-            new_width = int(width * scale)
-            new_height = int(height * scale)
-            img = cv2.resize(img, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
-        
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
         
         # Calculate text density (edges typically indicate text)
@@ -428,31 +414,9 @@ def check_is_study_material(image_path: str, extracted_text: str = "") -> Tuple[
             if color_variance > 10000 and edge_density < 0.0005:
                 return False, "Image does not appear to contain readable text or study materials. Please upload images with clear, readable text content from textbooks, notes, or educational materials."
         
-        # If we get here, it's ambiguous - try OCR one more time (optimized for speed)
-        try:
-            img_pil = Image.open(image_path)
-            
-            # Resize for faster OCR
-            width, height = img_pil.size
-            max_dim = 1200
-            if max(width, height) > max_dim:
-                scale = max_dim / max(width, height)
-                new_width = int(width * scale)
-                new_height = int(height * scale)
-                img_pil = img_pil.resize((new_width, new_height), Image.Resampling.LANCZOS)
-            
-            # Try only best OCR mode (PSM 6) for speed
-            try:
-                text = pytesseract.image_to_string(img_pil, config='--psm 6')
-                if text and len(text.strip()) >= 10:
-                    alnum_count = sum(1 for c in text if c.isalnum())
-                    if alnum_count >= 5:
-                        print(f"✅ Text found with OCR ({len(text.strip())} chars)")
-                        return True, None
-            except:
-                pass
-        except Exception as ocr_error:
-            print(f"⚠️ OCR retry failed: {ocr_error}")
+        # If we get here, it's ambiguous - try OCR one more time (skipped when it already ran)
+        if _retry_ocr(ctx, "OCR retry"):
+            return True, None
         
         # No text found - block the image
         return False, "Image does not contain readable text or study materials. Please upload images with clear, readable text content from textbooks, notes, diagrams, charts, or educational materials."
@@ -462,69 +426,69 @@ def check_is_study_material(image_path: str, extracted_text: str = "") -> Tuple[
         # On error, be conservative and require text
         return False, f"Could not verify image contains study material: {str(e)}. Please upload images with clear, readable text content."
 
-def validate_content(image_path: str) -> Tuple[bool, str]:
+def _object_verdict(ctx: ValidationContext) -> Optional[str]:
+    """Blocking message from YOLO, or None. Only people block (other classes may be false positives)."""
+    has_blocked_objects, obj_error, detected_classes = detect_blocked_objects(ctx)
+    if has_blocked_objects:
+        if obj_error and "human body" in obj_error.lower():
+            return obj_error
+        print(f"⚠️ Blocked object detected but not human: {obj_error} - allowing")
+    return None
+
+def _face_verdict(ctx: ValidationContext) -> Optional[str]:
+    has_faces, face_error = detect_faces_and_body_parts(ctx)
+    if not has_faces:
+        print("✅ No faces/body parts detected")
+    return face_error if has_faces else None
+
+def _text_verdict(ctx: ValidationContext) -> Optional[str]:
+    has_blocked_text, text_error, extracted_text = detect_text_content(ctx)
+    if not has_blocked_text and extracted_text:
+        print(f"✅ Clean text extracted ({len(extracted_text.strip())} chars)")
+    return text_error if has_blocked_text else None
+
+def _first_blocking_verdict(ctx: ValidationContext) -> Optional[str]:
     """
-    Comprehensive content validation
-    Returns: (is_valid, error_message)
-    STRICT: Blocks inappropriate content AND requires actual text/study material
-    Only allows images with readable text content from educational materials
+    Run the object, face and text checks concurrently and return the first blocking
+    message, without waiting for the checks still running. None if all pass.
     """
-    error_messages = []
-    extracted_text = ""
-    
-    print(f"🔍 Starting content validation for: {image_path}")
-    
-    # 1. Check for blocked objects (humans, weapons, etc.) - YOLO detection
+    checks = {"objects": _object_verdict, "faces": _face_verdict, "text": _text_verdict}
+    futures = {_executor.submit(check, ctx): name for name, check in checks.items()}
     try:
-        has_blocked_objects, obj_error, detected_classes = detect_blocked_objects(image_path)
-        if has_blocked_objects:
-            # Only block if it's clearly a person (not other objects)
-            if obj_error and "human body" in obj_error.lower():
-                error_messages.append(obj_error)
-                print(f"❌ Blocked objects detected: {obj_error}")
-            else:
-                # Other blocked objects - log but don't block (might be false positive)
-                print(f"⚠️ Blocked object detected but not human: {obj_error} - allowing")
-    except Exception as e:
-        print(f"⚠️ Object detection error (non-blocking): {e}")
-    
-    # 2. Check for faces and body parts - more strict to reduce false positives
-    try:
-        has_faces, face_error = detect_faces_and_body_parts(image_path)
-        if has_faces:
-            error_messages.append(face_error)
-            print(f"❌ Faces/body parts detected: {face_error}")
-        else:
-            print("✅ No faces/body parts detected")
-    except Exception as e:
-        print(f"⚠️ Face detection error (non-blocking): {e}")
-    
-    # 3. Check text content for blocked keywords and PII
-    try:
-        has_blocked_text, text_error, extracted_text = detect_text_content(image_path)
-        if has_blocked_text:
-            error_messages.append(text_error)
-            print(f"❌ Blocked text detected: {text_error}")
-        else:
-            if extracted_text:
-                print(f"✅ Clean text extracted ({len(extracted_text.strip())} chars)")
-    except Exception as e:
-        print(f"⚠️ Text detection error (non-blocking): {e}")
+        for future in as_completed(futures):
+            try:
+                message = future.result()
+            except Exception as e:
+                print(f"⚠️ {futures[future].capitalize()} check error (non-blocking): {e}")
+                continue
+            if message:
+                print(f"❌ {futures[future].capitalize()} check blocked the image: {message}")
+                return message
+        return None
+    finally:
+        for future in futures:
+            future.cancel()
+
+# Rejections caused by an error rather than by the image - not cached
+TRANSIENT_REJECTION_PREFIXES = ("Safety check failed", "Could not verify")
+
+def _validate(ctx: ValidationContext) -> Tuple[bool, str]:
+    """The full validation chain on a decoded image"""
+    if ctx.image is None:
+        return False, "Could not read image"
     
-    # 4. If we found humans/inappropriate content, block immediately
-    if error_messages:
-        human_body_errors = [msg for msg in error_messages if "human body" in msg.lower()]
-        if human_body_errors:
-            print(f"❌ Validation failed: {human_body_errors[0]}")
-            return False, human_body_errors[0]
-        # Other errors (PII, inappropriate content)
-        print(f"❌ Validation failed: {error_messages[0]}")
-        return False, error_messages[0]
+    # 1-3. Blocked objects (YOLO), faces/skin and text (keywords, PII) - concurrently,
+    # blocking as soon as any of them finds humans/inappropriate content
+    blocking_message = _first_blocking_verdict(ctx)
+    if blocking_message:
+        print(f"❌ Validation failed: {blocking_message}")
+        return False, blocking_message
+    extracted_text = ctx.ocr_text or ""
     
-    # 5. Check if image contains study material (text content)
+    # 4. Check if image contains study material (text content)
     # This is CRITICAL - we must ensure the image has educational content
     try:
-        is_study_material, study_error = check_is_study_material(image_path, extracted_text)
+        is_study_material, study_error = check_is_study_material(ctx, extracted_text)
         if not is_study_material:
             error_msg = study_error or "Image does not appear to contain readable text or study materials. Please upload images with clear, readable text content from textbooks, notes, or educational materials."
             print(f"❌ Study material check failed: {error_msg}")
@@ -536,38 +500,62 @@ def validate_content(image_path: str) -> Tuple[bool, str]:
         if not extracted_text or len(extracted_text.strip()) < 10:
             return False, "Image does not appear to contain readable text. Please upload images with clear, readable text content from study materials."
     
-    # 6. Final verification: Ensure we have sufficient text content (optimized for speed)
-    if not extracted_text or len(extracted_text.strip()) < 10:
-        # Try OCR one more time (single attempt for speed)
-        try:
-            img = Image.open(image_path)
-            
-            # Resize for faster OCR
-            width, height = img.size
-            max_dim = 1200
-            if max(width, height) > max_dim:
-                scale = max_dim / max(width, height)
-                new_width = int(width * scale)
-                new_height = int(height * scale)
-                img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-            
-            # Try only best OCR mode (PSM 6) for speed
-            text = pytesseract.image_to_string(img, config='--psm 6')
-            if text and len(text.strip()) >= 10:
-                # Check for alphanumeric content
-                alnum_count = sum(1 for c in text if c.isalnum())
-                if alnum_count >= 5:
-                    print(f"✅ Text found with final OCR ({len(text.strip())} chars, {alnum_count} alnum)")
-                    return True, ""
-        except Exception as e:
-            print(f"⚠️ Final OCR retry failed: {e}")
-        
+    # 5. Final verification: Ensure we have sufficient text content
+    if len((ctx.ocr_text or "").strip()) < 10 and not _retry_ocr(ctx, "final OCR"):
         # No text found after all attempts
         return False, "Image does not contain readable text. Please upload images with clear, readable text content from textbooks, notes, diagrams, charts, or educational materials."
     
     print("✅ Content validation PASSED - image contains study material")
     return True, ""
 
+def validate_content(image_path: str) -> Tuple[bool, str]:
+    """
+    Comprehensive content validation
+    Returns: (is_valid, error_message)
+    STRICT: Blocks inappropriate content AND requires actual text/study material
+    Only allows images with readable text content from educational materials
+    The image is decoded once (ValidationContext); verdicts are cached by exact and
+    perceptual hash (app/validation_cache.py), and the OCR text of an accepted image
+    is kept for extract_text_from_image.
+    """
+    print(f"🔍 Starting content validation for: {image_path}")
+    
+    with open(image_path, "rb") as f:
+        data = f.read()
+    if not settings.VALIDATION_CACHE_ENABLED:
+        ctx = ValidationContext(image_path, data)
+        is_valid, message = _validate(ctx)
+        if is_valid:
+            save_validation_text(ctx.sha256, ctx.ocr_text)
+        return is_valid, message
+    
+    db = SessionLocal()
+    try:
+        sha256 = content_sha256(data)
+        cached = lookup_exact(db, sha256)
+        if cached is not None:
+            print(f"⚡ Validation verdict cache hit (exact): {'PASSED' if cached.is_valid else cached.reason}")
+            if cached.is_valid:
+                save_validation_text(sha256, cached.ocr_text)
+            return cached.is_valid, cached.reason
+        
+        ctx = ValidationContext(image_path, data)
+        phash = perceptual_hash(ctx.image) if ctx.image is not None else None
+        if phash is not None:
+            cached = lookup_similar(db, phash)
+            if cached is not None:
+                print(f"⚡ Validation verdict cache hit (perceptual hash, {cached.distance} bits apart): {'PASSED' if cached.is_valid else cached.reason}")
+                return cached.is_valid, cached.reason
+        
+        is_valid, message = _validate(ctx)
+        if is_valid:
+            save_validation_text(ctx.sha256, ctx.ocr_text)
+        if not message.startswith(TRANSIENT_REJECTION_PREFIXES):
+            store_verdict(db, ctx.sha256, phash, is_valid, message, ctx.ocr_text)
+        return is_valid, message
+    finally:
+        db.close()
+
 def check_image_quality(image_path: str) -> Tuple[bool, Optional[str]]:
     """
     Check if image is readable (not too blurry)
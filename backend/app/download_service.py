@@ -7,8 +7,9 @@ from reportlab.lib import colors
 from docx import Document
 from docx.shared import Inches, Pt
 from docx.enum.text import WD_ALIGN_PARAGRAPH
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import io
+import re
 import html
 import unicodedata
 import tempfile
@@ -38,11 +39,14 @@ except ImportError as e:
     PLAYWRIGHT_AVAILABLE = False
     async_playwright = None
     print(f"⚠️  Playwright not available: {e}. Install with: pip install playwright && playwright install chromium")
+from app.browser_pool import get_browser_pool
+from app.render_assets import has_math, math_head_html, render_complete_script, RENDER_COMPLETE_FLAG
 from app.font_manager import (
     get_font_for_language,
     detect_language,
     is_rtl,
     get_alignment,
+    get_font_face_src,
     initialize_fonts
 )
 from reportlab.pdfbase import pdfmetrics
@@ -198,6 +202,152 @@ def _ensure_manual_font_registration():
 
 _ensure_manual_font_registration()
 
+def _escape_html_preserve_latex(text) -> str:
+    """Escape HTML but preserve LaTeX expressions for KaTeX"""
+    # Handle dict format
+    if isinstance(text, dict):
+        text = format_structured_answer(text, 0)
+    
+    if not text:
+        return ""
+    
+    # Convert to string if not already
+    text = str(text)
+    
+    # First, convert escaped LaTeX delimiters to single backslash for KaTeX
+    # JSON stores as \\( and \\), but KaTeX needs \( and \)
+    text = text.replace('\\\\(', '\\(').replace('\\\\)', '\\)')
+    text = text.replace('\\\\[', '\\[').replace('\\\\]', '\\]')
+    
+    # Pattern to match LaTeX expressions (inline and display math)
+    # Match \(...\) and \[...\] patterns
+    latex_pattern = r'\\(?:\([^)]*\)|\[[^\]]*\])'
+    placeholders = {}
+    placeholder_idx = 0
+    
+    def replace_latex(match):
+        nonlocal placeholder_idx
+        placeholder = f"__LATEX_{placeholder_idx}__"
+        placeholders[placeholder] = match.group(0)
+        placeholder_idx += 1
+        return placeholder
+    
+    # Find and replace all LaTeX expressions with placeholders
+    text_with_placeholders = re.sub(latex_pattern, replace_latex, text)
+    
+    # Escape HTML
+    escaped = html.escape(text_with_placeholders)
+    
+    # Restore LaTeX expressions (they're safe for HTML)
+    for placeholder, latex_expr in placeholders.items():
+        escaped = escaped.replace(placeholder, latex_expr)
+    
+    return escaped
+
+def build_qna_html(
+    qna_json: Dict[str, Any],
+    output_format: str,
+    title: str,
+    target_language: str
+) -> Tuple[str, str, str]:
+    """
+    HTML of a Q/A set for Playwright PDF rendering (font embedded as base64, KaTeX for LaTeX).
+    KaTeX is only included when the set contains math; the page sets window.__renderComplete
+    when math and fonts are done (see app/render_assets.py).
+    Returns: (html_string, font_path, font_name)
+    """
+    def normalize_text(text: str) -> str:
+        if not isinstance(text, str):
+            return text
+        return unicodedata.normalize("NFC", text)
+    
+    font_name = LANGUAGE_TO_FONT_NAME.get(target_language, "NotoLatin")
+    is_rtl_lang = is_rtl(target_language)
+    
+    # Get font file path (relative to this module's location)
+    base_dir = os.path.join(os.path.dirname(__file__), "fonts")
+    font_file = FONT_NAME_MAP.get(font_name, "NotoSans-Regular.ttf")
+    font_path = os.path.abspath(os.path.join(base_dir, font_file))
+    
+    # Build HTML
+    body_parts = []
+    
+    for idx, q in enumerate(qna_json.get("questions", []), 1):
+        question_text = normalize_text(q.get("question", ""))
+        body_parts.append(f'<div class="question-box"><span class="question-label">Q{idx}.</span><div class="question-text">{_escape_html_preserve_latex(question_text)}</div>')
+        
+        if q.get("type") == "mcq" and q.get("options"):
+            body_parts.append('<div class="options">')
+            for i, opt in enumerate(q.get("options", [])):
+                opt = normalize_text(opt)
+                option_label = chr(65 + i)
+                body_parts.append(f'<div class="option"><span class="option-label">{option_label}.</span><span>{_escape_html_preserve_latex(opt)}</span></div>')
+            body_parts.append('</div>')
+        
+        if q.get("marks"):
+            marks = normalize_text(str(q.get("marks")))
+            body_parts.append(f'<div class="marks">Marks: {html.escape(marks)}</div>')
+        
+        body_parts.append('</div>')
+        
+        if output_format in ["questions_answers", "answers_only"]:
+            # Try correct_answer first, then answer field as fallback
+            correct_answer = q.get("correct_answer") or q.get("answer")
+            
+            # Only add answer if it exists and is not empty
+            if correct_answer and correct_answer != "N/A" and str(correct_answer).strip():
+                answer_label = "✓ Answer:" if not is_rtl_lang else ":الإجابة ✓"
+                answer_label = normalize_text(answer_label)
+                
+                # Convert structured answer to text if needed
+                if isinstance(correct_answer, dict):
+                    answer_text = format_structured_answer(correct_answer, q.get("marks", 0))
+                else:
+                    answer_text = normalize_text(str(correct_answer))
+                
+                # Only add if formatted answer is not empty
+                if answer_text and answer_text.strip():
+                    body_parts.append(f'<div class="answer-box"><div class="answer-label">{html.escape(answer_label)}</div><div class="answer-text">{_escape_html_preserve_latex(answer_text)}</div></div>')
+    
+    body = '\n'.join(body_parts)
+    include_math = has_math(body)
+    title_html = html.escape(normalize_text(title))
+    
+    # Font embedded as base64, subset to the characters on the page (cached, see font_manager).
+    # The title is rendered uppercase (text-transform), so its uppercase forms are needed too.
+    font_src = get_font_face_src(font_path, text=title_html + title_html.upper() + body)
+    
+    css_content = f"""
+    @page {{ size: A4; margin: 1in; }}
+    @font-face {{ font-family: '{font_name}'; src: {font_src}; font-weight: normal; font-style: normal; }}
+    body, * {{ font-family: '{font_name}' !important; }}
+    body {{ font-size: 12pt; line-height: 1.8; color: #000000; direction: {'rtl' if is_rtl_lang else 'ltr'}; margin: 0; padding: 0; }}
+    .title {{ font-size: 18pt; font-weight: 700; color: #000000; text-align: center; margin-bottom: 30pt; margin-top: 0; text-transform: uppercase; letter-spacing: 1pt; }}
+    .question-box {{ border: none; padding: 0; margin-bottom: 20pt; }}
+    .question-label {{ font-weight: 700; font-size: 12pt; margin-right: 8pt; display: inline; }}
+    .question-text {{ font-weight: 400; font-size: 12pt; margin-bottom: 12pt; line-height: 1.8; display: inline; }}
+    .options {{ margin: 8pt 0 8pt 20pt; padding: 0; list-style: none; }}
+    .option {{ margin: 6pt 0; font-size: 12pt; line-height: 1.8; }}
+    .option-label {{ font-weight: 400; margin-right: 8pt; }}
+    .marks {{ font-style: normal; font-size: 10pt; color: #000000; margin-top: 8pt; margin-left: 20pt; }}
+    .answer-box {{ border: none; padding: 0; margin-bottom: 20pt; margin-top: 10pt; }}
+    .answer-label {{ font-weight: 400; font-size: 12pt; color: #000000; margin-right: 8pt; display: inline; }}
+    .answer-text {{ font-weight: 400; font-size: 12pt; color: #000000; line-height: 1.8; display: inline; }}
+    """
+    
+    html_string = f"""<!DOCTYPE html>
+<html lang="{target_language}" dir="{'rtl' if is_rtl_lang else 'ltr'}">
+<head>
+<meta charset="UTF-8">
+<style>{css_content}</style>
+{math_head_html(include_math)}
+</head>
+<body><div class="title">{title_html}</div>
+{body}
+{render_complete_script(include_math)}
+</body></html>"""
+    return html_string, font_path, font_name
+
 async def _generate_pdf_playwright_async(html_string: str, font_path: str, font_name: str) -> bytes:
     """
     Generate PDF using Playwright (Chromium) - BEST rendering quality.
@@ -205,46 +355,25 @@ async def _generate_pdf_playwright_async(html_string: str, font_path: str, font_
     Fonts are embedded via base64 in HTML, so no file system access needed.
     Enhanced settings for maximum accuracy and clarity.
     ASYNC VERSION for use with FastAPI.
+    The page comes from the persistent Chromium pool (app/browser_pool.py) - no browser
+    is launched per download.
     """
     print(f"🎭 Playwright: Generating PDF with font: {font_name}")
     try:
-        async with async_playwright() as p:
-            # Launch browser with high-quality rendering
-            browser = await p.chromium.launch(
-                headless=True,
-                args=[
-                    '--disable-web-security',  # Allow font loading
-                    '--disable-features=TranslateUI',
-                    '--disable-ipc-flooding-protection',
-                    '--font-render-hinting=none',  # Better font rendering
-                ]
-            )
-            page = await browser.new_page()
-            
-            # Set viewport for consistent rendering
-            await page.set_viewport_size({"width": 1200, "height": 1600})
-            
-            # Set content with HTML (fonts are already base64 embedded in HTML)
+        async with get_browser_pool().page() as page:
+            # Set content with HTML (fonts are already base64 embedded in HTML, KaTeX is served locally)
             print("🎭 Playwright: Setting HTML content...")
-            await page.set_content(html_string, wait_until='networkidle')
+            await page.set_content(html_string, wait_until='load')
             
-            # Wait for KaTeX to load and render LaTeX
-            print("🎭 Playwright: Waiting for KaTeX to render LaTeX...")
+            # The page flags completion once math is rendered and fonts are ready (app/render_assets.py)
+            print("🎭 Playwright: Waiting for math and fonts to render...")
             try:
-                # Wait for KaTeX to be available
-                await page.wait_for_function(
-                    "typeof renderMathInElement !== 'undefined' || typeof katex !== 'undefined'",
-                    timeout=10000
-                )
-                # Wait a bit more for KaTeX to finish rendering
-                await page.wait_for_timeout(1500)  # KaTeX renders synchronously, but give it time
-                print("✅ KaTeX rendering complete")
+                await page.wait_for_function(f"window.{RENDER_COMPLETE_FLAG} === true", timeout=10000)
+                print("✅ Rendering complete")
             except Exception as e:
-                print(f"⚠️  KaTeX wait warning: {e} (continuing anyway)")
-            
-            # Wait for fonts to fully load and render
-            print("🎭 Playwright: Waiting for fonts to load...")
-            await page.wait_for_timeout(1000)  # Additional wait for font rendering
+                # HTML built elsewhere may not set the flag
+                print(f"⚠️  Render-complete wait warning: {e} (continuing anyway)")
+                await page.evaluate("document.fonts.ready.then(() => document.fonts.size)")
             
             # Verify font is loaded by checking computed styles
             try:
@@ -269,9 +398,8 @@ async def _generate_pdf_playwright_async(html_string: str, font_path: str, font_
                 display_header_footer=False,
             )
             
-            await browser.close()
-            print(f"✅ Playwright: PDF generated successfully ({len(pdf_bytes)} bytes)")
-            return pdf_bytes
+        print(f"✅ Playwright: PDF generated successfully ({len(pdf_bytes)} bytes)")
+        return pdf_bytes
     except Exception as e:
         print(f"❌ Playwright error: {e}")
         import traceback
@@ -592,6 +720,7 @@ def generate_pdf(
 
     font_name = LANGUAGE_TO_FONT_NAME.get(target_language, "NotoLatin")
     is_rtl_lang = is_rtl(target_language)
+    text_alignment = get_alignment(target_language)  # For the ReportLab fallback
     
     # Get font file path
     base_dir = os.path.join(os.path.dirname(__file__), "fonts")
@@ -615,15 +744,12 @@ def generate_pdf(
     # Also prepare relative path
     font_url_relative = f"fonts/{font_file}"
     
-    # Try to load font as base64 for better compatibility (Playwright)
-    font_base64 = None
+    # Try to load font as base64 for better compatibility (encoded once per process, see font_manager)
+    font_base64_src = ""
     if os.path.exists(font_path):
         try:
-            import base64
-            with open(font_path, 'rb') as f:
-                font_data = f.read()
-                font_base64 = base64.b64encode(font_data).decode('utf-8')
-            print(f"✅ Font loaded as base64: {font_name} ({len(font_base64)} chars)")
+            font_base64_src = get_font_face_src(font_path)
+            print(f"✅ Font loaded as base64: {font_name} ({len(font_base64_src)} chars)")
         except Exception as e:
             print(f"⚠️  Failed to load font as base64: {e}")
             pass  # Fallback to file URL
@@ -631,9 +757,9 @@ def generate_pdf(
         print(f"❌ Font file not found: {font_path}")
     
     # Build font src with fallbacks - prefer base64 for maximum compatibility
-    if font_base64:
+    if font_base64_src:
         # Base64 encoding works best for all PDF generators
-        font_src = f"url(data:font/truetype;charset=utf-8;base64,{font_base64}) format('truetype')"
+        font_src = font_base64_src
     else:
         # Fallback to file URLs
         font_src = f"url('{font_url_file}') format('truetype'), url('{font_url_relative}') format('truetype')"
@@ -0,0 +1,300 @@
+"""
+Background Text Extraction
+Extracts text from uploads and split parts as soon as they are stored, so OCR runs
+while the teacher is still choosing generation settings instead of inside the
+generate request.
+
+Status lifecycle (stored on Upload / PdfSplitPart):
+    pending -> running -> done | failed
+The generate path awaits an in-flight extraction, reuses a finished one, or
+(re)starts it if nothing is running (e.g. after a server restart or a failure).
+
+PDF text is also written to the page store (app/page_store.py) so page-range
+generations can be served without touching the PDF again.
+
+Records that share a blob (app/blob_store.py) share their extraction: a duplicate
+upload or identical split part copies the finished text of the first one.
+"""
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models import Upload, PdfSplitPart
+from app.ocr_service import extract_pdf_pages, extract_text_from_image
+from app.page_store import PAGE_SEPARATOR, save_pages, get_page_texts, missing_pages, copy_page_texts
+
+EXTRACTION_PENDING = "pending"
+EXTRACTION_RUNNING = "running"
+EXTRACTION_DONE = "done"
+EXTRACTION_FAILED = "failed"
+
+KIND_UPLOAD = "upload"
+KIND_PART = "part"
+
+_executor = ThreadPoolExecutor(max_workers=max(1, settings.EXTRACTION_WORKERS), thread_name_prefix="extraction")
+_in_flight: Dict[Tuple[str, int], Future] = {}
+_lock = threading.Lock()
+
+
+def _model_for(kind: str):
+    return PdfSplitPart if kind == KIND_PART else Upload
+
+
+def _is_pdf(kind: str, record) -> bool:
+    if kind == KIND_PART:
+        return True
+    file_type = record.file_type.value if hasattr(record.file_type, 'value') else str(record.file_type)
+    return file_type == "pdf"
+
+
+def _forget(key: Tuple[str, int], future: Future) -> None:
+    with _lock:
+        if _in_flight.get(key) is future:
+            del _in_flight[key]
+
+
+def schedule_extraction(kind: str, record_id: int) -> Future:
+    """
+    Queue text extraction for an upload (kind="upload") or split part (kind="part").
+    Returns the in-flight future if one is already running for the same record.
+    Call only after the record has been committed - the worker uses its own session.
+    """
+    key = (kind, record_id)
+    with _lock:
+        future = _in_flight.get(key)
+        if future is not None and not future.done():
+            return future
+        future = _executor.submit(_run_extraction, kind, record_id)
+        _in_flight[key] = future
+    future.add_done_callback(lambda f: _forget(key, f))
+    print(f"🗂️ Queued background extraction for {kind} {record_id}")
+    return future
+
+
+def _run_extraction(kind: str, record_id: int) -> Optional[str]:
+    """Worker: extract text and persist status/result. Re-raises on failure."""
+    db = SessionLocal()
+    try:
+        record = db.query(_model_for(kind)).filter_by(id=record_id).first()
+        if record is None:
+            return None
+
+        if reuse_extraction(db, kind, record, wait=True):
+            db.commit()
+            return record.extracted_text
+
+        record.extraction_status = EXTRACTION_RUNNING
+        record.extraction_error = None
+        db.commit()
+
+        failed_pages: List[int] = []
+        try:
+            if kind == KIND_PART:
+                text, failed_pages = _extract_part(db, record)
+            elif _is_pdf(kind, record):
+                page_texts, failed_pages = extract_pdf_pages(record.file_path)
+                text = save_pages(db, record.id, page_texts)
+            else:
+                text = extract_text_from_image(record.file_path)
+            if not text or not text.strip():
+                raise Exception("Could not extract text from file. Please ensure the file contains readable text.")
+        except Exception as extract_error:
+            db.rollback()
+            record.extraction_status = EXTRACTION_FAILED
+            record.extraction_error = str(extract_error)
+            record.extraction_failed_pages = failed_pages or None
+            db.commit()
+            print(f"❌ Background extraction failed for {kind} {record_id}: {extract_error}")
+            raise
+
+        record.extracted_text = text
+        record.extraction_status = EXTRACTION_DONE
+        record.extraction_failed_pages = failed_pages or None
+        db.commit()
+        print(f"✅ Background extraction done for {kind} {record_id}: {len(text)} characters")
+        return text
+    finally:
+        db.close()
+
+
+def _find_donor(db, kind: str, record):
+    """Another record with the same content whose extraction is done"""
+    model = _model_for(kind)
+    return db.query(model).filter(
+        model.blob_sha256 == record.blob_sha256,
+        model.id != record.id,
+        model.extraction_status == EXTRACTION_DONE,
+        model.extracted_text.isnot(None)
+    ).order_by(model.id).first()
+
+
+def reuse_extraction(db, kind: str, record, wait: bool = False) -> bool:
+    """
+    Copy the finished extraction of another record with the same blob (text, status and
+    stored pages). With wait=True an in-flight extraction of the same content is awaited
+    first, so duplicates uploaded together are only OCRed once.
+    Returns True if the record now has its text. Does not commit.
+    """
+    if not getattr(record, "blob_sha256", None):
+        return False
+
+    donor = _find_donor(db, kind, record)
+    if donor is None and wait:
+        model = _model_for(kind)
+        twin_ids = [twin_id for (twin_id,) in db.query(model.id).filter(
+            model.blob_sha256 == record.blob_sha256,
+            model.id != record.id
+        ).all()]
+        with _lock:
+            running = [_in_flight.get((kind, twin_id)) for twin_id in twin_ids]
+        running = [future for future in running if future is not None and future.running()]
+        for future in running:
+            try:
+                future.result()
+            except Exception:
+                pass
+        if running:
+            db.expire_all()
+            donor = _find_donor(db, kind, record)
+    if donor is None:
+        return False
+
+    if kind == KIND_PART:
+        copy_page_texts(
+            db, donor.parent_upload_id, record.parent_upload_id,
+            source_start=donor.start_page,
+            source_end=donor.end_page,
+            page_offset=record.start_page - donor.start_page,
+            part_id_map={donor.id: record.id}
+        )
+    else:
+        copy_page_texts(db, donor.id, record.id)
+    copy_extraction(donor, record)
+    print(f"♻️ Reused extraction of {kind} {donor.id} for {kind} {record.id} (same content)")
+    return True
+
+
+def _extract_part(db, part) -> Tuple[str, List[int]]:
+    """
+    Text of a split part. Pages already in the parent's page store are reused
+    (no PDF I/O); otherwise the part's pages are extracted (from the book's file
+    for virtual parts) and stored against the parent upload with book page numbers.
+    """
+    # Parent book is being extracted right now: let it finish rather than OCR the same pages twice
+    with _lock:
+        parent_future = _in_flight.get((KIND_UPLOAD, part.parent_upload_id))
+    if parent_future is not None and parent_future.running():
+        try:
+            parent_future.result()
+        except Exception:
+            pass
+
+    stored = get_page_texts(db, part.parent_upload_id, part.start_page, part.end_page)
+    if not missing_pages(stored, part.start_page, part.end_page):
+        print(f"📚 Part {part.part_number}: reusing {len(stored)} stored page(s)")
+        return PAGE_SEPARATOR.join(stored[page] for page in sorted(stored) if stored[page]), []
+
+    if part.is_virtual:
+        # The part is a page range of the book's file: read just those pages (failed pages are book pages)
+        page_texts, failed_pages = extract_pdf_pages(part.file_path, first_page=part.start_page, last_page=part.end_page)
+    else:
+        page_texts, failed_pages = extract_pdf_pages(part.file_path)
+        # Part-relative failed pages -> book pages
+        failed_pages = [part.start_page + page - 1 for page in failed_pages]
+    text = save_pages(db, part.parent_upload_id, page_texts, first_page=part.start_page, part_id=part.id)
+    return text, failed_pages
+
+
+def _run_range_extraction(upload_id: int, start_page: int, end_page: int) -> None:
+    """Worker: extract only start_page..end_page of an upload into the page store"""
+    db = SessionLocal()
+    try:
+        upload = db.query(Upload).filter_by(id=upload_id).first()
+        if upload is None:
+            return
+        page_texts, failed_pages = extract_pdf_pages(upload.file_path, first_page=start_page, last_page=end_page)
+        save_pages(db, upload.id, page_texts, first_page=start_page)
+        db.commit()
+        print(f"✅ Extracted pages {start_page}-{end_page} of upload {upload_id}" + (f" (failed pages: {failed_pages})" if failed_pages else ""))
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def get_page_range_text(db, upload, start_page: int, end_page: int) -> Dict[int, str]:
+    """
+    Stored text for pages start_page..end_page of an upload, by page number.
+    Pages come from the page store; anything missing is filled by waiting for a
+    running extraction, by the split parts covering the range, or finally by
+    extracting just the missing pages.
+    """
+    page_texts = get_page_texts(db, upload.id, start_page, end_page)
+    if not missing_pages(page_texts, start_page, end_page):
+        return page_texts
+
+    with _lock:
+        future = _in_flight.get((KIND_UPLOAD, upload.id))
+    if future is not None:
+        try:
+            await asyncio.wrap_future(future)
+        except Exception as wait_error:
+            print(f"⚠️ Extraction of upload {upload.id} failed, extracting requested pages only: {wait_error}")
+        page_texts = get_page_texts(db, upload.id, start_page, end_page)
+
+    missing = missing_pages(page_texts, start_page, end_page)
+    if missing and upload.is_split:
+        parts = db.query(PdfSplitPart).filter(
+            PdfSplitPart.parent_upload_id == upload.id,
+            PdfSplitPart.start_page <= missing[-1],
+            PdfSplitPart.end_page >= missing[0]
+        ).all()
+        results = await asyncio.gather(*(get_extracted_text(part, KIND_PART) for part in parts), return_exceptions=True)
+        for part, result in zip(parts, results):
+            if isinstance(result, BaseException):
+                print(f"⚠️ Part {part.part_number} extraction failed: {result}")
+        page_texts = get_page_texts(db, upload.id, start_page, end_page)
+        missing = missing_pages(page_texts, start_page, end_page)
+
+    if missing:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(_executor, _run_range_extraction, upload.id, missing[0], missing[-1])
+        page_texts = get_page_texts(db, upload.id, start_page, end_page)
+
+    return page_texts
+
+
+async def get_extracted_text(record, kind: str) -> Optional[str]:
+    """
+    Text for an upload or split part, for the generate path.
+    Reuses a finished extraction, awaits one that is in flight, and otherwise starts
+    one now (never scheduled, lost on restart, or previously failed).
+    Raises the extraction error if it fails.
+    """
+    if record.extraction_status == EXTRACTION_DONE and record.extracted_text:
+        return record.extracted_text
+
+    with _lock:
+        future = _in_flight.get((kind, record.id))
+    if future is None:
+        future = schedule_extraction(kind, record.id)
+    else:
+        print(f"⏳ Waiting for in-flight extraction of {kind} {record.id}")
+    return await asyncio.wrap_future(future)
+
+
+def copy_extraction(source, target) -> None:
+    """Copy a finished extraction between records that share the same file (part -> upload)"""
+    target.extraction_status = source.extraction_status
+    target.extraction_error = source.extraction_error
+    target.extraction_failed_pages = source.extraction_failed_pages
+    target.extracted_text = source.extracted_text
+
+
+def shutdown_extraction_executor() -> None:
+    """Stop accepting work and drop queued extractions (running ones finish in the background)"""
+    _executor.shutdown(wait=False, cancel_futures=True)
@@ -8,8 +8,24 @@ import urllib.error
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib.enums import TA_LEFT, TA_RIGHT, TA_CENTER
-from typing import Dict, Tuple, Optional
+from typing import Callable, Dict, Tuple, Optional
+from collections import OrderedDict
+import base64
+import hashlib
+import io
 import re
+import string
+import threading
+
+# Optional import for font subsetting (smaller @font-face payloads in Playwright HTML)
+try:
+    from fontTools import subset as font_subset
+    FONTTOOLS_AVAILABLE = True
+except ImportError:
+    FONTTOOLS_AVAILABLE = False
+    font_subset = None
+
+from app.config import settings
 
 # Font paths (will be downloaded if not present)
 FONT_DIR = os.path.join(os.path.dirname(__file__), "fonts")
@@ -249,3 +265,70 @@ def initialize_fonts():
     print("🔤 Font system initialized (fonts will be downloaded on-demand)")
     # Don't download all fonts on startup - download them when needed
     # This prevents long startup times and 404 errors if fonts aren't available
+
+
+# Base64 @font-face payloads for HTML rendering, keyed by font file (+ glyph set for subsets)
+_font_payloads: "OrderedDict[str, str]" = OrderedDict()
+_font_payloads_lock = threading.Lock()
+
+# Always kept in subsets: printable ASCII (labels, numbering) and symbols KaTeX may draw
+# with the body font although the LaTeX source doesn't contain them
+SUBSET_BASE_CHARACTERS = string.printable + "✓−×÷±∓·∘√∞≤≥≠≈≡∑∏∫∂∆∇∈∉⊂⊃∪∩→←↔⇒⇔∀∃°′″…αβγδεθλμπρστφχψωΓΔΘΛΠΣΦΨΩ"
+
+
+def _cached_payload(key: str, build: Callable[[], Tuple[str, bytes]]) -> str:
+    """CSS src for a font payload, built once per key (LRU, FONT_PAYLOAD_CACHE_SIZE entries)"""
+    with _font_payloads_lock:
+        if key in _font_payloads:
+            _font_payloads.move_to_end(key)
+            return _font_payloads[key]
+    font_format, data = build()
+    mime = "font/truetype;charset=utf-8" if font_format == "truetype" else f"font/{font_format}"
+    src = f"url(data:{mime};base64,{base64.b64encode(data).decode('ascii')}) format('{font_format}')"
+    with _font_payloads_lock:
+        _font_payloads[key] = src
+        while len(_font_payloads) > max(1, settings.FONT_PAYLOAD_CACHE_SIZE):
+            _font_payloads.popitem(last=False)
+    return src
+
+
+def _subset_font(font_path: str, codepoints) -> bytes:
+    """WOFF with only the glyphs needed for codepoints (plus what shaping them can produce)"""
+    options = font_subset.Options()
+    options.layout_features = ["*"]  # Keep all GSUB/GPOS features: Indic conjuncts, Arabic joining forms
+    options.name_IDs = ["*"]
+    options.notdef_outline = True
+    options.hinting = False  # Not used when printing to PDF
+    options.flavor = "woff"
+    font = font_subset.load_font(font_path, options)
+    subsetter = font_subset.Subsetter(options)
+    subsetter.populate(unicodes=codepoints)
+    subsetter.subset(font)
+    buffer = io.BytesIO()
+    font_subset.save_font(font, buffer, options)
+    return buffer.getvalue()
+
+
+def get_font_face_src(font_path: str, text: Optional[str] = None) -> str:
+    """
+    CSS src of an @font-face rule embedding the font as base64 ("" if the file is missing).
+    Encoded payloads are cached in memory, so the font is read and encoded once per process.
+    Given the text to render (and FONT_SUBSETTING with fontTools installed), the font is
+    subset to the glyphs it needs; subsets are cached by glyph-set hash.
+    """
+    if not os.path.exists(font_path):
+        return ""
+    version = f"{font_path}:{os.path.getmtime(font_path)}"
+    
+    if text is not None and settings.FONT_SUBSETTING and FONTTOOLS_AVAILABLE:
+        codepoints = sorted({ord(c) for c in text} | {ord(c) for c in SUBSET_BASE_CHARACTERS})
+        glyph_set = hashlib.sha256(",".join(map(str, codepoints)).encode()).hexdigest()[:16]
+        try:
+            return _cached_payload(f"{version}:{glyph_set}", lambda: ("woff", _subset_font(font_path, codepoints)))
+        except Exception as e:
+            print(f"⚠️ Font subsetting failed, embedding the whole font: {e}")
+    
+    def read_font() -> Tuple[str, bytes]:
+        with open(font_path, "rb") as f:
+            return "truetype", f.read()
+    return _cached_payload(version, read_font)
@@ -1,32 +1,9 @@
 import cv2
 import numpy as np
 from PIL import Image
-try:
-    from ultralytics import YOLO
-    ULTRALYTICS_AVAILABLE = True
-except ImportError:
-    YOLO = None
-    ULTRALYTICS_AVAILABLE = False
-    print("⚠️ Warning: ultralytics not available. Human detection will be disabled.")
 import os
 from typing import Tuple, Optional
-
-# Load YOLO model for person detection
-_model_path = os.path.join(os.path.dirname(__file__), "models", "yolov8n.pt")
-_model = None
-
-def get_model():
-    """Lazy load YOLO model"""
-    global _model
-    if _model is None:
-        try:
-            if YOLO is None:
-                raise ImportError("ultralytics not available")
-            _model = YOLO("yolov8n.pt")  # nano model for speed
-        except Exception as e:
-            print(f"Warning: Could not load YOLO model: {e}")
-            print("Human detection will be disabled. Install ultralytics: pip install ultralytics")
-    return _model
+from app.model_registry import get_detector
 
 def detect_humans(image_path: str) -> Tuple[bool, Optional[str]]:
     """
@@ -34,8 +11,8 @@ def detect_humans(image_path: str) -> Tuple[bool, Optional[str]]:
     Returns: (has_humans, error_message)
     """
     try:
-        model = get_model()
-        if model is None:
+        detector = get_detector()
+        if detector is None:
             # If model not available, skip detection (for development)
             return False, None
         
@@ -45,21 +22,10 @@ def detect_humans(image_path: str) -> Tuple[bool, Optional[str]]:
             return False, "Could not read image"
         
         # Run detection
-        results = model(img, classes=[0])  # class 0 is 'person' in COCO dataset
+        detections = detector.detect([img], classes=[0])[0]  # class 0 is 'person' in COCO dataset
         
         # Check if any person detected
-        has_humans = False
-        for result in results:
-            boxes = result.boxes
-            if boxes is not None and len(boxes) > 0:
-                # Check for person class (class 0)
-                for box in boxes:
-                    cls = int(box.cls[0])
-                    if cls == 0:  # person class
-                        has_humans = True
-                        break
-                if has_humans:
-                    break
+        has_humans = any(detection.class_id == 0 for detection in detections)
         
         if has_humans:
             return True, "Image contains human body — upload text-only or remove people."
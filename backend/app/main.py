@@ -5,6 +5,7 @@ from contextlib import asynccontextmanager
 from app.config import settings
 from app.database import engine, Base
 from app.routers import auth, upload, qna, user, admin, reviews, ai_usage
+from app.upload_ingest import UploadSizeLimitMiddleware
 import asyncio
 import sys
 import logging
@@ -60,6 +61,46 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"⚠️  Database initialization warning: {e}")
     
+    # Optionally convert legacy whole-file Fernet uploads to the chunked format.
+    # Runs in a daemon thread: reads work on both formats, so nothing waits for it.
+    if settings.STORAGE_REENCRYPT_ON_STARTUP and settings.ENCRYPT_STORAGE:
+        import threading
+        from app.storage_service import reencrypt_storage
+
+        def run_reencryption():
+            try:
+                stats = reencrypt_storage()
+                print(f"✅ Storage re-encryption finished: {stats}")
+            except Exception as e:
+                print(f"⚠️  Storage re-encryption failed: {e}")
+
+        threading.Thread(target=run_reencryption, name="storage-reencrypt", daemon=True).start()
+        print("🔐 Storage re-encryption started in background")
+    
+    # Optionally load the shared YOLO detector now so the first image validation is warm
+    if settings.YOLO_PRELOAD:
+        import threading
+        from app.model_registry import preload_models
+
+        threading.Thread(target=preload_models, name="yolo-preload", daemon=True).start()
+        print("📦 YOLO model preload started in background")
+    
+    # Launch the persistent Chromium pool for PDF downloads (otherwise launched on the first download)
+    if settings.PDF_BROWSER_PRELAUNCH:
+        try:
+            from app.browser_pool import PLAYWRIGHT_AVAILABLE, start_browser_pool
+            if PLAYWRIGHT_AVAILABLE:
+                await start_browser_pool()
+        except Exception as e:
+            print(f"⚠️  Browser pool start failed (PDF downloads will retry, then fall back to ReportLab): {e}")
+    
+    # Spawn the ReportLab/DOCX/TXT render processes (fonts registered) before the first download
+    try:
+        from app.render_executor import start_render_executor
+        await start_render_executor()
+    except Exception as e:
+        print(f"⚠️  Render worker start failed (started on the first download instead): {e}")
+    
     print("✅ Application startup complete")
     
     yield
@@ -67,7 +108,38 @@ async def lifespan(app: FastAPI):
     # Shutdown
     print("🛑 Shutting down StudyQnA Generator API...")
     
-    # Close database connections first
+    # Stop background text extraction (queued jobs are dropped and restarted on demand)
+    try:
+        from app.extraction_service import shutdown_extraction_executor
+        shutdown_extraction_executor()
+        print("✅ Extraction workers stopped")
+    except Exception as e:
+        print(f"⚠️  Error stopping extraction workers: {e}")
+    
+    # Close pooled browsers (active renders get PDF_BROWSER_SHUTDOWN_GRACE_SECONDS to finish)
+    try:
+        from app.browser_pool import shutdown_browser_pool
+        await shutdown_browser_pool()
+        print("✅ Browser pool closed")
+    except Exception as e:
+        print(f"⚠️  Error closing browser pool: {e}")
+    
+    # Stop render processes (queued renders are dropped)
+    try:
+        from app.render_executor import shutdown_render_executor
+        shutdown_render_executor()
+        print("✅ Render workers stopped")
+    except Exception as e:
+        print(f"⚠️  Error stopping render workers: {e}")
+    
+    # Stop storage I/O threads
+    try:
+        from app.async_storage import shutdown_storage_executor
+        shutdown_storage_executor()
+    except Exception as e:
+        print(f"⚠️  Error stopping storage workers: {e}")
+    
+    # Close database connections
     try:
         engine.dispose()
         print("✅ Database connections closed")
@@ -94,6 +166,15 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Reject oversize uploads before the body is parsed and spooled
+# (added before CORS so the 413 still carries CORS headers)
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    max_bytes=settings.MAX_BOOK_PDF_SIZE_MB * 1024 * 1024,
+    paths=["/api/upload"],
+    detail=f"PDF size exceeds {settings.MAX_BOOK_PDF_SIZE_MB}MB limit. Maximum size for book splitting is {settings.MAX_BOOK_PDF_SIZE_MB}MB."
+)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
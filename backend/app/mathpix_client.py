@@ -0,0 +1,191 @@
+"""
+Async Mathpix Client
+Optional math-aware OCR fallback for pages Tesseract could not read.
+
+- Only the failing pages are submitted: they are copied into a small subset PDF
+  and the per-page results are mapped back to the original page numbers.
+- Polling uses asyncio.sleep, so it never blocks an event loop.
+- Cancelling the awaiting task deletes the remote job before re-raising.
+
+The API base URL comes from settings.MATHPIX_API_URL, so the client can be
+pointed at a local mock server (see test_mathpix_mock.py).
+"""
+import asyncio
+import base64
+import io
+import json
+from typing import Dict, List, Optional
+
+import httpx
+
+from app.config import settings
+
+
+class MathpixError(Exception):
+    """Mathpix request failed, returned an error status or timed out"""
+
+
+def mathpix_available() -> bool:
+    return bool(settings.MATHPIX_APP_ID and settings.MATHPIX_APP_KEY)
+
+
+def build_page_subset(pdf_data: bytes, pages: List[int]) -> bytes:
+    """Copy the given 1-indexed pages of a PDF, in order, into a new PDF"""
+    from PyPDF2 import PdfReader, PdfWriter
+
+    reader = PdfReader(io.BytesIO(pdf_data))
+    writer = PdfWriter()
+    for page in pages:
+        writer.add_page(reader.pages[page - 1])
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+class MathpixClient:
+    """
+    Minimal async client for the Mathpix v3 text and PDF endpoints.
+    Use as an async context manager:
+
+        async with MathpixClient() as client:
+            pages = await client.ocr_pdf(pdf_bytes)
+    """
+
+    def __init__(
+        self,
+        app_id: Optional[str] = None,
+        app_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        poll_interval: Optional[float] = None,
+        timeout: Optional[float] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.base_url = (base_url or settings.MATHPIX_API_URL).rstrip("/")
+        self.poll_interval = poll_interval if poll_interval is not None else settings.MATHPIX_POLL_INTERVAL
+        self.timeout = timeout if timeout is not None else settings.MATHPIX_TIMEOUT
+        self._headers = {
+            "app_id": app_id or settings.MATHPIX_APP_ID,
+            "app_key": app_key or settings.MATHPIX_APP_KEY
+        }
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def __aenter__(self) -> "MathpixClient":
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers=self._headers,
+            timeout=httpx.Timeout(60.0, connect=10.0),
+            transport=self._transport
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self._client.aclose()
+        self._client = None
+
+    async def ocr_image(self, png_bytes: bytes) -> Optional[str]:
+        """OCR a single image with /v3/text. Returns LaTeX-styled text if available."""
+        payload = {
+            "src": f"data:image/png;base64,{base64.b64encode(png_bytes).decode()}",
+            "formats": ["text"],
+            "data_options": {
+                "include_asciimath": True,
+                "include_latex": True,
+                "include_mathml": True
+            }
+        }
+        response = await self._client.post("/v3/text", json=payload)
+        if response.status_code != 200:
+            raise MathpixError(f"Mathpix image OCR failed: {response.status_code} {response.text[:300]}")
+        data = response.json()
+        return data.get("latex_styled") or data.get("latex") or data.get("text") or None
+
+    async def submit_pdf(self, pdf_bytes: bytes) -> str:
+        """Upload a PDF for processing. Returns the pdf_id."""
+        options = {"math_inline_delimiters": ["$", "$"], "rm_spaces": True}
+        response = await self._client.post(
+            "/v3/pdf",
+            files={"file": ("document.pdf", pdf_bytes, "application/pdf")},
+            data={"options_json": json.dumps(options)}
+        )
+        if response.status_code not in (200, 202):
+            raise MathpixError(f"Mathpix PDF submit failed: {response.status_code} {response.text[:300]}")
+        data = response.json()
+        pdf_id = data.get("pdf_id") or data.get("request_id")
+        if not pdf_id:
+            raise MathpixError(f"Mathpix PDF submit failed: no pdf_id ({data.get('error') or data})")
+        return pdf_id
+
+    async def wait_for_pdf(self, pdf_id: str) -> Dict:
+        """Poll the job status until it completes. Raises MathpixError on error or timeout."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        while True:
+            response = await self._client.get(f"/v3/pdf/{pdf_id}")
+            if response.status_code == 200:
+                data = response.json()
+                status = data.get("status")
+                if status == "completed":
+                    return data
+                if status in ("error", "failed"):
+                    raise MathpixError(f"Mathpix PDF OCR error status: {data.get('error') or status}")
+            if loop.time() + self.poll_interval > deadline:
+                raise MathpixError(f"Mathpix PDF OCR timed out after {self.timeout:.0f}s")
+            await asyncio.sleep(self.poll_interval)
+
+    async def get_pdf_pages(self, pdf_id: str) -> Dict[int, str]:
+        """Per-page text of a completed job (1-indexed page of the submitted PDF -> text)"""
+        response = await self._client.get(f"/v3/pdf/{pdf_id}.lines.json")
+        if response.status_code != 200:
+            raise MathpixError(f"Mathpix PDF result failed: {response.status_code} {response.text[:300]}")
+        pages = {}
+        for page in response.json().get("pages", []):
+            lines = [line.get("text", "") for line in page.get("lines", []) if line.get("text")]
+            pages[int(page.get("page", len(pages) + 1))] = "\n".join(lines).strip()
+        return pages
+
+    async def delete_pdf(self, pdf_id: str) -> None:
+        try:
+            await self._client.delete(f"/v3/pdf/{pdf_id}")
+        except Exception as delete_error:
+            print(f"⚠️ Could not delete Mathpix job {pdf_id}: {delete_error}")
+
+    async def ocr_pdf(self, pdf_bytes: bytes) -> Dict[int, str]:
+        """Submit, wait and fetch per-page text. The remote job is deleted if the task is cancelled."""
+        pdf_id = await self.submit_pdf(pdf_bytes)
+        try:
+            await self.wait_for_pdf(pdf_id)
+            return await self.get_pdf_pages(pdf_id)
+        except asyncio.CancelledError:
+            # Shield the cleanup request from the cancellation that triggered it
+            await asyncio.shield(self.delete_pdf(pdf_id))
+            raise
+
+
+async def mathpix_ocr_pages(pdf_data: bytes, pages: List[int], client: Optional[MathpixClient] = None) -> Dict[int, str]:
+    """
+    OCR only the given 1-indexed pages of a PDF with Mathpix.
+    Returns original page number -> text (pages Mathpix returned nothing for are omitted).
+    """
+    if not pages:
+        return {}
+    subset = build_page_subset(pdf_data, pages)
+    print(f"🔄 Submitting {len(pages)} page(s) to Mathpix ({len(subset) / 1024:.0f} KB): {pages}")
+
+    async def run(mathpix: MathpixClient) -> Dict[int, str]:
+        subset_pages = await mathpix.ocr_pdf(subset)
+        return {
+            pages[subset_page - 1]: text
+            for subset_page, text in subset_pages.items()
+            if text and 1 <= subset_page <= len(pages)
+        }
+
+    if client is not None:
+        return await run(client)
+    async with MathpixClient() as mathpix:
+        return await run(mathpix)
+
+
+async def mathpix_ocr_image(png_bytes: bytes) -> Optional[str]:
+    async with MathpixClient() as mathpix:
+        return await mathpix.ocr_image(png_bytes)
@@ -0,0 +1,268 @@
+"""
+Shared Object-Detection Model Registry
+One YOLO detector per process, shared by human_detection and content_validation
+(each used to load its own copy of yolov8n).
+
+Backends (settings.YOLO_BACKEND):
+- "onnx":        ONNX Runtime on CPU with a model exported at settings.YOLO_INPUT_SIZE.
+                 No torch import; batched inference when the model was exported with
+                 a dynamic batch axis. Pre- and post-processing follow the ultralytics
+                 predictor (stride-aligned letterbox, IoU 0.7 NMS), so both backends
+                 return the same detections.
+- "ultralytics": the ultralytics/PyTorch stack (the original path)
+- "auto":        onnx when onnxruntime and the exported model are present, else ultralytics
+
+Export the ONNX model once with:
+    python benchmark_yolo.py --export
+Set YOLO_PRELOAD=true to load the model at startup instead of on the first request.
+"""
+import importlib.util
+import os
+import threading
+import time
+from typing import List, NamedTuple, Optional, Sequence
+
+import cv2
+import numpy as np
+
+try:
+    import onnxruntime
+    ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    onnxruntime = None
+    ONNXRUNTIME_AVAILABLE = False
+
+# Imported on first use: ultralytics pulls in torch (seconds and hundreds of MB), which the ONNX backend avoids
+ULTRALYTICS_AVAILABLE = importlib.util.find_spec("ultralytics") is not None
+
+from app.config import settings
+
+MODELS_DIR = os.path.join(os.path.dirname(__file__), "models")
+MODEL_STRIDE = 32  # Largest YOLOv8 stride: letterboxed sides are multiples of it
+NMS_IOU = 0.7  # ultralytics predict default
+MAX_DETECTIONS = 300  # ultralytics predict default
+CLASS_OFFSET = 7680  # Per-class shift for class-aware NMS in letterboxed pixels (as ultralytics)
+
+
+class Detection(NamedTuple):
+    class_id: int
+    confidence: float
+    box: tuple  # (x1, y1, x2, y2) in pixels of the input image
+
+
+class Detector:
+    """Base class: detect objects in BGR images (as read by cv2.imread)"""
+    name = "base"
+
+    def detect(
+        self,
+        images: Sequence[np.ndarray],
+        conf: float = 0.25,
+        classes: Optional[Sequence[int]] = None
+    ) -> List[List[Detection]]:
+        """One list of detections per image"""
+        raise NotImplementedError
+
+
+class UltralyticsDetector(Detector):
+    """YOLO through ultralytics/PyTorch"""
+    name = "ultralytics"
+
+    def __init__(self, weights: str):
+        self.model = _load_ultralytics(weights)
+
+    def detect(self, images, conf=0.25, classes=None):
+        if not images:
+            return []
+        results = self.model(
+            list(images), conf=conf, classes=list(classes) if classes else None,
+            imgsz=settings.YOLO_INPUT_SIZE, verbose=False
+        )
+        detections = []
+        for result in results:
+            image_detections = []
+            boxes = result.boxes
+            if boxes is not None:
+                for box in boxes:
+                    image_detections.append(Detection(
+                        int(box.cls[0]), float(box.conf[0]), tuple(float(v) for v in box.xyxy[0])
+                    ))
+            detections.append(image_detections)
+        return detections
+
+
+class OnnxDetector(Detector):
+    """
+    YOLOv8 exported to ONNX, run with ONNX Runtime on CPU.
+    Images are letterboxed to a fixed square input; output rows are
+    (cx, cy, w, h, class scores...) per anchor, filtered and NMSed here.
+    """
+    name = "onnx"
+
+    def __init__(self, model_path: str, input_size: int):
+        options = onnxruntime.SessionOptions()
+        # More threads than CPUs only adds contention (2 threads on 1 vCPU nearly doubled latency)
+        options.intra_op_num_threads = max(1, min(settings.YOLO_THREADS, os.cpu_count() or 1))
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.input_size = input_size
+        # A fixed batch dimension of 1 means the model was exported without dynamic=True
+        self.max_batch = model_input.shape[0] if isinstance(model_input.shape[0], int) else settings.YOLO_MAX_BATCH
+        # Exported with dynamic=True: height and width are free, so inputs need not be square
+        self.dynamic_shape = not isinstance(model_input.shape[2], int)
+
+    def _letterbox(self, image: np.ndarray, rect: bool):
+        """
+        Scale to fit input_size and pad (as ultralytics' LetterBox). rect=True pads only
+        up to the next stride multiple instead of to a square, e.g. 640x480 for a 4:3 photo.
+        """
+        height, width = image.shape[:2]
+        scale = min(self.input_size / height, self.input_size / width)
+        new_width, new_height = int(round(width * scale)), int(round(height * scale))
+        if rect:
+            canvas_width = new_width + (self.input_size - new_width) % MODEL_STRIDE
+            canvas_height = new_height + (self.input_size - new_height) % MODEL_STRIDE
+        else:
+            canvas_width = canvas_height = self.input_size
+        resized = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+        canvas = np.full((canvas_height, canvas_width, 3), 114, dtype=np.uint8)
+        pad_x, pad_y = (canvas_width - new_width) // 2, (canvas_height - new_height) // 2
+        canvas[pad_y:pad_y + new_height, pad_x:pad_x + new_width] = resized
+        # BGR HWC uint8 -> RGB CHW float
+        blob = canvas[:, :, ::-1].transpose(2, 0, 1).astype(np.float32) / 255.0
+        return blob, scale, pad_x, pad_y
+
+    def detect(self, images, conf=0.25, classes=None):
+        detections = []
+        for batch_start in range(0, len(images), self.max_batch):
+            batch = images[batch_start:batch_start + self.max_batch]
+            # One input shape per batch: rectangular only when every image has the same shape
+            rect = self.dynamic_shape and len({image.shape for image in batch}) == 1
+            prepared = [self._letterbox(image, rect) for image in batch]
+            outputs = self.session.run(None, {self.input_name: np.stack([blob for blob, _, _, _ in prepared])})[0]
+            for output, image, (_, scale, pad_x, pad_y) in zip(outputs, batch, prepared):
+                detections.append(self._postprocess(output, image.shape[:2], scale, pad_x, pad_y, conf, classes))
+        return detections
+
+    @staticmethod
+    def _postprocess(output: np.ndarray, image_shape, scale: float, pad_x: int, pad_y: int, conf: float, classes) -> List[Detection]:
+        predictions = output.T  # (anchors, 4 + classes)
+        scores = predictions[:, 4:]
+        class_ids = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(scores)), class_ids]
+        keep = confidences > conf
+        if classes:
+            keep &= np.isin(class_ids, list(classes))
+        if not keep.any():
+            return []
+        boxes = predictions[keep, :4]
+        class_ids, confidences = class_ids[keep], confidences[keep]
+
+        # Class-aware NMS in letterboxed pixels: offset boxes per class so different classes never suppress each other
+        xywh = boxes.copy()
+        xywh[:, 0] -= boxes[:, 2] / 2
+        xywh[:, 1] -= boxes[:, 3] / 2
+        shifted = xywh.copy()
+        shifted[:, :2] += class_ids[:, None] * float(CLASS_OFFSET)
+        indices = np.array(cv2.dnn.NMSBoxes(shifted.tolist(), confidences.tolist(), conf, NMS_IOU)).flatten()[:MAX_DETECTIONS]
+
+        # Letterboxed (x, y, w, h) -> (x1, y1, x2, y2) in image pixels, clipped to the image
+        height, width = image_shape
+        detections = []
+        for i in indices:
+            x1 = min(max((xywh[i, 0] - pad_x) / scale, 0.0), width)
+            y1 = min(max((xywh[i, 1] - pad_y) / scale, 0.0), height)
+            x2 = min(max((xywh[i, 0] + xywh[i, 2] - pad_x) / scale, 0.0), width)
+            y2 = min(max((xywh[i, 1] + xywh[i, 3] - pad_y) / scale, 0.0), height)
+            detections.append(Detection(int(class_ids[i]), float(confidences[i]), (float(x1), float(y1), float(x2), float(y2))))
+        return detections
+
+
+def _load_ultralytics(weights: str):
+    """Load a YOLO model, working around PyTorch 2.6+ weights_only loading"""
+    if not ULTRALYTICS_AVAILABLE:
+        raise ImportError("ultralytics not available")
+    from ultralytics import YOLO
+    try:
+        import torch.serialization
+        from ultralytics.nn.tasks import DetectionModel
+        from ultralytics.nn.modules import Conv, Bottleneck, C2f, SPPF, Detect
+        torch.serialization.add_safe_globals([DetectionModel, Conv, Bottleneck, C2f, SPPF, Detect])
+    except Exception as e:
+        print(f"⚠️ Could not register ultralytics classes as safe globals: {e}")
+    try:
+        return YOLO(weights)
+    except Exception as e:
+        print(f"⚠️ YOLO load failed ({e}), retrying with torch.load(weights_only=False)")
+        import torch
+        original_load = torch.load
+
+        def patched_load(*args, **kwargs):
+            kwargs.setdefault("weights_only", False)
+            return original_load(*args, **kwargs)
+
+        torch.load = patched_load
+        try:
+            return YOLO(weights)
+        finally:
+            torch.load = original_load
+
+
+def onnx_model_path() -> str:
+    return settings.YOLO_ONNX_PATH or os.path.join(
+        MODELS_DIR, f"{os.path.splitext(os.path.basename(settings.YOLO_WEIGHTS))[0]}_{settings.YOLO_INPUT_SIZE}.onnx"
+    )
+
+
+def export_onnx(output_path: Optional[str] = None) -> str:
+    """Export settings.YOLO_WEIGHTS to ONNX at the fixed input size with a dynamic batch axis"""
+    output_path = output_path or onnx_model_path()
+    model = _load_ultralytics(settings.YOLO_WEIGHTS)
+    exported = model.export(format="onnx", imgsz=settings.YOLO_INPUT_SIZE, dynamic=True, simplify=True)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    os.replace(exported, output_path)
+    print(f"✅ Exported {settings.YOLO_WEIGHTS} to {output_path}")
+    return output_path
+
+
+def _create_detector(backend: str) -> Detector:
+    model_path = onnx_model_path()
+    if backend == "auto":
+        backend = "onnx" if ONNXRUNTIME_AVAILABLE and os.path.exists(model_path) else "ultralytics"
+    if backend == "onnx":
+        if not ONNXRUNTIME_AVAILABLE:
+            raise ImportError("onnxruntime not available. Install it: pip install onnxruntime")
+        return OnnxDetector(model_path, settings.YOLO_INPUT_SIZE)
+    return UltralyticsDetector(settings.YOLO_WEIGHTS)
+
+
+_detector: Optional[Detector] = None
+_load_failed = False
+_lock = threading.Lock()
+
+
+def get_detector() -> Optional[Detector]:
+    """The shared detector, loaded on first use. None if no backend could be loaded."""
+    global _detector, _load_failed
+    if _detector is not None or _load_failed:
+        return _detector
+    with _lock:
+        if _detector is None and not _load_failed:
+            start = time.perf_counter()
+            try:
+                _detector = _create_detector(settings.YOLO_BACKEND)
+                print(f"✅ YOLO detector loaded ({_detector.name}) in {time.perf_counter() - start:.2f}s")
+            except Exception as e:
+                _load_failed = True
+                print(f"⚠️ Warning: Could not load YOLO model: {e}")
+                print("⚠️ Object detection will be disabled. Install ultralytics or onnxruntime.")
+    return _detector
+
+
+def preload_models() -> None:
+    """Load the detector and run one dummy inference so the first request is warm"""
+    detector = get_detector()
+    if detector is not None:
+        detector.detect([np.zeros((settings.YOLO_INPUT_SIZE, settings.YOLO_INPUT_SIZE, 3), dtype=np.uint8)])
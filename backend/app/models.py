@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, JSON, Enum as SQLEnum, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Boolean, Date, DateTime, Text, ForeignKey, JSON, Enum as SQLEnum, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from datetime import datetime
@@ -57,6 +57,10 @@ class User(Base):
     daily_questions_limit = Column(Integer, default=50)  # Admin-configurable daily questions limit
     total_questions_reset_at = Column(DateTime, nullable=True)  # Timestamp when total questions count was last reset by admin
     daily_questions_reset_at = Column(DateTime, nullable=True)  # Timestamp when daily questions count was last reset by admin
+    # Materialized question counts (see app/question_quota.py)
+    total_questions_used = Column(Integer, nullable=False, default=0, server_default="0")  # Questions in sets created since total_questions_reset_at
+    daily_questions_used = Column(Integer, nullable=False, default=0, server_default="0")  # Questions in sets created on daily_questions_date since daily_questions_reset_at
+    daily_questions_date = Column(Date, nullable=True)  # UTC day daily_questions_used belongs to (earlier days read as 0)
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
     
@@ -80,6 +84,11 @@ class Upload(Base):
     subject = Column(String, nullable=True, default="general")  # Subject selection by teacher: mathematics, english, science, social_science, general
     is_deleted = Column(Boolean, default=False)
     is_split = Column(Boolean, default=False)  # True if this PDF was split into parts
+    extraction_status = Column(String, nullable=True, default="pending")  # Background text extraction: pending, running, done, failed
+    extraction_error = Column(Text, nullable=True)  # Error message when extraction failed
+    extraction_failed_pages = Column(JSON, nullable=True)  # 1-indexed pages OCR could not read
+    extracted_text = Column(Text, nullable=True)  # Cached extraction result, reused by generate
+    blob_sha256 = Column(String(64), nullable=True, index=True)  # Content-addressed blob holding the file (None for files stored before deduplication)
     created_at = Column(DateTime, server_default=func.now())
     
     # Relationships
@@ -95,6 +104,7 @@ class QnASet(Base):
     upload_id = Column(Integer, ForeignKey("uploads.id"), nullable=True)
     settings_json = Column(JSON, nullable=False)  # difficulty, type, format, etc.
     qna_json = Column(JSON, nullable=False)  # full Q/A data with answers
+    question_count = Column(Integer, nullable=False, default=0, server_default="0")  # len(qna_json["questions"]), counted once on insert
     created_at = Column(DateTime, server_default=func.now())
     
     # Relationships
@@ -209,18 +219,53 @@ class PdfSplitPart(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     part_number = Column(Integer, nullable=False)  # 1, 2, 3, etc.
     custom_name = Column(String, nullable=True)  # User-defined name for the part
+    title = Column(String, nullable=True)  # Chapter title from the PDF outline or a detected heading
     file_name = Column(String, nullable=False)  # Generated filename
-    file_path = Column(String, nullable=False)  # Storage path
-    file_size = Column(Integer, nullable=False)  # in bytes
+    file_path = Column(String, nullable=False)  # Storage path (the parent's file while the part is virtual)
+    file_size = Column(Integer, nullable=False)  # in bytes (estimated from the page share while virtual)
     start_page = Column(Integer, nullable=False)  # First page number (1-indexed)
     end_page = Column(Integer, nullable=False)  # Last page number (1-indexed)
     total_pages = Column(Integer, nullable=False)  # Pages in this part
+    extraction_status = Column(String, nullable=True, default="pending")  # Background text extraction: pending, running, done, failed
+    extraction_error = Column(Text, nullable=True)  # Error message when extraction failed
+    extraction_failed_pages = Column(JSON, nullable=True)  # 1-indexed pages OCR could not read
+    extracted_text = Column(Text, nullable=True)  # Cached extraction result, reused by generate
+    blob_sha256 = Column(String(64), nullable=True, index=True)  # Content-addressed blob holding the part PDF (NULL while virtual)
+    is_virtual = Column(Boolean, default=False)  # Page range of the parent's file; the part PDF is only built when downloaded
     created_at = Column(DateTime, server_default=func.now())
     
     # Relationships
     parent_upload = relationship("Upload", back_populates="split_parts")
     user = relationship("User", backref="pdf_split_parts")
 
+class PageText(Base):
+    """Extracted text of a single PDF page, so any page range can be assembled without PDF I/O"""
+    __tablename__ = "page_texts"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    upload_id = Column(Integer, ForeignKey("uploads.id", ondelete="CASCADE"), nullable=False, index=True)  # Book-level upload (parts store into their parent)
+    page_number = Column(Integer, nullable=False)  # Page number within the upload (1-indexed)
+    text = Column(Text, nullable=False, default="")  # Empty when the page could not be read
+    part_id = Column(Integer, ForeignKey("pdf_split_parts.id", ondelete="SET NULL"), nullable=True)  # Part whose extraction produced this page (None = the upload itself)
+    char_start = Column(Integer, nullable=False, default=0)  # Offset of this page in the extracted_text of the upload/part that produced it
+    char_end = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, server_default=func.now())
+    
+    __table_args__ = (
+        UniqueConstraint('upload_id', 'page_number', name='uq_page_text_upload_page'),
+    )
+
+class Blob(Base):
+    """A stored file, shared by every Upload / PdfSplitPart with the same content (see app/blob_store.py)"""
+    __tablename__ = "blobs"
+    
+    sha256 = Column(String(64), primary_key=True)  # SHA-256 of the plaintext
+    file_path = Column(String, nullable=False)  # Storage path (blobs/ab/cd/<sha256>)
+    size = Column(Integer, nullable=False)  # Plaintext size in bytes
+    ref_count = Column(Integer, nullable=False, default=0)  # Upload + PdfSplitPart rows referencing this blob
+    created_at = Column(DateTime, server_default=func.now())
+    last_used_at = Column(DateTime, server_default=func.now())  # Last time a new reference was added
+
 class DailyGenerationUsage(Base):
     """Tracks daily generation usage per user"""
     __tablename__ = "daily_generation_usage"
@@ -263,3 +308,22 @@ class ErrorLog(Base):
     # Relationships
     user = relationship("User", backref="error_logs")
 
+
+class ValidationVerdict(Base):
+    """Cached content validation result of an image (see app/validation_cache.py)"""
+    __tablename__ = "validation_verdicts"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    sha256 = Column(String(64), nullable=False, unique=True, index=True)  # SHA-256 of the image file
+    phash = Column(String(16), nullable=True)  # 64-bit perceptual hash (hex); None if the image could not be decoded
+    phash_band0 = Column(Integer, nullable=True, index=True)  # 16-bit slices of phash for near-duplicate lookup
+    phash_band1 = Column(Integer, nullable=True, index=True)
+    phash_band2 = Column(Integer, nullable=True, index=True)
+    phash_band3 = Column(Integer, nullable=True, index=True)
+    is_valid = Column(Boolean, nullable=False)
+    reason = Column(Text, nullable=True)  # Rejection message shown to the user
+    ocr_text = Column(Text, nullable=True)  # Text OCRed during validation (accepted images only)
+    hit_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_hit_at = Column(DateTime, nullable=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
@@ -0,0 +1,183 @@
+"""
+OCR Engine Abstraction
+Runs Tesseract over a list of page images and returns per-page results.
+
+Two engines are available (selected with settings.OCR_ENGINE):
+- "per_page": one pytesseract call (one tesseract process) per page - the original behaviour
+- "batch":    one tesseract process per batch of pages; images are handed over in a
+              list file so the language model is loaded once and start-up is paid once
+"""
+import csv
+import io
+import os
+import shlex
+import subprocess
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
+import pytesseract
+from PIL import Image
+
+from app.config import settings
+
+# (text, mean_word_confidence, word_count) - None when OCR of that page failed
+PageOcrResult = Optional[Tuple[str, float, int]]
+
+
+def _words_to_result(words: List[Dict]) -> Tuple[str, float, int]:
+    """
+    Rebuild page text from Tesseract word rows (image_to_data / TSV output).
+    Each row needs block_num, par_num, line_num, conf and text.
+    """
+    lines: Dict[Tuple[int, int, int], List[str]] = {}
+    confidences = []
+    for row in words:
+        try:
+            conf = float(row["conf"])
+        except (TypeError, ValueError):
+            conf = -1.0
+        word = row.get("text")
+        if conf < 0 or not word or not str(word).strip():
+            continue
+        key = (int(row["block_num"]), int(row["par_num"]), int(row["line_num"]))
+        lines.setdefault(key, []).append(str(word).strip())
+        confidences.append(conf)
+
+    text_lines = []
+    previous_paragraph = None
+    for (block_num, par_num, line_num), line_words in lines.items():
+        if previous_paragraph is not None and (block_num, par_num) != previous_paragraph:
+            text_lines.append("")  # Paragraph break
+        text_lines.append(" ".join(line_words))
+        previous_paragraph = (block_num, par_num)
+
+    mean_conf = sum(confidences) / len(confidences) if confidences else 0.0
+    return "\n".join(text_lines).strip(), mean_conf, len(confidences)
+
+
+def ocr_image_with_confidence(image: Image.Image, config: str = '--psm 6', lang: str = 'eng') -> Tuple[str, float, int]:
+    """
+    OCR a single image with image_to_data so word confidences are available.
+    Returns: (text, mean_word_confidence, word_count)
+    """
+    data = pytesseract.image_to_data(image, lang=lang, config=config, output_type=pytesseract.Output.DICT)
+    keys = ("block_num", "par_num", "line_num", "conf", "text")
+    rows = [
+        {key: data[key][i] for key in keys}
+        for i in range(len(data.get("text", [])))
+    ]
+    return _words_to_result(rows)
+
+
+class OcrEngine:
+    """Base class: OCR a list of page images, one result per image"""
+    name = "base"
+
+    def ocr_pages(self, images: List[Image.Image], config: str = '--psm 6', lang: str = 'eng') -> List[PageOcrResult]:
+        raise NotImplementedError
+
+
+class PerPageTesseractEngine(OcrEngine):
+    """One pytesseract call (and tesseract process) per page"""
+    name = "per_page"
+
+    def ocr_pages(self, images: List[Image.Image], config: str = '--psm 6', lang: str = 'eng') -> List[PageOcrResult]:
+        results: List[PageOcrResult] = []
+        for i, image in enumerate(images):
+            try:
+                results.append(ocr_image_with_confidence(image, config=config, lang=lang))
+            except pytesseract.TesseractNotFoundError:
+                raise
+            except Exception as page_error:
+                if _is_tesseract_missing(page_error):
+                    raise
+                print(f"⚠️ OCR error on image {i+1}: {page_error}")
+                results.append(None)
+        return results
+
+
+class BatchTesseractEngine(OcrEngine):
+    """
+    Hands Tesseract a list file of page images so one process OCRs the whole batch.
+    TSV output carries a page_num column, which is used to split results back into pages.
+    Falls back to per-page OCR for a batch if the batch invocation fails.
+    """
+    name = "batch"
+
+    def __init__(self, batch_size: int = 16, timeout: int = 600):
+        self.batch_size = max(1, batch_size)
+        self.timeout = timeout
+        self._fallback = PerPageTesseractEngine()
+
+    def ocr_pages(self, images: List[Image.Image], config: str = '--psm 6', lang: str = 'eng') -> List[PageOcrResult]:
+        results: List[PageOcrResult] = []
+        for start in range(0, len(images), self.batch_size):
+            batch = images[start:start + self.batch_size]
+            try:
+                results.extend(self._ocr_batch(batch, config, lang))
+            except pytesseract.TesseractNotFoundError:
+                raise
+            except Exception as batch_error:
+                print(f"⚠️ Batch OCR failed for images {start+1}-{start+len(batch)}: {batch_error}. Falling back to per-page OCR...")
+                results.extend(self._fallback.ocr_pages(batch, config=config, lang=lang))
+        return results
+
+    def _ocr_batch(self, images: List[Image.Image], config: str, lang: str) -> List[PageOcrResult]:
+        with tempfile.TemporaryDirectory(prefix="studyqna_ocr_") as tmp_dir:
+            image_paths = []
+            for i, image in enumerate(images):
+                image_path = os.path.join(tmp_dir, f"page_{i:04d}.png")
+                image.save(image_path, format="PNG", compress_level=1)  # Fast write; tesseract decodes PNG quickly
+                image_paths.append(image_path)
+
+            list_file = os.path.join(tmp_dir, "pages.txt")
+            with open(list_file, "w", encoding="utf-8") as f:
+                f.write("\n".join(image_paths) + "\n")
+
+            cmd = [pytesseract.pytesseract.tesseract_cmd, list_file, "stdout", "-l", lang]
+            cmd += shlex.split(config)
+            cmd.append("tsv")
+            try:
+                proc = subprocess.run(cmd, capture_output=True, timeout=self.timeout)
+            except FileNotFoundError:
+                raise pytesseract.TesseractNotFoundError()
+            if proc.returncode != 0:
+                raise Exception(f"tesseract exited with {proc.returncode}: {proc.stderr.decode('utf-8', 'replace')[:500]}")
+
+            return self._split_tsv(proc.stdout.decode("utf-8", "replace"), len(images))
+
+    @staticmethod
+    def _split_tsv(tsv_output: str, page_count: int) -> List[PageOcrResult]:
+        """Group TSV word rows by page_num (1-indexed, one page per input image)"""
+        words_by_page: Dict[int, List[Dict]] = {page: [] for page in range(1, page_count + 1)}
+        reader = csv.DictReader(io.StringIO(tsv_output), delimiter="\t", quoting=csv.QUOTE_NONE)
+        for row in reader:
+            try:
+                if int(row.get("level") or 0) != 5:  # Level 5 = word
+                    continue
+                page = int(row["page_num"])
+            except (TypeError, ValueError):
+                continue
+            if page in words_by_page:
+                words_by_page[page].append(row)
+        return [_words_to_result(words_by_page[page]) for page in range(1, page_count + 1)]
+
+
+def _is_tesseract_missing(error: Exception) -> bool:
+    error_str = str(error).lower()
+    return "tesseract" in error_str and ("not found" in error_str or "not installed" in error_str)
+
+
+_engine: Optional[OcrEngine] = None
+
+
+def get_ocr_engine() -> OcrEngine:
+    """Get the configured OCR engine (shared instance)"""
+    global _engine
+    if _engine is None:
+        if settings.OCR_ENGINE == "per_page":
+            _engine = PerPageTesseractEngine()
+        else:
+            _engine = BatchTesseractEngine(batch_size=settings.OCR_BATCH_SIZE)
+        print(f"🔤 OCR engine: {_engine.name}")
+    return _engine
@@ -2,21 +2,54 @@ import pytesseract
 from PIL import Image
 import cv2
 import numpy as np
-from typing import Optional
-from app.storage_service import read_file
+from typing import Optional, List, Dict, Tuple
+from app.storage_service import read_file, write_stream, stored_file_exists
+from app.blob_store import content_sha256, derived_path
+from app.config import settings
+from app.ocr_engine import OcrEngine, get_ocr_engine
+from app.text_layer_engine import get_text_layer_engine
+from app.mathpix_client import mathpix_available, mathpix_ocr_pages, mathpix_ocr_image
+from app.pdf_split_service import build_page_range_pdf
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import io
-import base64
-import os
-import time
-import requests
+
+# OCR text of an image that passed content validation, stored next to the image's blob
+VALIDATION_TEXT_ARTIFACT = "validation_ocr.txt"
+
+def save_validation_text(image_sha256: str, text: Optional[str]) -> None:
+    """Keep the OCR text content validation produced, so extraction doesn't OCR the image again"""
+    if not text or not text.strip():
+        return
+    path = derived_path(image_sha256, VALIDATION_TEXT_ARTIFACT)
+    try:
+        if not stored_file_exists(path):
+            write_stream(io.BytesIO(text.encode("utf-8")), path)
+    except Exception as e:
+        print(f"⚠️ Could not store validation OCR text: {e}")
+
+def load_validation_text(image_sha256: str) -> Optional[str]:
+    path = derived_path(image_sha256, VALIDATION_TEXT_ARTIFACT)
+    try:
+        if stored_file_exists(path):
+            return read_file(path).decode("utf-8")
+    except Exception as e:
+        print(f"⚠️ Could not read validation OCR text: {e}")
+    return None
 
 def extract_text_from_image(image_path: str) -> Optional[str]:
     """
     Extract text from image using OCR
+    Reuses the text content validation already extracted from the same image bytes,
+    unless it is too short to skip the Mathpix fallback below.
     """
     try:
         # Read image
         image_data = read_file(image_path)
+        validated_text = load_validation_text(content_sha256(image_data))
+        if validated_text and len(validated_text.strip()) >= 50:
+            print(f"♻️ Reusing OCR text from content validation ({len(validated_text.strip())} chars)")
+            return validated_text.strip()
         image = Image.open(io.BytesIO(image_data))
         
         # Convert to RGB if needed
@@ -38,10 +71,15 @@ def extract_text_from_image(image_path: str) -> Optional[str]:
         text = text.strip() if text else ""
 
         # If mathpix is available and the baseline is weak, try mathpix for better math OCR
-        if len(text) < 50 and _mathpix_available():
-            mathpix_text = _mathpix_ocr_image(processed_image)
-            if mathpix_text:
-                return mathpix_text.strip()
+        if len(text) < 50 and mathpix_available():
+            try:
+                buffered = io.BytesIO()
+                processed_image.save(buffered, format="PNG")
+                mathpix_text = _run_coroutine_blocking(mathpix_ocr_image(buffered.getvalue()))
+                if mathpix_text:
+                    return mathpix_text.strip()
+            except Exception as mathpix_error:
+                print(f"Mathpix image OCR error: {mathpix_error}")
 
         return text if text else None
         
@@ -54,245 +92,320 @@ def extract_text_from_pdf(pdf_path: str) -> Optional[str]:
     Extract text from PDF (handles both text-based and image-based/scanned PDFs)
     """
     try:
-        from PyPDF2 import PdfReader
-        from app.storage_service import read_file
-        import io
-        
+        text, _ = extract_pdf_text(pdf_path)
+        return text
+    except Exception as e:
+        print(f"PDF extraction error: {e}")
+        return None
+
+def extract_pdf_text(pdf_path: str) -> Tuple[Optional[str], List[int]]:
+    """
+    Extract text from PDF, raising a descriptive exception when extraction fails
+    (missing OCR tools, no readable text) instead of returning None.
+    Returns: (text, failed_pages) - failed_pages holds 1-indexed pages OCR could not read
+    """
+    page_texts, failed_pages = extract_pdf_pages(pdf_path)
+    text = "\n\n".join(page_text for page_text in page_texts if page_text)
+    return (text or None), failed_pages
+
+def extract_pdf_pages(pdf_path: str, first_page: Optional[int] = None, last_page: Optional[int] = None) -> Tuple[List[str], List[int]]:
+    """
+    Extract text page by page from a PDF, or from the 1-indexed first_page..last_page range
+    (both given; failed pages are still numbered in the whole PDF).
+    Returns: (page_texts, failed_pages) - one entry per page in the range ("" if unreadable).
+    Raises a descriptive exception when extraction fails.
+    """
+    from PyPDF2 import PdfReader
+    
+    if first_page and last_page:
+        # Copy just the range out of the stored file (random access, no decrypt of the whole book);
+        # the engines then see its pages as 1..n and failed pages are shifted back to book pages
+        page_offset = first_page - 1
+        pdf_data = build_page_range_pdf(pdf_path, first_page, last_page)
+    else:
+        page_offset = 0
         pdf_data = read_file(pdf_path)
-        pdf_reader = PdfReader(io.BytesIO(pdf_data))
-        
-        # First, try to extract text directly (for text-based PDFs)
-        text_parts = []
-        for page in pdf_reader.pages:
-            text = page.extract_text()
-            if text:
-                text_parts.append(text)
-        
-        combined = "\n\n".join(text_parts) if text_parts else ""
-        
-        # Check if we got sufficient text (at least 50 characters per page on average)
-        num_pages = len(pdf_reader.pages)
-        min_expected_text = max(50, num_pages * 50)  # At least 50 chars per page
-        
-        # If we have good text extraction, return it
-        if combined and len(combined.strip()) >= min_expected_text:
-            print(f"✅ PDF text extraction successful: {len(combined.strip())} characters from {num_pages} pages")
-            return combined.strip()
-        
-        # If text extraction is weak or empty, it's likely an image-based PDF
-        # Use OCR on PDF pages converted to images
-        print(f"⚠️ PDF appears to be image-based (extracted only {len(combined.strip()) if combined else 0} chars). Using OCR...")
+    pdf_reader = PdfReader(io.BytesIO(pdf_data))
+    if not pdf_reader.pages:
+        return [], []
+    
+    page_texts, failed_pages = _extract_pdf_data_pages(pdf_data, len(pdf_reader.pages))
+    return page_texts, [page_offset + page for page in failed_pages]
+
+def _extract_pdf_data_pages(pdf_data: bytes, page_count: int) -> Tuple[List[str], List[int]]:
+    """Text layer first, OCR for image-based PDFs (see extract_pdf_pages); failed pages are 1-indexed in pdf_data"""
+    first_page, last_page = 1, page_count
+    
+    # First, try to extract text directly (for text-based PDFs)
+    text_engine = get_text_layer_engine()
+    text_layer_pages = text_engine.extract_pages(pdf_data, first_page, last_page)
+    
+    combined = "\n\n".join(text for text in text_layer_pages if text)
+    
+    # Check if we got sufficient text (at least 50 characters per page on average)
+    num_pages = len(text_layer_pages)
+    min_expected_text = max(50, num_pages * 50)  # At least 50 chars per page
+    
+    # If we have good text extraction, return it
+    if combined and len(combined.strip()) >= min_expected_text:
+        print(f"✅ PDF text extraction successful ({text_engine.name}): {len(combined.strip())} characters from {num_pages} pages")
+        return text_layer_pages, []
+    
+    # If text extraction is weak or empty, it's likely an image-based PDF
+    # Use OCR on PDF pages converted to images
+    print(f"⚠️ PDF appears to be image-based (extracted only {len(combined.strip()) if combined else 0} chars). Using OCR...")
+    
+    try:
+        from pdf2image import convert_from_bytes
         
+        # Check if Tesseract is available before processing
         try:
-            from pdf2image import convert_from_bytes
-            import tempfile
-            import os
-            
-            # Convert PDF pages to images
-            try:
-                images = convert_from_bytes(pdf_data, dpi=300)  # Higher DPI for better OCR quality
-                print(f"📄 Converted {len(images)} PDF pages to images for OCR")
-            except Exception as convert_error:
-                # Check if it's a poppler error
-                error_str = str(convert_error).lower()
-                if "poppler" in error_str or "pdftoppm" in error_str or "cannot find" in error_str:
-                    raise Exception(f"Poppler utilities not found or not in PATH. Please install poppler: On Windows: choco install poppler (or download from poppler website), On Linux: sudo apt-get install poppler-utils, On macOS: brew install poppler. Original error: {convert_error}")
-                else:
-                    raise Exception(f"Failed to convert PDF to images: {convert_error}")
-            
-            # Check if Tesseract is available before processing
-            try:
-                pytesseract.get_tesseract_version()
-            except Exception as tesseract_check_error:
-                error_str = str(tesseract_check_error).lower()
-                if "tesseract" in error_str and ("not found" in error_str or "not installed" in error_str):
-                    raise Exception(f"Tesseract OCR is not installed or not in PATH. Please install tesseract: On Ubuntu/Debian: sudo apt-get install tesseract-ocr, On CentOS/RHEL: sudo yum install tesseract, On Windows: Download from https://github.com/UB-Mannheim/tesseract/wiki. Original error: {tesseract_check_error}")
-                else:
-                    raise Exception(f"Tesseract check failed: {tesseract_check_error}")
-            
-            ocr_text_parts = []
-            tesseract_error_occurred = False
-            failed_pages = []
-            for i, image in enumerate(images):
-                try:
-                    print(f"📄 Processing page {i+1}/{len(images)} for OCR...")
-                    # Preprocess image for better OCR
-                    img_array = np.array(image)
-                    gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-                    
-                    # Apply thresholding
-                    _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-                    
-                    # Convert back to PIL Image
-                    processed_image = Image.fromarray(thresh)
-                    
-                    # Extract text using OCR
-                    page_text = pytesseract.image_to_string(processed_image, lang='eng', config='--psm 6')
-                    if page_text and page_text.strip():
-                        ocr_text_parts.append(page_text.strip())
-                        print(f"✅ OCR extracted {len(page_text.strip())} characters from page {i+1}")
-                    else:
-                        print(f"⚠️ OCR returned empty text for page {i+1} (image may be blank or unreadable)")
-                        failed_pages.append(i+1)
-                except pytesseract.TesseractNotFoundError as tesseract_error:
-                    tesseract_error_occurred = True
-                    error_msg = f"Tesseract OCR is not installed or not in PATH. Please install tesseract: On Ubuntu/Debian: sudo apt-get install tesseract-ocr, On CentOS/RHEL: sudo yum install tesseract, On Windows: Download from https://github.com/UB-Mannheim/tesseract/wiki. Original error: {tesseract_error}"
-                    print(f"❌ {error_msg}")
-                    raise Exception(error_msg)
-                except Exception as page_error:
-                    error_str = str(page_error).lower()
-                    if "tesseract" in error_str and ("not found" in error_str or "not installed" in error_str):
-                        tesseract_error_occurred = True
-                        error_msg = f"Tesseract OCR is not installed or not in PATH. Please install tesseract: On Ubuntu/Debian: sudo apt-get install tesseract-ocr, On CentOS/RHEL: sudo yum install tesseract, On Windows: Download from https://github.com/UB-Mannheim/tesseract/wiki. Original error: {page_error}"
-                        print(f"❌ {error_msg}")
-                        raise Exception(error_msg)
-                    else:
-                        print(f"⚠️ OCR error on page {i+1}: {page_error}")
-                        failed_pages.append(i+1)
-                        continue
-            
-            if ocr_text_parts:
-                ocr_combined = "\n\n".join(ocr_text_parts)
-                print(f"✅ OCR extraction successful: {len(ocr_combined)} total characters from {len(ocr_text_parts)} pages")
-                if failed_pages:
-                    print(f"⚠️ Note: {len(failed_pages)} page(s) failed OCR: {failed_pages}")
-                return ocr_combined.strip()
+            pytesseract.get_tesseract_version()
+        except Exception as tesseract_check_error:
+            error_str = str(tesseract_check_error).lower()
+            if "tesseract" in error_str and ("not found" in error_str or "not installed" in error_str):
+                raise Exception(f"Tesseract OCR is not installed or not in PATH. Please install tesseract: On Ubuntu/Debian: sudo apt-get install tesseract-ocr, On CentOS/RHEL: sudo yum install tesseract, On Windows: Download from https://github.com/UB-Mannheim/tesseract/wiki. Original error: {tesseract_check_error}")
             else:
-                if tesseract_error_occurred:
-                    raise Exception("Tesseract OCR failed. Please ensure Tesseract is installed and in PATH.")
-                else:
-                    failed_info = f" Failed pages: {failed_pages}" if failed_pages else ""
-                    error_msg = f"OCR failed to extract text from any of the {len(images)} page(s).{failed_info} This could indicate: 1) Very low-quality or corrupted images, 2) Images with no readable text, 3) OCR processing errors. Please check the PDF quality and ensure images contain readable text."
-                    print(f"⚠️ {error_msg}")
-                    # Raise exception instead of returning None to provide better error message
-                    raise Exception(error_msg)
-        except ImportError as import_err:
-            error_msg = f"pdf2image not available: {import_err}"
-            print(f"⚠️ {error_msg}")
-            print("⚠️ Install with: pip install pdf2image")
-            print("⚠️ Also install poppler: On Windows: choco install poppler, On Linux: sudo apt-get install poppler-utils")
-            # Re-raise with more context for better error handling
-            raise Exception(f"OCR dependencies missing: {error_msg}. Please install pdf2image and poppler utilities.")
-        except Exception as ocr_error:
-            error_msg = f"PDF OCR error: {ocr_error}"
-            print(f"⚠️ {error_msg}")
-            # Check if it's a poppler error
-            if "poppler" in str(ocr_error).lower() or "pdftoppm" in str(ocr_error).lower():
-                raise Exception(f"Poppler utilities not found. Please install poppler: On Windows: choco install poppler, On Linux: sudo apt-get install poppler-utils. Original error: {ocr_error}")
-            raise Exception(f"OCR processing failed: {ocr_error}")
+                raise Exception(f"Tesseract check failed: {tesseract_check_error}")
         
-        # If OCR fails, try Mathpix as fallback (if available)
-        if (not combined or len(combined.strip()) < 100) and _mathpix_available():
-            print("🔄 Trying Mathpix PDF OCR as fallback...")
-            pdf_text = _mathpix_ocr_pdf(pdf_data)
-            if pdf_text:
-                print(f"✅ Mathpix OCR successful: {len(pdf_text.strip())} characters")
-                return pdf_text.strip()
+        # Adaptive OCR: fast low-DPI pass, escalate only low-confidence pages
+        page_texts, failed_pages = _ocr_pdf_pages(pdf_data, first_page=first_page, last_page=last_page)
         
-        # Return whatever text we got (even if minimal)
-        return combined.strip() if combined else None
+        # Mathpix fallback for the pages Tesseract could not read (only those pages are uploaded)
+        if failed_pages and mathpix_available():
+            failed_pages = _mathpix_fill_pages(pdf_data, page_texts, failed_pages, first_page)
+        ocr_text_parts = [page_text for page_text in page_texts if page_text]
         
-    except Exception as e:
-        print(f"PDF extraction error: {e}")
-        return None
+        if ocr_text_parts:
+            ocr_combined = "\n\n".join(ocr_text_parts)
+            print(f"✅ OCR extraction successful: {len(ocr_combined)} total characters from {len(ocr_text_parts)} pages")
+            if failed_pages:
+                print(f"⚠️ Note: {len(failed_pages)} page(s) failed OCR: {failed_pages}")
+            return page_texts, failed_pages
+        else:
+            failed_info = f" Failed pages: {failed_pages}" if failed_pages else ""
+            error_msg = f"OCR failed to extract text from any of the {len(page_texts)} page(s).{failed_info} This could indicate: 1) Very low-quality or corrupted images, 2) Images with no readable text, 3) OCR processing errors. Please check the PDF quality and ensure images contain readable text."
+            print(f"⚠️ {error_msg}")
+            # Raise exception instead of returning None to provide better error message
+            raise Exception(error_msg)
+    except ImportError as import_err:
+        error_msg = f"pdf2image not available: {import_err}"
+        print(f"⚠️ {error_msg}")
+        print("⚠️ Install with: pip install pdf2image")
+        print("⚠️ Also install poppler: On Windows: choco install poppler, On Linux: sudo apt-get install poppler-utils")
+        # Re-raise with more context for better error handling
+        raise Exception(f"OCR dependencies missing: {error_msg}. Please install pdf2image and poppler utilities.")
+    except Exception as ocr_error:
+        error_msg = f"PDF OCR error: {ocr_error}"
+        print(f"⚠️ {error_msg}")
+        # Check if it's a poppler error
+        if "poppler" in str(ocr_error).lower() or "pdftoppm" in str(ocr_error).lower():
+            raise Exception(f"Poppler utilities not found. Please install poppler: On Windows: choco install poppler, On Linux: sudo apt-get install poppler-utils. Original error: {ocr_error}")
+        raise Exception(f"OCR processing failed: {ocr_error}")
 
 # ----------------------------
-# Mathpix helpers (optional)
+# Adaptive OCR helpers
 # ----------------------------
 
-def _mathpix_available() -> bool:
-    return bool(os.getenv("MATHPIX_APP_ID") and os.getenv("MATHPIX_APP_KEY"))
+TESSERACT_NOT_FOUND_MESSAGE = "Tesseract OCR is not installed or not in PATH. Please install tesseract: On Ubuntu/Debian: sudo apt-get install tesseract-ocr, On CentOS/RHEL: sudo yum install tesseract, On Windows: Download from https://github.com/UB-Mannheim/tesseract/wiki."
 
 
-def _mathpix_headers():
-    return {
-        "app_id": os.getenv("MATHPIX_APP_ID", ""),
-        "app_key": os.getenv("MATHPIX_APP_KEY", ""),
-        "Content-type": "application/json"
-    }
+def _rasterize_pdf(pdf_data: bytes, dpi: int, first_page: Optional[int] = None, last_page: Optional[int] = None) -> List[Image.Image]:
+    """
+    Convert PDF pages (1-indexed, inclusive range) to PIL images with pdf2image/poppler
+    """
+    from pdf2image import convert_from_bytes
+    try:
+        return convert_from_bytes(pdf_data, dpi=dpi, first_page=first_page, last_page=last_page)
+    except Exception as convert_error:
+        # Check if it's a poppler error
+        error_str = str(convert_error).lower()
+        if "poppler" in error_str or "pdftoppm" in error_str or "cannot find" in error_str:
+            raise Exception(f"Poppler utilities not found or not in PATH. Please install poppler: On Windows: choco install poppler (or download from poppler website), On Linux: sudo apt-get install poppler-utils, On macOS: brew install poppler. Original error: {convert_error}")
+        raise Exception(f"Failed to convert PDF to images: {convert_error}")
 
 
-def _mathpix_ocr_image(pil_image: Image.Image) -> Optional[str]:
-    try:
-        buffered = io.BytesIO()
-        pil_image.save(buffered, format="PNG")
-        img_str = base64.b64encode(buffered.getvalue()).decode()
-        payload = {
-            "src": f"data:image/png;base64,{img_str}",
-            "formats": ["text"],
-            "data_options": {
-                "include_asciimath": True,
-                "include_latex": True,
-                "include_mathml": True
-            }
-        }
-        r = requests.post("https://api.mathpix.com/v3/text", json=payload, headers=_mathpix_headers(), timeout=30)
-        if r.status_code == 200:
-            data = r.json()
-            # Prefer LaTeX if available, else text
-            latex = data.get("latex_styled") or data.get("latex") or ""
-            plain = data.get("text") or ""
-            return latex or plain
-        else:
-            print(f"Mathpix image OCR failed: {r.status_code} {r.text}")
-    except Exception as e:
-        print(f"Mathpix image OCR error: {e}")
-    return None
+def _preprocess_page(image: Image.Image, force_threshold: bool = False) -> Tuple[Image.Image, bool]:
+    """
+    Grayscale a page and Otsu-threshold it only when that is likely to help.
+    Returns: (processed_image, is_blank)
+    
+    Clean digital scans are already almost two-tone (nearly all pixels close to
+    black or white), so binarizing them costs time without improving Tesseract's
+    output. Noisy, shaded or low-contrast scans keep the thresholding step.
+    """
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    gray = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2GRAY)
+    
+    # Near-uniform page (blank or separator page): nothing to OCR
+    if float(gray.std()) < 2.0:
+        return Image.fromarray(gray), True
+    
+    if not force_threshold:
+        hist = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel()
+        two_tone_ratio = (hist[:64].sum() + hist[192:].sum()) / max(1.0, hist.sum())
+        if two_tone_ratio >= settings.OCR_CLEAN_PAGE_RATIO:
+            return Image.fromarray(gray), False
+    
+    _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return Image.fromarray(thresh), False
 
 
-def _mathpix_ocr_pdf(pdf_bytes: bytes) -> Optional[str]:
+def _ocr_images_safe(images: List[Image.Image], page_numbers: List[int], engine: Optional[OcrEngine] = None) -> List[Optional[Tuple[str, float, int]]]:
     """
-    Use Mathpix PDF OCR (asynchronous) to extract math-aware text.
-    This is optional and only used when baseline PDF text is weak.
+    OCR a batch of page images with the configured engine. Tesseract-missing errors are
+    fatal and re-raised with install instructions; other errors fail only the affected
+    pages (None entries).
     """
+    engine = engine or get_ocr_engine()
     try:
-        # Submit PDF
-        submit_resp = requests.post(
-            "https://api.mathpix.com/v3/pdf",
-            files={"file": ("document.pdf", pdf_bytes, "application/pdf")},
-            data={"options_json": '{"math_inline_delimiters":["$", "$"],"rm_spaces":true}'},
-            headers=_mathpix_headers(),
-            timeout=60
-        )
-        if submit_resp.status_code not in (200, 202):
-            print(f"Mathpix PDF submit failed: {submit_resp.status_code} {submit_resp.text}")
-            return None
-        submit_data = submit_resp.json()
-        request_id = submit_data.get("pdf_id") or submit_data.get("request_id")
-        if not request_id:
-            print("Mathpix PDF submit failed: no request_id")
-            return None
+        return engine.ocr_pages(images)
+    except pytesseract.TesseractNotFoundError as tesseract_error:
+        error_msg = f"{TESSERACT_NOT_FOUND_MESSAGE} Original error: {tesseract_error}"
+        print(f"❌ {error_msg}")
+        raise Exception(error_msg)
+    except Exception as ocr_error:
+        error_str = str(ocr_error).lower()
+        if "tesseract" in error_str and ("not found" in error_str or "not installed" in error_str):
+            error_msg = f"{TESSERACT_NOT_FOUND_MESSAGE} Original error: {ocr_error}"
+            print(f"❌ {error_msg}")
+            raise Exception(error_msg)
+        print(f"⚠️ OCR error on page(s) {page_numbers}: {ocr_error}")
+        return [None] * len(images)
+
+
+def _ocr_pdf_pages(pdf_data: bytes, adaptive: Optional[bool] = None, engine: Optional[OcrEngine] = None,
+                   first_page: Optional[int] = None, last_page: Optional[int] = None) -> Tuple[List[str], List[int]]:
+    """
+    OCR every page of an image-based PDF (or the 1-indexed first_page..last_page range).
+    Returns: (page_texts, failed_pages) - page_texts has one entry per page ("" when OCR
+    failed), failed_pages holds 1-indexed page numbers of the document.
+    
+    Adaptive mode rasterizes the whole document at OCR_FAST_DPI first and only
+    re-rasterizes pages whose mean word confidence (or word count) is too low at
+    OCR_FULL_DPI with forced thresholding. Non-adaptive mode reproduces the original
+    fixed OCR_FULL_DPI + Otsu behaviour (used by benchmark_ocr.py for comparison).
+    Pages are OCRed in batches through the OCR engine (see app/ocr_engine.py).
+    """
+    if adaptive is None:
+        adaptive = settings.OCR_ADAPTIVE
+    engine = engine or get_ocr_engine()
+    
+    first_pass_dpi = settings.OCR_FAST_DPI if adaptive else settings.OCR_FULL_DPI
+    images = _rasterize_pdf(pdf_data, dpi=first_pass_dpi, first_page=first_page, last_page=last_page)
+    page_base = first_page or 1  # Document page number of images[0]
+    print(f"📄 Converted {len(images)} PDF pages to images for OCR ({first_pass_dpi} DPI)")
+    
+    page_texts = [""] * len(images)
+    failed_pages = []
+    escalate = []
+    
+    # Preprocess and drop blank pages before handing the batch to Tesseract
+    ocr_indexes = []
+    ocr_images = []
+    for i, image in enumerate(images):
+        processed_image, is_blank = _preprocess_page(image, force_threshold=not adaptive)
+        if is_blank:
+            print(f"⚠️ Page {page_base+i} is blank, skipping OCR")
+            failed_pages.append(page_base+i)
+            continue
+        ocr_indexes.append(i)
+        ocr_images.append(processed_image)
+    
+    # Free raw bitmaps; only the preprocessed pages are needed from here on
+    del images
+    
+    print(f"📄 Running OCR on {len(ocr_images)} page(s) with the {engine.name} engine...")
+    results = _ocr_images_safe(ocr_images, [page_base+i for i in ocr_indexes], engine)
+    del ocr_images
+    
+    for i, result in zip(ocr_indexes, results):
+        if result is None:
+            if adaptive:
+                escalate.append(i)
+            else:
+                failed_pages.append(page_base+i)
+            continue
         
-        # Poll for completion
-        for _ in range(20):  # up to ~20 * 3s = 60s
-            time.sleep(3)
-            status_resp = requests.get(
-                f"https://api.mathpix.com/v3/pdf/{request_id}",
-                headers=_mathpix_headers(),
-                timeout=30
-            )
-            if status_resp.status_code != 200:
+        text, confidence, word_count = result
+        page_texts[i] = text
+        if not adaptive:
+            if text:
+                print(f"✅ OCR extracted {len(text)} characters from page {page_base+i}")
+            else:
+                print(f"⚠️ OCR returned empty text for page {page_base+i} (image may be blank or unreadable)")
+                failed_pages.append(page_base+i)
+            continue
+        
+        if confidence < settings.OCR_MIN_CONFIDENCE or word_count < settings.OCR_MIN_WORDS:
+            print(f"🔎 Page {page_base+i}: confidence {confidence:.0f}, {word_count} words - escalating to {settings.OCR_FULL_DPI} DPI")
+            escalate.append(i)
+        else:
+            print(f"✅ OCR extracted {len(text)} characters from page {page_base+i} (confidence {confidence:.0f})")
+    
+    # Re-rasterize hard pages at full resolution, a batch at a time to bound memory
+    batch_size = max(1, settings.OCR_BATCH_SIZE)
+    for batch_start in range(0, len(escalate), batch_size):
+        batch_indexes = []
+        batch_images = []
+        for i in escalate[batch_start:batch_start + batch_size]:
+            try:
+                hi_res = _rasterize_pdf(pdf_data, dpi=settings.OCR_FULL_DPI, first_page=page_base+i, last_page=page_base+i)
+            except Exception as convert_error:
+                print(f"⚠️ Could not re-rasterize page {page_base+i}: {convert_error}")
                 continue
-            status_data = status_resp.json()
-            status = status_data.get("status")
-            if status == "completed":
-                # Get text output
-                text_url = status_data.get("text") or status_data.get("text_url")
-                if text_url:
-                    text_resp = requests.get(text_url, timeout=30)
-                    if text_resp.status_code == 200:
-                        return text_resp.text
-                # If inline text present
-                pages = status_data.get("pages")
-                if pages and isinstance(pages, list):
-                    return "\n\n".join(p.get("text", "") for p in pages if p.get("text"))
-                return None
-            if status in ("error", "failed"):
-                print(f"Mathpix PDF OCR error status: {status}")
-                return None
-        print("Mathpix PDF OCR timed out")
-        return None
-    except Exception as e:
-        print(f"Mathpix PDF OCR exception: {e}")
-        return None
+            if hi_res:
+                processed_image, _ = _preprocess_page(hi_res[0], force_threshold=True)
+                batch_indexes.append(i)
+                batch_images.append(processed_image)
+        
+        hi_res_results = _ocr_images_safe(batch_images, [page_base+i for i in batch_indexes], engine) if batch_images else []
+        for i, result in zip(batch_indexes, hi_res_results):
+            if result is not None and len(result[0]) >= len(page_texts[i]):
+                page_texts[i] = result[0]
+                print(f"✅ OCR extracted {len(result[0])} characters from page {page_base+i} at {settings.OCR_FULL_DPI} DPI (confidence {result[1]:.0f})")
+    
+    for i in escalate:
+        if not page_texts[i]:
+            print(f"⚠️ OCR returned empty text for page {page_base+i} (image may be blank or unreadable)")
+            failed_pages.append(page_base+i)
+    
+    if adaptive:
+        print(f"📊 Adaptive OCR: {len(page_texts) - len(escalate)} page(s) at {settings.OCR_FAST_DPI} DPI, {len(escalate)} escalated to {settings.OCR_FULL_DPI} DPI")
+    
+    return page_texts, sorted(failed_pages)
+
+# ----------------------------
+# Mathpix helpers (optional)
+# ----------------------------
+
+def _run_coroutine_blocking(coro):
+    """
+    Run a coroutine to completion from synchronous code. Extraction runs on worker
+    threads (no event loop), where this is a plain asyncio.run; if called from a
+    thread that already runs a loop, a helper thread is used instead.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(asyncio.run, coro).result()
 
+
+def _mathpix_fill_pages(pdf_data: bytes, page_texts: List[str], failed_pages: List[int], first_page: int = 1) -> List[int]:
+    """
+    Send only the pages Tesseract failed on to Mathpix and merge the results into
+    page_texts (indexed from first_page). Returns the pages that are still unreadable.
+    """
+    try:
+        recovered = _run_coroutine_blocking(mathpix_ocr_pages(pdf_data, failed_pages))
+    except Exception as mathpix_error:
+        print(f"⚠️ Mathpix fallback failed: {mathpix_error}")
+        return failed_pages
+    for page, text in recovered.items():
+        page_texts[page - first_page] = text.strip()
+    if recovered:
+        print(f"✅ Mathpix recovered {len(recovered)} page(s): {sorted(recovered)}")
+    return [page for page in failed_pages if page not in recovered]
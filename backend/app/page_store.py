@@ -0,0 +1,178 @@
+"""
+Page Text Store
+Extracted text is kept per page (PageText rows) so a generate request can name any
+page range of a book and build its context straight from the database, and so
+generated questions can be attributed to the pages they came from.
+
+Split parts store their pages against the parent upload using book page numbers,
+which lets a page range span several parts.
+
+Rows are upserted on (upload_id, page_number): overlapping extractions of the same
+upload (two generate requests for overlapping ranges, a part and a range) may store
+the same pages at once, and the last one wins instead of failing on the unique constraint.
+"""
+import re
+from typing import Dict, List, Optional
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.models import PageText
+
+PAGE_SEPARATOR = "\n\n"
+_WORD_RE = re.compile(r"[^\W\d_]{4,}", re.UNICODE)  # Words of 4+ letters (any script)
+
+
+def _upsert_pages(db: Session, rows: List[dict]) -> None:
+    """Insert PageText rows, replacing the stored text of pages that already exist"""
+    if not rows:
+        return
+    statement = insert(PageText).values(rows)
+    db.execute(statement.on_conflict_do_update(
+        constraint="uq_page_text_upload_page",
+        set_={
+            "text": statement.excluded.text,
+            "part_id": statement.excluded.part_id,
+            "char_start": statement.excluded.char_start,
+            "char_end": statement.excluded.char_end
+        }
+    ))
+
+
+def save_pages(db: Session, upload_id: int, page_texts: List[str], first_page: int = 1, part_id: Optional[int] = None) -> str:
+    """
+    Store one PageText row per page (replacing any rows for the same pages).
+    page_texts[0] is book page first_page. Returns the joined text of the non-empty pages;
+    each row's char_start/char_end point into that text.
+    Does not commit.
+    """
+    rows = []
+    joined = []
+    offset = 0
+    for i, page_text in enumerate(page_texts):
+        page_text = (page_text or "").strip()
+        if page_text and joined:
+            offset += len(PAGE_SEPARATOR)
+        char_start = offset
+        if page_text:
+            joined.append(page_text)
+            offset += len(page_text)
+        rows.append({
+            "upload_id": upload_id,
+            "page_number": first_page + i,
+            "text": page_text,
+            "part_id": part_id,
+            "char_start": char_start,
+            "char_end": offset
+        })
+    _upsert_pages(db, rows)
+    return PAGE_SEPARATOR.join(joined)
+
+
+def copy_page_texts(
+    db: Session,
+    source_upload_id: int,
+    target_upload_id: int,
+    source_start: int = 1,
+    source_end: Optional[int] = None,
+    page_offset: int = 0,
+    part_id_map: Optional[Dict[int, int]] = None
+) -> int:
+    """
+    Copy stored pages source_start..source_end of one upload to another (same content,
+    e.g. a duplicate upload). Pages are shifted by page_offset and part ids remapped
+    through part_id_map (unmapped parts become None). Returns the number of pages copied.
+    Does not commit.
+    """
+    query = db.query(PageText).filter(
+        PageText.upload_id == source_upload_id,
+        PageText.page_number >= source_start
+    )
+    if source_end is not None:
+        query = query.filter(PageText.page_number <= source_end)
+    rows = query.all()
+    if not rows:
+        return 0
+
+    _upsert_pages(db, [
+        {
+            "upload_id": target_upload_id,
+            "page_number": row.page_number + page_offset,
+            "text": row.text,
+            "part_id": (part_id_map or {}).get(row.part_id),
+            "char_start": row.char_start,
+            "char_end": row.char_end
+        }
+        for row in rows
+    ])
+    return len(rows)
+
+
+def get_page_texts(db: Session, upload_id: int, start_page: int, end_page: int) -> Dict[int, str]:
+    """Stored text by page number for start_page..end_page (pages not stored yet are absent)"""
+    rows = db.query(PageText.page_number, PageText.text).filter(
+        PageText.upload_id == upload_id,
+        PageText.page_number >= start_page,
+        PageText.page_number <= end_page
+    ).all()
+    return {page_number: text or "" for page_number, text in rows}
+
+
+def missing_pages(page_texts: Dict[int, str], start_page: int, end_page: int) -> List[int]:
+    return [page for page in range(start_page, end_page + 1) if page not in page_texts]
+
+
+def build_page_context(page_texts: Dict[int, str]) -> str:
+    """Join pages in order with page markers (empty pages are skipped)"""
+    sections = []
+    for page_number in sorted(page_texts):
+        text = page_texts[page_number].strip()
+        if text:
+            sections.append(f"--- Page {page_number} ---\n\n{text}")
+    return PAGE_SEPARATOR.join(sections)
+
+
+def _words(text: str) -> set:
+    return set(word.lower() for word in _WORD_RE.findall(text or ""))
+
+
+def attribute_question_pages(questions: List[Dict], page_texts: Dict[int, str], min_overlap: int = 2) -> List[Optional[int]]:
+    """
+    Best-matching source page for each question by word overlap between the question
+    (plus its answer and options) and each page. Words that appear on most pages carry
+    little signal, so each shared word is weighted by how rare it is across the pages.
+    Returns one page number per question, or None when no page overlaps enough.
+    """
+    page_words = {page: _words(text) for page, text in page_texts.items() if text}
+    if not page_words:
+        return [None] * len(questions)
+
+    document_frequency: Dict[str, int] = {}
+    for words in page_words.values():
+        for word in words:
+            document_frequency[word] = document_frequency.get(word, 0) + 1
+    page_count = len(page_words)
+
+    attributed: List[Optional[int]] = []
+    for question in questions:
+        options = question.get("options") or []
+        question_text = " ".join([
+            str(question.get("question", "")),
+            str(question.get("correct_answer", "") or question.get("answer", "")),
+            " ".join(str(option) for option in options) if isinstance(options, list) else str(options)
+        ])
+        question_words = _words(question_text)
+
+        best_page, best_score, best_overlap = None, 0.0, 0
+        for page, words in page_words.items():
+            shared = question_words & words
+            if not shared:
+                continue
+            score = sum(1.0 / document_frequency[word] for word in shared)
+            if score > best_score:
+                best_page, best_score, best_overlap = page, score, len(shared)
+        # Ignore matches made only of words common to every page
+        if best_overlap < min_overlap or (page_count > 1 and best_score <= best_overlap / page_count):
+            best_page = None
+        attributed.append(best_page)
+    return attributed
@@ -1,141 +1,353 @@
 """
 PDF Book Splitter Service
-Splits large PDF files into smaller parts (~6MB each) for better processing
+Splits large PDF files into chapter-aligned parts for better processing.
+
+Part boundaries come from, in order of preference:
+1. the PDF outline (bookmarks) - top-level entries, or the first level with several entries
+2. chapter headings ("Chapter 3", "Unit IV", "பாடம் 2", ...) at the top of pages of the text layer
+3. fixed chunks of PAGES_PER_PART pages (scanned books without bookmarks)
+Chapters shorter than SPLIT_MIN_PART_PAGES are merged with a neighbour and chapters
+longer than SPLIT_MAX_PART_PAGES are cut into even pieces.
+
+Parts are virtual: a page range of the original upload's file. Splitting only
+records the ranges; text extraction and previews read the pages straight from the
+book, and a part's own PDF is built (and stored as a blob) only when it is downloaded.
 """
 import io
+import math
+import re
 from pathlib import Path
-from typing import List, Dict, Any, Tuple
+from typing import Callable, List, Dict, Any, Tuple, Optional
 from PyPDF2 import PdfReader, PdfWriter
-from app.storage_service import save_file, read_file, ensure_storage_path
+from app.storage_service import open_file, read_file, write_stream, stored_file_exists
+from app.blob_store import write_blob, blob_path, derived_path
+from app.text_layer_engine import get_text_layer_engine
 from app.config import settings
 
+PAGES_PER_PART = 40  # Fallback when the book has no detectable chapters
+HEADING_SCAN_LINES = 4  # Non-empty lines at the top of a page checked for a chapter heading
+MAX_TITLE_LENGTH = 200  # Same limit as renaming a part
+
+HEADING_PATTERN = re.compile(
+    r"^(chapter|unit|lesson|module|part|அலகு|இயல்|பாடம்)\s*[-:.]?\s*(\d{1,3}|(?=[ivx])x{0,3}(?:ix|iv|v?i{0,3}))(?![a-z0-9])\s*[-:.)]?\s*(.*)$",
+    re.IGNORECASE
+)
+ROMAN_VALUES = {"i": 1, "v": 5, "x": 10}
+
 
 def split_pdf_into_parts(
     pdf_file_path: str,
-    user_id: int,
     original_filename: str,
-    target_size_mb: float = 6.0
+    total_pages: Optional[int] = None,
+    file_size: Optional[int] = None,
+    page_texts: Optional[Dict[int, str]] = None
 ) -> List[Dict[str, Any]]:
     """
-    Split a large PDF into smaller parts of approximately target_size_mb each.
-    
+    Plan the virtual parts of a large PDF (no part files are written).
+
     Args:
-        pdf_file_path: Path to the original PDF file
-        user_id: User ID for storage path
+        pdf_file_path: Path to the original PDF file (every part points at it)
         original_filename: Original filename (for naming parts)
-        target_size_mb: Target size per part in MB (default: 6MB)
-    
+        total_pages: Page count of the book if known (otherwise read from the file)
+        file_size: Size of the book in bytes, used to estimate part sizes
+        page_texts: Already extracted text by page number, for heading detection
+                    (otherwise the text layer is read when the book has no outline)
+
     Returns:
         List of dictionaries containing part information:
         [
             {
                 "part_number": 1,
                 "file_name": "book_part_1.pdf",
-                "file_path": "/path/to/part1.pdf",
+                "title": "Chapter 1: Real Numbers",
+                "file_path": "/path/to/blobs/ab/cd/abcd...",
                 "file_size": 6291456,
                 "start_page": 1,
-                "end_page": 20,
-                "total_pages": 20
+                "end_page": 24,
+                "total_pages": 24,
+                "is_virtual": True
             },
             ...
         ]
     """
-    target_size_bytes = int(target_size_mb * 1024 * 1024)
-    
-    # Read the PDF file
-    pdf_content = read_file(pdf_file_path)
-    pdf_reader = PdfReader(io.BytesIO(pdf_content))
-    total_pages = len(pdf_reader.pages)
-    
+    with open_file(pdf_file_path) as pdf_stream:
+        pdf_reader = PdfReader(pdf_stream)
+        if total_pages is None:
+            total_pages = len(pdf_reader.pages)
+        chapter_starts = _outline_starts(pdf_reader, total_pages)
+    method = "outline"
+
+    if len(chapter_starts) < 2:
+        if page_texts is None:
+            page_texts = _read_text_layer(pdf_file_path, total_pages)
+        chapter_starts = _heading_starts(page_texts, total_pages)
+        method = "headings"
+
     print(f"📚 Splitting PDF: {original_filename}")
     print(f"   Total pages: {total_pages}")
-    print(f"   Target size per part: {target_size_mb}MB ({target_size_bytes} bytes)")
-    
-    parts = []
-    current_part = 1
-    current_start_page = 0  # 0-indexed
-    
+    if len(chapter_starts) >= 2:
+        ranges = _fit_ranges(
+            _chapter_ranges(chapter_starts, total_pages),
+            settings.SPLIT_MIN_PART_PAGES,
+            settings.SPLIT_MAX_PART_PAGES
+        )
+        print(f"   Found {len(chapter_starts)} chapters ({method}), "
+              f"{settings.SPLIT_MIN_PART_PAGES}-{settings.SPLIT_MAX_PART_PAGES} pages per part")
+    else:
+        ranges = [
+            (start, min(total_pages, start + PAGES_PER_PART - 1), None)
+            for start in range(1, total_pages + 1, PAGES_PER_PART)
+        ]
+        print(f"   No chapters found, using fixed page chunk: {PAGES_PER_PART} pages per part")
+
     # Get base filename without extension
     base_name = Path(original_filename).stem
-    
-    # Calculate average page size to better estimate
-    sample_pages = min(10, total_pages)
-    total_sample_size = 0
-    for i in range(sample_pages):
-        temp_writer = PdfWriter()
-        temp_writer.add_page(pdf_reader.pages[i])
-        temp_buffer = io.BytesIO()
-        temp_writer.write(temp_buffer)
-        total_sample_size += len(temp_buffer.getvalue())
-    avg_page_size = total_sample_size / sample_pages if sample_pages > 0 else target_size_bytes / 50
-    
-    # Override strategy: split by page count (~40 pages per part) to reduce part count
-    pages_per_part = 40
-    print(f"   Average page size: {avg_page_size / 1024:.2f} KB")
-    print(f"   Using fixed page chunk: {pages_per_part} pages per part (page-based splitting)")
-    
-    while current_start_page < total_pages:
-        writer = PdfWriter()
-        start = current_start_page
-        end = min(total_pages, start + pages_per_part)
-        
-        # Add pages for this chunk (page-based)
-        for idx in range(start, end):
-            writer.add_page(pdf_reader.pages[idx])
-        
-        # Write part to bytes
-        part_buffer = io.BytesIO()
-        writer.write(part_buffer)
-        part_content = part_buffer.getvalue()
-        actual_size = len(part_content)
-        pages_in_part = end - start
-        
-        part_filename = f"{base_name}_part_{current_part}.pdf"
-        part_file_path = save_file(part_content, user_id, "pdf", part_filename)
-        
-        part_info = {
-            "part_number": current_part,
-            "file_name": part_filename,
-            "file_path": part_file_path,
-            "file_size": actual_size,
-            "start_page": start + 1,  # 1-indexed
-            "end_page": end,          # 1-indexed
-            "total_pages": pages_in_part
-        }
-        
-        parts.append(part_info)
-        
-        print(f"   ✅ Part {current_part}: Pages {part_info['start_page']}-{part_info['end_page']} "
-              f"({pages_in_part} pages, {actual_size / 1024 / 1024:.2f}MB)")
-        
-        current_part += 1
-        current_start_page = end
-    
+
+    parts = []
+    for part_number, (start_page, end_page, title) in enumerate(ranges, start=1):
+        pages_in_part = end_page - start_page + 1
+        parts.append({
+            "part_number": part_number,
+            "file_name": f"{base_name}_part_{part_number}.pdf",
+            "title": title,
+            "file_path": pdf_file_path,
+            # Share of the book by pages; replaced with the real size when the part is built
+            "file_size": (file_size or 0) * pages_in_part // max(1, total_pages),
+            "start_page": start_page,  # 1-indexed
+            "end_page": end_page,      # 1-indexed
+            "total_pages": pages_in_part,
+            "is_virtual": True
+        })
+        print(f"   ✅ Part {part_number}: Pages {start_page}-{end_page} ({pages_in_part} pages)"
+              + (f" - {title}" if title else ""))
+
     print(f"📦 PDF split into {len(parts)} parts")
     return parts
 
 
-def get_part_preview(part_file_path: str, max_pages: int = 5) -> bytes:
+def _outline_starts(pdf_reader: PdfReader, total_pages: int) -> List[Tuple[int, str]]:
+    """(first page, title) of each chapter in the outline, from the first level with several entries"""
+    try:
+        level = pdf_reader.outline
+    except Exception as e:
+        print(f"⚠️ Could not read PDF outline: {e}")
+        return []
+
+    # A single top-level entry (e.g. the book title) with the chapters nested under it: go one level down
+    while len([item for item in level if not isinstance(item, list)]) < 2:
+        nested = [item for item in level if isinstance(item, list)]
+        if not nested:
+            break
+        level = nested[0]
+
+    starts = []
+    for item in level:
+        if isinstance(item, list):
+            continue  # Sub-sections of the previous entry
+        try:
+            page = pdf_reader.get_destination_page_number(item) + 1
+        except Exception:
+            continue
+        if 1 <= page <= total_pages:
+            starts.append((page, str(item.title or "").strip()))
+    return starts
+
+
+def _read_text_layer(pdf_file_path: str, total_pages: int) -> Dict[int, str]:
+    """Text layer of every page by page number (empty for scanned books)"""
+    try:
+        texts = get_text_layer_engine().extract_pages(read_file(pdf_file_path), 1, total_pages)
+    except Exception as e:
+        print(f"⚠️ Could not read text layer for heading detection: {e}")
+        return {}
+    return {page: text for page, text in enumerate(texts, start=1)}
+
+
+def _heading_number(value: str) -> int:
+    if value.isdigit():
+        return int(value)
+    # Roman numeral
+    numbers = [ROMAN_VALUES[char] for char in value.lower()]
+    return sum(-n if i + 1 < len(numbers) and n < numbers[i + 1] else n for i, n in enumerate(numbers))
+
+
+def _heading_starts(page_texts: Dict[int, str], total_pages: int) -> List[Tuple[int, str]]:
+    """
+    (first page, title) of each chapter heading found at the top of a page.
+    A heading only counts when its number is higher than the previous one, so running
+    headers repeating "Chapter 3" on every page and cross-references do not split.
+    """
+    starts = []
+    last_number = {}  # Keyword -> number of the last accepted heading
+    for page in range(1, total_pages + 1):
+        lines = [line.strip() for line in (page_texts.get(page) or "").splitlines() if line.strip()]
+        for i, line in enumerate(lines[:HEADING_SCAN_LINES]):
+            match = HEADING_PATTERN.match(line)
+            if not match or len(line) > MAX_TITLE_LENGTH:
+                continue
+            keyword = match.group(1).lower()
+            number = _heading_number(match.group(2))
+            if number <= last_number.get(keyword, 0):
+                continue
+            last_number[keyword] = number
+            # "Chapter 3" alone on its line: the chapter name is usually the next line
+            title = line if match.group(3) or i + 1 >= len(lines) else f"{line}: {lines[i + 1]}"
+            starts.append((page, title[:MAX_TITLE_LENGTH]))
+            break
+    return starts
+
+
+def _chapter_ranges(chapter_starts: List[Tuple[int, str]], total_pages: int) -> List[Tuple[int, int, Optional[str]]]:
+    """Consecutive (start_page, end_page, title) ranges covering the whole book"""
+    starts = {}
+    for page, title in sorted(chapter_starts, key=lambda start: start[0]):
+        starts.setdefault(page, title or None)
+    if 1 not in starts:
+        starts[1] = None  # Front matter before the first chapter
+    pages = sorted(starts)
+    return [
+        (page, (pages[i + 1] - 1) if i + 1 < len(pages) else total_pages, starts[page])
+        for i, page in enumerate(pages)
+    ]
+
+
+def _fit_ranges(
+    ranges: List[Tuple[int, int, Optional[str]]],
+    min_pages: int,
+    max_pages: int
+) -> List[Tuple[int, int, Optional[str]]]:
+    """Merge chapters shorter than min_pages into a neighbour and cut ones longer than max_pages"""
+    merged = []
+    for start, end, title in ranges:
+        if merged:
+            previous_start, previous_end, previous_title = merged[-1]
+            too_short = (previous_end - previous_start + 1) < min_pages or (end - start + 1) < min_pages
+            if too_short and (end - previous_start + 1) <= max_pages:
+                titles = " / ".join(t for t in (previous_title, title) if t) or None
+                merged[-1] = (previous_start, end, titles[:MAX_TITLE_LENGTH] if titles else None)
+                continue
+        merged.append((start, end, title))
+
+    fitted = []
+    for start, end, title in merged:
+        length = end - start + 1
+        pieces = max(1, math.ceil(length / max_pages))
+        piece_length = math.ceil(length / pieces)
+        for piece in range(pieces):
+            piece_start = start + piece * piece_length
+            piece_title = f"{title} ({piece + 1}/{pieces})" if title and pieces > 1 else title
+            fitted.append((piece_start, min(end, piece_start + piece_length - 1), piece_title))
+    return fitted
+
+
+def build_page_range_pdf(pdf_file_path: str, start_page: int, end_page: int) -> bytes:
+    """PDF containing pages start_page..end_page (1-indexed, inclusive) of a stored PDF"""
+    # Decrypting stream: PyPDF2 only reads the objects of the copied pages
+    with open_file(pdf_file_path) as pdf_stream:
+        pdf_reader = PdfReader(pdf_stream)
+        writer = PdfWriter()
+        for idx in range(start_page - 1, min(end_page, len(pdf_reader.pages))):
+            writer.add_page(pdf_reader.pages[idx])
+        buffer = io.BytesIO()
+        writer.write(buffer)
+    return buffer.getvalue()
+
+
+def materialize_part(pdf_file_path: str, start_page: int, end_page: int) -> Tuple[str, str, int]:
+    """
+    Build the PDF of a virtual part and store it as a blob.
+    Returns (blob_sha256, file_path, file_size); identical parts share one blob.
+    """
+    part_content = build_page_range_pdf(pdf_file_path, start_page, end_page)
+    part_sha256, part_file_path, already_stored = write_blob(part_content)
+    print(f"📄 Built part PDF for pages {start_page}-{end_page} ({len(part_content) / 1024 / 1024:.2f}MB"
+          f"{', already stored' if already_stored else ''})")
+    return part_sha256, part_file_path, len(part_content)
+
+
+def ensure_part_blob(blob_sha256: str, pdf_file_path: str, start_page: int, end_page: int) -> bool:
+    """
+    Rebuild a part's blob if it is missing (see blob_store.ensure_blob_stream).
+    Returns True if it had to be rebuilt.
+    """
+    if stored_file_exists(blob_path(blob_sha256)):
+        return False
+    materialize_part(pdf_file_path, start_page, end_page)
+    return True
+
+
+def _cached_artifact(blob_sha256: Optional[str], cache_name: str, build: Callable[[], bytes]) -> bytes:
+    """Derived artifact of a blob: read it if stored, otherwise build and store it (uncached without a blob)"""
+    cache_path = derived_path(blob_sha256, cache_name) if blob_sha256 else None
+    if cache_path is not None and stored_file_exists(cache_path):
+        return read_file(cache_path)
+
+    content = build()
+
+    if cache_path is not None:
+        write_stream(io.BytesIO(content), cache_path)
+    return content
+
+
+def get_part_preview(
+    part_file_path: str,
+    max_pages: int = 5,
+    blob_sha256: Optional[str] = None,
+    start_page: int = 1
+) -> bytes:
     """
     Generate a preview PDF containing first few pages of a split part.
-    
+
     Args:
-        part_file_path: Path to the split part PDF
+        part_file_path: Path to the split part PDF (the book's file for virtual parts)
         max_pages: Maximum number of pages to include in preview
-    
+        blob_sha256: Blob hash of part_file_path; when given the preview is cached as a
+                     derived artifact and shared by every part with the same content
+        start_page: First page of the part in part_file_path (virtual parts)
+
     Returns:
         Bytes of preview PDF
     """
-    pdf_content = read_file(part_file_path)
-    pdf_reader = PdfReader(io.BytesIO(pdf_content))
-    
-    writer = PdfWriter()
-    preview_pages = min(max_pages, len(pdf_reader.pages))
-    
-    for i in range(preview_pages):
-        writer.add_page(pdf_reader.pages[i])
-    
-    preview_buffer = io.BytesIO()
-    writer.write(preview_buffer)
-    return preview_buffer.getvalue()
+    cache_name = f"preview_{max_pages}.pdf" if start_page == 1 else f"preview_p{start_page}_{max_pages}.pdf"
+    return _cached_artifact(
+        blob_sha256, cache_name,
+        lambda: build_page_range_pdf(part_file_path, start_page, start_page + max_pages - 1)
+    )
 
+
+def get_part_thumbnail(
+    part_file_path: str,
+    blob_sha256: Optional[str] = None,
+    start_page: int = 1,
+    width: Optional[int] = None
+) -> bytes:
+    """
+    JPEG thumbnail of the first page of a split part, cached like previews.
+    Only that page is copied out of the PDF and rasterized (pdf2image/poppler).
+    """
+    width = width or settings.PART_THUMBNAIL_WIDTH
+    cache_name = f"thumb_{width}.jpg" if start_page == 1 else f"thumb_p{start_page}_{width}.jpg"
+
+    def build() -> bytes:
+        from pdf2image import convert_from_bytes
+        page_pdf = build_page_range_pdf(part_file_path, start_page, start_page)
+        image = convert_from_bytes(page_pdf, size=(width, None), first_page=1, last_page=1)[0]
+        buffer = io.BytesIO()
+        image.convert("RGB").save(buffer, format="JPEG", quality=80, optimize=True)
+        return buffer.getvalue()
+
+    return _cached_artifact(blob_sha256, cache_name, build)
+
+
+def warm_part_artifacts(sources: List[Tuple[str, Optional[str], int, int]]) -> None:
+    """
+    Build and store the preview and thumbnail of each part ahead of the first request.
+    sources: (file_path, blob_sha256, start_page, preview_pages) per part, as served by the preview endpoints.
+    """
+    for part_file_path, blob_sha256, start_page, preview_pages in sources:
+        try:
+            get_part_preview(part_file_path, preview_pages, blob_sha256, start_page)
+            get_part_thumbnail(part_file_path, blob_sha256, start_page)
+        except Exception as e:
+            print(f"⚠️ Could not prepare preview of pages from {start_page}: {e}")
+    print(f"🖼️ Prepared previews and thumbnails for {len(sources)} part(s)")
@@ -0,0 +1,155 @@
+"""
+Per-User Question Counters and Quota Reservation
+Quota checks and usage displays used to load every QnASet of a user and count the
+questions in each qna_json - work that grew with the user's whole history and was
+paid before every generation. The counts are materialized instead:
+
+- qna_sets.question_count: questions in the set, written with the row.
+- users.total_questions_used: questions in sets created since total_questions_reset_at.
+- users.daily_questions_used: questions in sets created on daily_questions_date (UTC)
+  since daily_questions_reset_at. A counter from an earlier day reads as 0.
+
+Counters change in the same transaction as the rows they count: a set's insert and
+its delete (deleting a set gives its questions back, as counting the rows did). An
+admin count reset sets the reset timestamp and zeroes the counter.
+
+Generation reserves the requested number of questions with one conditional UPDATE
+before calling the AI, so concurrent generations cannot together exceed a limit. The
+reservation is settled to the actual number of questions when the set is saved, or
+released if generation fails. Counts a reset has already zeroed are not taken off again.
+"""
+from datetime import date, datetime
+from typing import Any, Optional, Tuple
+
+from sqlalchemy import and_, case, func
+from sqlalchemy.orm import Session
+
+from app.models import QnASet, User
+
+
+def count_questions(qna_json: Any) -> int:
+    if isinstance(qna_json, dict):
+        questions = qna_json.get("questions", [])
+        if isinstance(questions, list):
+            return len(questions)
+    return 0
+
+
+def _today() -> date:
+    return datetime.utcnow().date()
+
+
+def get_question_usage(user: User) -> Tuple[int, int]:
+    """(total, daily) questions used, from the user's counters"""
+    daily = (user.daily_questions_used or 0) if user.daily_questions_date == _today() else 0
+    return user.total_questions_used or 0, daily
+
+
+def _daily_used(today: date):
+    """SQL expression: today's daily count (0 if the counter belongs to an earlier day)"""
+    return case((User.daily_questions_date == today, User.daily_questions_used), else_=0)
+
+
+def _reset_since(reset_column, moment: datetime):
+    return and_(reset_column.isnot(None), reset_column >= moment)
+
+
+class QuestionReservation:
+    """Questions held against a user's limits while a generation runs"""
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.count = 0
+        self.day: Optional[date] = None
+        self.reserved_at: Optional[datetime] = None
+
+    def reserve(self, db: Session, count: int, total_limit: Optional[int], daily_limit: int) -> bool:
+        """
+        Atomically add count to both counters if that stays within the limits
+        (total_limit 0/None = unlimited). Returns False, changing nothing, if it would not.
+        """
+        today = _today()
+        conditions = [User.id == self.user_id, _daily_used(today) + count <= daily_limit]
+        if total_limit:
+            conditions.append(User.total_questions_used + count <= total_limit)
+        reserved_at = datetime.utcnow()
+        updated = db.query(User).filter(*conditions).update({
+            "total_questions_used": User.total_questions_used + count,
+            "daily_questions_used": _daily_used(today) + count,
+            "daily_questions_date": today
+        }, synchronize_session=False)
+        db.commit()
+        if updated:
+            self.count, self.day, self.reserved_at = count, today, reserved_at
+        return bool(updated)
+
+    def _held(self, reset_column):
+        """SQL expression: questions of this reservation still in a counter (0 if reset since)"""
+        return case((_reset_since(reset_column, self.reserved_at), 0), else_=self.count)
+
+    def settle(self, db: Session, question_count: int) -> None:
+        """
+        Replace the reservation by the saved set's actual count and commit - call right
+        after db.add() of the QnASet, so the set and its counts are committed together.
+        """
+        today = _today()
+        held_today = self._held(User.daily_questions_reset_at) if self.day == today else 0
+        try:
+            db.query(User).filter(User.id == self.user_id).update({
+                "total_questions_used": func.greatest(
+                    User.total_questions_used + question_count - self._held(User.total_questions_reset_at), 0
+                ),
+                # The set is created today, so it counts for today even if reserved yesterday
+                "daily_questions_used": case(
+                    (User.daily_questions_date == today,
+                     func.greatest(User.daily_questions_used + question_count - held_today, 0)),
+                    else_=question_count
+                ),
+                "daily_questions_date": today
+            }, synchronize_session=False)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        self.count = 0
+
+    def release(self, db: Session) -> None:
+        """Give back an unsettled reservation (generation failed). Never raises."""
+        if not self.count:
+            return
+        try:
+            db.rollback()
+            db.query(User).filter(User.id == self.user_id).update({
+                "total_questions_used": func.greatest(
+                    User.total_questions_used - self._held(User.total_questions_reset_at), 0
+                ),
+                "daily_questions_used": case(
+                    (User.daily_questions_date == self.day,
+                     func.greatest(User.daily_questions_used - self._held(User.daily_questions_reset_at), 0)),
+                    else_=User.daily_questions_used
+                )
+            }, synchronize_session=False)
+            db.commit()
+            self.count = 0
+        except Exception as e:
+            db.rollback()
+            print(f"⚠️  Failed to release question reservation of user {self.user_id}: {e}")
+
+
+def uncount_deleted_set(db: Session, user: User, qna_set: QnASet) -> None:
+    """Take a set being deleted off its owner's counters (commit together with the delete)"""
+    created_at = qna_set.created_at
+    count = qna_set.question_count or 0
+    if not count or created_at is None:
+        return
+    values = {}
+    if user.total_questions_reset_at is None or created_at >= user.total_questions_reset_at:
+        values["total_questions_used"] = func.greatest(User.total_questions_used - count, 0)
+    today = _today()
+    if created_at.date() == today and (user.daily_questions_reset_at is None or created_at >= user.daily_questions_reset_at):
+        values["daily_questions_used"] = case(
+            (User.daily_questions_date == today, func.greatest(User.daily_questions_used - count, 0)),
+            else_=User.daily_questions_used
+        )
+    if values:
+        db.query(User).filter(User.id == user.id).update(values, synchronize_session=False)
@@ -0,0 +1,132 @@
+"""
+Local Assets for HTML-to-PDF Rendering
+KaTeX is served to Chromium from disk instead of cdn.jsdelivr.net, so a Playwright
+render makes no network requests.
+
+Download HTML references ASSET_ORIGIN, a host that never resolves. The browser pool
+routes every request for it to route_assets(), which answers from KATEX_DIR (files
+are read once and kept in memory). Fetch the pinned KaTeX release once with:
+    python fetch_katex.py
+Until then pages fall back to the CDN.
+
+Completion is signalled explicitly: the last script in <body> renders the math
+synchronously, waits for document.fonts.ready and sets window.__renderComplete,
+which Playwright waits on instead of networkidle and fixed sleeps. Pages without
+math don't load KaTeX at all.
+"""
+import os
+import re
+import threading
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from app.config import settings
+
+KATEX_VERSION = "0.16.9"
+KATEX_CDN = f"https://cdn.jsdelivr.net/npm/katex@{KATEX_VERSION}/dist"
+# Subresource integrity of the CDN files (also verified by fetch_katex.py)
+KATEX_SRI = {
+    "katex.min.css": "sha384-n8MVd4RsNIU0tAv4ct0nTaAbDJwPJzDEaqSD1odI+WdtXRGWt2kTvGFasHpSy3SV",
+    "katex.min.js": "sha384-XjKyOOzG8j7q1aI2+fiEYHrTZ+8uBZ4mX16o8qEDmO1CsQrMdZengsGa4s9Q2x0M",
+    "contrib/auto-render.min.js": "sha384-+VBxd3r6XgURycqtZ117nYw44OOcIax56Z4dCRWbxyPt0Koah1uHoK0o4+/RRE05",
+}
+KATEX_DIR = settings.KATEX_ASSETS_DIR or os.path.join(os.path.dirname(__file__), "static", "katex")
+# Written by fetch_katex.py after every file (fonts included) is in place, holding KATEX_VERSION
+KATEX_MARKER = "VERSION"
+
+ASSET_ORIGIN = "https://render-assets.studyqna.invalid"
+ASSET_URL_PATTERN = f"{ASSET_ORIGIN}/**"
+RENDER_COMPLETE_FLAG = "__renderComplete"
+
+CONTENT_TYPES = {
+    ".css": "text/css",
+    ".js": "application/javascript",
+    ".woff2": "font/woff2",
+    ".woff": "font/woff",
+    ".ttf": "font/ttf",
+}
+
+# \( or \[ opening a KaTeX expression
+MATH_PATTERN = re.compile(r'\\[(\[]')
+
+_assets: Dict[str, Tuple[bytes, str]] = {}
+_assets_lock = threading.Lock()
+
+
+def katex_available() -> bool:
+    """True once fetch_katex.py has completely fetched the pinned release"""
+    try:
+        with open(os.path.join(KATEX_DIR, KATEX_MARKER), encoding="utf-8") as f:
+            return f.read().strip() == KATEX_VERSION
+    except OSError:
+        return False
+
+
+def has_math(text: str) -> bool:
+    return bool(MATH_PATTERN.search(text))
+
+
+def read_asset(path: str) -> Optional[Tuple[bytes, str]]:
+    """(content, content type) of an asset path like "katex/fonts/KaTeX_Main-Regular.woff2", or None"""
+    if not path.startswith("katex/"):
+        return None
+    relative = os.path.normpath(path[len("katex/"):])
+    if relative.startswith("..") or os.path.isabs(relative):
+        return None
+    with _assets_lock:
+        cached = _assets.get(relative)
+    if cached is not None:
+        return cached
+    file_path = os.path.join(KATEX_DIR, relative)
+    if not os.path.isfile(file_path):
+        return None
+    with open(file_path, "rb") as f:
+        asset = (f.read(), CONTENT_TYPES.get(os.path.splitext(relative)[1], "application/octet-stream"))
+    with _assets_lock:
+        _assets[relative] = asset
+    return asset
+
+
+async def route_assets(route) -> None:
+    """Playwright route handler for ASSET_URL_PATTERN"""
+    asset = read_asset(urlparse(route.request.url).path.lstrip("/"))
+    if asset is None:
+        await route.fulfill(status=404, body=b"")
+        return
+    content, content_type = asset
+    await route.fulfill(status=200, body=content, content_type=content_type)
+
+
+def math_head_html(include_math: bool) -> str:
+    """KaTeX stylesheet and scripts for <head> (loaded synchronously), or nothing without math"""
+    if not include_math:
+        return ""
+    if katex_available():
+        base = f"{ASSET_ORIGIN}/katex"
+        return (
+            f'<link rel="stylesheet" href="{base}/katex.min.css">\n'
+            f'<script src="{base}/katex.min.js"></script>\n'
+            f'<script src="{base}/contrib/auto-render.min.js"></script>'
+        )
+    return (
+        f'<link rel="stylesheet" href="{KATEX_CDN}/katex.min.css" integrity="{KATEX_SRI["katex.min.css"]}" crossorigin="anonymous">\n'
+        f'<script src="{KATEX_CDN}/katex.min.js" integrity="{KATEX_SRI["katex.min.js"]}" crossorigin="anonymous"></script>\n'
+        f'<script src="{KATEX_CDN}/contrib/auto-render.min.js" integrity="{KATEX_SRI["contrib/auto-render.min.js"]}" crossorigin="anonymous"></script>'
+    )
+
+
+def render_complete_script(include_math: bool) -> str:
+    """Last element of <body>: render math, then flag completion once fonts are ready"""
+    render_math = r"""
+    if (window.renderMathInElement) {
+        renderMathInElement(document.body, {
+            delimiters: [
+                {left: '\\(', right: '\\)', display: false},
+                {left: '\\[', right: '\\]', display: true}
+            ],
+            throwOnError: false
+        });
+    }""" if include_math else ""
+    return f"""<script>{render_math}
+    document.fonts.ready.then(function () {{ window.{RENDER_COMPLETE_FLAG} = true; }});
+</script>"""
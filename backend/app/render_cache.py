@@ -0,0 +1,237 @@
+"""
+Rendered Download Cache
+Teachers download the same set again and again (preview, print, share), and each
+download used to render the PDF/DOCX/TXT from qna_json again - for PDFs a Chromium
+render. Rendered files are kept on local disk and served from there.
+
+- Key: SHA-256 over RENDER_TEMPLATE_VERSION, set id, a hash of the canonical qna_json,
+  format, output_format and language. Editing a set changes its hash, so stale files
+  are never served; bump RENDER_TEMPLATE_VERSION whenever the generators change output.
+- The key doubles as the ETag, so a client that still has the file gets a 304 without
+  the cache (or the renderer) being touched.
+- Renderings are written to a temp file (temp_path) by the render worker through
+  storage_service.write_stream, so they are encrypted at rest like uploads when
+  ENCRYPT_STORAGE is on, and streamed from there; adopt() renames a cacheable one
+  into the cache. One directory per set lets deleting a set drop its files.
+- Budget: settings.RENDER_CACHE_MAX_MB on disk, shared by all worker processes. A hit
+  touches the file's mtime; when a store pushes the total over budget the directory is
+  scanned and the least recently used files are removed down to 90% of it.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+from app.config import settings
+from app.storage_service import stored_file_size
+
+RENDER_TEMPLATE_VERSION = "1"
+CACHE_DIR = settings.RENDER_CACHE_DIR or os.path.join(settings.STORAGE_PATH, "render_cache")
+TEMP_DIR_NAME = ".tmp"  # Renderings being written or streamed (same filesystem, so adopt() is a rename)
+TEMP_MAX_AGE_SECONDS = 3600  # Older temp renderings were abandoned (client gone before streaming, crash)
+EVICT_TO_FRACTION = 0.9
+
+_lock = threading.Lock()
+_total_bytes: Optional[int] = None  # This process's running estimate, resynced by every scan
+_last_temp_sweep = 0.0
+_counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "errors": 0}
+
+
+def _count(name: str, amount: int = 1) -> None:
+    with _lock:
+        _counters[name] += amount
+
+
+def content_hash(qna_json: Any) -> str:
+    canonical = json.dumps(qna_json, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def render_key(set_id: int, qna_json: Any, format: str, output_format: str, language: Optional[str]) -> str:
+    parts = [RENDER_TEMPLATE_VERSION, str(set_id), content_hash(qna_json), format, output_format, language or ""]
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+def etag_for(key: str) -> str:
+    return f'"{key[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def _set_dir(set_id: int) -> str:
+    return os.path.join(CACHE_DIR, f"set_{set_id}")
+
+
+def _path(set_id: int, key: str) -> str:
+    return os.path.join(_set_dir(set_id), key)
+
+
+def lookup(set_id: int, key: str) -> Optional[Tuple[str, int]]:
+    """(path, plaintext size) of a cached rendering for streaming, or None. Blocking: call from the storage pool."""
+    if not settings.RENDER_CACHE_ENABLED:
+        return None
+    path = _path(set_id, key)
+    try:
+        size = stored_file_size(path)
+        os.utime(path)  # Recently used: evicted last
+    except FileNotFoundError:
+        _count("misses")
+        return None
+    except Exception as e:
+        _count("errors")
+        print(f"⚠️ Render cache read failed: {e}")
+        return None
+    _count("hits")
+    return path, size
+
+
+def temp_path() -> str:
+    """Unique path to render a document to (written by the caller, removed with discard())"""
+    return os.path.join(CACHE_DIR, TEMP_DIR_NAME, uuid.uuid4().hex)
+
+
+def discard(path: str) -> None:
+    """Remove a temp rendering once it has been streamed. Never raises. Blocking: call from the storage pool."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+    _sweep_temp_files()
+
+
+def _sweep_temp_files() -> None:
+    """Remove abandoned temp renderings (at most every few minutes)"""
+    global _last_temp_sweep
+    now = time.time()
+    with _lock:
+        if now - _last_temp_sweep < TEMP_MAX_AGE_SECONDS / 12:
+            return
+        _last_temp_sweep = now
+    temp_dir = os.path.join(CACHE_DIR, TEMP_DIR_NAME)
+    try:
+        names = os.listdir(temp_dir)
+    except OSError:
+        return
+    for name in names:
+        path = os.path.join(temp_dir, name)
+        try:
+            if os.stat(path).st_mtime < now - TEMP_MAX_AGE_SECONDS:
+                os.remove(path)
+        except OSError:
+            continue
+
+
+def adopt(set_id: int, key: str, rendered_path: str) -> Optional[str]:
+    """
+    Move a rendering from temp_path() into the cache, then evict if over budget.
+    Returns its cache path, or None if it stays a temp file (cache disabled or the
+    move failed). Never raises. Blocking: call from the storage pool.
+    """
+    global _total_bytes
+    _sweep_temp_files()
+    if not settings.RENDER_CACHE_ENABLED:
+        return None
+    path = _path(set_id, key)
+    try:
+        os.makedirs(_set_dir(set_id), exist_ok=True)
+        os.replace(rendered_path, path)
+        size = os.path.getsize(path)
+    except Exception as e:
+        _count("errors")
+        print(f"⚠️ Could not cache rendered download: {e}")
+        return None
+    _count("stores")
+    with _lock:
+        if _total_bytes is not None:
+            _total_bytes += size
+        over_budget = _total_bytes is None or _total_bytes > settings.RENDER_CACHE_MAX_MB * 1024 * 1024
+    if over_budget:
+        _enforce_budget()
+    return path
+
+
+def _scan() -> list:
+    """(mtime, size, path) of every cached file (temp renderings excluded)"""
+    entries = []
+    for root, dirs, files in os.walk(CACHE_DIR):
+        if root == CACHE_DIR and TEMP_DIR_NAME in dirs:
+            dirs.remove(TEMP_DIR_NAME)
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue  # Removed by another worker meanwhile
+            entries.append((st.st_mtime, st.st_size, path))
+    return entries
+
+
+def _enforce_budget() -> None:
+    """Remove least recently used files until the cache is under EVICT_TO_FRACTION of its budget"""
+    global _total_bytes
+    budget = settings.RENDER_CACHE_MAX_MB * 1024 * 1024
+    entries = _scan()
+    total = sum(size for _, size, _ in entries)
+    evicted = 0
+    if total > budget:
+        target = budget * EVICT_TO_FRACTION
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+    with _lock:
+        _total_bytes = total
+        _counters["evictions"] += evicted
+    if evicted:
+        print(f"🧹 Render cache: evicted {evicted} file(s), {total / (1024 * 1024):.1f} MB kept")
+
+
+def invalidate_set(set_id: int) -> None:
+    """Drop every cached rendering of a set (e.g. when it is deleted)"""
+    shutil.rmtree(_set_dir(set_id), ignore_errors=True)
+
+
+def clear() -> int:
+    """Drop the whole cache (renderings being streamed are kept). Returns files removed."""
+    global _total_bytes
+    removed = len(_scan())
+    try:
+        names = [name for name in os.listdir(CACHE_DIR) if name != TEMP_DIR_NAME]
+    except OSError:
+        names = []
+    for name in names:
+        shutil.rmtree(os.path.join(CACHE_DIR, name), ignore_errors=True)
+    with _lock:
+        _total_bytes = 0
+    return removed
+
+
+def get_render_cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters of this worker process plus the size of the shared cache directory"""
+    entries = _scan()
+    with _lock:
+        counters = dict(_counters)
+    lookups = counters["hits"] + counters["misses"]
+    return {
+        **counters,
+        "enabled": settings.RENDER_CACHE_ENABLED,
+        "hit_rate": round(counters["hits"] / lookups, 3) if lookups else 0.0,
+        "entries": len(entries),
+        "size_mb": round(sum(size for _, size, _ in entries) / (1024 * 1024), 1),
+        "max_mb": settings.RENDER_CACHE_MAX_MB,
+        "template_version": RENDER_TEMPLATE_VERSION,
+    }
@@ -0,0 +1,257 @@
+"""
+Process Pool for Document Rendering
+generate_pdf (ReportLab platypus), generate_docx and generate_txt are pure-Python CPU
+work that holds the GIL. Run inside an async handler - or in a thread - a large 10-mark
+set stalls every other request for the whole build. They run in a pool of
+settings.RENDER_WORKERS processes instead.
+
+- Warm workers: each process imports app.download_service when it starts, which
+  registers the ReportLab fonts once; start_render_executor (FastAPI lifespan) spawns
+  the processes up front so no download waits for that.
+- Bounded queue: an API process admits at most RENDER_WORKERS + RENDER_QUEUE_SIZE
+  renders; further ones raise RenderQueueFull right away (routes answer 503).
+- Timeout: a render not finished RENDER_TIMEOUT_SECONDS after a worker picked it up
+  raises RenderTimeout (504); time spent queued does not count (the queue is bounded).
+  Workers mark the job they start in a shared array, so run_render knows when the
+  clock starts. A running render cannot be interrupted, so the pool is replaced and
+  its processes terminated; the other renders caught in that (killed, or cancelled
+  while queued) are retried once.
+- Workers are spawned, not forked: forking a process that runs an event loop and
+  thread pools is unsafe.
+- RENDER_WORKERS=0 renders in a thread instead (off the event loop, but GIL-bound).
+- render_to_file writes the document to a stored file from the worker, so the API
+  process streams it from disk instead of receiving and holding the whole file.
+"""
+import asyncio
+import io
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional
+
+from app.config import settings
+from app.storage_service import write_stream
+
+
+class RenderQueueFull(Exception):
+    """Too many renders queued in this process"""
+
+
+class RenderTimeout(Exception):
+    """A render did not finish within RENDER_TIMEOUT_SECONDS"""
+
+
+START_POLL_SECONDS = 0.05  # How often a queued render checks whether a worker picked it up
+
+_pool: Optional[ProcessPoolExecutor] = None
+_lock = threading.Lock()
+_admitted = 0
+_free_slots: Optional[List[int]] = None  # One slot per admitted render, indexing _started_jobs
+_started_jobs = None  # Shared lock-free array: slot -> id of the last job a worker started there
+_job_ids = itertools.count(1)
+_stats = {"renders": 0, "rejected": 0, "timeouts": 0, "failures": 0, "restarts": 0, "render_seconds": 0.0}
+
+
+def _init_worker(started_jobs) -> None:
+    global _started_jobs
+    _started_jobs = started_jobs
+    # Registers the ReportLab fonts (download_service runs initialize_fonts on import)
+    import app.download_service  # noqa: F401
+
+
+def _run_job(slot: int, job_id: int, func: Callable[..., Any], *args) -> Any:
+    """Worker side: mark the job as started (its timeout runs from here), then run it"""
+    # A plain store into shared memory: a worker killed at any point cannot leave a lock held
+    _started_jobs[slot] = job_id
+    return func(*args)
+
+
+def _worker_pid() -> int:
+    return os.getpid()
+
+
+def render_to_file(path: str, func: Callable[..., Any], *args) -> int:
+    """
+    Run a render function and store its output at path through storage_service.write_stream
+    (encrypted like any stored file). Returns the size in bytes. Use as run_render(render_to_file, path, func, ...).
+    """
+    content = func(*args)
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    return write_stream(io.BytesIO(content), path)
+
+
+def _queue_limit() -> int:
+    return max(1, settings.RENDER_WORKERS) + max(0, settings.RENDER_QUEUE_SIZE)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool, _started_jobs
+    with _lock:
+        if _pool is None:
+            context = multiprocessing.get_context("spawn")
+            if _started_jobs is None:
+                _started_jobs = context.RawArray("q", _queue_limit())
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.RENDER_WORKERS,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(_started_jobs,)
+            )
+        return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor, terminate: bool, reason: str) -> None:
+    """Replace a broken or stuck pool; terminate=True also kills its (busy) processes"""
+    global _pool
+    with _lock:
+        if _pool is not pool:
+            return  # Already replaced by another render
+        _pool = None
+        _stats["restarts"] += 1
+    print(f"♻️ Restarting render workers: {reason}")
+    processes = list((getattr(pool, "_processes", None) or {}).values()) if terminate else []
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        try:
+            process.terminate()
+        except Exception:
+            pass
+
+
+def _admit() -> int:
+    """Take a place in the bounded queue; returns the render's slot"""
+    global _admitted, _free_slots
+    with _lock:
+        if _admitted >= _queue_limit():
+            _stats["rejected"] += 1
+            raise RenderQueueFull(f"{_admitted} renders already in progress or queued")
+        if _free_slots is None:
+            _free_slots = list(range(_queue_limit()))
+        _admitted += 1
+        return _free_slots.pop()
+
+
+def _leave(slot: int) -> None:
+    global _admitted
+    with _lock:
+        _admitted -= 1
+        _free_slots.append(slot)
+
+
+async def _run_in_pool(pool: ProcessPoolExecutor, slot: int, func: Callable[..., Any], *args) -> Any:
+    """
+    Run func in the pool; the timeout starts when a worker picks the job up. On timeout
+    the pool is discarded and its processes killed (the job is running by then).
+    """
+    with _lock:
+        job_id = next(_job_ids)
+    job = pool.submit(_run_job, slot, job_id, func, *args)
+    future = asyncio.wrap_future(job)
+    try:
+        # Queued: no deadline (the queue is bounded and every running render has one)
+        while not future.done() and _started_jobs[slot] != job_id:
+            await asyncio.wait({future}, timeout=START_POLL_SECONDS)
+    except asyncio.CancelledError:
+        future.cancel()  # Caller went away: drop the job if it has not started
+        raise
+    try:
+        return await asyncio.wait_for(future, timeout=settings.RENDER_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        with _lock:
+            _stats["timeouts"] += 1
+        _discard_pool(pool, terminate=True, reason=f"render exceeded {settings.RENDER_TIMEOUT_SECONDS:.0f}s")
+        raise RenderTimeout(f"Rendering took longer than {settings.RENDER_TIMEOUT_SECONDS:.0f}s")
+    except asyncio.CancelledError:
+        if job.cancelled() and not asyncio.current_task().cancelling():
+            # Cancelled by _discard_pool while queued, not by our caller: the pool went away
+            raise BrokenProcessPool("render pool was replaced before the job started")
+        raise
+
+
+async def _run_in_thread(func: Callable[..., Any], *args) -> Any:
+    """RENDER_WORKERS=0: run func in a thread (a timed-out render keeps running there)"""
+    try:
+        return await asyncio.wait_for(asyncio.to_thread(func, *args), timeout=settings.RENDER_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        with _lock:
+            _stats["timeouts"] += 1
+        raise RenderTimeout(f"Rendering took longer than {settings.RENDER_TIMEOUT_SECONDS:.0f}s")
+
+
+async def run_render(func: Callable[..., Any], *args) -> Any:
+    """
+    Run a module-level render function (e.g. download_service.generate_pdf) in the
+    render pool and return its result. Raises RenderQueueFull or RenderTimeout.
+    """
+    slot = _admit()
+    start = time.perf_counter()
+    try:
+        for attempt in range(2):
+            pool = _get_pool() if settings.RENDER_WORKERS > 0 else None
+            try:
+                if pool is not None:
+                    result = await _run_in_pool(pool, slot, func, *args)
+                else:
+                    result = await _run_in_thread(func, *args)
+            except RenderTimeout:
+                raise
+            except BrokenProcessPool:
+                # A worker died, or another render's timeout replaced the pool (killed or cancelled this one)
+                _discard_pool(pool, terminate=False, reason="worker process died")
+                if attempt:
+                    with _lock:
+                        _stats["failures"] += 1
+                    raise
+                continue
+            except Exception:
+                with _lock:
+                    _stats["failures"] += 1
+                raise
+            with _lock:
+                _stats["renders"] += 1
+                _stats["render_seconds"] += time.perf_counter() - start
+            return result
+    finally:
+        _leave(slot)
+
+
+async def start_render_executor() -> None:
+    """Spawn the render processes now, fonts registered, instead of on the first download"""
+    if settings.RENDER_WORKERS <= 0:
+        return
+    start = time.perf_counter()
+    pool = _get_pool()
+    loop = asyncio.get_running_loop()
+    # One job per worker makes the pool spawn them all (each registers fonts in _init_worker)
+    await asyncio.gather(*(loop.run_in_executor(pool, _worker_pid) for _ in range(settings.RENDER_WORKERS)))
+    print(f"✅ Render workers ready: {settings.RENDER_WORKERS} process(es) in {time.perf_counter() - start:.2f}s")
+
+
+def shutdown_render_executor() -> None:
+    """Stop accepting renders and drop queued ones (running ones finish in the background)"""
+    global _pool
+    with _lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def get_render_executor_stats() -> Dict[str, Any]:
+    with _lock:
+        stats = dict(_stats)
+        admitted = _admitted
+    render_seconds = stats.pop("render_seconds")
+    return {
+        **stats,
+        "workers": settings.RENDER_WORKERS,
+        "mode": "process" if settings.RENDER_WORKERS > 0 else "thread",
+        "in_progress": admitted,
+        "queue_limit": _queue_limit(),
+        "avg_render_seconds": round(render_seconds / stats["renders"], 3) if stats["renders"] else 0.0,
+        "timeout_seconds": settings.RENDER_TIMEOUT_SECONDS,
+    }
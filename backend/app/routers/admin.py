@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Response, Body
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, RedirectResponse
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.routers.dependencies import get_admin_user
@@ -12,8 +12,15 @@ from app.schemas import (
     UserQuotaAdjust, UsageLogResponse, LoginLogResponse
 )
 from app.config import settings
-from app.storage_service import read_file
+from app.storage_service import get_read_cache_stats
+from app.async_storage import stream_file, stored_file_size, presigned_download_url, run_in_storage_pool
+from app.blob_store import release_blobs, purge_blobs, blob_hashes_for_users
 from app.error_logger import get_error_stats
+from app.browser_pool import get_browser_pool_stats
+from app.render_executor import get_render_executor_stats
+from app.validation_cache import get_verdict_cache_stats, invalidate_verdicts
+from app.render_cache import get_render_cache_stats, clear as clear_render_cache
+from app.question_quota import get_question_usage
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any
 import os
@@ -280,13 +287,20 @@ async def delete_user(
     # This works even without CASCADE, and is safe with CASCADE (just redundant)
     from app.models import (
         PremiumRequest, Upload, QnASet, AIUsageLog, LoginLog, 
-        UsageLog, Review, PdfSplitPart
+        UsageLog, Review, PdfSplitPart, PageText
     )
     
     # Get upload IDs first (needed for usage_logs cleanup)
     upload_ids = [u.id for u in db.query(Upload.id).filter(Upload.user_id == user_id).all()]
     
+    # Stored files are shared blobs: drop this user's references (files go when unreferenced)
+    orphaned_blobs = release_blobs(db, blob_hashes_for_users(db, [user_id]))
+    
     # Delete in dependency order (children before parents)
+    # 0. Stored page text (depends on uploads and split parts)
+    if upload_ids:
+        db.query(PageText).filter(PageText.upload_id.in_(upload_ids)).delete(synchronize_session=False)
+    
     # 1. PDF split parts (depend on uploads)
     if upload_ids:
         db.query(PdfSplitPart).filter(PdfSplitPart.parent_upload_id.in_(upload_ids)).delete(synchronize_session=False)
@@ -322,6 +336,7 @@ async def delete_user(
     # Now safe to delete the user
     db.delete(user)
     db.commit()
+    purge_blobs(db, orphaned_blobs)
     
     return {"message": "User deleted successfully", "user_id": user_id}
 
@@ -347,55 +362,10 @@ async def list_users(
 
     users = query.all()
     
-    # Calculate question counts for each user
-    from app.models import QnASet
-    # datetime is already imported at the top of the file
-    
     result = []
     for user in users:
-        # Count total questions from QnASets (after reset timestamp if set)
-        # Use reset timestamp if set, otherwise count all
-        if user.total_questions_reset_at:
-            reset_timestamp_total = user.total_questions_reset_at
-            qna_sets = db.query(QnASet).filter(
-                QnASet.user_id == user.id,
-                QnASet.created_at >= reset_timestamp_total
-            ).all()
-        else:
-            qna_sets = db.query(QnASet).filter(
-                QnASet.user_id == user.id
-            ).all()
-        
-        total_questions_used = 0
-        for qna_set in qna_sets:
-            if qna_set.qna_json and isinstance(qna_set.qna_json, dict):
-                questions = qna_set.qna_json.get("questions", [])
-                if isinstance(questions, list):
-                    total_questions_used += len(questions)
-        
-        # Count daily questions (questions generated after reset timestamp)
-        today_start = datetime.combine(datetime.utcnow().date(), datetime.min.time())
-        # If reset timestamp is set and is today or later, use it
-        if user.daily_questions_reset_at:
-            if user.daily_questions_reset_at.date() >= datetime.utcnow().date():
-                reset_timestamp = user.daily_questions_reset_at
-            else:
-                # Reset timestamp is from a previous day, use today's start instead
-                reset_timestamp = today_start
-        else:
-            reset_timestamp = today_start
-        
-        daily_qna_sets = db.query(QnASet).filter(
-            QnASet.user_id == user.id,
-            QnASet.created_at >= reset_timestamp
-        ).all()
-        
-        daily_questions_used = 0
-        for qna_set in daily_qna_sets:
-            if qna_set.qna_json and isinstance(qna_set.qna_json, dict):
-                questions = qna_set.qna_json.get("questions", [])
-                if isinstance(questions, list):
-                    daily_questions_used += len(questions)
+        # Questions used since the admin resets (materialized counters, see app/question_quota.py)
+        total_questions_used, daily_questions_used = get_question_usage(user)
         
         result.append({
             "id": user.id,
@@ -466,8 +436,11 @@ async def delete_users(
     """Bulk delete users (dangerous)"""
     if not ids:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No user IDs provided")
+    user_ids = [u.id for u in db.query(User.id).filter(User.id.in_(ids), User.role == UserRole.USER).all()]
+    orphaned_blobs = release_blobs(db, blob_hashes_for_users(db, user_ids)) if user_ids else []
     deleted = db.query(User).filter(User.id.in_(ids), User.role == UserRole.USER).delete(synchronize_session=False)
     db.commit()
+    purge_blobs(db, orphaned_blobs)
     return {"deleted": deleted, "ids": ids}
 
 @router.get("/uploads")
@@ -581,10 +554,8 @@ async def view_upload(
             detail="Upload not found"
         )
     
-    # Read file
+    # Stream file (decrypted chunk by chunk), or redirect to object storage when allowed
     try:
-        file_content = read_file(upload.file_path)
-        
         # Determine content type
         if upload.file_type == FileType.PDF:
             media_type = "application/pdf"
@@ -602,11 +573,17 @@ async def view_upload(
         else:
             media_type = "application/octet-stream"
         
-        return Response(
-            content=file_content,
+        presigned_url = await presigned_download_url(upload.file_path, upload.file_name, media_type)
+        if presigned_url:
+            return RedirectResponse(presigned_url, status_code=status.HTTP_307_TEMPORARY_REDIRECT)
+        
+        file_size = await stored_file_size(upload.file_path)
+        return StreamingResponse(
+            stream_file(upload.file_path),
             media_type=media_type,
             headers={
                 "Content-Disposition": f'inline; filename="{upload.file_name}"',
+                "Content-Length": str(file_size),
                 "X-Content-Type-Options": "nosniff"
             }
         )
@@ -648,16 +625,19 @@ async def adjust_user_quota(
         user.daily_questions_limit = 50  # Default daily questions limit
         print(f"✅ Reset daily questions limit to 50 for user {user.id} ({user.email})")
     
-    # Reset total questions count - sets reset timestamp to now, effectively resetting the count
+    # Reset total questions count - sets reset timestamp to now and zeroes the counter
     if adjustment.reset_total_questions_count:
         reset_time = datetime.utcnow()
         user.total_questions_reset_at = reset_time
+        user.total_questions_used = 0
         print(f"🔄 RESET TOTAL COUNT: Setting total_questions_reset_at to {reset_time} for user {user.id} ({user.email})")
     
-    # Reset daily questions count - sets reset timestamp to now, effectively resetting the count
+    # Reset daily questions count - sets reset timestamp to now and zeroes today's counter
     if adjustment.reset_daily_questions_count:
         reset_time = datetime.utcnow()
         user.daily_questions_reset_at = reset_time
+        user.daily_questions_used = 0
+        user.daily_questions_date = reset_time.date()
         print(f"🔄 RESET DAILY COUNT: Setting daily_questions_reset_at to {reset_time} for user {user.id} ({user.email})")
     
     # Keep backward compatibility for PDF/Image quotas
@@ -702,55 +682,9 @@ async def adjust_user_quota(
     
     print(f"📝 After commit and refresh: daily_questions_reset_at = {user.daily_questions_reset_at}")
     
-    # Calculate current question counts for response
-    from app.models import QnASet
-    
-    # Count total questions (load and count in Python for compatibility)
-    qna_sets = db.query(QnASet).filter(
-        QnASet.user_id == user.id
-    ).all()
-    
-    total_questions_used = 0
-    for qna_set in qna_sets:
-        if qna_set.qna_json and isinstance(qna_set.qna_json, dict):
-            questions = qna_set.qna_json.get("questions", [])
-            if isinstance(questions, list):
-                total_questions_used += len(questions)
-    
-    # Use reset timestamp if set, otherwise use today's start
-    today_start = datetime.combine(datetime.utcnow().date(), datetime.min.time())
-    # If reset timestamp is set and is today or later, use it
-    if user.daily_questions_reset_at:
-        reset_date = user.daily_questions_reset_at.date()
-        today_date = datetime.utcnow().date()
-        print(f"📅 Reset date: {reset_date}, Today: {today_date}")
-        if reset_date >= today_date:
-            reset_timestamp = user.daily_questions_reset_at
-            print(f"✅ Using reset timestamp: {reset_timestamp}")
-        else:
-            # Reset timestamp is from a previous day, use today's start instead
-            reset_timestamp = today_start
-            print(f"⚠️  Reset timestamp is from previous day, using today's start: {reset_timestamp}")
-    else:
-        reset_timestamp = today_start
-        print(f"ℹ️  No reset timestamp set, using today's start: {reset_timestamp}")
-    
-    print(f"🔍 Counting daily questions for user {user.id} after reset: reset_timestamp={reset_timestamp}")
-    
-    daily_qna_sets = db.query(QnASet).filter(
-        QnASet.user_id == user.id,
-        QnASet.created_at >= reset_timestamp
-    ).all()
-    
-    daily_questions_used = 0
-    for qna_set in daily_qna_sets:
-        if qna_set.qna_json and isinstance(qna_set.qna_json, dict):
-            questions = qna_set.qna_json.get("questions", [])
-            if isinstance(questions, list):
-                daily_questions_used += len(questions)
-    
-    print(f"📊 Daily questions used after reset: {daily_questions_used}")
-    print(f"📅 Reset timestamp: {user.daily_questions_reset_at}")
+    # Current question counts for the response
+    total_questions_used, daily_questions_used = get_question_usage(user)
+    print(f"📊 Questions used: total={total_questions_used}, daily={daily_questions_used} (daily reset: {user.daily_questions_reset_at})")
     
     return {
         "message": "Quota adjusted",
@@ -1130,6 +1064,77 @@ async def get_error_stats_endpoint(
     stats = get_error_stats(db, days)
     return stats
 
+@router.get("/storage-cache-stats")
+async def get_storage_cache_stats(
+    admin_user: User = Depends(get_admin_user)
+):
+    """Decrypted-file cache counters for this worker process (admin only)"""
+    return get_read_cache_stats()
+
+@router.get("/render-pool-stats")
+async def get_render_pool_stats(
+    admin_user: User = Depends(get_admin_user)
+):
+    """Persistent Chromium pool used for PDF downloads: renders, recycles and per-browser state (admin only)"""
+    return get_browser_pool_stats()
+
+@router.get("/render-worker-stats")
+async def get_render_worker_stats(
+    admin_user: User = Depends(get_admin_user)
+):
+    """ReportLab/DOCX/TXT render process pool of this API process: queue, timeouts, restarts (admin only)"""
+    return get_render_executor_stats()
+
+@router.get("/validation-cache-stats")
+async def get_validation_cache_stats(
+    admin_user: User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Image validation verdict cache: hit rate of this worker process and cached verdicts (admin only)"""
+    return get_verdict_cache_stats(db)
+
+@router.delete("/validation-cache")
+async def invalidate_validation_cache(
+    sha256: Optional[str] = None,
+    expired_only: bool = False,
+    admin_user: User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Invalidate cached image validation verdicts (admin only):
+    one image by sha256, only the expired ones, or all of them (e.g. after changing the validation rules)
+    """
+    deleted = invalidate_verdicts(db, sha256=sha256, expired_only=expired_only)
+    db.add(AuditLog(
+        admin_id=admin_user.id,
+        action="invalidate_validation_cache",
+        details={"sha256": sha256, "expired_only": expired_only, "deleted": deleted}
+    ))
+    db.commit()
+    return {"deleted": deleted}
+
+@router.get("/render-cache-stats")
+async def get_render_cache_statistics(
+    admin_user: User = Depends(get_admin_user)
+):
+    """Rendered download cache: hit rate of this worker process and disk usage (admin only)"""
+    return await run_in_storage_pool(get_render_cache_stats)
+
+@router.delete("/render-cache")
+async def clear_render_cache_endpoint(
+    admin_user: User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Drop every cached rendered download (admin only), e.g. after changing the PDF templates or fonts"""
+    deleted = await run_in_storage_pool(clear_render_cache)
+    db.add(AuditLog(
+        admin_id=admin_user.id,
+        action="clear_render_cache",
+        details={"deleted": deleted}
+    ))
+    db.commit()
+    return {"deleted": deleted}
+
 @router.get("/errors")
 async def list_errors(
     severity: Optional[str] = None,
@@ -1,19 +1,30 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Response, Query, Body, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.routers.dependencies import get_current_user, get_premium_user
 from app.models import User, QnASet, Upload
-from app.schemas import QnAGenerateRequest, QnASetResponse
-from app.ocr_service import extract_text_from_image, extract_text_from_pdf
+from app.schemas import QnAGenerateRequest, QnASetResponse, QnASetExportRequest
+from app.extraction_service import get_extracted_text, get_page_range_text, KIND_UPLOAD, KIND_PART
+from app.page_store import get_page_texts, build_page_context, attribute_question_pages
 from app.ai_service import generate_qna  # Keep for backward compatibility
 from app.ai_pipeline import generate_qna_pipeline
-from app.download_service import generate_pdf, generate_docx, generate_txt, _generate_pdf_playwright_async
+from app.download_service import generate_pdf, generate_docx, generate_txt, build_qna_html, _generate_pdf_playwright_async
 from app.download_service import PLAYWRIGHT_AVAILABLE
 from app.generation_tracker import check_daily_generation_limit, increment_daily_generation_count
+from app.question_quota import QuestionReservation, count_questions, get_question_usage, uncount_deleted_set
 from app.error_logger import log_api_error
 from app.font_manager import detect_language
 from app.models import PdfSplitPart
+from app.async_storage import run_in_storage_pool, submit_to_storage_pool, stream_file
+from app.storage_service import write_stream
+from app.render_executor import run_render, render_to_file, RenderQueueFull, RenderTimeout
+from app import render_cache
+from app.render_cache import render_key, etag_for, etag_matches
 import asyncio
+import io
+import time
+import zipfile
 from app.config import settings
 from typing import Optional
 
@@ -27,7 +38,21 @@ async def generate_qna_endpoint(
     db: Session = Depends(get_db)
 ):
     """Generate Q/A from uploaded file or multiple split parts"""
-    
+    reservation = QuestionReservation(current_user.id)
+    try:
+        return await _generate_qna(http_request, request, current_user, db, reservation)
+    except BaseException:
+        # Give back the questions reserved for a generation that did not save a set
+        reservation.release(db)
+        raise
+
+async def _generate_qna(
+    http_request: Request,
+    request: QnAGenerateRequest,
+    current_user: User,
+    db: Session,
+    reservation: QuestionReservation
+):
     # Check daily generation limit BEFORE processing
     try:
         can_generate, used, limit, message = check_daily_generation_limit(db, current_user)
@@ -59,6 +84,8 @@ async def generate_qna_endpoint(
     
     # Initialize selected_subject with default value
     selected_subject = "general"
+    page_range = False  # True when generating from start_page..end_page of a single upload
+    page_range_texts = {}  # Page number -> text of the pages the context was built from (source attribution)
     
     # Handle multi-select: if part_ids provided, use those instead of upload_id
     if request.part_ids and len(request.part_ids) > 0:
@@ -77,11 +104,19 @@ async def generate_qna_endpoint(
             )
         
         # Combine text from all selected parts and store part info for source tracking
+        # Parts are extracted in the background at split time; await them together
+        parts = sorted(parts, key=lambda p: p.part_number)
+        part_results = await asyncio.gather(
+            *(get_extracted_text(part, KIND_PART) for part in parts),
+            return_exceptions=True
+        )
         combined_text = []
         part_info_map = {}  # Map to store part info by part_number
-        for part in sorted(parts, key=lambda p: p.part_number):
+        for part, part_result in zip(parts, part_results):
             try:
-                part_text = extract_text_from_pdf(part.file_path)
+                if isinstance(part_result, BaseException):
+                    raise part_result
+                part_text = part_result
                 if part_text:
                     part_marker = f"--- Part {part.part_number} (Pages {part.start_page}-{part.end_page}) ---"
                     combined_text.append(f"\n\n{part_marker}\n\n")
@@ -123,6 +158,10 @@ async def generate_qna_endpoint(
         
         text_content = "".join(combined_text)
         
+        # Per-page text of the selected parts (stored against the parent upload) for source attribution
+        for part in parts:
+            page_range_texts.update(get_page_texts(db, part.parent_upload_id, part.start_page, part.end_page))
+        
         # Use the first part's parent upload for reference
         upload = db.query(Upload).filter(Upload.id == parts[0].parent_upload_id).first()
         if not upload:
@@ -164,12 +203,25 @@ async def generate_qna_endpoint(
                 detail="Upload not found"
             )
         
+        page_range = request.start_page is not None or request.end_page is not None
+        if page_range:
+            start_page = request.start_page or 1
+            end_page = request.end_page or upload.pages or start_page
+            if upload.file_type.value != "pdf" or start_page < 1 or end_page < start_page or (upload.pages and end_page > upload.pages):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Invalid page range {start_page}-{end_page}" + (f" (document has {upload.pages} pages)" if upload.pages else "")
+                )
+        
         # Extract text
         try:
-            if upload.file_type.value == "pdf":
-                text_content = extract_text_from_pdf(upload.file_path)
+            if page_range:
+                # Assemble the context from the page text store (only the requested pages)
+                page_range_texts = await get_page_range_text(db, upload, start_page, end_page)
+                text_content = build_page_context(page_range_texts)
             else:
-                text_content = extract_text_from_image(upload.file_path)
+                # Reuses the background extraction started at upload time (or awaits it)
+                text_content = await get_extracted_text(upload, KIND_UPLOAD)
         except Exception as extract_error:
             error_msg = str(extract_error)
             # Provide helpful error message based on error type
@@ -285,70 +337,30 @@ async def generate_qna_endpoint(
         total_limit = 10  # Free users: 10 total questions limit
         daily_limit = 10  # Free users: 10 daily questions limit
     
-    # Count total questions (after reset timestamp if set)
-    if current_user.total_questions_reset_at:
-        reset_timestamp_total = current_user.total_questions_reset_at
-        total_qna_sets = db.query(QnASet).filter(
-            QnASet.user_id == current_user.id,
-            QnASet.created_at >= reset_timestamp_total
-        ).all()
-    else:
-        total_qna_sets = db.query(QnASet).filter(
-            QnASet.user_id == current_user.id
-        ).all()
-    
-    total_questions_used = 0
-    for qna_set in total_qna_sets:
-        if qna_set.qna_json and isinstance(qna_set.qna_json, dict):
-            questions = qna_set.qna_json.get("questions", [])
-            if isinstance(questions, list):
-                total_questions_used += len(questions)
-    
-    # Determine the reset timestamp - use daily_questions_reset_at if set, otherwise use today's start
-    today_start = datetime.combine(datetime.utcnow().date(), datetime.min.time())
-    # If reset timestamp is set and is today or later, use it
-    if current_user.daily_questions_reset_at:
-        if current_user.daily_questions_reset_at.date() >= datetime.utcnow().date():
-            reset_timestamp = current_user.daily_questions_reset_at
-        else:
-            # Reset timestamp is from a previous day, use today's start instead
-            reset_timestamp = today_start
-    else:
-        reset_timestamp = today_start
-    
-    # Count questions generated after reset timestamp
-    daily_qna_sets = db.query(QnASet).filter(
-        QnASet.user_id == current_user.id,
-        QnASet.created_at >= reset_timestamp
-    ).all()
-    
-    daily_questions_used = 0
-    for qna_set in daily_qna_sets:
-        if qna_set.qna_json and isinstance(qna_set.qna_json, dict):
-            questions = qna_set.qna_json.get("questions", [])
-            if isinstance(questions, list):
-                daily_questions_used += len(questions)
-    
-    print(f"🔍 Total questions check: used={total_questions_used}, limit={total_limit if total_limit else 'unlimited'}")
-    print(f"🔍 Daily questions check: used={daily_questions_used}, limit={daily_limit}, reset_timestamp={reset_timestamp}")
-    
     # Calculate how many questions will be generated
     if request.custom_distribution and len(request.custom_distribution) > 0:
         questions_to_generate = sum(item.count for item in request.custom_distribution)
     else:
         questions_to_generate = request.num_questions
     
-    # Check if generating these questions would exceed total limit
-    if total_limit and total_questions_used + questions_to_generate > total_limit:
-        remaining = max(0, total_limit - total_questions_used)
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail=f"Total question limit exceeded. You have used {total_questions_used} of {total_limit} questions. "
-                  f"You can generate {remaining} more questions. Please contact admin to increase your limit."
-        )
-    
-    # Check if generating these questions would exceed daily limit
-    if daily_questions_used + questions_to_generate > daily_limit:
+    # Reserve the questions against both limits in one atomic update (see app/question_quota.py),
+    # so concurrent generations cannot overshoot; released again if generation fails
+    if not reservation.reserve(db, questions_to_generate, total_limit, daily_limit):
+        db.refresh(current_user)
+        total_questions_used, daily_questions_used = get_question_usage(current_user)
+        print(f"🔍 Question limits reached: total used={total_questions_used}/{total_limit or 'unlimited'}, "
+              f"daily used={daily_questions_used}/{daily_limit}, requested={questions_to_generate}")
+        
+        # Check if generating these questions would exceed total limit
+        if total_limit and total_questions_used + questions_to_generate > total_limit:
+            remaining = max(0, total_limit - total_questions_used)
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"Total question limit exceeded. You have used {total_questions_used} of {total_limit} questions. "
+                      f"You can generate {remaining} more questions. Please contact admin to increase your limit."
+            )
+        
+        # Otherwise the daily limit would be exceeded
         remaining = max(0, daily_limit - daily_questions_used)
         # Provide helpful suggestion to reduce question count
         suggestion = ""
@@ -359,6 +371,7 @@ async def generate_qna_endpoint(
             detail=f"Daily question limit exceeded. You have used {daily_questions_used} of {daily_limit} questions today. "
                   f"You can generate {remaining} more questions today.{suggestion} Please wait until tomorrow or contact admin to reset your daily limit."
         )
+    print(f"🔍 Reserved {questions_to_generate} questions (total limit={total_limit if total_limit else 'unlimited'}, daily limit={daily_limit})")
     
     # Get number of parts for dynamic content limit (needed for both custom and standard generation)
     num_parts = len(request.part_ids) if request.part_ids else (1 if request.upload_id else None)
@@ -714,7 +727,33 @@ async def generate_qna_endpoint(
             detail="Failed to generate Q/A: No data generated"
         )
     
+    # Attribute questions to the pages whose text they overlap most (page text store)
+    if page_range_texts:
+        questions = qna_data.get("questions", [])
+        attributed_pages = attribute_question_pages(questions, page_range_texts)
+        part_for_page = {}
+        if 'part_info_map' in locals():
+            for part_info in part_info_map.values():
+                for page in range(part_info["start_page"], part_info["end_page"] + 1):
+                    part_for_page[page] = part_info
+        for question, page in zip(questions, attributed_pages):
+            if page is None:
+                continue
+            source = question.setdefault("source", {})
+            part_info = part_for_page.get(page)
+            if part_info:
+                source["part_number"] = part_info["part_number"]
+                source["start_page"] = part_info["start_page"]
+                source["end_page"] = part_info["end_page"]
+            else:
+                source["start_page"] = min(page_range_texts)
+                source["end_page"] = max(page_range_texts)
+            source["exact_page"] = page
+            source["page_range"] = f"Pages {source['start_page']}-{source['end_page']}"
+        print(f"📄 Attributed {sum(1 for page in attributed_pages if page is not None)}/{len(questions)} questions to source pages")
+    
     # Add source tracking for multi-part selections
+    # Questions that could not be attributed to a page are spread evenly across the parts
     if request.part_ids and len(request.part_ids) > 0 and 'part_info_map' in locals():
         questions = qna_data.get("questions", [])
         total_questions = len(questions)
@@ -741,6 +780,9 @@ async def generate_qna_endpoint(
                 # Assign source info to questions with exact page numbers
                 for i in range(questions_for_this_part):
                     if question_idx < total_questions:
+                        if questions[question_idx].get("source", {}).get("exact_page"):
+                            question_idx += 1  # Already attributed from the page text store
+                            continue
                         if "source" not in questions[question_idx]:
                             questions[question_idx]["source"] = {}
                         
@@ -776,6 +818,9 @@ async def generate_qna_endpoint(
         "marks": request.marks,
         "target_language": request.target_language or "english"
     }
+    if page_range:
+        settings_json["start_page"] = start_page
+        settings_json["end_page"] = end_page
     
     # Decrement upload quota when generating questions (1 generation = 1 upload consumed)
     # This protects against unlimited generation from saved uploads
@@ -820,14 +865,17 @@ async def generate_qna_endpoint(
             detail="Invalid Q/A data generated. Please try again."
         )
     
+    question_count = count_questions(qna_data)
     qna_set = QnASet(
         user_id=current_user.id,
         upload_id=upload.id,
         settings_json=settings_json,
-        qna_json=qna_data
+        qna_json=qna_data,
+        question_count=question_count
     )
     db.add(qna_set)
-    db.commit()
+    # Commits the set together with its question count (reservation -> actual)
+    reservation.settle(db, question_count)
     db.refresh(qna_set)
     
     # Log usage for generation action (to match profile tab counts)
@@ -922,8 +970,10 @@ async def delete_qna_set(
             detail="Q/A set not found"
         )
     
+    uncount_deleted_set(db, current_user, qna_set)
     db.delete(qna_set)
     db.commit()
+    submit_to_storage_pool(render_cache.invalidate_set, set_id)
     
     return {"message": "Q/A set deleted", "id": set_id}
 
@@ -947,22 +997,18 @@ async def get_qna_set(
     
     return qna_set
 
-@router.get("/sets/{set_id}/download")
-async def download_qna_set(
-    set_id: int,
-    format: str,  # pdf, docx, txt
-    output_format: str,  # questions_only, questions_answers, answers_only
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """Download Q/A set in specified format"""
-    
-    # Check premium
+DOWNLOAD_MEDIA_TYPES = {
+    "pdf": "application/pdf",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "txt": "text/plain",
+}
+
+def _require_premium(user: User) -> None:
     from datetime import datetime
     is_premium = (
-        current_user.premium_status.value == "approved" and
-        current_user.premium_valid_until and
-        current_user.premium_valid_until > datetime.utcnow()
+        user.premium_status.value == "approved" and
+        user.premium_valid_until and
+        user.premium_valid_until > datetime.utcnow()
     )
     
     if not is_premium:
@@ -970,6 +1016,86 @@ async def download_qna_set(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Premium access required for downloads"
         )
+
+def _check_download_format(format: str) -> None:
+    if format not in DOWNLOAD_MEDIA_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid format. Use pdf, docx, or txt"
+        )
+
+async def _render_document(qna_json: dict, format: str, output_format: str, title: str, target_language: str, path: str):
+    """
+    Render a set as pdf, docx or txt into the stored file path (see render_cache.temp_path).
+    Returns (size, cacheable); a PDF from the ReportLab fallback after a Playwright failure
+    is not cacheable, so the next download tries Chromium again. ReportLab, DOCX and TXT
+    builds run in the render process pool (app/render_executor.py), which writes the file
+    itself: 503 when its queue is full, 504 on timeout.
+    """
+    cacheable = True
+    try:
+        if format == "pdf":
+            # Try Playwright first if available (best quality)
+            if PLAYWRIGHT_AVAILABLE:
+                try:
+                    # Built off the event loop: font subsetting is CPU work
+                    html_string, font_path, font_name = await asyncio.to_thread(
+                        build_qna_html, qna_json, output_format, title, target_language
+                    )
+                    
+                    print("🎭 Using Playwright for PDF generation (best quality)...")
+                    content = await _generate_pdf_playwright_async(html_string, font_path, font_name)
+                    print("✅ Playwright PDF generated successfully!")
+                except Exception as e:
+                    print(f"⚠️  Playwright error: {e}, falling back to generate_pdf...")
+                    import traceback
+                    traceback.print_exc()
+                    cacheable = False
+                else:
+                    return await run_in_storage_pool(write_stream, io.BytesIO(content), path), cacheable
+            size = await run_render(render_to_file, path, generate_pdf, qna_json, output_format, title, target_language)
+        elif format == "docx":
+            size = await run_render(render_to_file, path, generate_docx, qna_json, output_format, title)
+        else:
+            size = await run_render(render_to_file, path, generate_txt, qna_json, output_format, title)
+    except RenderQueueFull:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many downloads are being prepared right now. Please try again in a moment.",
+            headers={"Retry-After": "5"}
+        )
+    except RenderTimeout:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Preparing the download took too long. Please try again."
+        )
+    return size, cacheable
+
+async def _stream_rendering(path: str, temporary: bool):
+    """Stream a rendered file; a temp rendering is removed afterwards (also if the client goes away)"""
+    try:
+        async for chunk in stream_file(path):
+            yield chunk
+    finally:
+        if temporary:
+            await run_in_storage_pool(render_cache.discard, path)
+
+@router.get("/sets/{set_id}/download")
+async def download_qna_set(
+    set_id: int,
+    format: str,  # pdf, docx, txt
+    output_format: str,  # questions_only, questions_answers, answers_only
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Download Q/A set in specified format.
+    Renderings are cached on disk (app/render_cache.py) and carry an ETag, so repeat
+    downloads are streamed from a file and revalidations get a 304.
+    """
+    
+    _require_premium(current_user)
     
     # Get Q/A set
     qna_set = db.query(QnASet).filter(
@@ -983,299 +1109,46 @@ async def download_qna_set(
             detail="Q/A set not found"
         )
     
+    _check_download_format(format)
+    
     # Generate file
     title = f"Generated Questions - Set {set_id}"
     
     # Get target language from settings
     target_language = qna_set.settings_json.get("target_language", "english")
     
-    if format == "pdf":
-        # Try Playwright first if available (best quality)
-        if PLAYWRIGHT_AVAILABLE:
-            try:
-                # Build HTML for Playwright (same as generate_pdf does)
-                from app.download_service import LANGUAGE_TO_FONT_NAME, FONT_NAME_MAP, is_rtl
-                import os
-                import html as html_escape
-                import unicodedata
-                
-                font_name = LANGUAGE_TO_FONT_NAME.get(target_language, "NotoLatin")
-                is_rtl_lang = is_rtl(target_language)
-                
-                # Get font file path (relative to download_service.py location)
-                import app.download_service as ds_module
-                base_dir = os.path.join(os.path.dirname(ds_module.__file__), "fonts")
-                font_file = FONT_NAME_MAP.get(font_name, "NotoSans-Regular.ttf")
-                font_path = os.path.abspath(os.path.join(base_dir, font_file))
-                
-                def normalize_text(text: str) -> str:
-                    if not isinstance(text, str):
-                        return text
-                    return unicodedata.normalize("NFC", text)
-                
-                # Load font as base64
-                font_base64 = None
-                if os.path.exists(font_path):
-                    import base64
-                    with open(font_path, 'rb') as f:
-                        font_data = f.read()
-                        font_base64 = base64.b64encode(font_data).decode('utf-8')
-                
-                # Helper function to convert structured answer to formatted text
-                def format_structured_answer(answer, marks):
-                    """Convert structured answer (dict) to formatted text string"""
-                    if isinstance(answer, dict):
-                        # Check for English literature format (introduction, explanation, analysis, conclusion)
-                        if answer.get("introduction") or answer.get("explanation") or answer.get("analysis") or answer.get("conclusion"):
-                            parts = []
-                            if answer.get("introduction"):
-                                parts.append(f"Introduction: {answer.get('introduction')}")
-                            if answer.get("explanation"):
-                                parts.append(f"Explanation: {answer.get('explanation')}")
-                            if answer.get("analysis"):
-                                parts.append(f"Analysis: {answer.get('analysis')}")
-                            if answer.get("conclusion"):
-                                parts.append(f"Conclusion: {answer.get('conclusion')}")
-                            return "\n".join(parts)
-                        
-                        # Check for Science format (definition, explanation, example, conclusion)
-                        if answer.get("definition") and (answer.get("explanation") or answer.get("example") or answer.get("conclusion")):
-                            if not (answer.get("formula") or answer.get("given") or answer.get("steps")):
-                                parts = []
-                                if answer.get("definition"):
-                                    parts.append(f"Definition: {answer.get('definition')}")
-                                if answer.get("explanation"):
-                                    parts.append(f"Explanation: {answer.get('explanation')}")
-                                if answer.get("example"):
-                                    parts.append(f"Example: {answer.get('example')}")
-                                if answer.get("conclusion"):
-                                    parts.append(f"Conclusion: {answer.get('conclusion')}")
-                                return "\n".join(parts)
-                        
-                        # Check for Social Science format (background, context, key_points, explanation, conclusion)
-                        if answer.get("background") or answer.get("context") or answer.get("key_points"):
-                            parts = []
-                            if answer.get("background"):
-                                parts.append(f"Background: {answer.get('background')}")
-                            if answer.get("context"):
-                                parts.append(f"Context: {answer.get('context')}")
-                            if answer.get("key_points"):
-                                kp = answer.get("key_points")
-                                if isinstance(kp, list):
-                                    parts.append(f"Key Points: {' '.join(str(v) for v in kp)}")
-                                else:
-                                    parts.append(f"Key Points: {kp}")
-                            if answer.get("explanation"):
-                                parts.append(f"Explanation: {answer.get('explanation')}")
-                            if answer.get("conclusion"):
-                                parts.append(f"Conclusion: {answer.get('conclusion')}")
-                            return "\n".join(parts)
-                        
-                        # Board-style format (post-processed 10-mark math)
-                        if (
-                            answer.get("substitution") is not None
-                            or answer.get("calculation") is not None
-                            or answer.get("final_answer") is not None
-                        ):
-                            parts = []
-                            if answer.get("given"):
-                                parts.append(f"Given: {answer.get('given')}")
-                            if answer.get("formula"):
-                                parts.append(f"Formula: {answer.get('formula')}")
-                            if answer.get("substitution"):
-                                parts.append(f"Substitution: {answer.get('substitution')}")
-                            if answer.get("calculation"):
-                                parts.append(f"Calculation:\n{answer.get('calculation')}")
-                            if answer.get("final_answer"):
-                                parts.append(f"{answer.get('final_answer')}")
-                            return "\n".join(parts)
-
-                        # Original structured format (Math and other subjects)
-                        parts = []
-                        if answer.get("given"):
-                            parts.append(f"Given: {answer.get('given')}")
-                        if answer.get("definition"):
-                            parts.append(f"Definition: {answer.get('definition')}")
-                        if answer.get("formula"):
-                            parts.append(f"Formula/Theorem: {answer.get('formula')}")
-                        if answer.get("coefficients"):
-                            parts.append(f"Coefficients: {answer.get('coefficients')}")
-                        if answer.get("steps") and isinstance(answer.get("steps"), list):
-                            parts.append("Step-by-step Working:")
-                            for i, step in enumerate(answer.get("steps", []), 1):
-                                parts.append(f"Step {i}: {step}")
-                        if answer.get("function_values") and isinstance(answer.get("function_values"), list):
-                            parts.append("Function Values:")
-                            for value in answer.get("function_values", []):
-                                parts.append(f"  • {value}")
-                        if answer.get("final"):
-                            parts.append(f"Final Conclusion: {answer.get('final')}")
-                        return "\n".join(parts) if parts else ""
-                    return str(answer) if answer else ""
-                
-                # Helper function to escape HTML while preserving LaTeX
-                def escape_html_preserve_latex(text) -> str:
-                    """Escape HTML but preserve LaTeX expressions for KaTeX"""
-                    # Handle dict format
-                    if isinstance(text, dict):
-                        text = format_structured_answer(text, 0)
-                    
-                    if not text:
-                        return ""
-                    
-                    # Convert to string if not already
-                    text = str(text)
-                    
-                    import re
-                    
-                    # First, convert escaped LaTeX delimiters to single backslash for KaTeX
-                    # JSON stores as \\( and \\), but KaTeX needs \( and \)
-                    text = text.replace('\\\\(', '\\(').replace('\\\\)', '\\)')
-                    text = text.replace('\\\\[', '\\[').replace('\\\\]', '\\]')
-                    
-                    # Pattern to match LaTeX expressions (inline and display math)
-                    # Match \(...\) and \[...\] patterns
-                    latex_pattern = r'\\(?:\([^)]*\)|\[[^\]]*\])'
-                    placeholders = {}
-                    placeholder_idx = 0
-                    
-                    def replace_latex(match):
-                        nonlocal placeholder_idx
-                        placeholder = f"__LATEX_{placeholder_idx}__"
-                        placeholders[placeholder] = match.group(0)
-                        placeholder_idx += 1
-                        return placeholder
-                    
-                    # Find and replace all LaTeX expressions with placeholders
-                    text_with_placeholders = re.sub(latex_pattern, replace_latex, text)
-                    
-                    # Escape HTML
-                    escaped = html_escape.escape(text_with_placeholders)
-                    
-                    # Restore LaTeX expressions (they're safe for HTML)
-                    for placeholder, latex_expr in placeholders.items():
-                        escaped = escaped.replace(placeholder, latex_expr)
-                    
-                    return escaped
-                
-                # Build HTML
-                html_parts = []
-                font_src = f"url(data:font/truetype;charset=utf-8;base64,{font_base64}) format('truetype')" if font_base64 else ""
-                
-                css_content = f"""
-                @page {{ size: A4; margin: 1in; }}
-                @font-face {{ font-family: '{font_name}'; src: {font_src}; font-weight: normal; font-style: normal; }}
-                body, * {{ font-family: '{font_name}' !important; }}
-                body {{ font-size: 12pt; line-height: 1.8; color: #000000; direction: {'rtl' if is_rtl_lang else 'ltr'}; margin: 0; padding: 0; }}
-                .title {{ font-size: 18pt; font-weight: 700; color: #000000; text-align: center; margin-bottom: 30pt; margin-top: 0; text-transform: uppercase; letter-spacing: 1pt; }}
-                .question-box {{ border: none; padding: 0; margin-bottom: 20pt; }}
-                .question-label {{ font-weight: 700; font-size: 12pt; margin-right: 8pt; display: inline; }}
-                .question-text {{ font-weight: 400; font-size: 12pt; margin-bottom: 12pt; line-height: 1.8; display: inline; }}
-                .options {{ margin: 8pt 0 8pt 20pt; padding: 0; list-style: none; }}
-                .option {{ margin: 6pt 0; font-size: 12pt; line-height: 1.8; }}
-                .option-label {{ font-weight: 400; margin-right: 8pt; }}
-                .marks {{ font-style: normal; font-size: 10pt; color: #000000; margin-top: 8pt; margin-left: 20pt; }}
-                .answer-box {{ border: none; padding: 0; margin-bottom: 20pt; margin-top: 10pt; }}
-                .answer-label {{ font-weight: 400; font-size: 12pt; color: #000000; margin-right: 8pt; display: inline; }}
-                .answer-text {{ font-weight: 400; font-size: 12pt; color: #000000; line-height: 1.8; display: inline; }}
-                """
-                
-                # Add KaTeX script for LaTeX rendering (better than MathJax for PDF)
-                katex_script = """
-                <link rel="stylesheet" href="https://cdn.jsdelivr.net/npm/katex@0.16.9/dist/katex.min.css" integrity="sha384-n8MVd4RsNIU0tAv4ct0nTaAbDJwPJzDEaqSD1odI+WdtXRGWt2kTvGFasHpSy3SV" crossorigin="anonymous">
-                <script defer src="https://cdn.jsdelivr.net/npm/katex@0.16.9/dist/katex.min.js" integrity="sha384-XjKyOOzG8j7q1aI2+fiEYHrTZ+8uBZ4mX16o8qEDmO1CsQrMdZengsGa4s9Q2x0M" crossorigin="anonymous"></script>
-                <script defer src="https://cdn.jsdelivr.net/npm/katex@0.16.9/dist/contrib/auto-render.min.js" integrity="sha384-+VBxd3r6XgURycqtZ117nYw44OOcIax56Z4dCRWbxyPt0Koah1uHoK0o4+/RRE05" crossorigin="anonymous"
-                    onload="renderMathInElement(document.body, {
-                        delimiters: [
-                            {left: '\\\\(', right: '\\\\)', display: false},
-                            {left: '\\\\[', right: '\\\\]', display: true}
-                        ],
-                        throwOnError: false
-                    });"></script>
-                """
-                
-                html_parts.append(f"""<!DOCTYPE html>
-<html lang="{target_language}" dir="{'rtl' if is_rtl_lang else 'ltr'}">
-<head>
-<meta charset="UTF-8">
-<style>{css_content}</style>
-{katex_script}
-</head>
-<body><div class="title">{html_escape.escape(normalize_text(title))}</div>""")
-                
-                for idx, q in enumerate(qna_set.qna_json.get("questions", []), 1):
-                    question_text = normalize_text(q.get("question", ""))
-                    html_parts.append(f'<div class="question-box"><span class="question-label">Q{idx}.</span><div class="question-text">{escape_html_preserve_latex(question_text)}</div>')
-                    
-                    if q.get("type") == "mcq" and q.get("options"):
-                        html_parts.append('<div class="options">')
-                        for i, opt in enumerate(q.get("options", [])):
-                            opt = normalize_text(opt)
-                            option_label = chr(65 + i)
-                            html_parts.append(f'<div class="option"><span class="option-label">{option_label}.</span><span>{escape_html_preserve_latex(opt)}</span></div>')
-                        html_parts.append('</div>')
-                    
-                    if q.get("marks"):
-                        marks = normalize_text(str(q.get("marks")))
-                        html_parts.append(f'<div class="marks">Marks: {html_escape.escape(marks)}</div>')
-                    
-                    html_parts.append('</div>')
-                    
-                    if output_format in ["questions_answers", "answers_only"]:
-                        # Try correct_answer first, then answer field as fallback
-                        correct_answer = q.get("correct_answer") or q.get("answer")
-                        
-                        # Only add answer if it exists and is not empty
-                        if correct_answer and correct_answer != "N/A" and str(correct_answer).strip():
-                            answer_label = "✓ Answer:" if not is_rtl_lang else ":الإجابة ✓"
-                            answer_label = normalize_text(answer_label)
-                            
-                            # Convert structured answer to text if needed
-                            if isinstance(correct_answer, dict):
-                                answer_text = format_structured_answer(correct_answer, q.get("marks", 0))
-                            else:
-                                answer_text = normalize_text(str(correct_answer))
-                            
-                            # Only add if formatted answer is not empty
-                            if answer_text and answer_text.strip():
-                                html_parts.append(f'<div class="answer-box"><div class="answer-label">{html_escape.escape(answer_label)}</div><div class="answer-text">{escape_html_preserve_latex(answer_text)}</div></div>')
-                
-                html_parts.append('</body></html>')
-                html_string = '\n'.join(html_parts)
-                
-                print("🎭 Using Playwright for PDF generation (best quality)...")
-                content = await _generate_pdf_playwright_async(html_string, font_path, font_name)
-                print("✅ Playwright PDF generated successfully!")
-            except Exception as e:
-                print(f"⚠️  Playwright error: {e}, falling back to generate_pdf...")
-                import traceback
-                traceback.print_exc()
-                content = generate_pdf(qna_set.qna_json, output_format, title, target_language)
-        else:
-            content = generate_pdf(qna_set.qna_json, output_format, title, target_language)
-        media_type = "application/pdf"
-        filename = f"questions_set_{set_id}.pdf"
-    elif format == "docx":
-        content = generate_docx(qna_set.qna_json, output_format, title)
-        media_type = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-        filename = f"questions_set_{set_id}.docx"
-    elif format == "txt":
-        content = generate_txt(qna_set.qna_json, output_format, title)
-        media_type = "text/plain"
-        filename = f"questions_set_{set_id}.txt"
-    else:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid format. Use pdf, docx, or txt"
+    cache_key = render_key(set_id, qna_set.qna_json, format, output_format, target_language)
+    headers = {
+        "Content-Disposition": f"attachment; filename=questions_set_{set_id}.{format}",
+        "ETag": etag_for(cache_key),
+        "Cache-Control": "private, no-cache"  # Revalidate: the set may be edited
+    }
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    # Cached: streamed from disk chunk by chunk
+    cached = await run_in_storage_pool(render_cache.lookup, set_id, cache_key)
+    if cached is not None:
+        cached_path, size = cached
+        return StreamingResponse(
+            stream_file(cached_path),
+            media_type=DOWNLOAD_MEDIA_TYPES[format],
+            headers={**headers, "Content-Length": str(size)}
         )
     
-    if isinstance(content, str):
-        content = content.encode('utf-8')
+    # Rendered to a file and streamed from it like a cached download
+    path = render_cache.temp_path()
+    size, cacheable = await _render_document(qna_set.qna_json, format, output_format, title, target_language, path)
+    cached_path = await run_in_storage_pool(render_cache.adopt, set_id, cache_key, path) if cacheable else None
+    if not cacheable:
+        # A fallback rendering must not be revalidated with the set's ETag (that would pin it with 304s)
+        headers.pop("ETag")
+        headers["Cache-Control"] = "no-store"
     
-    return Response(
-        content=content,
-        media_type=media_type,
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    return StreamingResponse(
+        _stream_rendering(cached_path or path, temporary=cached_path is None),
+        media_type=DOWNLOAD_MEDIA_TYPES[format],
+        headers={**headers, "Content-Length": str(size)}
     )
 
 @router.post("/sets/{set_id}/download")
@@ -1287,21 +1160,9 @@ async def download_edited_qna_set(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Download edited Q/A set in specified format (POST endpoint for edited content)"""
-    
-    # Check premium
-    from datetime import datetime
-    is_premium = (
-        current_user.premium_status.value == "approved" and
-        current_user.premium_valid_until and
-        current_user.premium_valid_until > datetime.utcnow()
-    )
+    """Download edited Q/A set in specified format (POST endpoint for edited content, not cached)"""
     
-    if not is_premium:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Premium access required for downloads"
-        )
+    _require_premium(current_user)
     
     # Verify the set exists and belongs to user (for security)
     qna_set = db.query(QnASet).filter(
@@ -1315,6 +1176,8 @@ async def download_edited_qna_set(
             detail="Q/A set not found"
         )
     
+    _check_download_format(format)
+    
     # Use edited data if provided, otherwise fall back to stored data
     qna_json = edited_data.get("questions") if edited_data.get("questions") else qna_set.qna_json
     # If questions is provided, wrap it in the expected structure
@@ -1329,291 +1192,163 @@ async def download_edited_qna_set(
     
     # Generate file
     title = f"Generated Questions - Set {set_id}"
+    path = render_cache.temp_path()
+    size, _ = await _render_document(qna_json, format, output_format, title, target_language, path)
     
-    if format == "pdf":
-        # Try Playwright first if available (best quality)
-        if PLAYWRIGHT_AVAILABLE:
-            try:
-                # Build HTML for Playwright (same as GET endpoint)
-                from app.download_service import LANGUAGE_TO_FONT_NAME, FONT_NAME_MAP, is_rtl
-                import os
-                import html as html_escape
-                import unicodedata
-                
-                font_name = LANGUAGE_TO_FONT_NAME.get(target_language, "NotoLatin")
-                is_rtl_lang = is_rtl(target_language)
-                
-                # Get font file path
-                import app.download_service as ds_module
-                base_dir = os.path.join(os.path.dirname(ds_module.__file__), "fonts")
-                font_file = FONT_NAME_MAP.get(font_name, "NotoSans-Regular.ttf")
-                font_path = os.path.abspath(os.path.join(base_dir, font_file))
-                
-                def normalize_text(text: str) -> str:
-                    if not isinstance(text, str):
-                        return text
-                    return unicodedata.normalize("NFC", text)
-                
-                # Load font as base64
-                font_base64 = None
-                if os.path.exists(font_path):
-                    import base64
-                    with open(font_path, 'rb') as f:
-                        font_data = f.read()
-                        font_base64 = base64.b64encode(font_data).decode('utf-8')
-                
-                # Helper function to convert structured answer to formatted text
-                def format_structured_answer(answer, marks):
-                    """Convert structured answer (dict) to formatted text string"""
-                    if isinstance(answer, dict):
-                        # Check for English literature format (introduction, explanation, analysis, conclusion)
-                        if answer.get("introduction") or answer.get("explanation") or answer.get("analysis") or answer.get("conclusion"):
-                            parts = []
-                            if answer.get("introduction"):
-                                parts.append(f"Introduction: {answer.get('introduction')}")
-                            if answer.get("explanation"):
-                                parts.append(f"Explanation: {answer.get('explanation')}")
-                            if answer.get("analysis"):
-                                parts.append(f"Analysis: {answer.get('analysis')}")
-                            if answer.get("conclusion"):
-                                parts.append(f"Conclusion: {answer.get('conclusion')}")
-                            return "\n".join(parts)
-                        
-                        # Check for Science format (definition, explanation, example, conclusion)
-                        if answer.get("definition") and (answer.get("explanation") or answer.get("example") or answer.get("conclusion")):
-                            if not (answer.get("formula") or answer.get("given") or answer.get("steps")):
-                                parts = []
-                                if answer.get("definition"):
-                                    parts.append(f"Definition: {answer.get('definition')}")
-                                if answer.get("explanation"):
-                                    parts.append(f"Explanation: {answer.get('explanation')}")
-                                if answer.get("example"):
-                                    parts.append(f"Example: {answer.get('example')}")
-                                if answer.get("conclusion"):
-                                    parts.append(f"Conclusion: {answer.get('conclusion')}")
-                                return "\n".join(parts)
-                        
-                        # Check for Social Science format (background, context, key_points, explanation, conclusion)
-                        if answer.get("background") or answer.get("context") or answer.get("key_points"):
-                            parts = []
-                            if answer.get("background"):
-                                parts.append(f"Background: {answer.get('background')}")
-                            if answer.get("context"):
-                                parts.append(f"Context: {answer.get('context')}")
-                            if answer.get("key_points"):
-                                kp = answer.get("key_points")
-                                if isinstance(kp, list):
-                                    parts.append(f"Key Points: {' '.join(str(v) for v in kp)}")
-                                else:
-                                    parts.append(f"Key Points: {kp}")
-                            if answer.get("explanation"):
-                                parts.append(f"Explanation: {answer.get('explanation')}")
-                            if answer.get("conclusion"):
-                                parts.append(f"Conclusion: {answer.get('conclusion')}")
-                            return "\n".join(parts)
-                        
-                        # Board-style format (post-processed 10-mark math)
-                        if (
-                            answer.get("substitution") is not None
-                            or answer.get("calculation") is not None
-                            or answer.get("final_answer") is not None
-                        ):
-                            parts = []
-                            if answer.get("given"):
-                                parts.append(f"Given: {answer.get('given')}")
-                            if answer.get("formula"):
-                                parts.append(f"Formula: {answer.get('formula')}")
-                            if answer.get("substitution"):
-                                parts.append(f"Substitution: {answer.get('substitution')}")
-                            if answer.get("calculation"):
-                                parts.append(f"Calculation:\n{answer.get('calculation')}")
-                            if answer.get("final_answer"):
-                                parts.append(f"{answer.get('final_answer')}")
-                            return "\n".join(parts)
+    return StreamingResponse(
+        _stream_rendering(path, temporary=True),
+        media_type=DOWNLOAD_MEDIA_TYPES[format],
+        headers={
+            "Content-Disposition": f"attachment; filename=questions_set_{set_id}.{format}",
+            "Content-Length": str(size)
+        }
+    )
 
-                        # Original structured format (Math and other subjects)
-                        parts = []
-                        if answer.get("given"):
-                            parts.append(f"Given: {answer.get('given')}")
-                        if answer.get("definition"):
-                            parts.append(f"Definition: {answer.get('definition')}")
-                        if answer.get("formula"):
-                            parts.append(f"Formula/Theorem: {answer.get('formula')}")
-                        if answer.get("coefficients"):
-                            parts.append(f"Coefficients: {answer.get('coefficients')}")
-                        if answer.get("steps") and isinstance(answer.get("steps"), list):
-                            parts.append("Step-by-step Working:")
-                            for i, step in enumerate(answer.get("steps", []), 1):
-                                parts.append(f"Step {i}: {step}")
-                        if answer.get("function_values") and isinstance(answer.get("function_values"), list):
-                            parts.append("Function Values:")
-                            for value in answer.get("function_values", []):
-                                parts.append(f"  • {value}")
-                        if answer.get("final"):
-                            parts.append(f"Final Conclusion: {answer.get('final')}")
-                        return "\n".join(parts) if parts else ""
-                    return str(answer) if answer else ""
-                
-                # Helper function to escape HTML while preserving LaTeX
-                def escape_html_preserve_latex(text) -> str:
-                    """Escape HTML but preserve LaTeX expressions for KaTeX"""
-                    # Handle dict format
-                    if isinstance(text, dict):
-                        text = format_structured_answer(text, 0)
-                    
-                    if not text:
-                        return ""
-                    
-                    # Convert to string if not already
-                    text = str(text)
-                    
-                    import re
-                    
-                    # First, convert escaped LaTeX delimiters to single backslash for KaTeX
-                    text = text.replace('\\\\(', '\\(').replace('\\\\)', '\\)')
-                    text = text.replace('\\\\[', '\\[').replace('\\\\]', '\\]')
-                    
-                    # Pattern to match LaTeX expressions
-                    latex_pattern = r'\\(?:\([^)]*\)|\[[^\]]*\])'
-                    placeholders = {}
-                    placeholder_idx = 0
-                    
-                    def replace_latex(match):
-                        nonlocal placeholder_idx
-                        placeholder = f"__LATEX_{placeholder_idx}__"
-                        placeholders[placeholder] = match.group(0)
-                        placeholder_idx += 1
-                        return placeholder
-                    
-                    # Find and replace all LaTeX expressions with placeholders
-                    text_with_placeholders = re.sub(latex_pattern, replace_latex, text)
-                    
-                    # Escape HTML
-                    escaped = html_escape.escape(text_with_placeholders)
-                    
-                    # Restore LaTeX expressions
-                    for placeholder, latex_expr in placeholders.items():
-                        escaped = escaped.replace(placeholder, latex_expr)
-                    
-                    return escaped
-                
-                # Build HTML
-                html_parts = []
-                font_src = f"url(data:font/truetype;charset=utf-8;base64,{font_base64}) format('truetype')" if font_base64 else ""
-                
-                css_content = f"""
-                @page {{ size: A4; margin: 1in; }}
-                @font-face {{ font-family: '{font_name}'; src: {font_src}; font-weight: normal; font-style: normal; }}
-                body, * {{ font-family: '{font_name}' !important; }}
-                body {{ font-size: 12pt; line-height: 1.8; color: #000000; direction: {'rtl' if is_rtl_lang else 'ltr'}; margin: 0; padding: 0; }}
-                .title {{ font-size: 18pt; font-weight: 700; color: #000000; text-align: center; margin-bottom: 30pt; margin-top: 0; text-transform: uppercase; letter-spacing: 1pt; }}
-                .question-box {{ border: none; padding: 0; margin-bottom: 20pt; }}
-                .question-label {{ font-weight: 700; font-size: 12pt; margin-right: 8pt; display: inline; }}
-                .question-text {{ font-weight: 400; font-size: 12pt; margin-bottom: 12pt; line-height: 1.8; display: inline; }}
-                .options {{ margin: 8pt 0 8pt 20pt; padding: 0; list-style: none; }}
-                .option {{ margin: 6pt 0; font-size: 12pt; line-height: 1.8; }}
-                .option-label {{ font-weight: 400; margin-right: 8pt; }}
-                .marks {{ font-style: normal; font-size: 10pt; color: #000000; margin-top: 8pt; margin-left: 20pt; }}
-                .answer-box {{ border: none; padding: 0; margin-bottom: 20pt; margin-top: 10pt; }}
-                .answer-label {{ font-weight: 400; font-size: 12pt; color: #000000; margin-right: 8pt; display: inline; }}
-                .answer-text {{ font-weight: 400; font-size: 12pt; color: #000000; line-height: 1.8; display: inline; }}
-                """
-                
-                # Add KaTeX script for LaTeX rendering
-                katex_script = """
-                <link rel="stylesheet" href="https://cdn.jsdelivr.net/npm/katex@0.16.9/dist/katex.min.css" integrity="sha384-n8MVd4RsNIU0tAv4ct0nTaAbDJwPJzDEaqSD1odI+WdtXRGWt2kTvGFasHpSy3SV" crossorigin="anonymous">
-                <script defer src="https://cdn.jsdelivr.net/npm/katex@0.16.9/dist/katex.min.js" integrity="sha384-XjKyOOzG8j7q1aI2+fiEYHrTZ+8uBZ4mX16o8qEDmO1CsQrMdZengsGa4s9Q2x0M" crossorigin="anonymous"></script>
-                <script defer src="https://cdn.jsdelivr.net/npm/katex@0.16.9/dist/contrib/auto-render.min.js" integrity="sha384-+VBxd3r6XgURycqtZ117nYw44OOcIax56Z4dCRWbxyPt0Koah1uHoK0o4+/RRE05" crossorigin="anonymous"
-                    onload="renderMathInElement(document.body, {{
-                        delimiters: [
-                            {{left: '\\\\(', right: '\\\\)', display: false}},
-                            {{left: '\\\\[', right: '\\\\]', display: true}}
-                        ],
-                        throwOnError: false
-                    }});"></script>
-                """
-                
-                html_parts.append(f"""<!DOCTYPE html>
-<html lang="{target_language}" dir="{'rtl' if is_rtl_lang else 'ltr'}">
-<head>
-<meta charset="UTF-8">
-<style>{css_content}</style>
-{katex_script}
-</head>
-<body><div class="title">{html_escape.escape(normalize_text(title))}</div>""")
-                
-                for idx, q in enumerate(qna_json.get("questions", []), 1):
-                    question_text = normalize_text(q.get("question", ""))
-                    html_parts.append(f'<div class="question-box"><span class="question-label">Q{idx}.</span><div class="question-text">{escape_html_preserve_latex(question_text)}</div>')
-                    
-                    if q.get("type") == "mcq" and q.get("options"):
-                        html_parts.append('<div class="options">')
-                        for i, opt in enumerate(q.get("options", [])):
-                            opt = normalize_text(opt)
-                            option_label = chr(65 + i)
-                            html_parts.append(f'<div class="option"><span class="option-label">{option_label}.</span><span>{escape_html_preserve_latex(opt)}</span></div>')
-                        html_parts.append('</div>')
-                    
-                    if q.get("marks"):
-                        marks = normalize_text(str(q.get("marks")))
-                        html_parts.append(f'<div class="marks">Marks: {html_escape.escape(marks)}</div>')
-                    
-                    html_parts.append('</div>')
-                    
-                    if output_format in ["questions_answers", "answers_only"]:
-                        # Try correct_answer first, then answer field as fallback
-                        correct_answer = q.get("correct_answer") or q.get("answer")
-                        
-                        # Only add answer if it exists and is not empty
-                        if correct_answer and correct_answer != "N/A" and str(correct_answer).strip():
-                            answer_label = "✓ Answer:" if not is_rtl_lang else ":الإجابة ✓"
-                            answer_label = normalize_text(answer_label)
-                            
-                            # Convert structured answer to text if needed
-                            if isinstance(correct_answer, dict):
-                                answer_text = format_structured_answer(correct_answer, q.get("marks", 0))
-                            else:
-                                answer_text = normalize_text(str(correct_answer))
-                            
-                            # Only add if formatted answer is not empty
-                            if answer_text and answer_text.strip():
-                                html_parts.append(f'<div class="answer-box"><div class="answer-label">{html_escape.escape(answer_label)}</div><div class="answer-text">{escape_html_preserve_latex(answer_text)}</div></div>')
-                
-                html_parts.append('</body></html>')
-                html_string = '\n'.join(html_parts)
-                
-                print("🎭 Using Playwright for PDF generation (edited content)...")
-                content = await _generate_pdf_playwright_async(html_string, font_path, font_name)
-                print("✅ Playwright PDF generated successfully (edited)!")
-            except Exception as e:
-                print(f"⚠️  Playwright error: {e}, falling back to generate_pdf...")
-                import traceback
-                traceback.print_exc()
-                content = generate_pdf(qna_json, output_format, title, target_language)
-        else:
-            content = generate_pdf(qna_json, output_format, title, target_language)
-        media_type = "application/pdf"
-        filename = f"questions_set_{set_id}.pdf"
-    elif format == "docx":
-        content = generate_docx(qna_json, output_format, title)
-        media_type = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-        filename = f"questions_set_{set_id}.docx"
-    elif format == "txt":
-        content = generate_txt(qna_json, output_format, title)
-        media_type = "text/plain"
-        filename = f"questions_set_{set_id}.txt"
-    else:
+class _ZipChunks:
+    """Unseekable write target for zipfile: collects the archive bytes written since the last drain()"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+async def _stream_export_zip(jobs: list, output_format: str):
+    """
+    Yield a ZIP of (set_id, qna_json, target_language, format) jobs as the documents finish.
+    Up to BULK_EXPORT_CONCURRENCY documents are rendered (or found in the render cache)
+    at once. Each is rendered to a file and copied into the archive chunk by chunk; a job
+    holds its slot until its entry is written. The archive is handed out as it grows.
+    Failed documents are listed in errors.txt instead of aborting the download.
+    """
+    slots = asyncio.Semaphore(max(1, settings.BULK_EXPORT_CONCURRENCY))
+    temp_paths = set()  # Rendered but not yet written to the archive
+    
+    async def export_one(set_id: int, qna_json: dict, target_language: str, format: str):
+        await slots.acquire()  # Released by the writer below
+        name = f"questions_set_{set_id}.{format}"
+        try:
+            cache_key = render_key(set_id, qna_json, format, output_format, target_language)
+            cached = await run_in_storage_pool(render_cache.lookup, set_id, cache_key)
+            if cached is not None:
+                return name, cached[0], cached[1], None
+            path = render_cache.temp_path()
+            title = f"Generated Questions - Set {set_id}"
+            size, cacheable = await _render_document(qna_json, format, output_format, title, target_language, path)
+            cached_path = await run_in_storage_pool(render_cache.adopt, set_id, cache_key, path) if cacheable else None
+            if cached_path is None:
+                temp_paths.add(path)
+            return name, cached_path or path, size, None
+        except HTTPException as e:
+            return name, None, 0, e.detail
+        except asyncio.CancelledError:
+            if asyncio.current_task().cancelling():
+                raise  # The download was abandoned
+            # Cancelled underneath us (not by the download): one failed document, not a broken ZIP
+            print(f"⚠️ Export of {name} was cancelled")
+            return name, None, 0, "rendering failed"
+        except Exception as e:
+            print(f"⚠️ Export of {name} failed: {e}")
+            return name, None, 0, "rendering failed"
+
+    tasks = [asyncio.create_task(export_one(*job)) for job in jobs]
+    sink = _ZipChunks()
+    errors = []
+    try:
+        with zipfile.ZipFile(sink, "w") as archive:
+            for next_done in asyncio.as_completed(tasks):
+                name, path, size, error = await next_done
+                try:
+                    if error:
+                        errors.append(f"{name}: {error}")
+                    else:
+                        entry = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+                        entry.external_attr = 0o600 << 16
+                        # PDF and DOCX are compressed already
+                        entry.compress_type = zipfile.ZIP_DEFLATED if name.endswith(".txt") else zipfile.ZIP_STORED
+                        entry.file_size = size  # Known up front, so zipfile can pick ZIP64 for the entry
+                        with archive.open(entry, "w") as target:
+                            async for chunk in stream_file(path):
+                                target.write(chunk)
+                                yield sink.drain()
+                finally:
+                    slots.release()
+                    if path in temp_paths:
+                        temp_paths.discard(path)
+                        await run_in_storage_pool(render_cache.discard, path)
+                yield sink.drain()
+            if errors:
+                archive.writestr("errors.txt", "Could not export:\n" + "\n".join(errors) + "\n", compress_type=zipfile.ZIP_DEFLATED)
+        yield sink.drain()
+    finally:
+        # Client went away mid-download: stop the remaining renders and drop their files
+        for task in tasks:
+            task.cancel()
+        for path in temp_paths:
+            submit_to_storage_pool(render_cache.discard, path)
+
+@router.post("/sets/export")
+async def export_qna_sets(
+    export_request: QnASetExportRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Download several Q/A sets, each in one or more formats, as one ZIP.
+    The archive is streamed while the documents render; renderings already in the
+    download cache are reused.
+    """
+    
+    _require_premium(current_user)
+    
+    set_ids = list(dict.fromkeys(export_request.set_ids))
+    formats = list(dict.fromkeys(export_request.formats))
+    if not set_ids or not formats:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid format. Use pdf, docx, or txt"
+            detail="Select at least one Q/A set and one format"
+        )
+    if len(set_ids) > settings.BULK_EXPORT_MAX_SETS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.BULK_EXPORT_MAX_SETS} Q/A sets can be exported at once"
+        )
+    
+    qna_sets = {
+        qna_set.id: qna_set
+        for qna_set in db.query(QnASet).filter(
+            QnASet.id.in_(set_ids),
+            QnASet.user_id == current_user.id
+        ).all()
+    }
+    missing = [set_id for set_id in set_ids if set_id not in qna_sets]
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Q/A set not found: {', '.join(str(set_id) for set_id in missing)}"
         )
     
-    if isinstance(content, str):
-        content = content.encode('utf-8')
+    # Plain data only: the stream outlives this request's database session
+    jobs = [
+        (set_id, qna_sets[set_id].qna_json, qna_sets[set_id].settings_json.get("target_language", "english"), format)
+        for set_id in set_ids
+        for format in formats
+    ]
     
-    return Response(
-        content=content,
-        media_type=media_type,
+    from datetime import datetime
+    filename = f"question_sets_{datetime.utcnow():%Y%m%d_%H%M%S}.zip"
+    return StreamingResponse(
+        _stream_export_zip(jobs, export_request.output_format.value),
+        media_type="application/zip",
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
@@ -1646,7 +1381,7 @@ async def detect_content_language(
             # Combine text from all selected parts
             combined_text = []
             for part in sorted(parts, key=lambda p: p.part_number):
-                part_text = extract_text_from_pdf(part.file_path)
+                part_text = await get_extracted_text(part, KIND_PART)
                 if part_text:
                     combined_text.append(part_text)
             
@@ -1666,10 +1401,7 @@ async def detect_content_language(
                 )
             
             # Extract text sample
-            if upload.file_type.value == "pdf":
-                text_content = extract_text_from_pdf(upload.file_path)
-            else:
-                text_content = extract_text_from_image(upload.file_path)
+            text_content = await get_extracted_text(upload, KIND_UPLOAD)
         else:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -1,35 +1,26 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Response, Request
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, RedirectResponse
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.routers.dependencies import get_current_user, get_premium_user
 from app.models import User, Upload, FileType, UsageLog, PdfSplitPart
 from app.schemas import UploadResponse, PdfSplitPartResponse, PdfSplitResponse, PdfSplitPartRenameRequest
-from app.storage_service import save_file
+from app.blob_store import acquire_blob, find_split_donor, BlobTooLargeError
+from app.async_storage import run_in_storage_pool, submit_to_storage_pool, write_blob_stream, ensure_blob_stream, stream_file, stored_file_size, presigned_download_url
 # Image validation removed - only PDF uploads are supported
-from app.pdf_split_service import split_pdf_into_parts, get_part_preview
+from app.pdf_split_service import split_pdf_into_parts, get_part_preview, get_part_thumbnail, materialize_part, ensure_part_blob, warm_part_artifacts
+from app.extraction_service import schedule_extraction, copy_extraction, reuse_extraction, KIND_UPLOAD, KIND_PART, EXTRACTION_DONE
+from app.page_store import copy_page_texts, get_page_texts, missing_pages
+from app.upload_ingest import inspect_pdf_upload
 from app.config import settings
 from app.error_logger import log_api_error
 from datetime import datetime
-from PyPDF2 import PdfReader
-import io
 # Image processing imports removed - only PDF uploads are supported
 import os
 from typing import Tuple, List, Optional
 
 router = APIRouter()
 
-def count_pdf_pages(pdf_content: bytes) -> int:
-    """Count pages in PDF"""
-    try:
-        pdf_reader = PdfReader(io.BytesIO(pdf_content))
-        return len(pdf_reader.pages)
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Invalid PDF file: {str(e)}"
-        )
-
 # Image validation function removed - only PDF uploads are supported
 
 @router.post("", response_model=UploadResponse)
@@ -43,10 +34,6 @@ async def upload_file(
     """Upload PDF file with subject selection (Image uploads are not supported)"""
     
     try:
-        # Read file content
-        file_content = await file.read()
-        file_size = len(file_content)
-    
         # Determine file type - Only PDFs are supported
         content_type = file.content_type or ""
         file_ext = os.path.splitext(file.filename)[1].lower()
@@ -64,8 +51,12 @@ async def upload_file(
         # Validate size
         # For PDFs, allow up to MAX_BOOK_PDF_SIZE_MB for book splitting feature
         # Regular PDFs still limited to MAX_PDF_SIZE_MB, but larger ones can be split
+        # The file is already spooled to a temp file; hash, measure and count pages
+        # from it in chunks instead of reading the whole body into memory
         max_size = settings.MAX_BOOK_PDF_SIZE_MB * 1024 * 1024
-        if file_size > max_size:
+        try:
+            blob_sha256, file_size, pages = await run_in_storage_pool(inspect_pdf_upload, file.file, max_size)
+        except BlobTooLargeError:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"PDF size exceeds {settings.MAX_BOOK_PDF_SIZE_MB}MB limit. Maximum size for book splitting is {settings.MAX_BOOK_PDF_SIZE_MB}MB."
@@ -79,7 +70,6 @@ async def upload_file(
         )
         
         # PDF validation
-        pages = count_pdf_pages(file_content)
         max_pages = settings.MAX_PDF_PAGES if is_premium else settings.MAX_FREE_PDF_PAGES
         
         # Determine if PDF is large enough for splitting (>6MB)
@@ -110,8 +100,11 @@ async def upload_file(
         # Limits are enforced by question generation (10 questions/generation, 10 daily for free users)
         # No upload quota check needed - unlimited uploads for everyone
         
-        # Save file
-        file_path = save_file(file_content, current_user.id, file_type.value, file.filename)
+        # Save file (content-addressed: a file someone already uploaded is not stored again)
+        # Encrypted into storage in one streamed pass from the spooled file
+        blob_sha256, file_path, already_stored = await write_blob_stream(file.file, blob_sha256)
+        if already_stored:
+            print(f"♻️ Upload {file.filename} matches stored blob {blob_sha256[:12]} - reusing it")
         
         # Validate subject
         valid_subjects = ["mathematics", "english", "tamil", "science", "social_science", "general"]
@@ -134,9 +127,11 @@ async def upload_file(
             file_type=file_type,
             file_size=file_size,
             pages=pages if is_pdf else None,
-            subject=subject  # Store selected subject (user's choice takes precedence)
+            subject=subject,  # Store selected subject (user's choice takes precedence)
+            blob_sha256=blob_sha256
         )
         db.add(upload)
+        acquire_blob(db, blob_sha256, file_path, file_size)
         
         # Note: Quotas are now tracked by questions (700 total, 50 daily), not uploads
         # No need to decrement upload_quota_remaining or image_quota_remaining
@@ -152,6 +147,8 @@ async def upload_file(
         db.add(usage_log)
         
         db.commit()
+        # Referenced now: rewrite the blob if a purge removed the file write_blob_stream found
+        await ensure_blob_stream(file.file, blob_sha256)
         db.refresh(upload)
         
         usage_log.upload_id = upload.id
@@ -161,7 +158,14 @@ async def upload_file(
         if is_pdf and file_size > (6 * 1024 * 1024):
             # Mark as split-eligible (will be split on demand)
             # For now, just return the upload - splitting will be done via separate endpoint
+            # Text is extracted per part once the book is split
             pass
+        elif reuse_extraction(db, KIND_UPLOAD, upload):
+            # Same content was uploaded and extracted before
+            db.commit()
+        else:
+            # Start extracting text now so it is ready by the time the teacher clicks generate
+            schedule_extraction(KIND_UPLOAD, upload.id)
         
         # Prepare response with subject validation info
         response_data = {
@@ -174,6 +178,9 @@ async def upload_file(
             "subject": upload.subject.value if hasattr(upload.subject, 'value') else str(upload.subject),
             "detected_subject": detected_subject if detected_subject != "general" else None,
             "subject_mismatch_warning": subject_mismatch_warning,
+            "extraction_status": upload.extraction_status,
+            "extraction_error": upload.extraction_error,
+            "extraction_failed_pages": upload.extraction_failed_pages,
             "created_at": upload.created_at
         }
         
@@ -243,8 +250,10 @@ async def split_pdf(
     target_size_mb: float = 6.0
 ):
     """
-    Split a large PDF into smaller parts (~6MB each).
-    Only works for PDFs larger than 6MB.
+    Split a large PDF into chapter-aligned parts (outline, else detected headings,
+    else ~40 pages per part). Only works for PDFs larger than 6MB. Parts are page
+    ranges of the book's file, so splitting only writes their records
+    (target_size_mb is kept for API compatibility).
     """
     # Get the upload
     upload = db.query(Upload).filter(
@@ -281,13 +290,35 @@ async def split_pdf(
             detail="PDF is not large enough to split (must be >6MB)"
         )
     
+    # Same book already split for another upload: copy its parts instead of splitting again
+    donor = find_split_donor(db, upload)
+    if donor is not None:
+        try:
+            split_parts = _clone_split_parts(db, donor, upload)
+            return PdfSplitResponse(
+                parent_upload_id=upload.id,
+                total_parts=len(split_parts),
+                parts=[PdfSplitPartResponse.model_validate(p) for p in split_parts],
+                message=f"PDF successfully split into {len(split_parts)} parts"
+            )
+        except Exception as e:
+            db.rollback()
+            print(f"⚠️ Could not reuse split of upload {donor.id}, splitting again: {e}")
+    
     try:
-        # Split the PDF
-        parts_info = split_pdf_into_parts(
+        # Text already extracted for the whole book saves reading its text layer for heading detection
+        stored_texts = get_page_texts(db, upload.id, 1, upload.pages) if upload.pages else {}
+        if not upload.pages or missing_pages(stored_texts, 1, upload.pages):
+            stored_texts = None
+        
+        # Split the PDF (page ranges only; no part files are written)
+        parts_info = await run_in_storage_pool(
+            split_pdf_into_parts,
             upload.file_path,
-            current_user.id,
             upload.file_name,
-            target_size_mb
+            upload.pages,
+            upload.file_size,
+            stored_texts
         )
         
         # Create database records for each part
@@ -298,11 +329,13 @@ async def split_pdf(
                 user_id=current_user.id,
                 part_number=part_info["part_number"],
                 file_name=part_info["file_name"],
+                title=part_info["title"],
                 file_path=part_info["file_path"],
                 file_size=part_info["file_size"],
                 start_page=part_info["start_page"],
                 end_page=part_info["end_page"],
-                total_pages=part_info["total_pages"]
+                total_pages=part_info["total_pages"],
+                is_virtual=part_info["is_virtual"]
             )
             db.add(split_part)
             split_parts.append(split_part)
@@ -315,6 +348,13 @@ async def split_pdf(
         for part in split_parts:
             db.refresh(part)
         
+        # Extract text for every part in the background
+        for part in split_parts:
+            schedule_extraction(KIND_PART, part.id)
+        
+        # Build previews and thumbnails now so opening the part list only reads stored files
+        submit_to_storage_pool(warm_part_artifacts, [_part_artifact_source(part) for part in split_parts])
+        
         return PdfSplitResponse(
             parent_upload_id=upload.id,
             total_parts=len(split_parts),
@@ -332,6 +372,55 @@ async def split_pdf(
             detail=f"Failed to split PDF: {str(e)}"
         )
 
+def _clone_split_parts(db: Session, donor: Upload, upload: Upload) -> List[PdfSplitPart]:
+    """
+    Give upload its own copies of the split parts of donor (an upload of the same content).
+    Virtual parts point at upload's own file (the same blob), built part files are shared
+    blobs, finished extractions and stored page text are copied, and parts still waiting
+    for text are queued.
+    """
+    donor_parts = db.query(PdfSplitPart).filter(
+        PdfSplitPart.parent_upload_id == donor.id
+    ).order_by(PdfSplitPart.part_number).all()
+    if not donor_parts:
+        raise Exception("Donor upload has no split parts")
+    
+    split_parts = []
+    for donor_part in donor_parts:
+        split_part = PdfSplitPart(
+            parent_upload_id=upload.id,
+            user_id=upload.user_id,
+            part_number=donor_part.part_number,
+            file_name=donor_part.file_name,
+            title=donor_part.title,
+            file_path=upload.file_path if donor_part.is_virtual else donor_part.file_path,
+            file_size=donor_part.file_size,
+            start_page=donor_part.start_page,
+            end_page=donor_part.end_page,
+            total_pages=donor_part.total_pages,
+            blob_sha256=donor_part.blob_sha256,
+            is_virtual=donor_part.is_virtual
+        )
+        if donor_part.extraction_status == EXTRACTION_DONE:
+            copy_extraction(donor_part, split_part)
+        db.add(split_part)
+        if donor_part.blob_sha256:
+            acquire_blob(db, donor_part.blob_sha256, donor_part.file_path, donor_part.file_size)
+        split_parts.append(split_part)
+    db.flush()
+    
+    part_id_map = {donor_part.id: split_part.id for donor_part, split_part in zip(donor_parts, split_parts)}
+    copy_page_texts(db, donor.id, upload.id, part_id_map=part_id_map)
+    upload.is_split = True
+    db.commit()
+    
+    for part in split_parts:
+        db.refresh(part)
+        if part.extraction_status != EXTRACTION_DONE:
+            schedule_extraction(KIND_PART, part.id)
+    print(f"♻️ Reused {len(split_parts)} split part(s) of upload {donor.id} for upload {upload.id}")
+    return split_parts
+
 @router.get("/{upload_id}/split-parts", response_model=List[PdfSplitPartResponse])
 async def get_split_parts(
     upload_id: int,
@@ -397,16 +486,30 @@ async def rename_split_part(
     
     return PdfSplitPartResponse.model_validate(part)
 
-@router.get("/split-parts/{part_id}/preview")
-async def preview_split_part(
-    part_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """Get preview (first 5 pages) of a split part"""
+def _part_artifact_source(part: PdfSplitPart) -> Tuple[str, Optional[str], int, int]:
+    """
+    (file_path, blob_sha256, start_page, preview_pages) that a part's preview and thumbnail
+    are built from: the book's file for virtual parts, the part's own file otherwise
+    """
+    if part.is_virtual:
+        return part.file_path, part.parent_upload.blob_sha256, part.start_page, min(settings.PART_PREVIEW_PAGES, part.total_pages)
+    return part.file_path, part.blob_sha256, 1, settings.PART_PREVIEW_PAGES
+
+def _artifact_headers(kind: str, blob_sha256: Optional[str], start_page: int, variant: int) -> dict:
+    """Cache headers for a part preview/thumbnail; artifacts of a blob never change, so they get an ETag"""
+    headers = {"Cache-Control": f"private, max-age={settings.PART_ARTIFACT_MAX_AGE_SECONDS}"}
+    if blob_sha256:
+        headers["ETag"] = f'"{kind}-{blob_sha256[:24]}-{start_page}-{variant}"'
+    return headers
+
+def _not_modified(request: Request, headers: dict) -> bool:
+    etag = headers.get("ETag")
+    return etag is not None and etag in request.headers.get("if-none-match", "")
+
+def _get_user_part(db: Session, part_id: int, user_id: int) -> PdfSplitPart:
     part = db.query(PdfSplitPart).filter(
         PdfSplitPart.id == part_id,
-        PdfSplitPart.user_id == current_user.id
+        PdfSplitPart.user_id == user_id
     ).first()
     
     if not part:
@@ -414,14 +517,30 @@ async def preview_split_part(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Split part not found"
         )
+    return part
+
+@router.get("/split-parts/{part_id}/preview")
+async def preview_split_part(
+    part_id: int,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get preview (first 5 pages) of a split part (built once, then served from storage)"""
+    part = _get_user_part(db, part_id, current_user.id)
+    file_path, blob_sha256, start_page, preview_pages = _part_artifact_source(part)
+    headers = _artifact_headers("preview", blob_sha256, start_page, preview_pages)
+    if _not_modified(request, headers):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
     
     try:
-        preview_pdf = get_part_preview(part.file_path, max_pages=5)
+        preview_pdf = await run_in_storage_pool(get_part_preview, file_path, preview_pages, blob_sha256, start_page)
         return Response(
             content=preview_pdf,
             media_type="application/pdf",
             headers={
-                "Content-Disposition": f'inline; filename="preview_{part.file_name}"'
+                "Content-Disposition": f'inline; filename="preview_{part.file_name}"',
+                **headers
             }
         )
     except Exception as e:
@@ -430,6 +549,94 @@ async def preview_split_part(
             detail=f"Failed to generate preview: {str(e)}"
         )
 
+@router.get("/split-parts/{part_id}/thumbnail")
+async def thumbnail_split_part(
+    part_id: int,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """First-page JPEG thumbnail of a split part (built once, then served from storage)"""
+    part = _get_user_part(db, part_id, current_user.id)
+    file_path, blob_sha256, start_page, _ = _part_artifact_source(part)
+    headers = _artifact_headers("thumb", blob_sha256, start_page, settings.PART_THUMBNAIL_WIDTH)
+    if _not_modified(request, headers):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    try:
+        thumbnail = await run_in_storage_pool(get_part_thumbnail, file_path, blob_sha256, start_page)
+        return Response(content=thumbnail, media_type="image/jpeg", headers=headers)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to generate thumbnail: {str(e)}"
+        )
+
+async def _materialize_part(db: Session, part: PdfSplitPart) -> None:
+    """
+    Build the PDF of a virtual part on first download and keep it as the part's blob.
+    Later downloads (and other parts with the same pages) reuse the stored file.
+    """
+    if not part.is_virtual:
+        return
+    source_path, start_page, end_page = part.file_path, part.start_page, part.end_page
+    blob_sha256, file_path, file_size = await run_in_storage_pool(
+        materialize_part, source_path, start_page, end_page
+    )
+    # Conditional update: only the first of concurrent downloads records the blob reference
+    updated = db.query(PdfSplitPart).filter(
+        PdfSplitPart.id == part.id,
+        PdfSplitPart.is_virtual == True
+    ).update({
+        PdfSplitPart.file_path: file_path,
+        PdfSplitPart.file_size: file_size,
+        PdfSplitPart.blob_sha256: blob_sha256,
+        PdfSplitPart.is_virtual: False
+    }, synchronize_session=False)
+    if updated:
+        acquire_blob(db, blob_sha256, file_path, file_size)
+    db.commit()
+    if updated:
+        # Referenced now: rebuild the blob if a purge removed the file materialize_part found
+        await run_in_storage_pool(ensure_part_blob, blob_sha256, source_path, start_page, end_page)
+    db.refresh(part)
+
+@router.get("/split-parts/{part_id}/pdf")
+async def get_split_part_pdf(
+    part_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Download the PDF of a split part (redirects to object storage when presigned downloads are enabled)"""
+    part = db.query(PdfSplitPart).filter(
+        PdfSplitPart.id == part_id,
+        PdfSplitPart.user_id == current_user.id
+    ).first()
+    
+    if not part:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Split part not found"
+        )
+    
+    file_name = part.custom_name or part.file_name
+    if not file_name.lower().endswith(".pdf"):
+        file_name = f"{file_name}.pdf"
+    
+    await _materialize_part(db, part)
+    presigned_url = await presigned_download_url(part.file_path, file_name, "application/pdf")
+    if presigned_url:
+        return RedirectResponse(presigned_url, status_code=status.HTTP_307_TEMPORARY_REDIRECT)
+    
+    return StreamingResponse(
+        stream_file(part.file_path),
+        media_type="application/pdf",
+        headers={
+            "Content-Disposition": f'attachment; filename="{file_name}"',
+            "Content-Length": str(await stored_file_size(part.file_path))
+        }
+    )
+
 @router.get("/split-parts/{part_id}/download")
 async def download_split_part(
     part_id: int,
@@ -448,12 +655,10 @@ async def download_split_part(
             detail="Split part not found"
         )
     
+    await _materialize_part(db, part)
+    
     # Create a temporary Upload record for this part so it can be used with QnA generation
     # This allows the part to work seamlessly with existing QnA endpoints
-    from app.storage_service import read_file
-    
-    part_content = read_file(part.file_path)
-    
     # Create upload record for this part
     part_upload = Upload(
         user_id=current_user.id,
@@ -462,11 +667,28 @@ async def download_split_part(
         file_type=FileType.PDF,
         file_size=part.file_size,
         pages=part.total_pages,
-        is_deleted=False
+        is_deleted=False,
+        blob_sha256=part.blob_sha256
     )
     db.add(part_upload)
+    # Same file as the part: reuse its extracted text instead of extracting again
+    if part.extraction_status == EXTRACTION_DONE:
+        copy_extraction(part, part_upload)
+        db.flush()
+        # The part's pages are stored against the book with book page numbers; the upload's start at 1
+        copy_page_texts(
+            db, part.parent_upload_id, part_upload.id,
+            source_start=part.start_page,
+            source_end=part.end_page,
+            page_offset=1 - part.start_page
+        )
+    if part.blob_sha256:
+        acquire_blob(db, part.blob_sha256, part.file_path, part.file_size)
     db.commit()
     db.refresh(part_upload)
     
+    if part_upload.extraction_status != EXTRACTION_DONE:
+        schedule_extraction(KIND_UPLOAD, part_upload.id)
+    
     return UploadResponse.model_validate(part_upload)
 
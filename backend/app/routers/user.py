@@ -6,6 +6,7 @@ from app.models import User, PremiumRequest, PremiumStatus, Upload, UsageLog, Fi
 from app.schemas import UserResponse, PremiumRequestCreate, PremiumRequestResponse, UserProfileResponse
 from app.config import settings
 from app.generation_tracker import get_daily_generation_stats
+from app.question_quota import get_question_usage
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional
 
@@ -152,51 +153,8 @@ async def get_user_profile(
     # Get daily generation stats
     generation_stats = get_daily_generation_stats(db, current_user.id)
     
-    # Calculate total questions based on actual questions generated from QnASet records
-    from app.models import QnASet
-    
-    # Count total questions from QnASets (after reset timestamp if set)
-    if current_user.total_questions_reset_at:
-        reset_timestamp_total = current_user.total_questions_reset_at
-        qna_sets = db.query(QnASet).filter(
-            QnASet.user_id == current_user.id,
-            QnASet.created_at >= reset_timestamp_total
-        ).all()
-    else:
-        qna_sets = db.query(QnASet).filter(
-            QnASet.user_id == current_user.id
-        ).all()
-    
-    questions_used = 0
-    for qna_set in qna_sets:
-        if qna_set.qna_json and isinstance(qna_set.qna_json, dict):
-            questions = qna_set.qna_json.get("questions", [])
-            if isinstance(questions, list):
-                questions_used += len(questions)
-    
-    # Count daily questions (questions generated after reset timestamp)
-    today_start = datetime.combine(now.date(), datetime.min.time())
-    # If reset timestamp is set and is today or later, use it
-    if current_user.daily_questions_reset_at:
-        if current_user.daily_questions_reset_at.date() >= now.date():
-            reset_timestamp = current_user.daily_questions_reset_at
-        else:
-            # Reset timestamp is from a previous day, use today's start instead
-            reset_timestamp = today_start
-    else:
-        reset_timestamp = today_start
-    
-    daily_qna_sets = db.query(QnASet).filter(
-        QnASet.user_id == current_user.id,
-        QnASet.created_at >= reset_timestamp
-    ).all()
-    
-    daily_questions_used = 0
-    for qna_set in daily_qna_sets:
-        if qna_set.qna_json and isinstance(qna_set.qna_json, dict):
-            questions = qna_set.qna_json.get("questions", [])
-            if isinstance(questions, list):
-                daily_questions_used += len(questions)
+    # Questions used since the admin resets (materialized counters, see app/question_quota.py)
+    questions_used, daily_questions_used = get_question_usage(current_user)
     
     # Set limits based on premium status - use user's actual limit fields (can be customized by admin)
     if is_premium:
@@ -68,6 +68,9 @@ class UploadResponse(BaseModel):
     is_split: Optional[bool] = False
     detected_subject: Optional[str] = None  # Subject detected from content (for validation)
     subject_mismatch_warning: Optional[str] = None  # Warning message if mismatch detected
+    extraction_status: Optional[str] = None  # Background text extraction: pending, running, done, failed
+    extraction_error: Optional[str] = None
+    extraction_failed_pages: Optional[List[int]] = None
     created_at: datetime
     
     class Config:
@@ -79,11 +82,15 @@ class PdfSplitPartResponse(BaseModel):
     parent_upload_id: int
     part_number: int
     custom_name: Optional[str]
+    title: Optional[str] = None  # Chapter title found when splitting
     file_name: str
     file_size: int
     start_page: int
     end_page: int
     total_pages: int
+    extraction_status: Optional[str] = None  # Background text extraction: pending, running, done, failed
+    extraction_error: Optional[str] = None
+    extraction_failed_pages: Optional[List[int]] = None
     created_at: datetime
     
     class Config:
@@ -109,6 +116,8 @@ class DistributionItem(BaseModel):
 class QnAGenerateRequest(BaseModel):
     upload_id: Optional[int] = None  # Optional: can use part_ids instead
     part_ids: Optional[List[int]] = None  # Optional: list of split part IDs for multi-select
+    start_page: Optional[int] = None  # Optional: generate from a page range of upload_id (1-indexed, inclusive)
+    end_page: Optional[int] = None
     difficulty: DifficultyLevel
     qna_type: QnAType
     num_questions: int
@@ -129,6 +138,11 @@ class QnASetResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class QnASetExportRequest(BaseModel):
+    set_ids: List[int]
+    formats: List[Literal["pdf", "docx", "txt"]] = ["pdf"]  # Every set is exported in each format
+    output_format: OutputFormat = OutputFormat.QUESTIONS_ANSWERS
+
 # Premium Request Schemas
 class PremiumRequestCreate(BaseModel):
     pass
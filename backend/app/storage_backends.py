@@ -0,0 +1,403 @@
+"""
+Storage Backends
+Where stored file bytes live. storage_service handles naming, encryption and caching;
+a backend only moves (already encrypted) bytes.
+
+A stored file is identified by its location string, which is what Upload.file_path
+and PdfSplitPart.file_path hold:
+- local filesystem:  a path under settings.STORAGE_PATH (as before)
+- S3-compatible:     s3://<bucket>/<key>
+
+The backend for new files is chosen with settings.STORAGE_BACKEND ("local" or "s3").
+Reads dispatch on the location itself, so files written before switching backends
+keep working.
+
+The S3 driver works with AWS S3 and with S3-compatible servers (MinIO, Ceph, moto)
+through settings.S3_ENDPOINT_URL; see test_s3_backend.py. boto3 is only needed when
+it is used.
+"""
+import io
+import os
+import uuid
+from pathlib import Path
+from typing import BinaryIO, Optional, Tuple
+
+try:
+    import boto3
+    from botocore.config import Config as BotoConfig
+    from botocore.exceptions import ClientError
+    BOTO3_AVAILABLE = True
+except ImportError:
+    boto3 = None
+    BotoConfig = None
+    ClientError = Exception
+    BOTO3_AVAILABLE = False
+
+from app.config import settings
+
+S3_SCHEME = "s3://"
+
+
+class StorageBackend:
+    """Byte storage for stored files, addressed by location strings"""
+    name = "base"
+
+    def location_for(self, key: str) -> str:
+        """Location of a storage key such as "blobs/ab/cd/<sha256>" """
+        raise NotImplementedError
+
+    def open_write(self, location: str) -> BinaryIO:
+        """
+        Writable binary stream. The object only becomes visible when the stream is
+        closed (readers never see a partial file); abort() discards it.
+        """
+        raise NotImplementedError
+
+    def open_read(self, location: str) -> BinaryIO:
+        """Seekable binary stream of the stored bytes"""
+        raise NotImplementedError
+
+    def read_range(self, location: str, offset: int, length: int) -> bytes:
+        with self.open_read(location) as f:
+            f.seek(offset)
+            return f.read(length)
+
+    def exists(self, location: str) -> bool:
+        raise NotImplementedError
+
+    def stat(self, location: str) -> Optional[Tuple]:
+        """Version stamp that changes whenever the object is rewritten (None if missing)"""
+        raise NotImplementedError
+
+    def delete(self, location: str) -> None:
+        raise NotImplementedError
+
+    def delete_prefix(self, location: str) -> None:
+        """Delete everything stored under a directory-like location"""
+        raise NotImplementedError
+
+    def presigned_url(self, location: str, filename: str, media_type: str, expires_in: int) -> Optional[str]:
+        """Time-limited URL clients can download from directly (None if unsupported)"""
+        return None
+
+
+# ==================== LOCAL FILESYSTEM ====================
+
+class _AtomicLocalWriter(io.FileIO):
+    """Writes to a temp file next to the target and renames it into place on close"""
+
+    def __init__(self, path: Path):
+        self._target = path
+        self._tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        self._aborted = False
+        super().__init__(str(self._tmp_path), "wb")
+
+    def abort(self) -> None:
+        self._aborted = True
+        self.close()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        super().close()
+        if self._aborted:
+            self._tmp_path.unlink(missing_ok=True)
+        else:
+            os.replace(self._tmp_path, self._target)
+
+
+class LocalStorageBackend(StorageBackend):
+    name = "local"
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = Path(root or settings.STORAGE_PATH)
+
+    def location_for(self, key: str) -> str:
+        return str(self.root / key)
+
+    def open_write(self, location: str) -> BinaryIO:
+        path = Path(location)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if os.name != 'nt':
+            os.chmod(path.parent, 0o700)
+        return _AtomicLocalWriter(path)
+
+    def open_read(self, location: str) -> BinaryIO:
+        return open(location, "rb")
+
+    def exists(self, location: str) -> bool:
+        return Path(location).is_file()
+
+    def stat(self, location: str) -> Optional[Tuple]:
+        try:
+            st = os.stat(location)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def delete(self, location: str) -> None:
+        Path(location).unlink(missing_ok=True)
+
+    def delete_prefix(self, location: str) -> None:
+        import shutil
+        shutil.rmtree(location, ignore_errors=True)
+
+
+# ==================== S3-COMPATIBLE ====================
+
+def parse_s3_location(location: str) -> Tuple[str, str]:
+    bucket, _, key = location[len(S3_SCHEME):].partition("/")
+    return bucket, key
+
+
+class _S3MultipartWriter(io.RawIOBase):
+    """
+    Streams bytes to S3 as a multipart upload, holding at most one part in memory.
+    Small objects (under one part) are sent with a single PutObject on close.
+    Nothing is visible until close() completes the upload; abort() cancels it.
+    """
+
+    def __init__(self, client, bucket: str, key: str, part_size: int):
+        super().__init__()
+        self._client = client
+        self._bucket = bucket
+        self._key = key
+        self._part_size = max(part_size, 5 * 1024 * 1024)  # S3 minimum for all but the last part
+        self._buffer = bytearray()
+        self._upload_id: Optional[str] = None
+        self._parts = []
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
+
+    def write(self, data) -> int:
+        self._buffer += data
+        while len(self._buffer) >= self._part_size:
+            self._upload_part(bytes(self._buffer[:self._part_size]))
+            del self._buffer[:self._part_size]
+        return len(data)
+
+    def _upload_part(self, data: bytes) -> None:
+        if self._upload_id is None:
+            response = self._client.create_multipart_upload(Bucket=self._bucket, Key=self._key)
+            self._upload_id = response["UploadId"]
+        part_number = len(self._parts) + 1
+        response = self._client.upload_part(
+            Bucket=self._bucket, Key=self._key, UploadId=self._upload_id,
+            PartNumber=part_number, Body=data
+        )
+        self._parts.append({"PartNumber": part_number, "ETag": response["ETag"]})
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        try:
+            if self._upload_id is None:
+                self._client.put_object(Bucket=self._bucket, Key=self._key, Body=bytes(self._buffer))
+            else:
+                if self._buffer:
+                    self._upload_part(bytes(self._buffer))
+                self._client.complete_multipart_upload(
+                    Bucket=self._bucket, Key=self._key, UploadId=self._upload_id,
+                    MultipartUpload={"Parts": self._parts}
+                )
+        except Exception:
+            self.abort()
+            raise
+        finally:
+            self._buffer = bytearray()
+            super().close()
+
+    def abort(self) -> None:
+        if self._upload_id is not None:
+            try:
+                self._client.abort_multipart_upload(Bucket=self._bucket, Key=self._key, UploadId=self._upload_id)
+            except Exception as e:
+                print(f"⚠️ Could not abort multipart upload of {self._key}: {e}")
+            self._upload_id = None
+        self._buffer = bytearray()
+        if not self.closed:
+            super().close()
+
+
+class _S3RangeReader(io.RawIOBase):
+    """Seekable view of an S3 object; every read is a ranged GET of just the requested bytes"""
+
+    def __init__(self, client, bucket: str, key: str):
+        super().__init__()
+        self._client = client
+        self._bucket = bucket
+        self._key = key
+        self.size = client.head_object(Bucket=bucket, Key=key)["ContentLength"]
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if position < 0:
+            raise ValueError("Negative seek position")
+        self._position = position
+        return position
+
+    def readinto(self, buffer) -> int:
+        if self._position >= self.size or len(buffer) == 0:
+            return 0
+        end = min(self.size, self._position + len(buffer)) - 1
+        response = self._client.get_object(Bucket=self._bucket, Key=self._key, Range=f"bytes={self._position}-{end}")
+        data = response["Body"].read()
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+
+class S3StorageBackend(StorageBackend):
+    name = "s3"
+
+    def __init__(
+        self,
+        bucket: Optional[str] = None,
+        prefix: Optional[str] = None,
+        endpoint_url: Optional[str] = None,
+        region: Optional[str] = None,
+        access_key: Optional[str] = None,
+        secret_key: Optional[str] = None
+    ):
+        if not BOTO3_AVAILABLE:
+            raise Exception("boto3 is not installed. Install it with: pip install boto3")
+        self.bucket = bucket or settings.S3_BUCKET
+        if not self.bucket:
+            raise Exception("S3_BUCKET must be set to use the s3 storage backend")
+        self.prefix = (prefix if prefix is not None else settings.S3_PREFIX).strip("/")
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url or settings.S3_ENDPOINT_URL or None,
+            region_name=region or settings.S3_REGION or None,
+            aws_access_key_id=access_key or settings.S3_ACCESS_KEY_ID or None,
+            aws_secret_access_key=secret_key or settings.S3_SECRET_ACCESS_KEY or None,
+            # Path-style addressing works with MinIO and other S3-compatible servers
+            config=BotoConfig(s3={"addressing_style": "path"}, retries={"max_attempts": 5, "mode": "standard"})
+        )
+
+    def location_for(self, key: str) -> str:
+        full_key = f"{self.prefix}/{key}" if self.prefix else key
+        return f"{S3_SCHEME}{self.bucket}/{full_key}"
+
+    def open_write(self, location: str) -> BinaryIO:
+        bucket, key = parse_s3_location(location)
+        return _S3MultipartWriter(self.client, bucket, key, settings.S3_MULTIPART_CHUNK_SIZE)
+
+    def open_read(self, location: str) -> BinaryIO:
+        bucket, key = parse_s3_location(location)
+        reader = _S3RangeReader(self.client, bucket, key)
+        # Buffer reads so small sequential reads (PyPDF2, chunk decryption) batch into large ranged GETs
+        return io.BufferedReader(reader, buffer_size=settings.S3_READ_BUFFER_SIZE)
+
+    def read_range(self, location: str, offset: int, length: int) -> bytes:
+        if length <= 0:
+            return b""
+        bucket, key = parse_s3_location(location)
+        try:
+            response = self.client.get_object(Bucket=bucket, Key=key, Range=f"bytes={offset}-{offset + length - 1}")
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") == "InvalidRange":
+                return b""
+            raise
+        return response["Body"].read()
+
+    def _head(self, location: str) -> Optional[dict]:
+        bucket, key = parse_s3_location(location)
+        try:
+            return self.client.head_object(Bucket=bucket, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def exists(self, location: str) -> bool:
+        return self._head(location) is not None
+
+    def stat(self, location: str) -> Optional[Tuple]:
+        head = self._head(location)
+        if head is None:
+            return None
+        return head.get("ETag"), head.get("ContentLength")
+
+    def delete(self, location: str) -> None:
+        bucket, key = parse_s3_location(location)
+        self.client.delete_object(Bucket=bucket, Key=key)
+
+    def delete_prefix(self, location: str) -> None:
+        bucket, key = parse_s3_location(location)
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=bucket, Prefix=key.rstrip("/") + "/"):
+            objects = [{"Key": obj["Key"]} for obj in page.get("Contents", [])]
+            if objects:
+                self.client.delete_objects(Bucket=bucket, Delete={"Objects": objects, "Quiet": True})
+
+    def presigned_url(self, location: str, filename: str, media_type: str, expires_in: int) -> Optional[str]:
+        bucket, key = parse_s3_location(location)
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={
+                "Bucket": bucket,
+                "Key": key,
+                "ResponseContentType": media_type,
+                "ResponseContentDisposition": f'inline; filename="{filename}"'
+            },
+            ExpiresIn=expires_in
+        )
+
+
+_local_backend: Optional[LocalStorageBackend] = None
+_s3_backend: Optional[S3StorageBackend] = None
+
+
+def _get_local_backend() -> LocalStorageBackend:
+    global _local_backend
+    if _local_backend is None:
+        _local_backend = LocalStorageBackend()
+    return _local_backend
+
+
+def _get_s3_backend() -> S3StorageBackend:
+    global _s3_backend
+    if _s3_backend is None:
+        _s3_backend = S3StorageBackend()
+        print(f"🪣 S3 storage backend: bucket={_s3_backend.bucket} endpoint={settings.S3_ENDPOINT_URL or 'AWS'}")
+    return _s3_backend
+
+
+def get_storage_backend() -> StorageBackend:
+    """Backend that new files are written to (settings.STORAGE_BACKEND)"""
+    if settings.STORAGE_BACKEND == "s3":
+        return _get_s3_backend()
+    return _get_local_backend()
+
+
+def backend_for_location(location: str) -> StorageBackend:
+    """Backend holding an existing stored file"""
+    if location.startswith(S3_SCHEME):
+        return _get_s3_backend()
+    return _get_local_backend()
+
+
+def is_local_location(location: str) -> bool:
+    return not location.startswith(S3_SCHEME)
@@ -1,19 +1,39 @@
+import io
 import os
+import threading
+import time
 import uuid
 import shutil
+from collections import OrderedDict
 from pathlib import Path
-from typing import Optional
+from typing import BinaryIO, Dict, Iterator, Optional, Tuple
 from app.config import settings
-from cryptography.fernet import Fernet
+from app.chunked_encryption import (
+    DecryptedFileReader,
+    EncryptedFileWriter,
+    MAGIC,
+    derive_chunk_key,
+    has_chunked_header,
+)
+from app.storage_backends import (
+    backend_for_location,
+    get_storage_backend,
+    is_local_location,
+)
+from cryptography.fernet import Fernet, InvalidToken
 import base64
 import hashlib
 
 # Generate encryption key (in production, store securely)
 _encryption_key = None
+_chunk_key_cache = None
 
 def get_encryption_key():
     """Get or generate encryption key"""
     global _encryption_key
+    if _encryption_key is None and settings.STORAGE_ENCRYPTION_KEY:
+        # Shared key from the environment, so every API node can read every file
+        _encryption_key = settings.STORAGE_ENCRYPTION_KEY.encode()
     if _encryption_key is None:
         # In production, load from secure storage
         key_file = Path(settings.STORAGE_PATH) / ".encryption_key"
@@ -40,29 +60,66 @@ def ensure_storage_path(user_id: int, file_type: str):
     
     return user_path
 
+def _chunk_key() -> bytes:
+    """AES key for the chunked storage format (derived from the Fernet key)"""
+    global _chunk_key_cache
+    if _chunk_key_cache is None:
+        _chunk_key_cache = derive_chunk_key(get_encryption_key())
+    return _chunk_key_cache
+
+def storage_location(key: str) -> str:
+    """Location (file_path value) of a storage key such as "blobs/ab/cd/<sha256>" on the active backend"""
+    return get_storage_backend().location_for(key)
+
+def _new_file_path(user_id: int, file_type: str, original_filename: str) -> str:
+    # Generate UUID filename
+    file_ext = Path(original_filename).suffix
+    uuid_filename = f"{uuid.uuid4()}{file_ext}"
+    if get_storage_backend().name == "local":
+        return str(ensure_storage_path(user_id, file_type) / uuid_filename)
+    return storage_location(f"uploads/user_{user_id}/{file_type}/{uuid_filename}")
+
+def write_stream(source: BinaryIO, file_path: str, encrypt: Optional[bool] = None) -> int:
+    """
+    Copy source to a stored file in chunks, encrypting on the way if enabled. Returns plaintext size.
+    The file appears atomically when complete; nothing is left behind if reading or writing fails.
+    """
+    chunk_size = settings.STORAGE_CHUNK_SIZE
+    if encrypt is None:
+        encrypt = settings.ENCRYPT_STORAGE
+    sink = backend_for_location(str(file_path)).open_write(str(file_path))
+    writer = EncryptedFileWriter(sink, _chunk_key(), chunk_size) if encrypt else sink
+    size = 0
+    try:
+        while True:
+            data = source.read(chunk_size)
+            if not data:
+                break
+            writer.write(data)
+            size += len(data)
+        writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+    return size
+
 def save_file(file_content: bytes, user_id: int, file_type: str, original_filename: str) -> str:
     """
     Save file with UUID name and return the file path
+    Encrypted in a single pass (plaintext never touches the disk)
     """
-    storage_dir = ensure_storage_path(user_id, file_type)
-    
-    # Generate UUID filename
-    file_ext = Path(original_filename).suffix
-    uuid_filename = f"{uuid.uuid4()}{file_ext}"
-    file_path = storage_dir / uuid_filename
-    
-    # Save file
-    with open(file_path, "wb") as f:
-        f.write(file_content)
-    
-    # Encrypt if enabled
-    if settings.ENCRYPT_STORAGE:
-        encrypt_file(file_path)
-    
-    return str(file_path)
+    file_path = _new_file_path(user_id, file_type, original_filename)
+    write_stream(io.BytesIO(file_content), file_path)
+    return file_path
+
+def save_stream(source: BinaryIO, user_id: int, file_type: str, original_filename: str) -> str:
+    """Like save_file, but reads from a file object so only one chunk is held in memory"""
+    file_path = _new_file_path(user_id, file_type, original_filename)
+    write_stream(source, file_path)
+    return file_path
 
 def encrypt_file(file_path: Path):
-    """Encrypt file using Fernet"""
+    """Encrypt file using Fernet (legacy format; new files use the chunked format)"""
     try:
         key = get_encryption_key()
         fernet = Fernet(key)
@@ -78,36 +135,277 @@ def encrypt_file(file_path: Path):
         print(f"Encryption error: {e}")
 
 def decrypt_file(file_path: Path) -> bytes:
-    """Decrypt file using Fernet"""
+    """Decrypt a legacy whole-file Fernet file"""
+    with _open_raw(str(file_path)) as f:
+        encrypted_data = f.read()
     try:
         key = get_encryption_key()
         fernet = Fernet(key)
         
-        with open(file_path, "rb") as f:
-            encrypted_data = f.read()
-        
         return fernet.decrypt(encrypted_data)
     except Exception as e:
         print(f"Decryption error: {e}")
-        # If decryption fails, try reading as plain file
-        with open(file_path, "rb") as f:
-            return f.read()
+        # If decryption fails, use the file as plain data
+        return encrypted_data
+
+def _open_raw(file_path: str) -> BinaryIO:
+    """Stored bytes as written (still encrypted)"""
+    return backend_for_location(file_path).open_read(file_path)
+
+def is_chunked_location(file_path: str) -> bool:
+    """True if the stored file uses the chunked encryption format"""
+    try:
+        return has_chunked_header(backend_for_location(file_path).read_range(file_path, 0, len(MAGIC)))
+    except Exception:
+        return False
+
+def stored_file_exists(file_path: str) -> bool:
+    return backend_for_location(file_path).exists(file_path)
+
+class DecryptedFileCache:
+    """
+    In-process LRU cache of decrypted file contents, bounded by total bytes.
+    
+    One user flow reads the same file many times (upload, split, previews, extraction,
+    generate, detect-language), and each read used to decrypt it again. Entries expire
+    ttl_seconds after they were cached, so plaintext does not linger in memory after a
+    burst of activity. Each entry remembers the file's version stamp from its backend
+    (mtime and size, or ETag), so a replaced file (e.g. re-encrypted) is never served stale.
+    Files larger than half the budget are not cached, so one book cannot flush everything.
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: float):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[bytes, Tuple, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _key(file_path: str) -> str:
+        return os.path.abspath(file_path) if is_local_location(file_path) else file_path
+
+    @staticmethod
+    def _stamp(key: str) -> Optional[Tuple]:
+        try:
+            return backend_for_location(key).stat(key)
+        except Exception:
+            return None
+
+    def get(self, file_path: str) -> Optional[bytes]:
+        if self.max_bytes <= 0:
+            return None
+        key = self._key(file_path)
+        stamp = self._stamp(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                data, cached_stamp, expires_at = entry
+                if cached_stamp == stamp and time.monotonic() < expires_at:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return data
+                self._remove(key)
+                self.expirations += 1
+            self.misses += 1
+            return None
+
+    def put(self, file_path: str, data: bytes) -> None:
+        if self.max_bytes <= 0 or len(data) > self.max_bytes // 2:
+            return
+        key = self._key(file_path)
+        stamp = self._stamp(key)
+        if stamp is None:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (data, stamp, time.monotonic() + self.ttl_seconds)
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, file_path: Optional[str] = None, prefix: Optional[str] = None) -> None:
+        """Drop one file, every file under a directory prefix, or (no arguments) everything"""
+        with self._lock:
+            if file_path is None and prefix is None:
+                keys = list(self._entries)
+            elif file_path is not None:
+                keys = [self._key(file_path)]
+            else:
+                root = self._key(prefix)
+                separator = os.sep if is_local_location(prefix) else "/"
+                keys = [key for key in self._entries if key == root or key.startswith(root + separator)]
+            for key in keys:
+                if key in self._entries:
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def _remove(self, key: str) -> None:
+        data, _, _ = self._entries.pop(key)
+        self._bytes -= len(data)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations
+            }
+
+
+_read_cache = DecryptedFileCache(settings.STORAGE_CACHE_MAX_BYTES, settings.STORAGE_CACHE_TTL_SECONDS)
+
+def get_read_cache_stats() -> Dict[str, float]:
+    """Hit/miss/eviction counters and current size of the decrypted-file cache"""
+    return _read_cache.stats()
+
+def invalidate_read_cache(file_path: Optional[str] = None, prefix: Optional[str] = None) -> None:
+    _read_cache.invalidate(file_path=file_path, prefix=prefix)
+
+def open_file(file_path: str) -> BinaryIO:
+    """
+    Open a stored file for reading as a seekable binary stream of its plaintext.
+    - cached files (see read_file): served from memory
+    - chunked files: decrypted one chunk at a time (O(chunk) memory, random access)
+    - legacy Fernet files: decrypted whole into memory (run migrations/reencrypt_storage.py)
+    - plain files: opened directly
+    Callers must close the stream (use it in a with block).
+    """
+    cached = _read_cache.get(file_path)
+    if cached is not None:
+        return io.BytesIO(cached)
+    if is_chunked_location(file_path):
+        reader = DecryptedFileReader(_open_raw(file_path), _chunk_key())
+        return io.BufferedReader(reader, buffer_size=reader.chunk_size)
+    if settings.ENCRYPT_STORAGE:
+        return io.BytesIO(decrypt_file(file_path))
+    return _open_raw(file_path)
 
 def read_file(file_path: str) -> bytes:
-    """Read file (with decryption if needed)"""
-    path = Path(file_path)
+    """Read file (with decryption if needed). Whole-file reads go through the decrypted-file cache."""
+    data = _read_cache.get(file_path)
+    if data is not None:
+        return data
+    with open_file(file_path) as f:
+        data = f.read()
+    _read_cache.put(file_path, data)
+    return data
+
+def read_file_range(file_path: str, offset: int, length: int) -> bytes:
+    """Read plaintext bytes offset..offset+length without decrypting the rest of the file"""
+    cached = _read_cache.get(file_path)
+    if cached is not None:
+        return cached[offset:offset + length]
+    with open_file(file_path) as f:
+        f.seek(offset)
+        return f.read(length)
+
+def iter_file_chunks(file_path: str, chunk_size: Optional[int] = None) -> Iterator[bytes]:
+    """Yield the plaintext of a stored file in chunks (for streaming responses)"""
+    chunk_size = chunk_size or settings.STORAGE_CHUNK_SIZE
+    with open_file(file_path) as f:
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                break
+            yield data
+
+def stored_file_size(file_path: str) -> int:
+    """Plaintext size of a stored file (reads only the header for chunked files)"""
+    if is_chunked_location(file_path):
+        with DecryptedFileReader(_open_raw(file_path), _chunk_key()) as reader:
+            return reader.size
     if settings.ENCRYPT_STORAGE:
-        return decrypt_file(path)
-    else:
-        with open(path, "rb") as f:
-            return f.read()
+        return len(decrypt_file(file_path))
+    with _open_raw(file_path) as f:
+        return f.seek(0, io.SEEK_END)
+
+def presigned_download_url(file_path: str, filename: str, media_type: str) -> Optional[str]:
+    """
+    Direct download URL from the storage backend, so the bytes do not flow through the API.
+    Only for plaintext objects on backends that support it (S3) and when
+    STORAGE_PRESIGNED_DOWNLOADS is enabled; encrypted files must be decrypted here.
+    """
+    if not settings.STORAGE_PRESIGNED_DOWNLOADS or settings.ENCRYPT_STORAGE:
+        return None
+    if is_chunked_location(file_path):
+        return None
+    return backend_for_location(file_path).presigned_url(
+        file_path, filename, media_type, settings.STORAGE_PRESIGNED_URL_TTL_SECONDS
+    )
+
+def reencrypt_file(file_path: str) -> bool:
+    """
+    Convert a legacy Fernet (or plain) stored file to the chunked format in place.
+    The new file replaces the old one atomically, so readers see either the old
+    or the new file. Returns False if already chunked.
+    """
+    if is_chunked_location(file_path):
+        return False
+    with _open_raw(file_path) as f:
+        raw = f.read()
+    try:
+        plaintext = Fernet(get_encryption_key()).decrypt(raw)
+    except InvalidToken:
+        # Stored before encryption was enabled
+        plaintext = raw
+    if not stored_file_exists(file_path):
+        # Deleted while we were reading it - don't resurrect it
+        return False
+    write_stream(io.BytesIO(plaintext), file_path, encrypt=True)
+    _read_cache.invalidate(file_path)
+    return True
+
+def reencrypt_storage() -> dict:
+    """
+    Re-encrypt every legacy file under STORAGE_PATH/uploads. Safe to re-run.
+    Legacy files only exist on the local backend (object storage came later).
+    """
+    stats = {"converted": 0, "skipped": 0, "failed": 0}
+    uploads_dir = Path(settings.STORAGE_PATH) / "uploads"
+    if not uploads_dir.exists():
+        return stats
+    for path in uploads_dir.rglob("*"):
+        if not path.is_file() or path.name.endswith(".tmp"):
+            continue
+        try:
+            if reencrypt_file(str(path)):
+                stats["converted"] += 1
+            else:
+                stats["skipped"] += 1
+        except Exception as e:
+            stats["failed"] += 1
+            print(f"⚠️ Could not re-encrypt {path}: {e}")
+    return stats
 
 def delete_file(file_path: str):
     """Delete file securely"""
+    _read_cache.invalidate(file_path)
+    try:
+        backend_for_location(file_path).delete(file_path)
+    except Exception as e:
+        print(f"File deletion error: {e}")
+
+def delete_prefix(location: str):
+    """Delete every stored file under a directory-like location"""
+    _read_cache.invalidate(prefix=location)
     try:
-        path = Path(file_path)
-        if path.exists():
-            path.unlink()
+        backend_for_location(location).delete_prefix(location)
     except Exception as e:
         print(f"File deletion error: {e}")
 
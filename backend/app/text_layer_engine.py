@@ -0,0 +1,140 @@
+"""
+Text-Layer Extraction Engines
+Extract the embedded text layer of a PDF page by page (no OCR).
+
+Engines (selected with settings.PDF_TEXT_ENGINE):
+- "pdftotext": poppler's pdftotext in a subprocess; one process for the whole page
+               range, pages separated by form feeds. Much faster than PyPDF2 on large
+               books and copes with more font encodings.
+- "pypdf2":    PyPDF2 page.extract_text() - the original pure-Python path
+- "auto":      pdftotext, with PyPDF2 retried on pages where pdftotext found almost
+               nothing (and used for everything if pdftotext is not installed)
+
+poppler-utils is already required for OCR (pdf2image), so pdftotext is normally available.
+Run benchmark_text_engines.py to compare engines on your documents.
+"""
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+from typing import List, Optional
+
+from app.config import settings
+
+
+class TextLayerEngine:
+    """Base class: extract text for pages first_page..last_page (1-indexed, inclusive)"""
+    name = "base"
+
+    def extract_pages(self, pdf_data: bytes, first_page: int, last_page: int) -> List[str]:
+        raise NotImplementedError
+
+
+class PyPDF2TextEngine(TextLayerEngine):
+    """PyPDF2 page.extract_text(), one page at a time"""
+    name = "pypdf2"
+
+    def extract_pages(self, pdf_data: bytes, first_page: int, last_page: int) -> List[str]:
+        return self.extract_page_list(pdf_data, list(range(first_page, last_page + 1)))
+
+    def extract_page_list(self, pdf_data: bytes, page_numbers: List[int]) -> List[str]:
+        """Text of the given 1-indexed pages, parsing the document once"""
+        from PyPDF2 import PdfReader
+
+        reader = PdfReader(io.BytesIO(pdf_data))
+        page_texts = []
+        for page_number in page_numbers:
+            try:
+                page_texts.append((reader.pages[page_number - 1].extract_text() or "").strip())
+            except Exception as page_error:
+                print(f"⚠️ PyPDF2 could not read page {page_number}: {page_error}")
+                page_texts.append("")
+        return page_texts
+
+
+class PdftotextEngine(TextLayerEngine):
+    """poppler pdftotext in a subprocess; pages are split on the form feed it emits after each page"""
+    name = "pdftotext"
+
+    def __init__(self, timeout: int = 120):
+        self.timeout = timeout
+
+    @staticmethod
+    def available() -> bool:
+        return shutil.which("pdftotext") is not None
+
+    def extract_pages(self, pdf_data: bytes, first_page: int, last_page: int) -> List[str]:
+        # pdftotext needs a seekable file; the temp file lives only for the call
+        with tempfile.TemporaryDirectory(prefix="studyqna_text_") as tmp_dir:
+            pdf_path = os.path.join(tmp_dir, "document.pdf")
+            with open(pdf_path, "wb") as f:
+                f.write(pdf_data)
+            cmd = ["pdftotext", "-enc", "UTF-8", "-f", str(first_page), "-l", str(last_page), pdf_path, "-"]
+            try:
+                proc = subprocess.run(cmd, capture_output=True, timeout=self.timeout)
+            except FileNotFoundError:
+                raise Exception("pdftotext not found. Please install poppler: On Linux: sudo apt-get install poppler-utils, On macOS: brew install poppler")
+            if proc.returncode != 0:
+                raise Exception(f"pdftotext exited with {proc.returncode}: {proc.stderr.decode('utf-8', 'replace')[:500]}")
+
+        page_count = last_page - first_page + 1
+        pages = proc.stdout.decode("utf-8", "replace").split("\f")
+        page_texts = [page.strip() for page in pages[:page_count]]
+        page_texts += [""] * (page_count - len(page_texts))
+        return page_texts
+
+
+class AutoTextEngine(TextLayerEngine):
+    """
+    pdftotext first; pages where it found fewer than settings.PDF_TEXT_WEAK_PAGE_CHARS
+    characters are retried with PyPDF2 and the longer result kept. Falls back to
+    PyPDF2 entirely when pdftotext is missing or fails.
+    """
+    name = "auto"
+
+    def __init__(self):
+        self._pdftotext = PdftotextEngine()
+        self._pypdf2 = PyPDF2TextEngine()
+
+    def extract_pages(self, pdf_data: bytes, first_page: int, last_page: int) -> List[str]:
+        if not PdftotextEngine.available():
+            return self._pypdf2.extract_pages(pdf_data, first_page, last_page)
+        try:
+            page_texts = self._pdftotext.extract_pages(pdf_data, first_page, last_page)
+        except Exception as pdftotext_error:
+            print(f"⚠️ pdftotext failed, using PyPDF2: {pdftotext_error}")
+            return self._pypdf2.extract_pages(pdf_data, first_page, last_page)
+
+        weak = [i for i, text in enumerate(page_texts) if len(text) < settings.PDF_TEXT_WEAK_PAGE_CHARS]
+        if weak and len(weak) == len(page_texts):
+            # Usually a scanned document (OCR follows), so re-reading every page with PyPDF2 is
+            # wasted time. Probe one page in case pdftotext could not decode the fonts.
+            probe = self._pypdf2.extract_page_list(pdf_data, [first_page])
+            if len(probe[0]) < settings.PDF_TEXT_WEAK_PAGE_CHARS:
+                return page_texts
+        if weak:
+            retries = self._pypdf2.extract_page_list(pdf_data, [first_page + i for i in weak])
+            for i, retry in zip(weak, retries):
+                if len(retry) > len(page_texts[i]):
+                    page_texts[i] = retry
+        return page_texts
+
+
+_engine: Optional[TextLayerEngine] = None
+
+
+def get_text_layer_engine() -> TextLayerEngine:
+    """Get the configured text-layer engine (shared instance)"""
+    global _engine
+    if _engine is None:
+        if settings.PDF_TEXT_ENGINE == "pypdf2":
+            _engine = PyPDF2TextEngine()
+        elif settings.PDF_TEXT_ENGINE == "pdftotext":
+            _engine = PdftotextEngine()
+        else:
+            _engine = AutoTextEngine()
+            if not PdftotextEngine.available():
+                print("⚠️ pdftotext not found - text-layer extraction will use PyPDF2")
+        print(f"📝 Text-layer engine: {_engine.name}")
+    return _engine
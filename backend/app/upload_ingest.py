@@ -0,0 +1,90 @@
+"""
+Streaming Upload Ingestion
+Keeps memory per upload constant, whatever the size of the PDF:
+
+1. UploadSizeLimitMiddleware rejects an oversize request body with 413 before it is
+   parsed - from Content-Length when the client sends one, otherwise as soon as the
+   streamed body passes the limit.
+2. The multipart parser spools the file to a SpooledTemporaryFile (in memory up to
+   1 MB, then on disk); the handler never calls file.read() on the whole body.
+3. inspect_pdf_upload() hashes the spooled file chunk by chunk (enforcing the size
+   limit again) and counts pages with PyPDF2 reading from the file, not a bytes copy.
+4. blob_store.write_blob_stream() encrypts it into storage in a single streamed pass,
+   or skips the write entirely when the same content is already stored.
+"""
+from typing import BinaryIO, NamedTuple
+
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+from PyPDF2 import PdfReader
+
+from app.blob_store import stream_sha256
+
+# Room for multipart boundaries, part headers and the small form fields next to the file
+FORM_OVERHEAD_BYTES = 1024 * 1024
+
+
+class InspectedUpload(NamedTuple):
+    sha256: str
+    size: int
+    pages: int
+
+
+def count_pdf_pages(stream: BinaryIO) -> int:
+    """Count pages of a PDF read from a seekable stream (rewound afterwards)"""
+    try:
+        return len(PdfReader(stream).pages)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid PDF file: {str(e)}"
+        )
+    finally:
+        stream.seek(0)
+
+
+def inspect_pdf_upload(stream: BinaryIO, max_bytes: int) -> InspectedUpload:
+    """
+    Hash, measure and page-count a spooled upload without loading it into memory.
+    Raises blob_store.BlobTooLargeError past max_bytes. Blocking: run it in the storage pool.
+    """
+    sha256, size = stream_sha256(stream, max_bytes)
+    return InspectedUpload(sha256, size, count_pdf_pages(stream))
+
+
+class UploadSizeLimitMiddleware:
+    """
+    ASGI middleware capping the request body of the upload endpoints.
+    Pure ASGI (not BaseHTTPMiddleware) so streamed responses elsewhere are untouched.
+    """
+
+    def __init__(self, app, max_bytes: int, paths, detail: str):
+        self.app = app
+        self.max_body_bytes = max_bytes + FORM_OVERHEAD_BYTES
+        self.paths = {path.rstrip("/") for path in paths}
+        self.detail = detail
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"].rstrip("/") not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length and content_length.isdigit() and int(content_length) > self.max_body_bytes:
+            response = JSONResponse({"detail": self.detail}, status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    # Raised inside body parsing, so the app's exception handler turns it into a 413
+                    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=self.detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -0,0 +1,189 @@
+"""
+Content Validation Verdict Cache
+Re-uploads of the same photo (or a re-compressed / resized copy of it) reuse the
+verdict of the first validation instead of running YOLO, Haar, skin and OCR again.
+
+Lookups, cheapest first:
+1. Exact: SHA-256 of the file bytes. Needs no decoding; the stored OCR text is reused too.
+2. Similar: 64-bit DCT perceptual hash within settings.VALIDATION_PHASH_MAX_DISTANCE bits.
+   The hash is split into four 16-bit bands stored in indexed columns; two hashes at most
+   3 bits apart share at least one band, so candidates come from an index lookup and only
+   those are compared bit by bit. Only the verdict is reused - similar-looking pages of a
+   book can hash alike, so their OCR text is not.
+
+Entries expire after settings.VALIDATION_CACHE_TTL_HOURS (re-validated on the next upload)
+and can be invalidated by admins, e.g. after the validation rules change.
+Every function swallows database errors: the cache never makes validation fail.
+"""
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional
+
+import cv2
+import numpy as np
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import ValidationVerdict
+
+PHASH_BANDS = 4
+PHASH_BAND_BITS = 16
+
+
+class CachedVerdict(NamedTuple):
+    is_valid: bool
+    reason: str
+    ocr_text: Optional[str]  # Only for exact matches
+    match: str  # "exact" or "similar"
+    distance: int  # Hamming distance of the perceptual hashes (0 for exact matches)
+
+
+_counters = {"exact_hits": 0, "similar_hits": 0, "misses": 0, "stores": 0, "errors": 0}
+_counters_lock = threading.Lock()
+
+
+def _count(name: str) -> None:
+    with _counters_lock:
+        _counters[name] += 1
+
+
+def perceptual_hash(image: np.ndarray) -> int:
+    """64-bit pHash: low-frequency 8x8 DCT coefficients of a 32x32 grayscale copy, thresholded at their median"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].flatten()
+    bits = low > np.median(low[1:])  # The DC term would skew the median
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def _bands(phash: int) -> List[int]:
+    mask = (1 << PHASH_BAND_BITS) - 1
+    return [(phash >> (PHASH_BAND_BITS * (PHASH_BANDS - 1 - i))) & mask for i in range(PHASH_BANDS)]
+
+
+def _hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _record_hit(db: Session, verdict: ValidationVerdict) -> None:
+    db.query(ValidationVerdict).filter(ValidationVerdict.id == verdict.id).update(
+        {"hit_count": ValidationVerdict.hit_count + 1, "last_hit_at": datetime.utcnow()},
+        synchronize_session=False
+    )
+    db.commit()
+
+
+def lookup_exact(db: Session, sha256: str) -> Optional[CachedVerdict]:
+    """Unexpired verdict for exactly these file bytes"""
+    try:
+        verdict = db.query(ValidationVerdict).filter(
+            ValidationVerdict.sha256 == sha256,
+            ValidationVerdict.expires_at > datetime.utcnow()
+        ).first()
+        if verdict is None:
+            return None
+        _record_hit(db, verdict)
+        _count("exact_hits")
+        return CachedVerdict(verdict.is_valid, verdict.reason or "", verdict.ocr_text, "exact", 0)
+    except Exception as e:
+        db.rollback()
+        _count("errors")
+        print(f"⚠️ Validation cache lookup failed: {e}")
+        return None
+
+
+def lookup_similar(db: Session, phash: int) -> Optional[CachedVerdict]:
+    """Unexpired verdict of the closest image within VALIDATION_PHASH_MAX_DISTANCE bits (counts a miss if none)"""
+    try:
+        bands = _bands(phash)
+        candidates = db.query(ValidationVerdict).filter(
+            ValidationVerdict.expires_at > datetime.utcnow(),
+            or_(*[getattr(ValidationVerdict, f"phash_band{i}") == band for i, band in enumerate(bands)])
+        ).limit(200).all()
+        best, best_distance = None, None
+        for candidate in candidates:
+            distance = _hamming(phash, int(candidate.phash, 16))
+            if distance <= settings.VALIDATION_PHASH_MAX_DISTANCE and (best is None or distance < best_distance):
+                best, best_distance = candidate, distance
+        if best is None:
+            _count("misses")
+            return None
+        _record_hit(db, best)
+        _count("similar_hits")
+        return CachedVerdict(best.is_valid, best.reason or "", None, "similar", best_distance)
+    except Exception as e:
+        db.rollback()
+        _count("errors")
+        print(f"⚠️ Validation cache lookup failed: {e}")
+        return None
+
+
+def store_verdict(
+    db: Session,
+    sha256: str,
+    phash: Optional[int],
+    is_valid: bool,
+    reason: str,
+    ocr_text: Optional[str]
+) -> None:
+    """Insert or refresh the verdict for these file bytes"""
+    values = {
+        "phash": f"{phash:016x}" if phash is not None else None,
+        "is_valid": is_valid,
+        "reason": reason or None,
+        "ocr_text": ocr_text if is_valid and ocr_text and ocr_text.strip() else None,
+        "expires_at": datetime.utcnow() + timedelta(hours=settings.VALIDATION_CACHE_TTL_HOURS),
+        "created_at": datetime.utcnow(),
+        "hit_count": 0
+    }
+    for i, band in enumerate(_bands(phash) if phash is not None else [None] * PHASH_BANDS):
+        values[f"phash_band{i}"] = band
+    try:
+        updated = db.query(ValidationVerdict).filter(ValidationVerdict.sha256 == sha256).update(
+            values, synchronize_session=False
+        )
+        if not updated:
+            db.add(ValidationVerdict(sha256=sha256, **values))
+        db.commit()
+        _count("stores")
+    except IntegrityError:
+        # Another worker stored the same image concurrently
+        db.rollback()
+    except Exception as e:
+        db.rollback()
+        _count("errors")
+        print(f"⚠️ Could not store validation verdict: {e}")
+
+
+def invalidate_verdicts(db: Session, sha256: Optional[str] = None, expired_only: bool = False) -> int:
+    """Delete one image's verdict, the expired ones, or (no arguments) all of them. Returns rows deleted."""
+    query = db.query(ValidationVerdict)
+    if sha256:
+        query = query.filter(ValidationVerdict.sha256 == sha256)
+    if expired_only:
+        query = query.filter(ValidationVerdict.expires_at <= datetime.utcnow())
+    deleted = query.delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
+def get_verdict_cache_stats(db: Session) -> Dict[str, float]:
+    """Hit/miss counters of this worker process plus the size of the shared table"""
+    with _counters_lock:
+        counters = dict(_counters)
+    hits = counters["exact_hits"] + counters["similar_hits"]
+    lookups = hits + counters["misses"]
+    now = datetime.utcnow()
+    return {
+        **counters,
+        "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+        "entries": db.query(ValidationVerdict).filter(ValidationVerdict.expires_at > now).count(),
+        "expired_entries": db.query(ValidationVerdict).filter(ValidationVerdict.expires_at <= now).count(),
+        "rejected_entries": db.query(ValidationVerdict).filter(
+            ValidationVerdict.expires_at > now, ValidationVerdict.is_valid.is_(False)
+        ).count(),
+        "ttl_hours": settings.VALIDATION_CACHE_TTL_HOURS,
+        "phash_max_distance": settings.VALIDATION_PHASH_MAX_DISTANCE
+    }
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Event-loop lag benchmark for upload storage
+
+Simulates concurrent large uploads hitting async handlers and measures how long a
+periodic heartbeat on the same event loop is delayed. Each simulated upload stores
+the file in the blob store (hash + chunked encryption) and reads it back, as the
+upload and split endpoints do.
+
+Modes:
+- sync:  blocking storage calls made directly inside the coroutine (the old handlers)
+- async: the same work through app/async_storage.py (storage thread pool)
+
+Usage:
+    cd backend
+    python benchmark_event_loop_lag.py
+    python benchmark_event_loop_lag.py --uploads 2 --size-mb 20
+
+Measured (1 vCPU, Python 3.11, ENCRYPT_STORAGE on, 4 storage workers), 4 x 100 MB:
+    sync   max 1864-2319 ms, p95 = max, 3 heartbeat ticks in ~1.9 s
+    async  max 39-57 ms, p95 14 ms, mean 3.7 ms, ~155 ticks in ~2.1 s
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Store benchmark files in a throwaway directory, not the real storage
+os.environ.setdefault("STORAGE_PATH", tempfile.mkdtemp(prefix="studyqna_lag_"))
+
+# Add backend directory to path so we can import app modules
+sys.path.insert(0, str(Path(__file__).parent))
+
+
+async def heartbeat(stop: asyncio.Event, interval: float, lags: list) -> None:
+    """Record how late each tick fires relative to its schedule"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, time.perf_counter() - start - interval))
+
+
+async def run_mode(mode: str, payloads: list, interval: float) -> dict:
+    from app import async_storage, blob_store, storage_service
+
+    async def one_upload(data: bytes) -> None:
+        if mode == "sync":
+            _, path, _ = blob_store.write_blob(data)
+            storage_service.invalidate_read_cache(path)
+            storage_service.read_file(path)
+            storage_service.delete_file(path)
+        else:
+            _, path, _ = await async_storage.write_blob(data)
+            storage_service.invalidate_read_cache(path)
+            await async_storage.read_file(path)
+            await async_storage.delete_file(path)
+
+    lags = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(heartbeat(stop, interval, lags))
+    await asyncio.sleep(interval * 2)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one_upload(data) for data in payloads))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await monitor
+    lags_ms = sorted(lag * 1000 for lag in lags) or [0.0]
+    return {
+        "elapsed": elapsed,
+        "max_ms": lags_ms[-1],
+        "p95_ms": lags_ms[min(len(lags_ms) - 1, int(len(lags_ms) * 0.95))],
+        "mean_ms": statistics.mean(lags_ms),
+        "ticks": len(lags),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure event-loop lag during concurrent uploads")
+    parser.add_argument("--uploads", type=int, default=4, help="Concurrent uploads")
+    parser.add_argument("--size-mb", type=int, default=100, help="Size of each upload in MB")
+    parser.add_argument("--interval", type=float, default=0.01, help="Heartbeat interval in seconds")
+    args = parser.parse_args()
+
+    from app.config import settings
+
+    print(f"📁 Storage: {settings.STORAGE_PATH} (encrypt={settings.ENCRYPT_STORAGE}, workers={settings.STORAGE_IO_WORKERS})")
+    print(f"📦 {args.uploads} concurrent upload(s) of {args.size_mb} MB\n")
+    content = os.urandom(args.size_mb * 1024 * 1024)
+    # Different content per upload so every one is hashed, encrypted and written. Built before
+    # timing: copying 100 MB inside the coroutine would itself block the loop in both modes
+    payloads = [content + i.to_bytes(4, "big") for i in range(args.uploads)]
+    del content
+
+    print("=" * 72)
+    print(f"{'mode':<8}{'total (s)':>11}{'max lag (ms)':>15}{'p95 lag (ms)':>15}{'mean lag (ms)':>16}{'ticks':>7}")
+    print("=" * 72)
+    results = {}
+    for mode in ("sync", "async"):
+        result = asyncio.run(run_mode(mode, payloads, args.interval))
+        results[mode] = result
+        print(f"{mode:<8}{result['elapsed']:>11.2f}{result['max_ms']:>15.0f}{result['p95_ms']:>15.0f}{result['mean_ms']:>16.1f}{result['ticks']:>7}")
+    print("=" * 72)
+
+    if results["async"]["max_ms"] > 0:
+        print(f"Worst-case lag reduced {results['sync']['max_ms'] / results['async']['max_ms']:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
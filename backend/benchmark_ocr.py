@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+OCR accuracy/speed benchmark for scanned PDFs
+
+Compares the original fixed-resolution OCR (every page at OCR_FULL_DPI + Otsu)
+against the adaptive strategy (fast OCR_FAST_DPI pass, confidence-driven escalation),
+and the per-page tesseract engine against the batched engine (--engines).
+
+The fixture corpus is a directory of PDFs, each with a ground-truth text file next
+to it (same name, .txt). If the directory does not exist, a synthetic corpus of
+clean, noisy, low-contrast and small-print textbook pages is generated into it.
+
+Usage:
+    cd backend
+    python benchmark_ocr.py
+    python benchmark_ocr.py --fixtures ./benchmark_fixtures/ocr --regenerate
+    python benchmark_ocr.py --engines
+"""
+
+import argparse
+import difflib
+import os
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+# Add backend directory to path so we can import app modules
+sys.path.insert(0, str(Path(__file__).parent))
+
+DEFAULT_FIXTURE_DIR = Path(__file__).parent / "benchmark_fixtures" / "ocr"
+FONT_PATH = Path(__file__).parent / "app" / "fonts" / "NotoSans-Regular.ttf"
+
+SAMPLE_PARAGRAPHS = [
+    "Photosynthesis is the process by which green plants use sunlight, water and carbon dioxide to make glucose and release oxygen.",
+    "The area of a triangle is half the product of its base and height. If the base is 12 cm and the height is 5 cm, the area is 30 square centimetres.",
+    "The French Revolution began in 1789 and brought an end to the absolute monarchy in France.",
+    "Newton's first law states that a body remains at rest or in uniform motion unless acted upon by an external force.",
+    "A prime number has exactly two factors: one and the number itself. The first five primes are 2, 3, 5, 7 and 11.",
+    "Rivers carry sediment from the mountains to the plains, where it is deposited to form fertile alluvial soil.",
+    "An adjective describes a noun. In the sentence 'The tall boy ran quickly', the word tall is an adjective.",
+    "Acids turn blue litmus paper red, while bases turn red litmus paper blue.",
+]
+
+# (name, font size in px at 300 DPI, noise level, contrast)
+PAGE_STYLES = [
+    ("clean", 42, 0, 1.0),
+    ("clean_small", 30, 0, 1.0),
+    ("noisy", 42, 40, 1.0),
+    ("low_contrast", 42, 10, 0.35),
+]
+
+
+def normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text or "").strip().lower()
+
+
+def char_accuracy(expected: str, actual: str) -> float:
+    return difflib.SequenceMatcher(None, normalize(expected), normalize(actual)).ratio()
+
+
+def generate_fixtures(fixture_dir: Path, pages_per_doc: int = 4) -> None:
+    """Render synthetic A4 pages at 300 DPI with known text and save as PDFs"""
+    from PIL import Image, ImageDraw, ImageFont, ImageFilter
+    import numpy as np
+    import textwrap
+
+    fixture_dir.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(42)
+    width, height = 2480, 3508  # A4 at 300 DPI
+
+    for name, font_size, noise, contrast in PAGE_STYLES:
+        font = ImageFont.truetype(str(FONT_PATH), font_size) if FONT_PATH.exists() else ImageFont.load_default()
+        pages = []
+        ground_truth = []
+        for _ in range(pages_per_doc):
+            paragraphs = rng.sample(SAMPLE_PARAGRAPHS, 5)
+            ink = int(255 * (1 - contrast))
+            page = Image.new("L", (width, height), color=255)
+            draw = ImageDraw.Draw(page)
+            y = 200
+            page_lines = []
+            for paragraph in paragraphs:
+                for line in textwrap.wrap(paragraph, width=int(4200 / font_size)):
+                    draw.text((200, y), line, fill=ink, font=font)
+                    page_lines.append(line)
+                    y += int(font_size * 1.6)
+                y += font_size
+            if noise:
+                arr = np.array(page, dtype=np.int16)
+                arr += np.random.default_rng(rng.randint(0, 10_000)).normal(0, noise, arr.shape).astype(np.int16)
+                page = Image.fromarray(np.clip(arr, 0, 255).astype("uint8")).filter(ImageFilter.GaussianBlur(0.8))
+            pages.append(page.convert("RGB"))
+            ground_truth.append("\n".join(page_lines))
+
+        pdf_path = fixture_dir / f"{name}.pdf"
+        pages[0].save(pdf_path, format="PDF", resolution=300, save_all=True, append_images=pages[1:])
+        (fixture_dir / f"{name}.txt").write_text("\n\n".join(ground_truth), encoding="utf-8")
+        print(f"✅ Generated fixture {pdf_path.name} ({pages_per_doc} pages)")
+
+
+def run_mode(pdf_bytes: bytes, adaptive: bool, engine=None):
+    from app.ocr_service import _ocr_pdf_pages
+
+    start = time.perf_counter()
+    page_texts, failed_pages = _ocr_pdf_pages(pdf_bytes, adaptive=adaptive, engine=engine)
+    elapsed = time.perf_counter() - start
+    return "\n\n".join(t for t in page_texts if t), elapsed, failed_pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fixed vs adaptive OCR")
+    parser.add_argument("--fixtures", type=Path, default=DEFAULT_FIXTURE_DIR, help="Directory of PDFs with .txt ground truth")
+    parser.add_argument("--regenerate", action="store_true", help="Regenerate the synthetic fixture corpus")
+    parser.add_argument("--engines", action="store_true", help="Compare per-page vs batched tesseract engines instead of fixed vs adaptive")
+    args = parser.parse_args()
+
+    if args.regenerate or not args.fixtures.exists():
+        print(f"📁 Generating synthetic fixture corpus in {args.fixtures}")
+        generate_fixtures(args.fixtures)
+
+    pdfs = sorted(args.fixtures.glob("*.pdf"))
+    if not pdfs:
+        print(f"❌ No PDFs found in {args.fixtures}")
+        sys.exit(1)
+
+    print("=" * 78)
+    print(f"{'document':<20}{'mode':<10}{'time (s)':>10}{'accuracy':>11}{'failed pages':>16}")
+    print("=" * 78)
+
+    if args.engines:
+        from app.ocr_engine import PerPageTesseractEngine, BatchTesseractEngine
+        modes = [("per_page", None, PerPageTesseractEngine()), ("batch", None, BatchTesseractEngine())]
+    else:
+        modes = [("fixed", False, None), ("adaptive", True, None)]
+
+    totals = {mode: [0.0, 0.0] for mode, _, _ in modes}
+    for pdf_path in pdfs:
+        truth_path = pdf_path.with_suffix(".txt")
+        expected = truth_path.read_text(encoding="utf-8") if truth_path.exists() else None
+        pdf_bytes = pdf_path.read_bytes()
+        for mode, adaptive, engine in modes:
+            text, elapsed, failed = run_mode(pdf_bytes, adaptive, engine)
+            accuracy = char_accuracy(expected, text) if expected is not None else float("nan")
+            totals[mode][0] += elapsed
+            totals[mode][1] += accuracy if expected is not None else 0.0
+            print(f"{pdf_path.stem:<20}{mode:<10}{elapsed:>10.2f}{accuracy:>11.3f}{str(failed or '-'):>16}")
+
+    print("=" * 78)
+    for mode, (elapsed, accuracy_sum) in totals.items():
+        print(f"{mode:<10} total time {elapsed:7.2f}s   mean accuracy {accuracy_sum / len(pdfs):.3f}")
+    baseline, candidate = modes[0][0], modes[1][0]
+    if totals[candidate][0] > 0:
+        print(f"Speed-up ({candidate} vs {baseline}): {totals[baseline][0] / totals[candidate][0]:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
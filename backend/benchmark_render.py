@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Event-loop lag and throughput benchmark for document rendering
+
+Renders a synthetic large set (10-mark questions with long structured answers)
+several times concurrently from async code and measures how late a periodic
+heartbeat on the same event loop fires, plus renders per second.
+
+Modes:
+- inline:  generate_pdf/docx/txt called directly inside the coroutine (the old handlers)
+- thread:  asyncio.to_thread (off the loop, but the renders still hold the GIL)
+- process: app/render_executor.py (warm process pool)
+
+Usage:
+    cd backend
+    python benchmark_render.py
+    python benchmark_render.py --format docx --renders 8 --questions 40 --workers 4
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Add backend directory to path so we can import app modules
+sys.path.insert(0, str(Path(__file__).parent))
+
+
+def build_set(questions: int) -> dict:
+    """A 10-mark set with long structured answers, like the heaviest real downloads"""
+    paragraph = ("The process is explained with reference to the textbook definition, a worked example "
+                 "and the conditions under which it applies. ") * 6
+    return {"questions": [
+        {
+            "type": "descriptive",
+            "marks": 10,
+            "question": f"Q{i + 1}. Explain the concept in detail with a suitable example and diagram description.",
+            "correct_answer": {
+                "introduction": paragraph,
+                "explanation": paragraph * 2,
+                "analysis": paragraph,
+                "conclusion": paragraph,
+            },
+        }
+        for i in range(questions)
+    ]}
+
+
+async def heartbeat(stop: asyncio.Event, interval: float, lags: list) -> None:
+    """Record how late each tick fires relative to its schedule"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, time.perf_counter() - start - interval))
+
+
+async def run_mode(mode: str, render, renders: int, args: tuple, interval: float) -> dict:
+    from app.render_executor import run_render, start_render_executor
+
+    if mode == "process":
+        await start_render_executor()  # Spawned before timing, as in the app lifespan
+
+    async def one_render() -> None:
+        if mode == "inline":
+            render(*args)
+        elif mode == "thread":
+            await asyncio.to_thread(render, *args)
+        else:
+            await run_render(render, *args)
+
+    lags = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(heartbeat(stop, interval, lags))
+    await asyncio.sleep(interval * 2)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one_render() for _ in range(renders)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await monitor
+    lags_ms = sorted(lag * 1000 for lag in lags) or [0.0]
+    return {
+        "elapsed": elapsed,
+        "throughput": renders / elapsed,
+        "max_ms": lags_ms[-1],
+        "p95_ms": lags_ms[min(len(lags_ms) - 1, int(len(lags_ms) * 0.95))],
+        "mean_ms": statistics.mean(lags_ms),
+        "ticks": len(lags),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure event-loop lag and throughput of document rendering")
+    parser.add_argument("--format", choices=["pdf", "docx", "txt"], default="pdf")
+    parser.add_argument("--renders", type=int, default=4, help="Concurrent renders")
+    parser.add_argument("--questions", type=int, default=30, help="10-mark questions in the set")
+    parser.add_argument("--workers", type=int, default=2, help="Render processes (RENDER_WORKERS)")
+    parser.add_argument("--interval", type=float, default=0.01, help="Heartbeat interval in seconds")
+    parser.add_argument("--modes", nargs="*", default=["inline", "thread", "process"])
+    args = parser.parse_args()
+
+    os.environ["RENDER_WORKERS"] = str(args.workers)
+    os.environ.setdefault("RENDER_QUEUE_SIZE", str(args.renders))
+    from app import download_service
+    from app.render_executor import shutdown_render_executor
+
+    qna = build_set(args.questions)
+    title = "Benchmark Set"
+    if args.format == "pdf":
+        render, render_args = download_service.generate_pdf, (qna, "questions_answers", title, "english")
+    elif args.format == "docx":
+        render, render_args = download_service.generate_docx, (qna, "questions_answers", title)
+    else:
+        render, render_args = download_service.generate_txt, (qna, "questions_answers", title)
+
+    start = time.perf_counter()
+    size = len(render(*render_args))
+    print(f"📄 {args.format.upper()} of {args.questions} ten-mark questions: {size / 1024:.0f} KB, "
+          f"{time.perf_counter() - start:.2f}s single render")
+    print(f"⚙️  {args.renders} concurrent render(s), {args.workers} render process(es), {os.cpu_count()} CPUs\n")
+
+    print("=" * 86)
+    print(f"{'mode':<9}{'total (s)':>11}{'renders/s':>11}{'max lag (ms)':>15}{'p95 lag (ms)':>15}{'mean lag (ms)':>16}{'ticks':>7}")
+    print("=" * 86)
+    results = {}
+    for mode in args.modes:
+        result = asyncio.run(run_mode(mode, render, args.renders, render_args, args.interval))
+        results[mode] = result
+        print(f"{mode:<9}{result['elapsed']:>11.2f}{result['throughput']:>11.2f}{result['max_ms']:>15.0f}"
+              f"{result['p95_ms']:>15.0f}{result['mean_ms']:>16.1f}{result['ticks']:>7}")
+    print("=" * 86)
+    shutdown_render_executor()
+
+    if "inline" in results and "process" in results and results["process"]["max_ms"] > 0:
+        print(f"Worst-case lag reduced {results['inline']['max_ms'] / results['process']['max_ms']:.0f}x, "
+              f"throughput {results['process']['throughput'] / results['inline']['throughput']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Text-layer extraction benchmark for text-based PDFs
+
+Compares the text-layer engines in app/text_layer_engine.py (pdftotext, PyPDF2 and
+auto) on speed and accuracy, to pick settings.PDF_TEXT_ENGINE for a deployment.
+
+The fixture corpus is a directory of PDFs, each optionally with a ground-truth text
+file next to it (same name, .txt). If the directory does not exist, synthetic
+textbook PDFs of increasing length are generated into it with ReportLab.
+
+Usage:
+    cd backend
+    python benchmark_text_engines.py
+    python benchmark_text_engines.py --fixtures ./benchmark_fixtures/text --regenerate
+    python benchmark_text_engines.py --fixtures /path/to/real/books --repeat 3
+"""
+
+import argparse
+import difflib
+import io
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+# Add backend directory to path so we can import app modules
+sys.path.insert(0, str(Path(__file__).parent))
+
+DEFAULT_FIXTURE_DIR = Path(__file__).parent / "benchmark_fixtures" / "text"
+FONT_PATH = Path(__file__).parent / "app" / "fonts" / "NotoSans-Regular.ttf"
+
+SAMPLE_SENTENCES = [
+    "Photosynthesis is the process by which green plants use sunlight, water and carbon dioxide to make glucose.",
+    "The area of a triangle is half the product of its base and height.",
+    "The French Revolution began in 1789 and ended the absolute monarchy in France.",
+    "Newton's first law states that a body remains at rest unless acted upon by an external force.",
+    "A prime number has exactly two factors: one and the number itself.",
+    "Rivers carry sediment from the mountains to the plains, forming fertile alluvial soil.",
+    "An adjective describes a noun, as in 'the tall boy ran quickly'.",
+    "Acids turn blue litmus paper red, while bases turn red litmus paper blue.",
+]
+
+# (name, pages)
+DOCUMENTS = [
+    ("chapter_10p", 10),
+    ("unit_60p", 60),
+    ("book_250p", 250),
+]
+
+
+def normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text or "").strip().lower()
+
+
+def char_accuracy(expected: str, actual: str) -> float:
+    return difflib.SequenceMatcher(None, normalize(expected), normalize(actual), autojunk=False).ratio()
+
+
+def generate_fixtures(fixture_dir: Path) -> None:
+    """Write multi-page text PDFs with ReportLab and their ground-truth text"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+
+    fixture_dir.mkdir(parents=True, exist_ok=True)
+    font_name = "Helvetica"
+    if FONT_PATH.exists():
+        pdfmetrics.registerFont(TTFont("NotoSans", str(FONT_PATH)))
+        font_name = "NotoSans"
+
+    rng = random.Random(7)
+    width, height = A4
+    for name, page_count in DOCUMENTS:
+        pdf_path = fixture_dir / f"{name}.pdf"
+        pdf = canvas.Canvas(str(pdf_path), pagesize=A4)
+        ground_truth = []
+        for page in range(1, page_count + 1):
+            pdf.setFont(font_name, 11)
+            y = height - 60
+            page_lines = [f"Page {page}"]
+            pdf.drawString(50, y, page_lines[0])
+            y -= 24
+            while y > 60:
+                line = rng.choice(SAMPLE_SENTENCES)
+                pdf.drawString(50, y, line)
+                page_lines.append(line)
+                y -= 16
+            pdf.showPage()
+            ground_truth.append("\n".join(page_lines))
+        pdf.save()
+        (fixture_dir / f"{name}.txt").write_text("\n\n".join(ground_truth), encoding="utf-8")
+        print(f"✅ Generated fixture {pdf_path.name} ({page_count} pages)")
+
+
+def main():
+    from PyPDF2 import PdfReader
+    from app.text_layer_engine import AutoTextEngine, PdftotextEngine, PyPDF2TextEngine
+
+    parser = argparse.ArgumentParser(description="Benchmark PDF text-layer extraction engines")
+    parser.add_argument("--fixtures", type=Path, default=DEFAULT_FIXTURE_DIR, help="Directory of PDFs (optional .txt ground truth)")
+    parser.add_argument("--regenerate", action="store_true", help="Regenerate the synthetic fixture corpus")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per engine and document (best time is reported)")
+    args = parser.parse_args()
+
+    if args.regenerate or not args.fixtures.exists():
+        print(f"📁 Generating synthetic fixture corpus in {args.fixtures}")
+        generate_fixtures(args.fixtures)
+
+    pdfs = sorted(args.fixtures.glob("*.pdf"))
+    if not pdfs:
+        print(f"❌ No PDFs found in {args.fixtures}")
+        sys.exit(1)
+
+    engines = [PyPDF2TextEngine()]
+    if PdftotextEngine.available():
+        engines += [PdftotextEngine(), AutoTextEngine()]
+    else:
+        print("⚠️ pdftotext not found - install poppler-utils to benchmark it")
+
+    print("=" * 82)
+    print(f"{'document':<18}{'pages':>6}  {'engine':<11}{'time (s)':>10}{'pages/s':>10}{'accuracy':>11}{'empty pages':>14}")
+    print("=" * 82)
+
+    totals = {engine.name: 0.0 for engine in engines}
+    for pdf_path in pdfs:
+        pdf_bytes = pdf_path.read_bytes()
+        page_count = len(PdfReader(io.BytesIO(pdf_bytes)).pages)
+        truth_path = pdf_path.with_suffix(".txt")
+        expected = truth_path.read_text(encoding="utf-8") if truth_path.exists() else None
+        for engine in engines:
+            best = None
+            for _ in range(max(1, args.repeat)):
+                start = time.perf_counter()
+                page_texts = engine.extract_pages(pdf_bytes, 1, page_count)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            totals[engine.name] += best
+            text = "\n\n".join(t for t in page_texts if t)
+            accuracy = char_accuracy(expected, text) if expected is not None else float("nan")
+            empty = sum(1 for t in page_texts if not t)
+            print(f"{pdf_path.stem:<18}{page_count:>6}  {engine.name:<11}{best:>10.2f}{page_count / best:>10.0f}{accuracy:>11.3f}{empty:>14}")
+
+    print("=" * 82)
+    baseline = totals.get("pypdf2", 0.0)
+    for name, elapsed in totals.items():
+        speedup = f"   {baseline / elapsed:.1f}x vs pypdf2" if name != "pypdf2" and elapsed > 0 else ""
+        print(f"{name:<11} total time {elapsed:7.2f}s{speedup}")
+
+
+if __name__ == "__main__":
+    main()
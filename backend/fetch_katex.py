@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Download the pinned KaTeX release used by Playwright PDF rendering
+The CSS, the scripts and the woff2 fonts the CSS references are stored in
+app/static/katex (or KATEX_ASSETS_DIR) and served to Chromium locally, so
+PDF downloads never depend on the CDN. The CSS and scripts are checked against
+the subresource-integrity hashes in app/render_assets.py. The VERSION marker is
+written last: until it is there, rendering keeps using the CDN.
+
+Usage:
+    cd backend
+    python fetch_katex.py
+"""
+
+import base64
+import hashlib
+import os
+import re
+import sys
+import urllib.request
+from pathlib import Path
+
+# Add backend directory to path so we can import app modules
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.render_assets import KATEX_CDN, KATEX_DIR, KATEX_MARKER, KATEX_SRI, KATEX_VERSION
+
+
+def download(name: str) -> bytes:
+    with urllib.request.urlopen(f"{KATEX_CDN}/{name}", timeout=30) as response:
+        return response.read()
+
+
+def save(name: str, content: bytes) -> None:
+    path = os.path.join(KATEX_DIR, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+def main():
+    print(f"📥 KaTeX {KATEX_VERSION} -> {KATEX_DIR}")
+    # A stale marker would vouch for a half-replaced set of files if this run fails
+    marker = os.path.join(KATEX_DIR, KATEX_MARKER)
+    if os.path.exists(marker):
+        os.remove(marker)
+    for name, integrity in KATEX_SRI.items():
+        content = download(name)
+        algorithm, expected = integrity.split("-", 1)
+        actual = base64.b64encode(hashlib.new(algorithm, content).digest()).decode()
+        if actual != expected:
+            print(f"❌ Integrity check failed for {name}")
+            sys.exit(1)
+        save(name, content)
+        print(f"✅ {name} ({len(content) / 1024:.0f} KB)")
+
+    # Chromium uses the first format it supports, which is woff2 in KaTeX's @font-face rules
+    with open(os.path.join(KATEX_DIR, "katex.min.css"), encoding="utf-8") as f:
+        fonts = sorted(set(re.findall(r"url\((fonts/[^)]+\.woff2)\)", f.read())))
+    for name in fonts:
+        save(name, download(name))
+    print(f"✅ {len(fonts)} fonts")
+    save(KATEX_MARKER, KATEX_VERSION.encode())
+    print("\n✅ KaTeX assets ready")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Database migration script to add the content-addressed blob store
+Creates the blobs table (one row per distinct stored file, with a reference count)
+and adds blob_sha256 to uploads and pdf_split_parts.
+
+Files stored before this migration keep their per-upload paths and have no blob
+(blob_sha256 stays NULL); they are simply not deduplicated.
+
+Usage:
+    cd backend
+    python -m migrations.add_blob_store
+    OR
+    python migrations/add_blob_store.py
+"""
+import sys
+import os
+from pathlib import Path
+
+# Add parent directory to path so we can import app modules
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from sqlalchemy import text
+from app.database import engine
+
+def run_migration():
+    """Create blobs table and add blob_sha256 columns"""
+    print("🔄 Starting blob store migration...")
+    print(f"📁 Working directory: {os.getcwd()}")
+    
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS blobs (
+                    sha256 VARCHAR(64) PRIMARY KEY,
+                    file_path VARCHAR NOT NULL,
+                    size INTEGER NOT NULL,
+                    ref_count INTEGER NOT NULL DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+            """))
+            print("✅ Created blobs table")
+            
+            for table in ("uploads", "pdf_split_parts"):
+                conn.execute(text(f"""
+                    ALTER TABLE {table}
+                    ADD COLUMN IF NOT EXISTS blob_sha256 VARCHAR(64);
+                """))
+                conn.execute(text(f"""
+                    CREATE INDEX IF NOT EXISTS ix_{table}_blob_sha256 ON {table}(blob_sha256);
+                """))
+                print(f"✅ Added blob_sha256 to {table}")
+        
+        print("\n✅ Migration completed successfully!")
+        
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        import traceback
+        traceback.print_exc()
+        raise
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,56 @@
+"""
+Database migration script to add background text extraction columns
+Adds extraction_status, extraction_error, extraction_failed_pages and extracted_text
+to the uploads and pdf_split_parts tables.
+
+Existing rows are left as 'pending'; their text is extracted on the next generate.
+
+Usage:
+    cd backend
+    python -m migrations.add_extraction_status
+    OR
+    python migrations/add_extraction_status.py
+"""
+import sys
+import os
+from pathlib import Path
+
+# Add parent directory to path so we can import app modules
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from sqlalchemy import text
+from app.database import engine
+
+COLUMNS = [
+    ("extraction_status", "VARCHAR DEFAULT 'pending'"),
+    ("extraction_error", "TEXT"),
+    ("extraction_failed_pages", "JSON"),
+    ("extracted_text", "TEXT"),
+]
+
+def run_migration():
+    """Add extraction status columns to uploads and pdf_split_parts"""
+    print("🔄 Starting extraction status migration...")
+    print(f"📁 Working directory: {os.getcwd()}")
+    
+    try:
+        with engine.begin() as conn:
+            for table_name in ("uploads", "pdf_split_parts"):
+                for column_name, column_type in COLUMNS:
+                    conn.execute(text(f"""
+                        ALTER TABLE {table_name}
+                        ADD COLUMN IF NOT EXISTS {column_name} {column_type};
+                    """))
+                    print(f"✅ Added {column_name} column to {table_name} table")
+        
+        print("\n✅ Migration completed successfully!")
+        
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        import traceback
+        traceback.print_exc()
+        raise
+
+if __name__ == "__main__":
+    run_migration()
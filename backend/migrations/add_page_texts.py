@@ -0,0 +1,61 @@
+"""
+Database migration script to add the page text store
+Creates the page_texts table (extracted text per PDF page with offsets), used for
+page-range generation and question source attribution.
+
+Existing uploads fill the store the next time their text is extracted.
+
+Usage:
+    cd backend
+    python -m migrations.add_page_texts
+    OR
+    python migrations/add_page_texts.py
+"""
+import sys
+import os
+from pathlib import Path
+
+# Add parent directory to path so we can import app modules
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from sqlalchemy import text
+from app.database import engine
+
+def run_migration():
+    """Create page_texts table"""
+    print("🔄 Starting page text store migration...")
+    print(f"📁 Working directory: {os.getcwd()}")
+    
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS page_texts (
+                    id SERIAL PRIMARY KEY,
+                    upload_id INTEGER NOT NULL REFERENCES uploads(id) ON DELETE CASCADE,
+                    page_number INTEGER NOT NULL,
+                    text TEXT NOT NULL DEFAULT '',
+                    part_id INTEGER REFERENCES pdf_split_parts(id) ON DELETE SET NULL,
+                    char_start INTEGER NOT NULL DEFAULT 0,
+                    char_end INTEGER NOT NULL DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    CONSTRAINT uq_page_text_upload_page UNIQUE (upload_id, page_number)
+                );
+            """))
+            print("✅ Created page_texts table")
+            
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_page_texts_upload_id ON page_texts(upload_id);
+            """))
+            print("✅ Created page_texts index")
+        
+        print("\n✅ Migration completed successfully!")
+        
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        import traceback
+        traceback.print_exc()
+        raise
+
+if __name__ == "__main__":
+    run_migration()
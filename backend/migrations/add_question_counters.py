@@ -0,0 +1,87 @@
+"""
+Database migration script to add materialized question counters
+Adds qna_sets.question_count and the per-user counters total_questions_used,
+daily_questions_used and daily_questions_date (see app/question_quota.py), then
+backfills them from the stored sets with the same reset-timestamp rules the old
+per-request counting used. Safe to run again: the backfill recomputes from scratch.
+
+Run it while generation is paused (or right after deploying), so no set is created
+between the backfill and the new code taking over.
+
+Usage:
+    cd backend
+    python -m migrations.add_question_counters
+    OR
+    python migrations/add_question_counters.py
+"""
+import sys
+import os
+from datetime import datetime
+from pathlib import Path
+
+# Add parent directory to path so we can import app modules
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from sqlalchemy import text
+from app.database import engine
+
+def run_migration():
+    """Add question counter columns and backfill them"""
+    print("🔄 Starting question counters migration...")
+    print(f"📁 Working directory: {os.getcwd()}")
+
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("""
+                ALTER TABLE qna_sets ADD COLUMN IF NOT EXISTS question_count INTEGER NOT NULL DEFAULT 0;
+            """))
+            conn.execute(text("""
+                ALTER TABLE users ADD COLUMN IF NOT EXISTS total_questions_used INTEGER NOT NULL DEFAULT 0;
+            """))
+            conn.execute(text("""
+                ALTER TABLE users ADD COLUMN IF NOT EXISTS daily_questions_used INTEGER NOT NULL DEFAULT 0;
+            """))
+            conn.execute(text("""
+                ALTER TABLE users ADD COLUMN IF NOT EXISTS daily_questions_date DATE;
+            """))
+            print("✅ Added question_count and user counter columns")
+
+            result = conn.execute(text("""
+                UPDATE qna_sets SET question_count = CASE
+                    WHEN json_typeof(qna_json -> 'questions') = 'array' THEN json_array_length(qna_json -> 'questions')
+                    ELSE 0
+                END;
+            """))
+            print(f"✅ Backfilled question_count of {result.rowcount} Q/A sets")
+
+            # Same windows as before: total since total_questions_reset_at; daily since
+            # today's start (UTC) or a later daily_questions_reset_at
+            now = datetime.utcnow()
+            today_start = datetime.combine(now.date(), datetime.min.time())
+            result = conn.execute(text("""
+                UPDATE users SET
+                    total_questions_used = COALESCE((
+                        SELECT SUM(q.question_count) FROM qna_sets q
+                        WHERE q.user_id = users.id
+                          AND (users.total_questions_reset_at IS NULL OR q.created_at >= users.total_questions_reset_at)
+                    ), 0),
+                    daily_questions_used = COALESCE((
+                        SELECT SUM(q.question_count) FROM qna_sets q
+                        WHERE q.user_id = users.id
+                          AND q.created_at >= GREATEST(:today_start, COALESCE(users.daily_questions_reset_at, :today_start))
+                    ), 0),
+                    daily_questions_date = :today;
+            """), {"today_start": today_start, "today": now.date()})
+            print(f"✅ Backfilled question counters of {result.rowcount} users")
+
+        print("\n✅ Migration completed successfully!")
+
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        import traceback
+        traceback.print_exc()
+        raise
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,47 @@
+"""
+Database migration script to add chapter titles to split parts
+Adds title to pdf_split_parts: the chapter name taken from the PDF outline or a
+detected heading when a book is split into chapter-aligned parts.
+
+Parts split before this migration keep title = NULL and show their file name.
+
+Usage:
+    cd backend
+    python -m migrations.add_split_part_titles
+    OR
+    python migrations/add_split_part_titles.py
+"""
+import sys
+import os
+from pathlib import Path
+
+# Add parent directory to path so we can import app modules
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from sqlalchemy import text
+from app.database import engine
+
+def run_migration():
+    """Add title column to pdf_split_parts"""
+    print("🔄 Starting split part titles migration...")
+    print(f"📁 Working directory: {os.getcwd()}")
+    
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("""
+                ALTER TABLE pdf_split_parts
+                ADD COLUMN IF NOT EXISTS title VARCHAR;
+            """))
+            print("✅ Added title to pdf_split_parts")
+        
+        print("\n✅ Migration completed successfully!")
+        
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        import traceback
+        traceback.print_exc()
+        raise
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,65 @@
+"""
+Database migration script to add the content validation verdict cache
+Creates validation_verdicts: one row per validated image (by SHA-256) with its
+perceptual hash split into four indexed 16-bit bands for near-duplicate lookup.
+
+Usage:
+    cd backend
+    python -m migrations.add_validation_verdicts
+    OR
+    python migrations/add_validation_verdicts.py
+"""
+import sys
+import os
+from pathlib import Path
+
+# Add parent directory to path so we can import app modules
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from sqlalchemy import text
+from app.database import engine
+
+def run_migration():
+    """Create validation_verdicts table"""
+    print("🔄 Starting validation verdict cache migration...")
+    print(f"📁 Working directory: {os.getcwd()}")
+    
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS validation_verdicts (
+                    id SERIAL PRIMARY KEY,
+                    sha256 VARCHAR(64) NOT NULL UNIQUE,
+                    phash VARCHAR(16),
+                    phash_band0 INTEGER,
+                    phash_band1 INTEGER,
+                    phash_band2 INTEGER,
+                    phash_band3 INTEGER,
+                    is_valid BOOLEAN NOT NULL,
+                    reason TEXT,
+                    ocr_text TEXT,
+                    hit_count INTEGER NOT NULL DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_hit_at TIMESTAMP,
+                    expires_at TIMESTAMP NOT NULL
+                );
+            """))
+            print("✅ Created validation_verdicts table")
+            
+            for column in ["sha256", "phash_band0", "phash_band1", "phash_band2", "phash_band3", "expires_at"]:
+                conn.execute(text(f"""
+                    CREATE INDEX IF NOT EXISTS ix_validation_verdicts_{column} ON validation_verdicts({column});
+                """))
+            print("✅ Created validation_verdicts indexes")
+        
+        print("\n✅ Migration completed successfully!")
+        
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        import traceback
+        traceback.print_exc()
+        raise
+
+if __name__ == "__main__":
+    run_migration()
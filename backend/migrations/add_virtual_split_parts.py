@@ -0,0 +1,47 @@
+"""
+Database migration script to add virtual split parts
+Adds is_virtual to pdf_split_parts. Virtual parts are page ranges of the parent
+upload's file; their own PDF is only built (and stored as a blob) when downloaded.
+
+Parts split before this migration have their own files and keep is_virtual = FALSE.
+
+Usage:
+    cd backend
+    python -m migrations.add_virtual_split_parts
+    OR
+    python migrations/add_virtual_split_parts.py
+"""
+import sys
+import os
+from pathlib import Path
+
+# Add parent directory to path so we can import app modules
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from sqlalchemy import text
+from app.database import engine
+
+def run_migration():
+    """Add is_virtual column to pdf_split_parts"""
+    print("🔄 Starting virtual split parts migration...")
+    print(f"📁 Working directory: {os.getcwd()}")
+    
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("""
+                ALTER TABLE pdf_split_parts
+                ADD COLUMN IF NOT EXISTS is_virtual BOOLEAN NOT NULL DEFAULT FALSE;
+            """))
+            print("✅ Added is_virtual to pdf_split_parts")
+        
+        print("\n✅ Migration completed successfully!")
+        
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        import traceback
+        traceback.print_exc()
+        raise
+
+if __name__ == "__main__":
+    run_migration()
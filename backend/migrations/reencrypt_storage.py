@@ -0,0 +1,44 @@
+"""
+Storage migration script to convert legacy whole-file Fernet uploads to the
+chunked encryption format (see app/chunked_encryption.py).
+
+Reads work on both formats, so this can run while the app is serving traffic and
+can be interrupted and re-run at any time (already converted files are skipped).
+Set STORAGE_REENCRYPT_ON_STARTUP=true to run it in the background at startup instead.
+
+Usage:
+    cd backend
+    python -m migrations.reencrypt_storage
+    OR
+    python migrations/reencrypt_storage.py
+"""
+import sys
+import os
+from pathlib import Path
+
+# Add parent directory to path so we can import app modules
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.config import settings
+from app.storage_service import reencrypt_storage
+
+def run_migration():
+    """Re-encrypt every legacy file under STORAGE_PATH/uploads"""
+    print("🔄 Starting storage re-encryption...")
+    print(f"📁 Storage path: {os.path.abspath(settings.STORAGE_PATH)}")
+    
+    if not settings.ENCRYPT_STORAGE:
+        print("⚠️  ENCRYPT_STORAGE is disabled - nothing to do")
+        return
+    
+    stats = reencrypt_storage()
+    print(f"✅ Converted: {stats['converted']}")
+    print(f"⏭️  Already chunked: {stats['skipped']}")
+    if stats["failed"]:
+        print(f"❌ Failed: {stats['failed']} (see warnings above)")
+        sys.exit(1)
+    print("✅ Storage re-encryption completed successfully!")
+
+if __name__ == "__main__":
+    run_migration()
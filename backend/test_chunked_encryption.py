@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Test that failed writes of encrypted files publish nothing
+A stored file must only appear once it is complete. The local sink renames its temp
+file into place on close() and the S3 sink completes its multipart upload, so a
+failure while finalizing an encrypted file must abort the sink, not close it.
+
+Checks:
+- a complete encrypted file round-trips and leaves no temp file
+- the sink failing on the final chunk publishes nothing and leaves no temp file
+- the sink failing on the header rewrite publishes nothing and leaves no temp file
+- storage_service.write_stream publishes nothing when finalizing fails
+
+Usage:
+    cd backend
+    python test_chunked_encryption.py
+"""
+
+import os
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+# Add backend directory to path so we can import app modules
+sys.path.insert(0, str(Path(__file__).parent))
+
+CHUNK_SIZE = 64 * 1024
+
+
+class SinkFailure(Exception):
+    pass
+
+
+def failing_writer_class():
+    from app.storage_backends import _AtomicLocalWriter
+
+    class FailingLocalWriter(_AtomicLocalWriter):
+        """Local atomic writer whose n-th write() raises (1 = the header)"""
+
+        def __init__(self, path: Path, fail_on_write: int):
+            super().__init__(path)
+            self.fail_on_write = fail_on_write
+            self.writes = 0
+
+        def write(self, data) -> int:
+            self.writes += 1
+            if self.writes == self.fail_on_write:
+                raise SinkFailure(f"write #{self.writes} failed")
+            return super().write(data)
+
+    return FailingLocalWriter
+
+
+def check(ok: bool, message: str, results: list) -> None:
+    print(f"{'✅' if ok else '❌'} {message}")
+    results.append(ok)
+
+
+def leftovers(directory: Path) -> list:
+    return sorted(p.name for p in directory.iterdir())
+
+
+def run_tests(directory: Path) -> bool:
+    from app import storage_service
+    from app.chunked_encryption import DecryptedFileReader, EncryptedFileWriter
+    from app.storage_backends import _AtomicLocalWriter
+
+    FailingLocalWriter = failing_writer_class()
+    results = []
+    key = os.urandom(32)
+    # Three full chunks are written by write(); the fourth (final) one and the header rewrite by close()
+    data = random.Random(7).randbytes(3 * CHUNK_SIZE + 1000)
+    final_chunk_write = 5
+    header_rewrite_write = 6
+
+    # 1. Complete file
+    target = directory / "complete"
+    with EncryptedFileWriter(_AtomicLocalWriter(target), key, CHUNK_SIZE) as writer:
+        writer.write(data)
+    with DecryptedFileReader(open(target, "rb"), key) as reader:
+        round_trip = reader.read()
+    check(round_trip == data and leftovers(directory) == ["complete"],
+          "Complete encrypted file round-trips and leaves no temp file", results)
+    target.unlink()
+
+    # 2./3. Sink fails while close() finalizes the file
+    for fail_on_write, what in [(final_chunk_write, "final chunk"), (header_rewrite_write, "header rewrite")]:
+        target = directory / "partial"
+        writer = EncryptedFileWriter(FailingLocalWriter(target, fail_on_write), key, CHUNK_SIZE)
+        writer.write(data)
+        try:
+            writer.close()
+            raised = False
+        except SinkFailure:
+            raised = True
+        check(raised and leftovers(directory) == [],
+              f"Sink failing on the {what} publishes nothing and leaves no temp file", results)
+
+    # 4. write_stream: the failure surfaces and nothing is published
+    class FailingBackend:
+        def open_write(self, location: str):
+            return FailingLocalWriter(Path(location), final_chunk_write)
+
+    original = storage_service.backend_for_location
+    storage_service.backend_for_location = lambda location: FailingBackend()
+    target = directory / "streamed"
+    try:
+        storage_service.write_stream(_Chunks(data), str(target), encrypt=True)
+        raised = False
+    except SinkFailure:
+        raised = True
+    finally:
+        storage_service.backend_for_location = original
+    check(raised and leftovers(directory) == [],
+          "write_stream publishes nothing when the final chunk cannot be written", results)
+
+    return all(results)
+
+
+class _Chunks:
+    """Source handing out data in STORAGE_CHUNK_SIZE reads"""
+
+    def __init__(self, data: bytes):
+        self._data = data
+        self._offset = 0
+
+    def read(self, size: int) -> bytes:
+        chunk = self._data[self._offset:self._offset + size]
+        self._offset += len(chunk)
+        return chunk
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["STORAGE_PATH"] = tmp
+        os.environ["STORAGE_CHUNK_SIZE"] = str(CHUNK_SIZE)
+        directory = Path(tmp) / "files"
+        directory.mkdir()
+        print(f"🧪 Writing test files under {directory}")
+        ok = run_tests(directory)
+    print("\n✅ All chunked encryption tests passed" if ok else "\n❌ Some chunked encryption tests failed")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Test the async Mathpix client against a local mock Mathpix server
+No Mathpix account or network access needed.
+
+Checks:
+- only the requested pages are submitted, and results map back to original page numbers
+- polling does not block the event loop
+- cancelling the task deletes the remote job
+- a job that never completes times out
+
+Usage:
+    cd backend
+    python test_mathpix_mock.py
+"""
+
+import asyncio
+import io
+import json
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Add backend directory to path so we can import app modules
+sys.path.insert(0, str(Path(__file__).parent))
+
+from PyPDF2 import PdfReader, PdfWriter
+
+
+class MockMathpixState:
+    def __init__(self):
+        self.jobs = {}  # pdf_id -> {"pages": int, "polls": int}
+        self.deleted = []
+        self.polls_until_complete = 2
+        self.never_complete = False
+        self.lock = threading.Lock()
+
+
+STATE = MockMathpixState()
+
+
+class MockMathpixHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass  # Keep test output readable
+
+    def _json(self, status_code, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path != "/v3/pdf":
+            return self._json(404, {"error": "not found"})
+        if not self.headers.get("app_id") or not self.headers.get("app_key"):
+            return self._json(401, {"error": "missing credentials"})
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        match = re.search(rb"%PDF.*%%EOF", body, re.S)
+        if not match:
+            return self._json(400, {"error": "no pdf in request"})
+        page_count = len(PdfReader(io.BytesIO(match.group(0))).pages)
+        with STATE.lock:
+            pdf_id = f"mock-{len(STATE.jobs) + 1}"
+            STATE.jobs[pdf_id] = {"pages": page_count, "polls": 0}
+        self._json(200, {"pdf_id": pdf_id})
+
+    def do_GET(self):
+        match = re.fullmatch(r"/v3/pdf/([\w-]+)(\.lines\.json)?", self.path)
+        if not match or match.group(1) not in STATE.jobs:
+            return self._json(404, {"error": "not found"})
+        job = STATE.jobs[match.group(1)]
+        if match.group(2):
+            pages = [
+                {"page": page, "lines": [{"text": f"mathpix page {page}"}, {"text": "$x^2 + y^2 = z^2$"}]}
+                for page in range(1, job["pages"] + 1)
+            ]
+            return self._json(200, {"pages": pages})
+        with STATE.lock:
+            job["polls"] += 1
+            done = not STATE.never_complete and job["polls"] >= STATE.polls_until_complete
+        self._json(200, {"status": "completed" if done else "split", "num_pages": job["pages"]})
+
+    def do_DELETE(self):
+        match = re.fullmatch(r"/v3/pdf/([\w-]+)", self.path)
+        if match:
+            STATE.deleted.append(match.group(1))
+        self._json(200, {})
+
+
+def make_pdf(page_count: int) -> bytes:
+    writer = PdfWriter()
+    for _ in range(page_count):
+        writer.add_blank_page(width=595, height=842)
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+async def measure_loop_lag(stop: asyncio.Event, interval: float = 0.05) -> float:
+    """Largest delay of a periodic tick while other work runs on the loop"""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+
+async def run_tests(base_url: str) -> bool:
+    from app.mathpix_client import MathpixClient, MathpixError, mathpix_ocr_pages
+
+    ok = True
+    pdf = make_pdf(6)
+
+    def client(**kwargs):
+        options = {"app_id": "test", "app_key": "test", "base_url": base_url, "poll_interval": 0.2, "timeout": 5}
+        options.update(kwargs)
+        return MathpixClient(**options)
+
+    # 1. Page subset submission and per-page mapping (+ event loop stays responsive)
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_loop_lag(stop))
+    async with client() as mathpix:
+        result = await mathpix_ocr_pages(pdf, [2, 5], client=mathpix)
+    stop.set()
+    worst_lag = await lag_task
+    job = STATE.jobs["mock-1"]
+    if job["pages"] == 2 and sorted(result) == [2, 5] and result[2].startswith("mathpix page 1") and result[5].startswith("mathpix page 2"):
+        print(f"✅ Submitted only 2 of 6 pages; results mapped to pages {sorted(result)}")
+    else:
+        print(f"❌ Subset mapping wrong: submitted {job['pages']} page(s), result {result}")
+        ok = False
+    if worst_lag < 0.1:
+        print(f"✅ Event loop stayed responsive while polling (worst tick delay {worst_lag * 1000:.0f} ms)")
+    else:
+        print(f"❌ Event loop blocked for {worst_lag * 1000:.0f} ms while polling")
+        ok = False
+
+    # 2. Cancellation deletes the remote job
+    STATE.never_complete = True
+    async with client() as mathpix:
+        task = asyncio.create_task(mathpix_ocr_pages(pdf, [1], client=mathpix))
+        await asyncio.sleep(0.5)
+        task.cancel()
+        try:
+            await task
+            print("❌ Cancelled task finished normally")
+            ok = False
+        except asyncio.CancelledError:
+            if "mock-2" in STATE.deleted:
+                print("✅ Cancelling the task deleted the Mathpix job")
+            else:
+                print(f"❌ Job not deleted after cancellation (deleted: {STATE.deleted})")
+                ok = False
+
+    # 3. Timeout
+    async with client(timeout=0.6) as mathpix:
+        try:
+            await mathpix_ocr_pages(pdf, [3], client=mathpix)
+            print("❌ Expected a timeout")
+            ok = False
+        except MathpixError as timeout_error:
+            print(f"✅ Timed out as expected: {timeout_error}")
+    STATE.never_complete = False
+
+    return ok
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockMathpixHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    print(f"🧪 Mock Mathpix server on {base_url}")
+    try:
+        ok = asyncio.run(run_tests(base_url))
+    finally:
+        server.shutdown()
+    print("\n✅ All Mathpix mock tests passed" if ok else "\n❌ Some Mathpix mock tests failed")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Test the S3 storage backend against a local S3-compatible server
+No AWS account needed.
+
+Uses moto's standalone server when moto is installed (pip install "moto[server]"),
+otherwise an already running server given by S3_ENDPOINT_URL, e.g. MinIO:
+
+    docker run -p 9000:9000 minio/minio server /data
+    S3_ENDPOINT_URL=http://localhost:9000 S3_ACCESS_KEY_ID=minioadmin \\
+        S3_SECRET_ACCESS_KEY=minioadmin python test_s3_backend.py
+
+Checks:
+- streamed multipart upload round-trips and leaves no pending uploads
+- an aborted upload leaves nothing behind
+- ranged reads return exactly the requested bytes
+- chunked encryption streams to S3 and supports random-access decryption
+- presigned URLs serve the object
+- deleting a prefix removes every object under it
+
+Usage:
+    cd backend
+    python test_s3_backend.py
+"""
+
+import os
+import random
+import sys
+import urllib.request
+import uuid
+from pathlib import Path
+
+# Add backend directory to path so we can import app modules
+sys.path.insert(0, str(Path(__file__).parent))
+
+BUCKET = f"studyqna-test-{uuid.uuid4().hex[:8]}"
+
+
+def start_local_server():
+    """Start moto's S3 server if available. Returns (server or None, endpoint_url)."""
+    if os.getenv("S3_ENDPOINT_URL"):
+        return None, os.environ["S3_ENDPOINT_URL"]
+    try:
+        from moto.server import ThreadedMotoServer
+    except ImportError:
+        print("❌ Install moto (pip install \"moto[server]\") or set S3_ENDPOINT_URL to a running S3-compatible server")
+        sys.exit(1)
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=0)
+    server.start()
+    host, port = server.get_host_and_port()
+    return server, f"http://{host}:{port}"
+
+
+def check(ok: bool, message: str, results: list) -> None:
+    print(f"{'✅' if ok else '❌'} {message}")
+    results.append(ok)
+
+
+def run_tests() -> bool:
+    from app.chunked_encryption import DecryptedFileReader, EncryptedFileWriter
+    from app.storage_backends import S3StorageBackend
+
+    backend = S3StorageBackend(bucket=BUCKET, prefix="test")
+    try:
+        backend.client.create_bucket(Bucket=BUCKET)
+    except Exception as e:
+        print(f"⚠️ create_bucket: {e}")
+
+    results = []
+    rng = random.Random(3)
+    data = rng.randbytes(13 * 1024 * 1024 + 123)  # Three 5 MB parts, the last one short
+
+    # 1. Multipart streamed upload
+    location = backend.location_for("blobs/aa/bb/multipart")
+    writer = backend.open_write(location)
+    for offset in range(0, len(data), 256 * 1024):
+        writer.write(data[offset:offset + 256 * 1024])
+    writer.close()
+    with backend.open_read(location) as f:
+        round_trip = f.read()
+    pending = backend.client.list_multipart_uploads(Bucket=BUCKET).get("Uploads", [])
+    check(round_trip == data and not pending, f"Multipart upload round-trips {len(data) / 1024 / 1024:.1f} MB in 5 MB parts", results)
+
+    # 2. Aborted upload leaves nothing behind
+    aborted = backend.location_for("blobs/aa/bb/aborted")
+    writer = backend.open_write(aborted)
+    writer.write(data[:6 * 1024 * 1024])
+    writer.abort()
+    pending = backend.client.list_multipart_uploads(Bucket=BUCKET).get("Uploads", [])
+    check(not backend.exists(aborted) and not pending, "Aborted upload leaves no object and no pending multipart upload", results)
+
+    # 3. Ranged reads
+    ranges_ok = all(
+        backend.read_range(location, start, length) == data[start:start + length]
+        for start, length in [(0, 10), (5 * 1024 * 1024 - 3, 7), (len(data) - 5, 50), (len(data) + 10, 5)]
+    )
+    check(ranges_ok, "Ranged reads return exactly the requested bytes", results)
+
+    # 4. Chunked encryption streamed to S3 (no header rewrite possible) + random access
+    key = os.urandom(32)
+    encrypted = backend.location_for("blobs/aa/bb/encrypted")
+    with EncryptedFileWriter(backend.open_write(encrypted), key, chunk_size=64 * 1024) as enc:
+        for offset in range(0, len(data), 100_000):
+            enc.write(data[offset:offset + 100_000])
+    reader = DecryptedFileReader(backend.open_read(encrypted), key)
+    samples = [(rng.randrange(len(data)), rng.randrange(1, 200_000)) for _ in range(20)]
+    random_ok = reader.size == len(data) and all(reader.read_range(o, n) == data[o:o + n] for o, n in samples)
+    reader.close()
+    check(random_ok, "Encrypted object decrypts at random offsets (size derived from object length)", results)
+
+    # 5. Presigned URL
+    url = backend.presigned_url(location, "book.pdf", "application/pdf", 60)
+    with urllib.request.urlopen(url) as response:
+        presigned_ok = response.read(1024) == data[:1024]
+    check(presigned_ok, "Presigned URL serves the object", results)
+
+    # 6. Prefix delete
+    backend.delete_prefix(backend.location_for("blobs/aa"))
+    remaining = backend.client.list_objects_v2(Bucket=BUCKET, Prefix="test/blobs/aa/").get("KeyCount", 0)
+    check(remaining == 0, "Deleting a prefix removes every object under it", results)
+
+    return all(results)
+
+
+def main():
+    server, endpoint_url = start_local_server()
+    os.environ["S3_ENDPOINT_URL"] = endpoint_url
+    os.environ.setdefault("S3_ACCESS_KEY_ID", "test")
+    os.environ.setdefault("S3_SECRET_ACCESS_KEY", "test")
+    os.environ.setdefault("S3_REGION", "us-east-1")
+    os.environ["S3_MULTIPART_CHUNK_SIZE"] = str(5 * 1024 * 1024)
+    print(f"🧪 S3-compatible server at {endpoint_url}, bucket {BUCKET}")
+    try:
+        ok = run_tests()
+    finally:
+        if server is not None:
+            server.stop()
+    print("\n✅ All S3 backend tests passed" if ok else "\n❌ Some S3 backend tests failed")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
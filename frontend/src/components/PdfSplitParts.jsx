@@ -3,6 +3,38 @@ import { api } from '../utils/api'
 import toast from 'react-hot-toast'
 import { getRotatingMessages } from '../utils/rotatingLoader'
 
+// First-page thumbnail of a part (fetched with the auth header, cached by the browser)
+const PartThumbnail = ({ partId }) => {
+  const [url, setUrl] = useState(null)
+
+  useEffect(() => {
+    let objectUrl = null
+    let cancelled = false
+    api.getSplitPartThumbnail(partId)
+      .then((response) => {
+        if (cancelled) return
+        objectUrl = URL.createObjectURL(response.data)
+        setUrl(objectUrl)
+      })
+      .catch(() => {})  // No thumbnail (e.g. poppler missing): just show nothing
+    return () => {
+      cancelled = true
+      if (objectUrl) URL.revokeObjectURL(objectUrl)
+    }
+  }, [partId])
+
+  if (!url) {
+    return <div className="w-16 h-20 mr-4 flex-shrink-0 rounded border border-gray-200 bg-gray-100" />
+  }
+  return (
+    <img
+      src={url}
+      alt=""
+      className="w-16 h-20 mr-4 flex-shrink-0 rounded border border-gray-200 object-cover object-top"
+    />
+  )
+}
+
 const PdfSplitParts = ({ uploadId, onPartSelected, onMultiSelect }) => {
   const [parts, setParts] = useState([])
   const [loading, setLoading] = useState(false)
@@ -19,6 +51,14 @@ const PdfSplitParts = ({ uploadId, onPartSelected, onMultiSelect }) => {
     }
   }, [uploadId])
 
+  // Poll while parts are still being extracted in the background
+  useEffect(() => {
+    const extracting = parts.some(p => p.extraction_status === 'pending' || p.extraction_status === 'running')
+    if (!extracting) return
+    const timer = setTimeout(checkSplitStatus, 5000)
+    return () => clearTimeout(timer)
+  }, [parts])
+
   const checkSplitStatus = async () => {
     try {
       const response = await api.getSplitParts(uploadId)
@@ -248,6 +288,7 @@ const PdfSplitParts = ({ uploadId, onPartSelected, onMultiSelect }) => {
             className="bg-white border border-gray-200 rounded-lg p-4 hover:shadow-md transition-shadow"
           >
             <div className="flex items-center justify-between">
+              <PartThumbnail partId={part.id} />
               <div className="flex-1">
                 <div className="flex items-center gap-3 mb-2">
                   <span className="bg-blue-100 text-blue-800 px-3 py-1 rounded-full text-sm font-semibold">
@@ -259,6 +300,24 @@ const PdfSplitParts = ({ uploadId, onPartSelected, onMultiSelect }) => {
                   <span className="text-sm text-gray-500">
                     {(part.file_size / 1024 / 1024).toFixed(2)} MB
                   </span>
+                  {part.extraction_status === 'done' && (
+                    <span className="bg-green-100 text-green-800 px-2 py-0.5 rounded-full text-xs font-semibold">
+                      Ready
+                    </span>
+                  )}
+                  {(part.extraction_status === 'pending' || part.extraction_status === 'running') && (
+                    <span className="bg-yellow-100 text-yellow-800 px-2 py-0.5 rounded-full text-xs font-semibold">
+                      Reading text...
+                    </span>
+                  )}
+                  {part.extraction_status === 'failed' && (
+                    <span
+                      className="bg-red-100 text-red-800 px-2 py-0.5 rounded-full text-xs font-semibold"
+                      title={part.extraction_error || ''}
+                    >
+                      Text not readable
+                    </span>
+                  )}
                 </div>
                 
                 {renamingPartId === part.id ? (
@@ -267,12 +326,12 @@ const PdfSplitParts = ({ uploadId, onPartSelected, onMultiSelect }) => {
                       type="text"
                       value={newName}
                       onChange={(e) => setNewName(e.target.value)}
-                      placeholder={part.custom_name || part.file_name}
+                      placeholder={part.custom_name || part.title || part.file_name}
                       className="flex-1 px-3 py-1 border border-gray-300 rounded text-sm"
                       autoFocus
                     />
                     <button
-                      onClick={() => handleRename(part.id, part.custom_name || part.file_name)}
+                      onClick={() => handleRename(part.id, part.custom_name || part.title || part.file_name)}
                       className="bg-green-600 text-white px-3 py-1 rounded text-sm hover:bg-green-700"
                     >
                       Save
@@ -290,12 +349,12 @@ const PdfSplitParts = ({ uploadId, onPartSelected, onMultiSelect }) => {
                 ) : (
                   <div className="flex items-center gap-2">
                     <span className="text-base font-medium text-gray-900">
-                      {part.custom_name || part.file_name}
+                      {part.custom_name || part.title || part.file_name}
                     </span>
                     <button
                       onClick={() => {
                         setRenamingPartId(part.id)
-                        setNewName(part.custom_name || part.file_name)
+                        setNewName(part.custom_name || part.title || part.file_name)
                       }}
                       className="text-blue-600 hover:text-blue-800 text-sm"
                       title="Rename this part"
@@ -644,6 +644,8 @@ const QnAGenerator = ({ uploads, selectedUpload, onSelectUpload, isPremium, onGe
       ...prev,
       upload_id: partIds ? null : (selectedUpload?.id || ''),
       part_ids: partIds || null,
+      start_page: null,
+      end_page: null,
       // Auto-update num_questions when parts selection changes (reset to default)
       num_questions: partCount > 0 
         ? calculateDefaultQuestions(partCount, prev.marks, isMobile)
@@ -1264,7 +1266,7 @@ const QnAGenerator = ({ uploads, selectedUpload, onSelectUpload, isPremium, onGe
                     <span className="text-[9px] md:text-[11px] text-gray-500">Auto-set type: {deriveTypeFromMarks(q.marks)}</span>
                     {q.source && (
                       <span className="text-[8px] md:text-[10px] text-gray-500 bg-gray-100 px-1.5 md:px-2 py-0.5 rounded mt-1 break-words">
-                        📄 Part {q.source.part_number} {q.source.exact_page ? `(Page ${q.source.exact_page})` : (q.source.page_range || `Pages ${q.source.start_page}-${q.source.end_page}`)}
+                        📄 {q.source.part_number ? `Part ${q.source.part_number} ` : ''}{q.source.exact_page ? `(Page ${q.source.exact_page})` : (q.source.page_range || `Pages ${q.source.start_page}-${q.source.end_page}`)}
                       </span>
                     )}
                   </div>
@@ -2037,6 +2039,40 @@ const QnAGenerator = ({ uploads, selectedUpload, onSelectUpload, isPremium, onGe
           )}
         </div>
 
+        {/* Optional page range - context is built from just these pages */}
+        {settings.upload_id && !settings.part_ids && selectedUpload?.pages > 1 && (
+          <div>
+            <label className="block text-sm md:text-sm font-medium text-gray-700 mb-2">
+              Page Range
+              <span className="text-xs md:text-xs text-gray-500 ml-2">
+                (Optional - leave empty to use the whole document)
+              </span>
+            </label>
+            <div className="flex items-center gap-2">
+              <input
+                type="number"
+                min={1}
+                max={selectedUpload.pages}
+                value={settings.start_page || ''}
+                onChange={(e) => setSettings({ ...settings, start_page: e.target.value ? parseInt(e.target.value) : null })}
+                placeholder="From"
+                className="w-24 border border-gray-300 rounded-md px-3 py-2 text-sm"
+              />
+              <span className="text-gray-500">–</span>
+              <input
+                type="number"
+                min={settings.start_page || 1}
+                max={selectedUpload.pages}
+                value={settings.end_page || ''}
+                onChange={(e) => setSettings({ ...settings, end_page: e.target.value ? parseInt(e.target.value) : null })}
+                placeholder="To"
+                className="w-24 border border-gray-300 rounded-md px-3 py-2 text-sm"
+              />
+              <span className="text-xs text-gray-500">of {selectedUpload.pages} pages</span>
+            </div>
+          </div>
+        )}
+
         <div>
           <label className="block text-sm md:text-sm font-medium text-gray-700 mb-2">
             Target Language
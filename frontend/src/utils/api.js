@@ -27,6 +27,8 @@ export const api = {
     axios.put(`${API_BASE}/upload/split-parts/${partId}/rename`, { custom_name: customName }),
   previewSplitPart: (partId) => 
     axios.get(`${API_BASE}/upload/split-parts/${partId}/preview`, { responseType: 'blob' }),
+  getSplitPartThumbnail: (partId) => 
+    axios.get(`${API_BASE}/upload/split-parts/${partId}/thumbnail`, { responseType: 'blob' }),
   downloadSplitPart: (partId) => 
     axios.get(`${API_BASE}/upload/split-parts/${partId}/download`),
   